@@ -0,0 +1,325 @@
+"""
+배치 세션 API 엔드포인트 - 임베딩을 서버에 보관하고 점진적으로 분석
+"""
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query
+
+from ...schemas.requests import (
+    BatchSessionCreateRequest,
+    BatchSessionAddImagesRequest,
+    BatchSessionRangeSearchRequest,
+    BatchImage
+)
+from ...schemas.responses import BatchSessionResponse, BatchAnalysisResponse
+from ...models.model_manager import model_manager
+from ...services.batch_session import batch_session_manager, BatchSession
+from ...services.embedding_inputs import resolve_embedding_inputs
+from ...services.single_flight import single_flight
+from ...core.logging import get_logger, log_request
+from ...core.config import settings
+from .faces import create_response_metadata, create_error_detail
+
+logger = get_logger(__name__)
+router = APIRouter()
+
+
+def _get_session_or_404(session_id: str) -> BatchSession:
+    """세션 조회 (없거나 만료되면 404)"""
+    session = batch_session_manager.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=create_error_detail(
+            "SESSION_NOT_FOUND", f"배치 세션을 찾을 수 없거나 만료되었습니다: {session_id}"
+        ))
+    return session
+
+
+async def _extract_embeddings(images: List[BatchImage]) -> Tuple[List[Tuple[str, list, Dict[str, Any]]], List[str]]:
+    """새 이미지들의 임베딩만 추출"""
+    if len(images) > settings.max_batch_size:
+        raise ValueError(f"배치 크기가 최대값을 초과했습니다 (최대 {settings.max_batch_size}개)")
+
+    analyzer = model_manager.get_face_analyzer()
+    items = []
+    failed_ids = []
+    await single_flight.submit(analyzer.prefetch_faces, [img.image for img in images])
+
+    for img in images:
+        try:
+            result = await analyzer.extract_embedding(img.image, face_id=0)
+            items.append((img.id, result["embedding"], {
+                "name": img.name,
+                "bounding_box": result["bounding_box"],
+                "confidence": result["confidence"]
+            }))
+        except Exception as e:
+            logger.warning(f"이미지 {img.id} 처리 실패: {e}")
+            failed_ids.append(img.id)
+
+    return items, failed_ids
+
+
+@router.post("/batch-sessions", response_model=BatchSessionResponse)
+async def create_batch_session(request: BatchSessionCreateRequest):
+    """
+    배치 세션을 생성합니다. 임베딩은 TTL 동안 서버에 보관됩니다.
+
+    - **images**: 초기 이미지들 (선택사항)
+    - **similarity_threshold**: 그룹화 유사도 임계값
+    """
+    start_time = time.time()
+
+    try:
+        async with model_manager.request_context("batch_session_create"):
+            items, failed_ids = await _extract_embeddings(request.images)
+
+            session = batch_session_manager.create(request.similarity_threshold, items)
+            added_ids = list(session.image_ids)
+
+            data = session.get_summary()
+            data["added_ids"] = added_ids
+            data["failed_ids"] = failed_ids
+            data["groups"] = session.get_groups()["groups"]
+
+            processing_time = time.time() - start_time
+
+            response_data = BatchSessionResponse(
+                success=True,
+                data=data,
+                metadata=create_response_metadata(processing_time)
+            )
+
+            log_request(
+                method="POST",
+                url="/batch-sessions",
+                status_code=200,
+                processing_time=processing_time
+            )
+
+            return response_data
+
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/batch-sessions",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+
+    except Exception as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/batch-sessions",
+            status_code=500,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "배치 세션 생성 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
+
+
+@router.post("/batch-sessions/{session_id}/images", response_model=BatchSessionResponse)
+async def add_batch_session_images(session_id: str, request: BatchSessionAddImagesRequest):
+    """
+    배치 세션에 이미지를 추가합니다.
+
+    새 이미지 K개의 임베딩과 K x N 유사도 블록만 계산하며, 그룹은 점진적으로 갱신됩니다.
+
+    - **images**: 추가할 이미지들
+    """
+    start_time = time.time()
+
+    try:
+        async with model_manager.request_context("batch_session_add"):
+            session = _get_session_or_404(session_id)
+
+            items, failed_ids = await _extract_embeddings(request.images)
+            batch_session_manager.check_capacity(session, len(items))
+            added_ids = session.add(items)
+
+            data = session.get_summary()
+            data["added_ids"] = added_ids
+            data["failed_ids"] = failed_ids
+            data["similarity_block"] = session.get_similarity_block(added_ids) if added_ids else None
+            data["groups"] = session.get_groups()["groups"]
+
+            processing_time = time.time() - start_time
+
+            response_data = BatchSessionResponse(
+                success=True,
+                data=data,
+                metadata=create_response_metadata(processing_time)
+            )
+
+            log_request(
+                method="POST",
+                url=f"/batch-sessions/{session_id}/images",
+                status_code=200,
+                processing_time=processing_time
+            )
+
+            return response_data
+
+    except HTTPException:
+        raise
+
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url=f"/batch-sessions/{session_id}/images",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+
+    except Exception as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url=f"/batch-sessions/{session_id}/images",
+            status_code=500,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "배치 세션 이미지 추가 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
+
+
+@router.get("/batch-sessions/{session_id}", response_model=BatchSessionResponse)
+async def get_batch_session(session_id: str):
+    """
+    배치 세션 정보를 조회합니다.
+    """
+    start_time = time.time()
+    session = _get_session_or_404(session_id)
+
+    data = session.get_summary()
+    data["groups"] = session.get_groups()["groups"]
+
+    return BatchSessionResponse(
+        success=True,
+        data=data,
+        metadata=create_response_metadata(time.time() - start_time)
+    )
+
+
+@router.get("/batch-sessions/{session_id}/analysis", response_model=BatchAnalysisResponse)
+async def analyze_batch_session(
+    session_id: str,
+    analysis_type: str = Query(..., pattern="^(similarity_matrix|find_best_match|group_similar)$"),
+    similarity_threshold: Optional[float] = Query(None, ge=0.0, le=1.0)
+):
+    """
+    세션에 저장된 임베딩으로 배치 분석을 수행합니다 (이미지 재분석 없음).
+
+    - **analysis_type**: 분석 유형 (similarity_matrix, find_best_match, group_similar)
+    - **similarity_threshold**: 유사도 임계값 (생략 시 세션 임계값)
+    """
+    start_time = time.time()
+
+    try:
+        session = _get_session_or_404(session_id)
+
+        if session.size < 2:
+            raise ValueError("최소 2개의 유효한 얼굴 이미지가 필요합니다")
+
+        result = session.analyze(analysis_type, similarity_threshold)
+
+        processing_time = time.time() - start_time
+
+        log_request(
+            method="GET",
+            url=f"/batch-sessions/{session_id}/analysis",
+            status_code=200,
+            processing_time=processing_time
+        )
+
+        return BatchAnalysisResponse(
+            success=True,
+            data=result,
+            metadata=create_response_metadata(processing_time)
+        )
+
+    except HTTPException:
+        raise
+
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="GET",
+            url=f"/batch-sessions/{session_id}/analysis",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+
+
+@router.post("/batch-sessions/{session_id}/range-search", response_model=BatchSessionResponse)
+async def range_search_batch_session(session_id: str, request: BatchSessionRangeSearchRequest):
+    """
+    세션에서 유사도가 임계값 이상인 모든 이미지를 찾습니다.
+
+    - **image_id**: 세션 안의 기준 이미지 (이미 계산된 유사도 행 사용)
+    - **query**: 세션 밖의 질의 임베딩 또는 이미지 (image_id 대신)
+    - **similarity_threshold**: 최소 유사도
+    """
+    start_time = time.time()
+
+    try:
+        session = _get_session_or_404(session_id)
+
+        embedding = None
+        if request.query is not None:
+            async with model_manager.request_context("batch_session_range_search"):
+                vectors, _ = await resolve_embedding_inputs([request.query])
+            embedding = vectors[0]
+
+        result = session.range_search(request.similarity_threshold, image_id=request.image_id, embedding=embedding)
+        result["session_id"] = session_id
+
+        processing_time = time.time() - start_time
+
+        log_request(
+            method="POST",
+            url=f"/batch-sessions/{session_id}/range-search",
+            status_code=200,
+            processing_time=processing_time
+        )
+
+        return BatchSessionResponse(
+            success=True,
+            data=result,
+            metadata=create_response_metadata(processing_time)
+        )
+
+    except HTTPException:
+        raise
+
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url=f"/batch-sessions/{session_id}/range-search",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+
+
+@router.delete("/batch-sessions/{session_id}")
+async def delete_batch_session(session_id: str):
+    """
+    배치 세션을 삭제합니다.
+    """
+    _get_session_or_404(session_id)
+    batch_session_manager.delete(session_id)
+
+    return {
+        "success": True,
+        "data": {"session_id": session_id, "deleted": True}
+    }
@@ -0,0 +1,69 @@
+"""
+캐시 관리 API 엔드포인트 - 얼굴 분석 캐시 조회와 수동 비우기
+
+캐시는 워커 프로세스마다 따로 있으므로 응답은 요청을 처리한 워커의 캐시만 보여줍니다.
+비우기는 관리 작업이라 관리 키(ADMIN_API_KEY)나 API 키 인증이 있어야 합니다.
+"""
+import secrets
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from ...services.analysis_cache import analysis_cache
+from ...core.config import settings
+from ...core.logging import get_logger
+from .faces import create_error_detail
+
+logger = get_logger(__name__)
+router = APIRouter()
+
+
+async def require_admin(request: Request):
+    """
+    관리 작업 인증
+
+    ADMIN_API_KEY 가 있으면 X-Admin-Key 헤더가 일치해야 하고(401), 없으면 API 키 인증(미들웨어가
+    X-API-Key 확인)이 켜져 있어야 합니다. 둘 다 설정되지 않았으면 누구나 호출할 수 있으므로 403 입니다.
+    """
+    if settings.admin_api_key:
+        provided = request.headers.get("X-Admin-Key") or ""
+        if not secrets.compare_digest(provided.encode("utf-8"), settings.admin_api_key.encode("utf-8")):
+            raise HTTPException(status_code=401, detail=create_error_detail("UNAUTHORIZED", "유효하지 않은 관리 키입니다"))
+        return
+    if settings.api_key_enabled and settings.api_key:
+        return
+    raise HTTPException(
+        status_code=403,
+        detail=create_error_detail("ADMIN_DISABLED", "관리 키(ADMIN_API_KEY)나 API 키 인증이 설정되지 않아 관리 작업을 할 수 없습니다")
+    )
+
+
+@router.get("/cache/analysis")
+async def get_analysis_cache(top: int = Query(20, ge=0, le=1000)):
+    """
+    얼굴 분석 캐시 상태를 조회합니다.
+
+    - **top**: 적중 수가 많은 순서로 보여줄 항목 수 (키는 이미지 해시)
+    """
+    return {
+        "success": True,
+        "data": {
+            "stats": analysis_cache.get_stats(),
+            "top_keys": analysis_cache.get_top_keys(top)
+        }
+    }
+
+
+@router.delete("/cache/analysis", dependencies=[Depends(require_admin)])
+async def flush_analysis_cache():
+    """
+    얼굴 분석 캐시를 비웁니다 (접근 빈도 기록 포함).
+
+    관리 키(X-Admin-Key) 또는 API 키가 필요하며, 둘 다 설정되지 않은 서버에서는 403 입니다.
+    """
+    removed = analysis_cache.clear()
+    logger.info(f"얼굴 분석 캐시 비움: {removed['entries']}개, {removed['bytes']} 바이트")
+
+    return {
+        "success": True,
+        "data": {"flushed": True, **removed}
+    }
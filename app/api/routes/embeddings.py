@@ -0,0 +1,234 @@
+"""
+임베딩 비교 API 엔드포인트 - 저장된 임베딩으로 이미지 재분석 없이 비교
+"""
+import time
+
+import numpy as np
+from fastapi import APIRouter, HTTPException
+
+from ...schemas.requests import (
+    EmbeddingComparisonRequest,
+    EmbeddingSearchRequest,
+    EmbeddingBatchAnalysisRequest
+)
+from ...schemas.responses import (
+    EmbeddingComparisonResponse,
+    EmbeddingSearchResponse,
+    BatchAnalysisResponse
+)
+from ...models.model_manager import model_manager
+from ...services.embedding_inputs import resolve_embedding_inputs
+from ...utils.similarity_utils import (
+    cosine_similarity_matrix,
+    similarity_matrix_result,
+    best_matches_from_matrix,
+    greedy_groups_from_matrix
+)
+from ...core.logging import get_logger, log_request
+from ...core.config import settings
+from .faces import create_response_metadata, create_error_detail
+
+logger = get_logger(__name__)
+router = APIRouter(prefix="/embeddings")
+
+
+@router.post("/compare", response_model=EmbeddingComparisonResponse)
+async def compare_embeddings(request: EmbeddingComparisonRequest):
+    """
+    두 임베딩(또는 임베딩과 이미지)을 1:1 비교합니다.
+    
+    - **source**: 원본 임베딩 또는 이미지
+    - **target**: 비교할 임베딩 또는 이미지
+    - **similarity_threshold**: 일치 판정 임계값
+    """
+    start_time = time.time()
+    
+    try:
+        async with model_manager.request_context("embedding_comparison"):
+            vectors, image_count = await resolve_embedding_inputs([request.source, request.target])
+            similarity = float(np.dot(vectors[0], vectors[1]))
+            
+            processing_time = time.time() - start_time
+            
+            response_data = EmbeddingComparisonResponse(
+                success=True,
+                data={
+                    "similarity": similarity,
+                    "is_match": similarity >= request.similarity_threshold,
+                    "similarity_threshold": request.similarity_threshold,
+                    "computed_from_images": image_count
+                },
+                metadata=create_response_metadata(processing_time)
+            )
+            
+            log_request(
+                method="POST",
+                url="/embeddings/compare",
+                status_code=200,
+                processing_time=processing_time
+            )
+            
+            return response_data
+            
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/embeddings/compare",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+        
+    except Exception as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/embeddings/compare",
+            status_code=500,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "임베딩 비교 처리 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
+
+
+@router.post("/search", response_model=EmbeddingSearchResponse)
+async def search_embeddings(request: EmbeddingSearchRequest):
+    """
+    질의 임베딩을 후보 임베딩들과 1:N 비교합니다.
+    
+    - **query**: 질의 임베딩 또는 이미지
+    - **candidates**: 후보 임베딩 또는 이미지들
+    - **top_k**: 반환할 최대 결과 수
+    - **similarity_threshold**: 최소 유사도
+    """
+    start_time = time.time()
+    
+    try:
+        async with model_manager.request_context("embedding_search"):
+            vectors, image_count = await resolve_embedding_inputs([request.query] + request.candidates)
+            scores = vectors[1:] @ vectors[0]
+            
+            # 상위 k개만 부분 정렬
+            k = min(request.top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            
+            matches = [
+                {
+                    "id": request.candidates[i].id,
+                    "index": int(i),
+                    "similarity": float(scores[i])
+                }
+                for i in top
+                if scores[i] >= request.similarity_threshold
+            ]
+            
+            processing_time = time.time() - start_time
+            
+            response_data = EmbeddingSearchResponse(
+                success=True,
+                data={
+                    "matches": matches,
+                    "total_candidates": len(request.candidates),
+                    "computed_from_images": image_count
+                },
+                metadata=create_response_metadata(processing_time)
+            )
+            
+            log_request(
+                method="POST",
+                url="/embeddings/search",
+                status_code=200,
+                processing_time=processing_time
+            )
+            
+            return response_data
+            
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/embeddings/search",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+        
+    except Exception as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/embeddings/search",
+            status_code=500,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "임베딩 검색 처리 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
+
+
+@router.post("/batch-analysis", response_model=BatchAnalysisResponse)
+async def batch_analyze_embeddings(request: EmbeddingBatchAnalysisRequest):
+    """
+    임베딩(또는 이미지)으로 배치 분석을 수행합니다. 결과 형식은 /batch-analysis 와 같습니다.
+    
+    - **items**: 분석할 임베딩 또는 이미지들 (고유 id 필수)
+    - **analysis_type**: 분석 유형 (similarity_matrix, find_best_match, group_similar)
+    - **similarity_threshold**: 유사도 임계값
+    """
+    start_time = time.time()
+    
+    try:
+        async with model_manager.request_context("embedding_batch_analysis"):
+            # N×N 행렬을 만드므로 비교/검색보다 작은 상한 적용
+            vectors, _ = await resolve_embedding_inputs(request.items, settings.max_embedding_matrix_size)
+            image_ids = [item.id for item in request.items]
+            sim = cosine_similarity_matrix(vectors)
+            
+            if request.analysis_type == "similarity_matrix":
+                result = similarity_matrix_result(sim, image_ids)
+            elif request.analysis_type == "find_best_match":
+                result = best_matches_from_matrix(sim, image_ids, request.similarity_threshold)
+            else:
+                result = greedy_groups_from_matrix(sim, image_ids, request.similarity_threshold)
+            
+            processing_time = time.time() - start_time
+            
+            response_data = BatchAnalysisResponse(
+                success=True,
+                data=result,
+                metadata=create_response_metadata(processing_time)
+            )
+            
+            log_request(
+                method="POST",
+                url="/embeddings/batch-analysis",
+                status_code=200,
+                processing_time=processing_time
+            )
+            
+            return response_data
+            
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/embeddings/batch-analysis",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+        
+    except Exception as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/embeddings/batch-analysis",
+            status_code=500,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "임베딩 배치 분석 처리 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
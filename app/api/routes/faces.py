@@ -1,13 +1,15 @@
 """
 얼굴 분석 API 엔드포인트
 """
+import json
 import time
 import uuid
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union
 
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 
 from ...schemas.requests import (
     FaceComparisonRequest,
@@ -16,6 +18,7 @@ from ...schemas.requests import (
     BatchAnalysisRequest,
     FamilySimilarityRequest,
     FindMostSimilarParentRequest,
+    FamilyMatrixRequest,
     AgeEstimationRequest,
     GenderEstimationRequest
 )
@@ -26,11 +29,22 @@ from ...schemas.responses import (
     BatchAnalysisResponse,
     FamilySimilarityResponse,
     FindMostSimilarParentResponse,
+    FamilyMatrixResponse,
     AgeEstimationResponse,
     GenderEstimationResponse,
     ResponseMetadata
 )
 from ...models.model_manager import model_manager
+from ...services.single_flight import single_flight
+from ...services.response_cache import response_cache, make_etag, etag_matches
+from ...services.reference_faces import reference_face_manager, ReferenceFace
+from ...utils.similarity_utils import (
+    to_normalized_matrix,
+    cosine_similarity_matrix,
+    similarity_matrix_result,
+    best_matches_from_matrix,
+    greedy_groups_from_matrix
+)
 from ...core.logging import get_logger, log_request
 from ...core.config import settings
 
@@ -48,6 +62,77 @@ def create_response_metadata(processing_time: float) -> ResponseMetadata:
     )
 
 
+def create_error_detail(code: str, message: str, details: Dict[str, Any] = None) -> Dict[str, Any]:
+    """에러 응답 본문 생성"""
+    return {
+        "success": False,
+        "error": {
+            "code": code,
+            "message": message,
+            "details": details or {}
+        }
+    }
+
+
+async def _resolve_face_input(image: Optional[str], reference_id: Optional[str]) -> Union[str, ReferenceFace]:
+    """요청의 이미지 또는 참조 얼굴 (참조 얼굴이 없거나 만료되면 ValueError, 공유 저장소 조회는 작업 스레드에서)"""
+    if reference_id is not None:
+        return await single_flight.submit(reference_face_manager.resolve, reference_id)
+    return image
+
+
+def _flight_image(face_input: Union[str, ReferenceFace]) -> str:
+    """단일 실행 키에 쓰는 이미지 문자열 (참조 얼굴은 ID 기반 토큰)"""
+    return face_input.token if isinstance(face_input, ReferenceFace) else face_input
+
+
+def _response_etag(analyzer, endpoint: str, images: list, params: Dict[str, Any]) -> str:
+    """응답 ETag (더미 모드 응답은 실제 모델 응답과 다른 ETag)"""
+    model_version = settings.model_name if analyzer.is_loaded else f"{settings.model_name}:dummy"
+    return make_etag(endpoint, images, params, model_version)
+
+
+def _json_bytes(content) -> bytes:
+    """JSONResponse 와 같은 방식으로 직렬화"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _data_response(data: bytes, metadata, headers: Dict[str, str]) -> Response:
+    """직렬화된 data 에 이번 요청의 메타데이터를 붙인 성공 응답 (data 는 다시 직렬화하지 않음)"""
+    body = b'{"success":true,"metadata":' + _json_bytes(jsonable_encoder(metadata)) + b',"data":' + data + b"}"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _cached_response(http_request: Request, etag: str, url: str, start_time: float) -> Optional[Response]:
+    """If-None-Match 가 일치하면 304, 응답 캐시에 있으면 저장된 data 로 만든 응답 (둘 다 아니면 None)"""
+    if not response_cache.enabled:
+        return None
+    
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        response_cache.record_not_modified()
+        log_request(method="POST", url=url, status_code=304, processing_time=time.time() - start_time)
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    data = response_cache.get(etag)
+    if data is None:
+        return None
+    
+    # request_id, timestamp, processing_time 은 요청마다 새로 만듦
+    processing_time = time.time() - start_time
+    log_request(method="POST", url=url, status_code=200, processing_time=processing_time, cache="hit")
+    return _data_response(data, create_response_metadata(processing_time), {"ETag": etag, "X-Cache": "HIT"})
+
+
+def _cacheable_response(etag: str, response_data) -> Response:
+    """응답의 data 만 직렬화해 캐시에 저장하고 ETag 헤더와 함께 반환"""
+    if not response_cache.enabled:
+        return JSONResponse(content=jsonable_encoder(response_data))
+    
+    data = _json_bytes(jsonable_encoder(response_data.data))
+    response_cache.put(etag, data)
+    return _data_response(data, response_data.metadata, {"ETag": etag, "X-Cache": "MISS"})
+
+
 @router.post("/compare-faces", response_model=FaceComparisonResponse)
 async def compare_faces(request: FaceComparisonRequest):
     """
@@ -55,6 +140,7 @@ async def compare_faces(request: FaceComparisonRequest):
     
     - **source_image**: 원본 이미지 (Base64 인코딩)
     - **target_image**: 비교할 이미지 (Base64 인코딩)
+    - **source_reference_id / target_reference_id**: 이미지 대신 쓸 참조 얼굴 ID (/references)
     - **similarity_threshold**: 유사도 임계값 (0.0-1.0)
     """
     start_time = time.time()
@@ -63,11 +149,17 @@ async def compare_faces(request: FaceComparisonRequest):
         async with model_manager.request_context("face_comparison"):
             # 얼굴 분석기 가져오기
             analyzer = model_manager.get_face_analyzer()
+            source = await _resolve_face_input(request.source_image, request.source_reference_id)
+            target = await _resolve_face_input(request.target_image, request.target_reference_id)
             
             # 얼굴 비교 수행
-            result = await analyzer.compare_faces(
-                source_image=request.source_image,
-                target_image=request.target_image,
+            result = await single_flight.run(
+                "compare_faces",
+                [_flight_image(source), _flight_image(target)],
+                {"threshold": request.similarity_threshold},
+                analyzer.compare_faces_sync,
+                source_image=source,
+                target_image=target,
                 threshold=request.similarity_threshold
             )
             
@@ -134,7 +226,7 @@ async def compare_faces(request: FaceComparisonRequest):
 
 
 @router.post("/detect-faces", response_model=FaceDetectionResponse)
-async def detect_faces(request: FaceDetectionRequest):
+async def detect_faces(request: FaceDetectionRequest, http_request: Request):
     """
     이미지에서 얼굴을 감지하고 속성을 분석합니다.
     
@@ -150,12 +242,23 @@ async def detect_faces(request: FaceDetectionRequest):
             # 얼굴 분석기 가져오기
             analyzer = model_manager.get_face_analyzer()
             
+            # 같은 입력의 응답이면 304 또는 저장된 본문 반환
+            etag = _response_etag(analyzer, "detect_faces", [request.image], request.dict(exclude={"image"}))
+            cached = _cached_response(http_request, etag, "/detect-faces", start_time)
+            if cached is not None:
+                return cached
+            
             # 얼굴 감지 수행
-            result = await analyzer.detect_faces(
+            result = await single_flight.run(
+                "detect_faces",
+                [request.image],
+                request.dict(exclude={"image"}),
+                analyzer.detect_faces_sync,
                 image=request.image,
                 include_landmarks=request.include_landmarks,
                 include_attributes=request.include_attributes,
-                max_faces=request.max_faces
+                max_faces=request.max_faces,
+                embedding_format=request.embedding_format
             )
             
             # 랜드마크 제거 (요청하지 않은 경우)
@@ -186,7 +289,7 @@ async def detect_faces(request: FaceDetectionRequest):
                 processing_time=processing_time
             )
             
-            return response_data
+            return _cacheable_response(etag, response_data)
             
     except ValueError as e:
         processing_time = time.time() - start_time
@@ -230,7 +333,7 @@ async def detect_faces(request: FaceDetectionRequest):
 
 
 @router.post("/extract-embedding", response_model=EmbeddingResponse)
-async def extract_embedding(request: EmbeddingExtractionRequest):
+async def extract_embedding(request: EmbeddingExtractionRequest, http_request: Request):
     """
     이미지에서 얼굴 임베딩을 추출합니다.
     
@@ -245,11 +348,22 @@ async def extract_embedding(request: EmbeddingExtractionRequest):
             # 얼굴 분석기 가져오기
             analyzer = model_manager.get_face_analyzer()
             
+            # 같은 입력의 응답이면 304 또는 저장된 본문 반환
+            etag = _response_etag(analyzer, "extract_embedding", [request.image], request.dict(exclude={"image"}))
+            cached = _cached_response(http_request, etag, "/extract-embedding", start_time)
+            if cached is not None:
+                return cached
+            
             # 임베딩 추출 수행
-            result = await analyzer.extract_embedding(
+            result = await single_flight.run(
+                "extract_embedding",
+                [request.image],
+                request.dict(exclude={"image"}),
+                analyzer.extract_embedding_sync,
                 image=request.image,
                 face_id=request.face_id,
-                normalize=request.normalize if hasattr(request, 'normalize') else True
+                normalize=request.normalize if hasattr(request, 'normalize') else True,
+                embedding_format=request.embedding_format
             )
             
             processing_time = time.time() - start_time
@@ -268,7 +382,7 @@ async def extract_embedding(request: EmbeddingExtractionRequest):
                 processing_time=processing_time
             )
             
-            return response_data
+            return _cacheable_response(etag, response_data)
             
     except ValueError as e:
         processing_time = time.time() - start_time
@@ -334,6 +448,7 @@ async def batch_analysis(request: BatchAnalysisRequest):
             # 각 이미지에서 임베딩 추출
             embeddings = {}
             face_info = {}
+            await single_flight.submit(analyzer.prefetch_faces, [img.image for img in request.images])
             
             for img in request.images:
                 try:
@@ -427,6 +542,7 @@ async def compare_family_faces(request: FamilySimilarityRequest):
     
     - **parent_image**: 부모 이미지 (Base64 인코딩)
     - **child_image**: 자녀 이미지 (Base64 인코딩)  
+    - **parent_reference_id / child_reference_id**: 이미지 대신 쓸 참조 얼굴 ID (/references)
     - **parent_age**: 부모 나이 (선택사항, 보정에 사용)
     - **child_age**: 자녀 나이 (선택사항, 보정에 사용)
     """
@@ -436,11 +552,17 @@ async def compare_family_faces(request: FamilySimilarityRequest):
         async with model_manager.request_context("family_similarity_analysis"):
             # 얼굴 분석기 가져오기
             analyzer = model_manager.get_face_analyzer()
+            parent = await _resolve_face_input(request.parent_image, request.parent_reference_id)
+            child = await _resolve_face_input(request.child_image, request.child_reference_id)
             
             # 가족 유사도 분석 수행
-            result = await analyzer.analyze_family_similarity(
-                parent_image=request.parent_image,
-                child_image=request.child_image,
+            result = await single_flight.run(
+                "compare_family_faces",
+                [_flight_image(parent), _flight_image(child)],
+                {"parent_age": request.parent_age, "child_age": request.child_age},
+                analyzer.analyze_family_similarity_sync,
+                parent_image=parent,
+                child_image=child,
                 parent_age=request.parent_age,
                 child_age=request.child_age
             )
@@ -513,6 +635,7 @@ async def find_most_similar_parent(request: FindMostSimilarParentRequest):
     여러 부모 중 가장 닮은 부모를 찾습니다.
     
     - **child_image**: 자녀 이미지 (Base64 인코딩)
+    - **child_reference_id**: 자녀 이미지 대신 쓸 참조 얼굴 ID (/references)
     - **parent_images**: 부모 후보 이미지들 (Base64 인코딩, 2-10개)
     - **child_age**: 자녀 나이 (선택사항)
     - **use_family_analysis**: 가족 특화 분석 사용 여부
@@ -523,10 +646,15 @@ async def find_most_similar_parent(request: FindMostSimilarParentRequest):
         async with model_manager.request_context("find_most_similar_parent"):
             # 얼굴 분석기 가져오기
             analyzer = model_manager.get_face_analyzer()
+            child = await _resolve_face_input(request.child_image, request.child_reference_id)
             
             # 부모 찾기 분석 수행
-            result = await analyzer.find_most_similar_parent(
-                child_image=request.child_image,
+            result = await single_flight.run(
+                "find_most_similar_parent",
+                [_flight_image(child)] + list(request.parent_images),
+                {"child_age": request.child_age, "use_family_analysis": request.use_family_analysis},
+                analyzer.find_most_similar_parent_sync,
+                child_image=child,
                 parent_images=request.parent_images,
                 child_age=request.child_age,
                 use_family_analysis=request.use_family_analysis
@@ -594,112 +722,124 @@ async def find_most_similar_parent(request: FindMostSimilarParentRequest):
         raise HTTPException(status_code=500, detail=error_response)
 
 
-async def _create_similarity_matrix(embeddings: Dict[str, list]) -> Dict[str, Any]:
-    """유사도 매트릭스 생성"""
-    import numpy as np
+@router.post("/family-matrix", response_model=FamilyMatrixResponse)
+async def family_matrix(request: FamilyMatrixRequest):
+    """
+    여러 자녀와 여러 부모 간 가족 유사도를 한 번에 계산합니다.
     
-    image_ids = list(embeddings.keys())
-    n = len(image_ids)
-    matrix = [[0.0] * n for _ in range(n)]
+    각 이미지는 한 번만 감지/임베딩되며 (중복 이미지 포함), 모든 쌍의 점수는 행렬 연산으로 계산됩니다.
     
-    for i, id1 in enumerate(image_ids):
-        for j, id2 in enumerate(image_ids):
-            if i == j:
-                matrix[i][j] = 1.0
-            else:
-                # 코사인 유사도 계산
-                emb1 = np.array(embeddings[id1])
-                emb2 = np.array(embeddings[id2])
-                similarity = float(np.dot(emb1, emb2))
-                matrix[i][j] = similarity
+    - **parent_images**: 부모 이미지들 (id, image, age)
+    - **child_images**: 자녀 이미지들 (id, image, age)
+    """
+    start_time = time.time()
     
-    return {
-        "similarity_matrix": {
-            "matrix": matrix,
-            "image_ids": image_ids
+    try:
+        async with model_manager.request_context("family_matrix"):
+            # 얼굴 분석기 가져오기
+            analyzer = model_manager.get_face_analyzer()
+            
+            # 가족 유사도 행렬 계산
+            result = await single_flight.run(
+                "family_matrix",
+                [img.image for img in request.parent_images + request.child_images],
+                {
+                    "parents": [img.dict(exclude={"image"}) for img in request.parent_images],
+                    "children": [img.dict(exclude={"image"}) for img in request.child_images]
+                },
+                analyzer.analyze_family_matrix_sync,
+                parent_images=[img.dict() for img in request.parent_images],
+                child_images=[img.dict() for img in request.child_images]
+            )
+            
+            processing_time = time.time() - start_time
+            
+            # 응답 생성
+            response_data = FamilyMatrixResponse(
+                success=True,
+                data=result,
+                metadata=create_response_metadata(processing_time)
+            )
+            
+            # 로깅
+            log_request(
+                method="POST",
+                url="/family-matrix",
+                status_code=200,
+                processing_time=processing_time
+            )
+            
+            return response_data
+            
+    except ValueError as e:
+        # 클라이언트 오류 (잘못된 입력)
+        processing_time = time.time() - start_time
+        error_response = {
+            "success": False,
+            "error": {
+                "code": "INVALID_INPUT",
+                "message": str(e),
+                "details": {}
+            }
         }
-    }
+        
+        log_request(
+            method="POST",
+            url="/family-matrix",
+            status_code=400,
+            processing_time=processing_time
+        )
+        
+        raise HTTPException(status_code=400, detail=error_response)
+        
+    except Exception as e:
+        # 서버 오류
+        processing_time = time.time() - start_time
+        error_response = {
+            "success": False,
+            "error": {
+                "code": "PROCESSING_ERROR",
+                "message": "가족 유사도 행렬 분석 처리 중 오류가 발생했습니다",
+                "details": {"original_error": str(e)}
+            }
+        }
+        
+        log_request(
+            method="POST",
+            url="/family-matrix",
+            status_code=500,
+            processing_time=processing_time
+        )
+        
+        raise HTTPException(status_code=500, detail=error_response)
+
+
+async def _create_similarity_matrix(embeddings: Dict[str, list]) -> Dict[str, Any]:
+    """유사도 매트릭스 생성"""
+    image_ids = list(embeddings.keys())
+    matrix = to_normalized_matrix([embeddings[i] for i in image_ids])
+    
+    return similarity_matrix_result(cosine_similarity_matrix(matrix), image_ids)
 
 
 async def _find_best_matches(embeddings: Dict[str, list], threshold: float) -> Dict[str, Any]:
     """최고 매칭 찾기"""
-    import numpy as np
-    
-    best_matches = []
     image_ids = list(embeddings.keys())
+    matrix = to_normalized_matrix([embeddings[i] for i in image_ids])
     
-    for i, id1 in enumerate(image_ids):
-        best_similarity = 0.0
-        best_match = None
-        
-        for j, id2 in enumerate(image_ids):
-            if i != j:
-                emb1 = np.array(embeddings[id1])
-                emb2 = np.array(embeddings[id2])
-                similarity = float(np.dot(emb1, emb2))
-                
-                if similarity > best_similarity and similarity >= threshold:
-                    best_similarity = similarity
-                    best_match = id2
-        
-        if best_match:
-            best_matches.append({
-                "source_id": id1,
-                "target_id": best_match,
-                "similarity": best_similarity
-            })
-    
-    return {"best_matches": best_matches}
+    return best_matches_from_matrix(cosine_similarity_matrix(matrix), image_ids, threshold)
 
 
 async def _group_similar_faces(embeddings: Dict[str, list], threshold: float) -> Dict[str, Any]:
     """유사한 얼굴 그룹화"""
-    import numpy as np
-    
     image_ids = list(embeddings.keys())
-    groups = []
-    visited = set()
+    matrix = to_normalized_matrix([embeddings[i] for i in image_ids])
     
-    for i, id1 in enumerate(image_ids):
-        if id1 in visited:
-            continue
-        
-        group = [id1]
-        visited.add(id1)
-        
-        for j, id2 in enumerate(image_ids):
-            if i != j and id2 not in visited:
-                emb1 = np.array(embeddings[id1])
-                emb2 = np.array(embeddings[id2])
-                similarity = float(np.dot(emb1, emb2))
-                
-                if similarity >= threshold:
-                    group.append(id2)
-                    visited.add(id2)
-        
-        if len(group) >= 2:
-            # 그룹 내 평균 유사도 계산
-            similarities = []
-            for x in range(len(group)):
-                for y in range(x + 1, len(group)):
-                    emb_x = np.array(embeddings[group[x]])
-                    emb_y = np.array(embeddings[group[y]])
-                    sim = float(np.dot(emb_x, emb_y))
-                    similarities.append(sim)
-            
-            avg_similarity = np.mean(similarities) if similarities else 0.0
-            
-            groups.append({
-                "group_id": len(groups),
-                "members": group,
-                "avg_similarity": float(avg_similarity)
-            })
-    
-    return {"groups": groups}
+    return greedy_groups_from_matrix(cosine_similarity_matrix(matrix), image_ids, threshold)
 
 
 @router.post("/estimate-age", response_model=AgeEstimationResponse)
-async def estimate_age(request: AgeEstimationRequest):
+async def estimate_age(request: AgeEstimationRequest, http_request: Request):
     """
     이미지에서 나이를 추정합니다.
     
@@ -712,8 +852,14 @@ async def estimate_age(request: AgeEstimationRequest):
             # 얼굴 분석기 가져오기
             analyzer = model_manager.get_face_analyzer()
             
+            # 같은 입력의 응답이면 304 또는 저장된 본문 반환
+            etag = _response_etag(analyzer, "estimate_age", [request.image], {})
+            cached = _cached_response(http_request, etag, "/estimate-age", start_time)
+            if cached is not None:
+                return cached
+            
             # 나이 추정 수행
-            result = await analyzer.estimate_age(request.image)
+            result = await single_flight.run("estimate_age", [request.image], {}, analyzer.estimate_age_sync, request.image)
             
             processing_time = time.time() - start_time
             
@@ -732,7 +878,7 @@ async def estimate_age(request: AgeEstimationRequest):
                 processing_time=processing_time
             )
             
-            return response_data
+            return _cacheable_response(etag, response_data)
             
     except ValueError as e:
         # 클라이언트 오류 (잘못된 입력)
@@ -778,7 +924,7 @@ async def estimate_age(request: AgeEstimationRequest):
 
 
 @router.post("/estimate-gender", response_model=GenderEstimationResponse)
-async def estimate_gender(request: GenderEstimationRequest):
+async def estimate_gender(request: GenderEstimationRequest, http_request: Request):
     """
     이미지에서 성별 확률을 추정합니다.
     
@@ -791,8 +937,16 @@ async def estimate_gender(request: GenderEstimationRequest):
             # 얼굴 분석기 가져오기
             analyzer = model_manager.get_face_analyzer()
             
+            # 같은 입력의 응답이면 304 또는 저장된 본문 반환
+            etag = _response_etag(analyzer, "estimate_gender", [request.image], {})
+            cached = _cached_response(http_request, etag, "/estimate-gender", start_time)
+            if cached is not None:
+                return cached
+            
             # 성별 확률 추정 수행
-            result = await analyzer.estimate_gender_probability(request.image)
+            result = await single_flight.run(
+                "estimate_gender", [request.image], {}, analyzer.estimate_gender_probability_sync, request.image
+            )
             
             processing_time = time.time() - start_time
             
@@ -811,7 +965,7 @@ async def estimate_gender(request: GenderEstimationRequest):
                 processing_time=processing_time
             )
             
-            return response_data
+            return _cacheable_response(etag, response_data)
             
     except ValueError as e:
         # 클라이언트 오류 (잘못된 입력)
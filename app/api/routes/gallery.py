@@ -0,0 +1,593 @@
+"""
+얼굴 갤러리 API 엔드포인트 - 얼굴 등록, 삭제, 1:N 검색
+"""
+import asyncio
+import json
+import time
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from ...schemas.requests import (
+    GalleryEnrollRequest,
+    GallerySearchRequest,
+    GalleryRangeSearchRequest,
+    GalleryDedupeRequest,
+    GalleryKinshipSearchRequest,
+    GalleryIndexTrainRequest
+)
+from ...schemas.responses import GalleryResponse
+from ...models.model_manager import model_manager
+from ...models.gallery.gallery import face_gallery
+from ...models.gallery.persistence import GalleryLockedError
+from ...models.gallery.templates import face_quality_weight
+from ...services.embedding_inputs import resolve_embedding_inputs, resolve_embedding_inputs_with_details
+from ...core.logging import get_logger, log_request
+from ...core.config import settings
+from .faces import create_response_metadata, create_error_detail
+
+logger = get_logger(__name__)
+
+
+async def require_gallery():
+    """
+    갤러리 열기 (이 워커가 아직 열지 못했으면 다시 시도)
+
+    다른 워커 프로세스가 갤러리 디렉토리를 소유하고 있으면 503 을 반환합니다.
+    """
+    if face_gallery.is_open:
+        return
+    try:
+        await asyncio.to_thread(face_gallery.open)
+    except GalleryLockedError as e:
+        raise HTTPException(status_code=503, detail=create_error_detail("GALLERY_UNAVAILABLE", str(e)))
+
+
+router = APIRouter(prefix="/gallery", dependencies=[Depends(require_gallery)])
+
+
+async def _gallery_size() -> int:
+    """갤러리 크기 (샤딩 갤러리는 샤드 호출이므로 스레드에서)"""
+    return await asyncio.to_thread(lambda: face_gallery.size)
+
+
+def _enroll(request: GalleryEnrollRequest, vector, quality: float, detected: dict):
+    """
+    등록 또는 기존 신원 템플릿에 합치기 (블로킹 - 작업 스레드에서 호출)
+
+    Returns:
+        (갤러리 ID, 등록 결과, 등록된 얼굴, 갤러리 크기)
+    """
+    merged = request.merge and request.id is not None and face_gallery.get(request.id) is not None
+    outcome = {"status": "merged", "duplicate_of": None, "similarity": None}
+    if merged:
+        face_id = face_gallery.add_samples(request.id, [vector], [quality])["id"]
+    else:
+        attributes = {
+            "tenant": request.tenant,
+            "age": request.age if request.age is not None else detected.get("age"),
+            "gender": request.gender or detected.get("gender"),
+            "landmarks": request.landmarks or detected.get("keypoints")
+        }
+        outcomes = []
+        face_id = face_gallery.enroll(
+            vector, face_id=request.id, metadata=request.metadata, attributes=attributes,
+            quality=quality, dedupe=request.dedupe, outcomes=outcomes
+        )
+        outcome = outcomes[0]
+
+    return face_id, outcome, face_gallery.get(face_id), face_gallery.size
+
+
+@router.post("/enroll", response_model=GalleryResponse)
+async def enroll_face(request: GalleryEnrollRequest):
+    """
+    얼굴을 갤러리에 등록합니다.
+    
+    - **id**: 갤러리 ID (없으면 생성)
+    - **embedding** 또는 **image**: 등록할 임베딩 또는 이미지
+    - **metadata**: 함께 저장할 메타데이터
+    - **tenant**, **age**, **gender**: 필터 검색용 속성 (나이/성별은 없으면 이미지 분석 결과 사용)
+    - **quality**: 템플릿 가중치 (없으면 검출 점수 x 얼굴 크기)
+    - **merge**: true 이고 id 가 이미 있으면 그 신원의 템플릿에 합침 (검색 대상 행이 늘지 않음)
+    - **dedupe**: 서버 중복 억제 적용 - 거의 같은 얼굴이 있으면 status 가 skipped/merged 이고 id 는 기존 얼굴
+      (샤딩 갤러리의 테넌트 분할에서는 같은 테넌트 샤드 안에서만 찾음)
+    - **landmarks**: 5점 랜드마크 (친족 검색용, 없으면 이미지 분석 결과 사용)
+    """
+    start_time = time.time()
+    
+    try:
+        async with model_manager.request_context("gallery_enroll"):
+            vectors, image_count, details = await resolve_embedding_inputs_with_details([request])
+            detected = details[0] or {}
+            quality = request.quality
+            if quality is None:
+                quality = face_quality_weight(detected.get("confidence"), detected.get("bounding_box")) if detected else 1.0
+            
+            # WAL fsync 와 인덱스 갱신(샤딩이면 샤드 응답 대기)이 이벤트 루프를 막지 않도록 스레드에서 실행
+            face_id, outcome, face, gallery_size = await asyncio.to_thread(
+                _enroll, request, vectors[0], quality, detected
+            )
+            
+            processing_time = time.time() - start_time
+            
+            response_data = GalleryResponse(
+                success=True,
+                data={
+                    "id": face_id,
+                    "attributes": face["attributes"],
+                    "status": outcome["status"],
+                    "duplicate_of": outcome["duplicate_of"],
+                    "similarity": outcome["similarity"],
+                    "samples": face["samples"],
+                    "quality": quality,
+                    "gallery_size": gallery_size,
+                    "computed_from_images": image_count
+                },
+                metadata=create_response_metadata(processing_time)
+            )
+            
+            log_request(
+                method="POST",
+                url="/gallery/enroll",
+                status_code=200,
+                processing_time=processing_time
+            )
+            
+            return response_data
+            
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/gallery/enroll",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+        
+    except Exception as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/gallery/enroll",
+            status_code=500,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "갤러리 등록 처리 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
+
+
+@router.delete("/faces/{face_id}", response_model=GalleryResponse)
+async def delete_face(face_id: str):
+    """
+    갤러리에서 얼굴을 삭제합니다.
+    """
+    start_time = time.time()
+    
+    try:
+        if not await asyncio.to_thread(face_gallery.delete, face_id):
+            raise HTTPException(status_code=404, detail=create_error_detail(
+                "FACE_NOT_FOUND", f"갤러리에 등록되지 않은 ID입니다: {face_id}"
+            ))
+        
+        gallery_size = await _gallery_size()
+        processing_time = time.time() - start_time
+        
+        log_request(
+            method="DELETE",
+            url=f"/gallery/faces/{face_id}",
+            status_code=200,
+            processing_time=processing_time
+        )
+        
+        return GalleryResponse(
+            success=True,
+            data={"id": face_id, "deleted": True, "gallery_size": gallery_size},
+            metadata=create_response_metadata(processing_time)
+        )
+        
+    except HTTPException:
+        raise
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "갤러리 삭제 처리 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
+
+
+@router.post("/search", response_model=GalleryResponse)
+async def search_gallery(request: GallerySearchRequest):
+    """
+    질의 얼굴과 가장 유사한 갤러리 얼굴을 찾습니다.
+    
+    - **query**: 질의 임베딩 또는 이미지
+    - **top_k**: 반환할 최대 결과 수
+    - **similarity_threshold**: 최소 유사도
+    - **ef_search**: HNSW 탐색 후보 수 (클수록 정확하고 느림)
+    - **nprobe**: IVF-PQ 탐색 리스트 수 (클수록 정확하고 느림)
+    - **exact**: 인덱스 대신 전수 검색
+    - **filters**: 속성 필터 (tenant, gender, age_min, age_max) - 검색 중에 적용되어 top_k 를 채움
+    
+    샤딩 갤러리에서 응답하지 않은 샤드가 있으면 나머지 샤드 결과만 반환하고 partial 이 true 입니다.
+    """
+    start_time = time.time()
+    
+    try:
+        async with model_manager.request_context("gallery_search"):
+            vectors, image_count = await resolve_embedding_inputs([request.query])
+            stats = {}
+            # HNSW 탐색과 샤드 응답 대기는 블로킹이므로 스레드에서 실행
+            matches = await asyncio.to_thread(
+                face_gallery.search,
+                vectors[0],
+                top_k=request.top_k,
+                threshold=request.similarity_threshold,
+                exact=request.exact,
+                ef_search=request.ef_search,
+                nprobe=request.nprobe,
+                filters=request.filters.dict(exclude_none=True) if request.filters else None,
+                stats=stats
+            )
+            failed_shards = stats.get("failed_shards", [])
+            gallery_size = await _gallery_size()
+            
+            processing_time = time.time() - start_time
+            
+            response_data = GalleryResponse(
+                success=True,
+                data={
+                    "matches": matches,
+                    "gallery_size": gallery_size,
+                    "computed_from_images": image_count,
+                    "partial": bool(failed_shards),
+                    "failed_shards": failed_shards
+                },
+                metadata=create_response_metadata(processing_time)
+            )
+            
+            log_request(
+                method="POST",
+                url="/gallery/search",
+                status_code=200,
+                processing_time=processing_time
+            )
+            
+            return response_data
+            
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/gallery/search",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+        
+    except Exception as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/gallery/search",
+            status_code=500,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "갤러리 검색 처리 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
+
+
+def _stream_range_matches(blocks, stats, max_results=None):
+    """범위 검색 결과를 NDJSON 줄로 생성 (매칭 한 줄씩, 마지막 줄은 요약)"""
+    sent = 0
+    for matches in blocks:
+        for match in matches:
+            if max_results is not None and sent >= max_results:
+                break
+            yield json.dumps(match, ensure_ascii=False) + "\n"
+            sent += 1
+        if max_results is not None and sent >= max_results:
+            break
+
+    yield json.dumps({"summary": {**stats, "returned": sent, "truncated": sent < stats["matches"]}}) + "\n"
+
+
+@router.post("/range-search", response_model=GalleryResponse)
+async def range_search_gallery(request: GalleryRangeSearchRequest):
+    """
+    질의 얼굴과의 유사도가 임계값 이상인 갤러리 얼굴을 모두 찾습니다.
+    
+    - **query**: 질의 임베딩 또는 이미지
+    - **similarity_threshold**: 최소 유사도 (top_k 대신 임계값 기준)
+    - **filters**: 속성 필터 (tenant, gender, age_min, age_max)
+    - **max_results**: 최대 결과 수 (없으면 서버 설정, 스트리밍은 제한 없음)
+    - **stream**: true 면 application/x-ndjson 으로 블록 단위 스트리밍 (블록 순서, 전체 정렬 없음)
+    """
+    start_time = time.time()
+    
+    try:
+        async with model_manager.request_context("gallery_range_search"):
+            vectors, image_count = await resolve_embedding_inputs([request.query])
+            filters = request.filters.dict(exclude_none=True) if request.filters else None
+            
+            if request.stream:
+                stats = {}
+                blocks = face_gallery.iter_range_search(
+                    vectors[0], request.similarity_threshold, filters=filters, stats=stats
+                )
+                log_request(
+                    method="POST",
+                    url="/gallery/range-search",
+                    status_code=200,
+                    processing_time=time.time() - start_time
+                )
+                return StreamingResponse(
+                    _stream_range_matches(blocks, stats, request.max_results),
+                    media_type="application/x-ndjson"
+                )
+            
+            result = await asyncio.to_thread(
+                face_gallery.range_search,
+                vectors[0],
+                request.similarity_threshold,
+                filters=filters,
+                max_results=request.max_results or settings.gallery_range_max_results
+            )
+            
+            processing_time = time.time() - start_time
+            
+            response_data = GalleryResponse(
+                success=True,
+                data={
+                    **result,
+                    "gallery_size": await _gallery_size(),
+                    "computed_from_images": image_count
+                },
+                metadata=create_response_metadata(processing_time)
+            )
+            
+            log_request(
+                method="POST",
+                url="/gallery/range-search",
+                status_code=200,
+                processing_time=processing_time
+            )
+            
+            return response_data
+            
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/gallery/range-search",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+        
+    except Exception as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/gallery/range-search",
+            status_code=500,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "갤러리 범위 검색 처리 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
+
+
+@router.post("/dedupe", response_model=GalleryResponse)
+async def dedupe_gallery(request: GalleryDedupeRequest):
+    """
+    기존 갤러리의 거의 같은 얼굴을 일괄 정리합니다.
+    
+    - **similarity_threshold**: 중복 유사도 (없으면 서버 설정)
+    - **action**: merge (남길 신원 템플릿에 합친 뒤 삭제) 또는 delete
+    - **dry_run**: 찾기만 하고 적용하지 않음
+    """
+    start_time = time.time()
+    
+    try:
+        async with model_manager.request_context("gallery_dedupe"):
+            # 전체 스캔은 CPU 작업이므로 이벤트 루프를 막지 않도록 스레드에서 실행
+            result = await asyncio.to_thread(
+                face_gallery.dedupe, request.similarity_threshold, request.action, request.dry_run
+            )
+            
+            processing_time = time.time() - start_time
+            
+            log_request(
+                method="POST",
+                url="/gallery/dedupe",
+                status_code=200,
+                processing_time=processing_time
+            )
+            
+            return GalleryResponse(
+                success=True,
+                data={**result, "gallery_size": await _gallery_size()},
+                metadata=create_response_metadata(processing_time)
+            )
+            
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/gallery/dedupe",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+        
+    except Exception as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/gallery/dedupe",
+            status_code=500,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "갤러리 중복 정리 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
+
+
+@router.post("/kinship-search", response_model=GalleryResponse)
+async def kinship_search_gallery(request: GalleryKinshipSearchRequest):
+    """
+    질의 얼굴의 가족(친족)일 가능성이 높은 갤러리 얼굴을 찾습니다.
+    
+    인덱스로 임베딩 유사도 상위 shortlist 개를 뽑은 뒤, 그 후보에만 가족 유사도
+    (랜드마크 기하 특징 + 나이 보정)를 계산해 다시 정렬합니다.
+    
+    - **query**: 질의 임베딩 또는 이미지
+    - **landmarks**, **age**: 질의 얼굴 랜드마크/나이 (없으면 이미지 분석 결과 사용)
+    - **top_k**: 반환할 최대 결과 수
+    - **shortlist**: 가족 유사도를 계산할 후보 수 (없으면 서버 설정)
+    - **min_family_similarity**: 최소 가족 유사도
+    - **exclude_ids**: 결과에서 뺄 갤러리 ID (질의 본인 등)
+    - **filters**: 속성 필터 (tenant, gender, age_min, age_max)
+    """
+    start_time = time.time()
+    
+    try:
+        async with model_manager.request_context("gallery_kinship_search"):
+            vectors, image_count, details = await resolve_embedding_inputs_with_details([request.query])
+            detected = details[0] or {}
+            stats = {}
+            matches = await asyncio.to_thread(
+                face_gallery.kinship_search,
+                vectors[0],
+                landmarks=request.landmarks or detected.get("keypoints"),
+                age=request.age if request.age is not None else detected.get("age"),
+                top_k=request.top_k,
+                shortlist=request.shortlist or settings.gallery_kinship_shortlist,
+                min_family_similarity=request.min_family_similarity,
+                filters=request.filters.dict(exclude_none=True) if request.filters else None,
+                exclude_ids=request.exclude_ids,
+                stats=stats
+            )
+            failed_shards = stats.get("failed_shards", [])
+            
+            processing_time = time.time() - start_time
+            
+            response_data = GalleryResponse(
+                success=True,
+                data={
+                    "matches": matches,
+                    "candidates": stats["candidates"],
+                    "gallery_size": await _gallery_size(),
+                    "computed_from_images": image_count,
+                    "partial": bool(failed_shards),
+                    "failed_shards": failed_shards
+                },
+                metadata=create_response_metadata(processing_time)
+            )
+            
+            log_request(
+                method="POST",
+                url="/gallery/kinship-search",
+                status_code=200,
+                processing_time=processing_time
+            )
+            
+            return response_data
+            
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/gallery/kinship-search",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+        
+    except Exception as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/gallery/kinship-search",
+            status_code=500,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "갤러리 친족 검색 처리 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
+
+
+@router.post("/index/train", response_model=GalleryResponse)
+async def train_gallery_index(request: GalleryIndexTrainRequest):
+    """
+    IVF-PQ 인덱스를 등록된 얼굴로 학습하고 전체 얼굴을 인코딩합니다.
+    
+    - **sample_size**: 학습에 쓸 얼굴 수 (없으면 전체)
+    """
+    start_time = time.time()
+    
+    try:
+        async with model_manager.request_context("gallery_index_train"):
+            # k-means 학습은 CPU 작업이므로 이벤트 루프를 막지 않도록 스레드에서 실행
+            stats = await asyncio.to_thread(face_gallery.train_index, request.sample_size)
+            
+            processing_time = time.time() - start_time
+            
+            log_request(
+                method="POST",
+                url="/gallery/index/train",
+                status_code=200,
+                processing_time=processing_time
+            )
+            
+            return GalleryResponse(
+                success=True,
+                data=stats,
+                metadata=create_response_metadata(processing_time)
+            )
+            
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/gallery/index/train",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+        
+    except Exception as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/gallery/index/train",
+            status_code=500,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "갤러리 인덱스 학습 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
+
+
+@router.get("/stats", response_model=GalleryResponse)
+async def get_gallery_stats():
+    """
+    갤러리 통계를 반환합니다.
+    """
+    start_time = time.time()
+    
+    try:
+        stats = await asyncio.to_thread(face_gallery.get_stats)
+        return GalleryResponse(
+            success=True,
+            data=stats,
+            metadata=create_response_metadata(time.time() - start_time)
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "갤러리 통계 조회 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
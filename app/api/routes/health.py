@@ -9,6 +9,13 @@ from fastapi.responses import JSONResponse
 
 from ...schemas.responses import HealthResponse, ModelInfoResponse, MetricsResponse
 from ...models.model_manager import model_manager
+from ...services.analysis_cache import analysis_cache
+from ...services.redis_cache import redis_cache
+from ...services.shm_cache import shm_cache
+from ...services.response_cache import response_cache
+from ...services.negative_cache import negative_cache, client_stats
+from ...services.single_flight import single_flight
+from ...services.reference_faces import reference_face_manager
 from ...core.config import settings
 from ...core.logging import get_logger
 
@@ -117,7 +124,8 @@ async def get_metrics():
     """
     성능 메트릭을 반환합니다.
     
-    요청 수, 처리 시간, 에러율 등의 통계를 포함합니다.
+    요청 수, 처리 시간, 에러율, 얼굴 분석 캐시 히트/미스/제거 수, 합쳐진 동일 요청 수,
+    클라이언트별 얼굴 없음/실패 비율 등의 통계를 포함합니다.
     """
     try:
         metrics = model_manager.get_metrics()
@@ -136,7 +144,17 @@ async def get_metrics():
             system_info={
                 "uptime_seconds": metrics.get("uptime_seconds", 0),
                 "error_rate": metrics.get("error_rate", 0)
-            }
+            },
+            cache_stats={
+                "analysis": analysis_cache.get_stats(),
+                "shared_memory": shm_cache.get_stats(),
+                "redis": redis_cache.get_stats(),
+                "responses": response_cache.get_stats(),
+                "negative": negative_cache.get_stats(),
+                "references": reference_face_manager.get_stats()
+            },
+            single_flight_stats=single_flight.get_stats(),
+            client_stats=client_stats.get_stats()
         )
         
         return response
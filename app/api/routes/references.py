@@ -0,0 +1,117 @@
+"""
+참조 얼굴 API 엔드포인트 - 한 번 분석한 얼굴을 ID 로 비교 요청에 재사용
+"""
+import time
+
+from fastapi import APIRouter, HTTPException
+
+from ...schemas.requests import ReferenceFaceCreateRequest
+from ...schemas.responses import ReferenceFaceResponse
+from ...models.model_manager import model_manager
+from ...services.reference_faces import reference_face_manager, ReferenceFace
+from ...services.single_flight import single_flight
+from ...core.logging import get_logger, log_request
+from .faces import create_response_metadata, create_error_detail
+
+logger = get_logger(__name__)
+router = APIRouter()
+
+
+async def _get_reference_or_404(reference_id: str) -> ReferenceFace:
+    """참조 얼굴 조회 (없거나 만료되면 404)"""
+    reference = await single_flight.submit(reference_face_manager.get, reference_id)
+    if reference is None:
+        raise HTTPException(status_code=404, detail=create_error_detail(
+            "REFERENCE_NOT_FOUND", f"참조 얼굴을 찾을 수 없거나 만료되었습니다: {reference_id}"
+        ))
+    return reference
+
+
+@router.post("/references", response_model=ReferenceFaceResponse)
+async def create_reference_face(request: ReferenceFaceCreateRequest):
+    """
+    참조 얼굴을 생성합니다. 얼굴은 마지막 사용 후 TTL 동안 서버에 보관됩니다.
+
+    반환된 reference_id 는 /compare-faces, /compare-family-faces, /find-most-similar-parent 에서
+    이미지 대신 쓸 수 있으며, 이때 해당 얼굴은 다시 업로드하거나 분석하지 않습니다.
+
+    - **image**: 참조할 얼굴 이미지
+    - **face_id**: 사용할 얼굴 인덱스
+    - **age**: 나이 (선택사항, 감지된 나이 대신 사용)
+    - **name**: 이름 (선택사항)
+    """
+    start_time = time.time()
+
+    try:
+        async with model_manager.request_context("reference_face_create"):
+            analyzer = model_manager.get_face_analyzer()
+            face = await analyzer.analyze_reference_face(request.image, face_id=request.face_id)
+            reference = await single_flight.submit(reference_face_manager.create, face, age=request.age, name=request.name)
+
+            processing_time = time.time() - start_time
+
+            response_data = ReferenceFaceResponse(
+                success=True,
+                data=reference.get_summary(),
+                metadata=create_response_metadata(processing_time)
+            )
+
+            log_request(
+                method="POST",
+                url="/references",
+                status_code=200,
+                processing_time=processing_time
+            )
+
+            return response_data
+
+    except ValueError as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/references",
+            status_code=400,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=400, detail=create_error_detail("INVALID_INPUT", str(e)))
+
+    except Exception as e:
+        processing_time = time.time() - start_time
+        log_request(
+            method="POST",
+            url="/references",
+            status_code=500,
+            processing_time=processing_time
+        )
+        raise HTTPException(status_code=500, detail=create_error_detail(
+            "PROCESSING_ERROR", "참조 얼굴 생성 중 오류가 발생했습니다", {"original_error": str(e)}
+        ))
+
+
+@router.get("/references/{reference_id}", response_model=ReferenceFaceResponse)
+async def get_reference_face(reference_id: str):
+    """
+    참조 얼굴 정보를 조회합니다 (임베딩 제외).
+    """
+    start_time = time.time()
+    reference = await _get_reference_or_404(reference_id)
+
+    return ReferenceFaceResponse(
+        success=True,
+        data=reference.get_summary(),
+        metadata=create_response_metadata(time.time() - start_time)
+    )
+
+
+@router.delete("/references/{reference_id}")
+async def delete_reference_face(reference_id: str):
+    """
+    참조 얼굴을 삭제합니다.
+    """
+    await _get_reference_or_404(reference_id)
+    await single_flight.submit(reference_face_manager.delete, reference_id)
+
+    return {
+        "success": True,
+        "data": {"reference_id": reference_id, "deleted": True}
+    }
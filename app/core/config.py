@@ -33,12 +33,27 @@ class Settings(BaseSettings):
     # 보안 설정
     api_key_enabled: bool = False
     api_key: Optional[str] = None
+    admin_api_key: Optional[str] = None  # 캐시 비우기 같은 관리 작업 키 (X-Admin-Key, 없으면 API 키 인증 필요)
     secret_key: str = "your-secret-key-for-jwt"
     
     # 캐시 설정
     cache_enabled: bool = True
     cache_ttl: int = 3600
+    cache_max_bytes: int = 64 * 1024 * 1024  # 얼굴 분석 캐시가 보관할 감지 결과의 최대 크기 (추정 바이트)
+    cache_window_ratio: float = 0.01  # 새 항목이 빈도 비교 없이 들어가는 창 구역 비율 (W-TinyLFU)
+    cache_negative_ttl: int = 60  # 얼굴 없음 이미지를 기억하는 시간 (초)
+    cache_negative_max_entries: int = 4096
+    client_stats_max_clients: int = 1000  # 얼굴 없음/실패 수를 집계할 최대 클라이언트 수
+    cache_redis_enabled: bool = False  # 워커 사이 공유용 Redis 계층 (redis 패키지 필요)
     redis_url: str = "redis://localhost:6379/0"
+    cache_redis_float16: bool = False  # Redis 에 임베딩을 float16 으로 저장 (크기 절반, 임베딩 값이 약간 바뀜)
+    cache_shm_enabled: bool = False  # 같은 호스트 워커끼리 공유 메모리로 분석 결과 공유
+    cache_shm_name: str = "face_analysis_cache"
+    cache_shm_slots: int = 4096
+    cache_shm_slot_bytes: int = 8704  # 512차원 기준 얼굴 4개까지
+    response_cache_enabled: bool = True  # 멱등 분석 응답의 ETag/304 와 본문 캐시
+    response_cache_max_entries: int = 1024
+    response_cache_max_bytes: int = 64 * 1024 * 1024
     
     # 로깅 설정
     log_file: str = "logs/app.log"
@@ -49,8 +64,49 @@ class Settings(BaseSettings):
     # 성능 설정
     max_image_size: int = 10 * 1024 * 1024  # 10MB
     max_batch_size: int = 10
+    max_embedding_batch_size: int = 10000  # 이미지 없이 임베딩만 받는 요청
+    max_embedding_matrix_size: int = 500  # N×N 유사도 행렬을 만드는 /embeddings/batch-analysis
     processing_timeout: int = 30
     max_concurrent_requests: int = 100
+    single_flight_enabled: bool = True  # 처리 중인 동일 요청을 한 번의 계산으로 합침
+    analysis_workers: int = 4  # 분석(추론)을 실행하는 작업 스레드 수 - 동시에 실행되는 추론 수의 상한
+    aligned_crop_reuse: bool = True  # 얼굴별 정렬 크롭을 하위 모델 사이에서 공유 (랜드마크 모델 생략)
+    
+    # 배치 세션 설정
+    batch_session_ttl: int = 1800  # 30분 (마지막 접근 기준)
+    batch_session_max_images: int = 500
+    max_batch_sessions: int = 100
+    
+    # 참조 얼굴 설정
+    reference_face_ttl: int = 1800  # 30분 (마지막 사용 기준)
+    max_reference_faces: int = 1000
+    
+    # 얼굴 갤러리 설정
+    gallery_path: str = "data/gallery"
+    gallery_embedding_dim: int = 512
+    gallery_index_type: str = "flat"  # flat (전수 검색), hnsw, ivfpq
+    gallery_hnsw_m: int = 16
+    gallery_hnsw_ef_construction: int = 200
+    gallery_hnsw_ef_search: int = 64
+    gallery_ivf_nlist: int = 1024
+    gallery_ivf_nprobe: int = 16
+    gallery_pq_m: int = 64  # 얼굴당 PQ 코드 바이트 수
+    gallery_ivfpq_rerank: int = 100
+    gallery_wal_fsync: bool = True
+    gallery_compaction_wal_records: int = 10000  # WAL 이 이 건수를 넘으면 백그라운드 스냅샷
+    gallery_filter_exact_limit: int = 2048  # 필터 통과 얼굴이 이 이하면 인덱스 대신 전수 비교
+    gallery_range_block_size: int = 4096  # 범위 검색 가지치기 블록 크기 (행)
+    gallery_range_max_results: int = 10000  # 스트리밍하지 않는 범위 검색 응답의 최대 결과 수
+    gallery_max_exemplars: int = 0  # 신원별 재정렬용 대표 표본 수 (0 이면 템플릿만 사용)
+    gallery_exemplar_rerank: int = 50  # 대표 표본으로 점수를 보정할 상위 후보 수
+    gallery_dedupe_threshold: float = 0.0  # 등록 시 이 유사도 이상인 기존 얼굴이 있으면 중복 (0 이면 끔)
+    gallery_dedupe_action: str = "skip"  # 중복 처리: skip (건너뜀) 또는 merge (기존 템플릿에 합침)
+    gallery_dedupe_lsh_bits: int = 16  # LSH 표당 초평면 비트 수
+    gallery_dedupe_lsh_tables: int = 16  # LSH 표 수
+    gallery_shards: int = 0  # 샤드 프로세스 수 (0 이면 API 프로세스 안의 단일 갤러리)
+    gallery_shard_partition: str = "hash"  # hash (face_id) 또는 tenant
+    gallery_shard_timeout: float = 10.0  # 샤드 호출 시간 초과 (초), 넘으면 부분 결과
+    gallery_kinship_shortlist: int = 100  # 친족 검색에서 가족 유사도를 계산할 임베딩 상위 후보 수
     
     # Rate Limiting
     rate_limit_enabled: bool = True
@@ -101,6 +157,44 @@ class Settings(BaseSettings):
         path.mkdir(parents=True, exist_ok=True)
         return str(path)
     
+    @validator("gallery_index_type")
+    def validate_gallery_index_type(cls, v):
+        """갤러리 인덱스 유형 검사"""
+        if v not in ("flat", "hnsw", "ivfpq"):
+            raise ValueError(f"지원하지 않는 갤러리 인덱스입니다: {v}")
+        return v
+    
+    @validator("gallery_dedupe_action")
+    def validate_gallery_dedupe_action(cls, v):
+        """갤러리 중복 처리 방식 검사"""
+        if v not in ("skip", "merge"):
+            raise ValueError(f"지원하지 않는 중복 처리 방식입니다: {v}")
+        return v
+    
+    @validator("gallery_shard_partition")
+    def validate_gallery_shard_partition(cls, v):
+        """갤러리 샤드 분할 방식 검사"""
+        if v not in ("hash", "tenant"):
+            raise ValueError(f"지원하지 않는 샤드 분할 방식입니다: {v}")
+        return v
+    
+    def get_gallery_index_params(self) -> dict:
+        """갤러리 인덱스 유형별 파라미터 반환"""
+        if self.gallery_index_type == "hnsw":
+            return {
+                "m": self.gallery_hnsw_m,
+                "ef_construction": self.gallery_hnsw_ef_construction,
+                "ef_search": self.gallery_hnsw_ef_search
+            }
+        if self.gallery_index_type == "ivfpq":
+            return {
+                "nlist": self.gallery_ivf_nlist,
+                "m": self.gallery_pq_m,
+                "nprobe": self.gallery_ivf_nprobe,
+                "rerank": self.gallery_ivfpq_rerank
+            }
+        return {}
+    
     def get_cors_origins(self) -> List[str]:
         """CORS origins 목록 반환"""
         if isinstance(self.cors_origins, str):
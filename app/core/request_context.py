@@ -0,0 +1,47 @@
+"""
+요청 컨텍스트 - 요청 처리 중 어디서든 현재 요청에 표시를 남기기 위한 플래그
+
+미들웨어가 요청마다 빈 플래그 dict 를 설정하고, 분석 코드(작업 스레드 포함)가 표시한 값을
+응답 후 미들웨어가 읽습니다. asyncio.to_thread 는 컨텍스트를 복사하지만 dict 자체는 같은 객체이므로
+스레드에서 남긴 표시도 보입니다.
+
+현재 작업 이름(model_manager.request_context 의 operation_type)도 함께 두어 캐시가 작업별로 집계합니다.
+"""
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Optional
+
+_request_flags: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_flags", default=None)
+_operation: ContextVar[Optional[str]] = ContextVar("operation", default=None)
+
+
+def start_request() -> Dict[str, Any]:
+    """현재 요청의 플래그 dict 생성"""
+    flags: Dict[str, Any] = {}
+    _request_flags.set(flags)
+    return flags
+
+
+def get_request_flags() -> Optional[Dict[str, Any]]:
+    """현재 요청의 플래그 (요청 밖이면 None)"""
+    return _request_flags.get()
+
+
+def set_request_flag(name: str, value: Any = True):
+    """현재 요청에 표시 (요청 밖이면 무시)"""
+    flags = _request_flags.get()
+    if flags is not None:
+        flags[name] = value
+
+
+def set_operation(name: Optional[str]) -> Token:
+    """현재 작업 이름 설정 (되돌릴 때 쓰는 토큰 반환)"""
+    return _operation.set(name)
+
+
+def reset_operation(token: Token):
+    _operation.reset(token)
+
+
+def get_operation() -> Optional[str]:
+    """현재 작업 이름 (작업 밖이면 None)"""
+    return _operation.get()
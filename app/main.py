@@ -14,7 +14,11 @@ import uvicorn
 from .core.config import settings
 from .core.logging import get_logger, log_request, log_error
 from .models.model_manager import model_manager
-from .api.routes import faces, health
+from .core.request_context import start_request
+from .models.gallery.gallery import face_gallery
+from .models.gallery.persistence import GalleryLockedError
+from .services.negative_cache import client_stats, ClientFailureStats
+from .api.routes import faces, health, batch_sessions, embeddings, gallery, references, cache
 
 logger = get_logger(__name__)
 
@@ -34,6 +38,12 @@ async def lifespan(app: FastAPI):
         if settings.debug_mode:
             await model_manager.warmup_models()
         
+        # 얼굴 갤러리 복원 (스냅샷 매핑 + WAL 재생) - 디렉토리는 한 워커만 소유
+        try:
+            await asyncio.to_thread(face_gallery.open)
+        except GalleryLockedError as e:
+            logger.warning(f"이 워커는 갤러리 없이 시작합니다 (/gallery 요청은 503): {e}")
+        
         logger.info("애플리케이션 시작 완료")
         
     except Exception as e:
@@ -47,6 +57,7 @@ async def lifespan(app: FastAPI):
     
     try:
         await model_manager.shutdown_models()
+        await asyncio.to_thread(face_gallery.close)
         logger.info("애플리케이션 종료 완료")
         
     except Exception as e:
@@ -99,8 +110,20 @@ async def request_middleware(request: Request, call_next):
             )
     
     try:
+        flags = start_request()
         response = await call_next(request)
         
+        # 분석 요청은 클라이언트별 얼굴 없음/실패 집계
+        if request.method == "POST":
+            client_stats.record(
+                ClientFailureStats.client_id(
+                    request.headers.get("X-Client-ID"),
+                    request.client.host if request.client else None
+                ),
+                response.status_code,
+                no_face=flags.get("no_face", False)
+            )
+        
         # 요청 로깅
         processing_time = time.time() - start_time
         log_request(
@@ -180,6 +203,55 @@ app.include_router(
     }
 )
 
+app.include_router(
+    batch_sessions.router,
+    tags=["batch-sessions"],
+    responses={
+        400: {"description": "잘못된 요청"},
+        404: {"description": "세션 없음 또는 만료"},
+        500: {"description": "내부 서버 오류"}
+    }
+)
+
+app.include_router(
+    references.router,
+    tags=["references"],
+    responses={
+        400: {"description": "잘못된 요청"},
+        404: {"description": "참조 얼굴 없음 또는 만료"},
+        500: {"description": "내부 서버 오류"}
+    }
+)
+
+app.include_router(
+    embeddings.router,
+    tags=["embeddings"],
+    responses={
+        400: {"description": "잘못된 요청"},
+        500: {"description": "내부 서버 오류"}
+    }
+)
+
+app.include_router(
+    gallery.router,
+    tags=["gallery"],
+    responses={
+        400: {"description": "잘못된 요청"},
+        404: {"description": "갤러리에 없는 얼굴"},
+        500: {"description": "내부 서버 오류"},
+        503: {"description": "다른 워커가 갤러리를 소유 중"}
+    }
+)
+
+app.include_router(
+    cache.router,
+    tags=["cache"],
+    responses={
+        401: {"description": "관리 키 불일치"},
+        403: {"description": "관리 키나 API 키 인증이 설정되지 않음"}
+    }
+)
+
 app.include_router(
     health.router,
     tags=["monitoring"],
@@ -0,0 +1,180 @@
+"""
+정렬 크롭 재사용 - 얼굴마다 모델 입력 크롭과 블롭을 기하별로 한 번만 만들어 공유
+
+InsightFace FaceAnalysis.get 은 하위 모델마다 model.get(img, face) 를 불러 각자 전체 이미지에서
+warpAffine 으로 크롭을 만들고 blobFromImage 로 새 배열을 할당합니다. 성별 분석기도 genderage 크롭을
+다시 만듭니다. 여기서는 (기하, 크기) 별 크롭과 (기하, 크기, 평균, 표준편차) 별 블롭을 얼굴당 한 번만 만들고,
+스레드별로 미리 할당한 버퍼에 써서 얼굴과 요청마다 배열을 새로 만들지 않습니다.
+
+기하는 두 가지입니다.
+- "center": 박스 중심 기준 max(w, h) * 1.5 영역 (genderage, 랜드마크 모델 - face_align.transform 과 같은 변환)
+- "arcface": 5점 키포인트 기준 유사 변환 (인식 모델 - face_align.norm_crop 과 같은 변환)
+"""
+import threading
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from ..core.logging import get_logger
+from ..services.analysis_cache import CachedFace
+
+try:
+    from insightface.utils import face_align
+except ImportError:  # 더미 모드 - FaceAnalyzer 가 파이프라인을 만들지 않음
+    face_align = None
+
+logger = get_logger(__name__)
+
+CENTER = "center"
+ARCFACE = "arcface"
+
+
+def center_transform(bbox, size: int) -> np.ndarray:
+    """박스 중심 크롭 변환 행렬 (face_align.transform(img, center, size, size / (max(w, h) * 1.5), 0) 과 같은 값)"""
+    w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    cx, cy = (bbox[2] + bbox[0]) / 2, (bbox[3] + bbox[1]) / 2
+    scale = size / (max(w, h) * 1.5)
+    return np.array([
+        [scale, 0.0, size / 2 - cx * scale],
+        [0.0, scale, size / 2 - cy * scale]
+    ], dtype=np.float64)
+
+
+def arcface_transform(kps, size: int) -> np.ndarray:
+    """5점 키포인트 정렬 변환 행렬 (face_align.norm_crop 과 같은 값)"""
+    return face_align.estimate_norm(np.asarray(kps, dtype=np.float32), size)
+
+
+class AlignedCropCache:
+    """
+    얼굴 하나의 정렬 크롭/블롭 캐시 (스레드별)
+
+    reset 으로 얼굴을 바꾸면 이전 얼굴의 크롭과 블롭은 무효가 되고 버퍼는 그대로 재사용합니다.
+    반환한 배열은 같은 스레드의 다음 reset 전까지만 유효하므로 모델 입력으로만 쓰고 보관하지 않습니다.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _state(self) -> Dict:
+        state = getattr(self._local, "state", None)
+        if state is None:
+            state = self._local.state = {"img": None, "face": None, "buffers": {}, "crops": {}, "blobs": {}}
+        return state
+
+    def reset(self, img: np.ndarray, face):
+        """새 얼굴 시작"""
+        state = self._state()
+        state["img"] = img
+        state["face"] = face
+        state["crops"].clear()
+        state["blobs"].clear()
+
+    def _buffer(self, key: Tuple, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        """미리 할당한 버퍼 (모양이 바뀔 때만 새로 할당)"""
+        buffers = self._state()["buffers"]
+        buffer = buffers.get(key)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = buffers[key] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def crop(self, geometry: str, size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """정렬 크롭과 변환 행렬 (같은 얼굴의 같은 기하/크기면 다시 warp 하지 않음)"""
+        state = self._state()
+        key = (geometry, size)
+        cached = state["crops"].get(key)
+        if cached is None:
+            img, face = state["img"], state["face"]
+            if geometry == CENTER:
+                M = center_transform(face.bbox, size)
+            elif geometry == ARCFACE:
+                M = arcface_transform(face.kps, size)
+            else:
+                raise ValueError(f"지원하지 않는 크롭 기하: {geometry}")
+
+            buffer = self._buffer(("crop",) + key, (size, size) + img.shape[2:], img.dtype)
+            cv2.warpAffine(img, M, (size, size), dst=buffer, borderValue=0.0)
+            cached = state["crops"][key] = (buffer, M)
+        return cached
+
+    def blob(self, geometry: str, size: int, mean: float, std: float) -> np.ndarray:
+        """
+        모델 입력 블롭 (1, 3, size, size)
+
+        cv2.dnn.blobFromImage(crop, 1 / std, (size, size), (mean,) * 3, swapRB=True) 와 같은 값을
+        버퍼에 바로 씁니다. 정규화가 같은 모델끼리는 블롭도 공유합니다.
+        """
+        state = self._state()
+        key = (geometry, size, float(mean), float(std))
+        blob = state["blobs"].get(key)
+        if blob is None:
+            crop, _ = self.crop(geometry, size)
+            blob = self._buffer(("blob",) + key, (1, 3, size, size), np.float32)
+            np.subtract(crop[:, :, ::-1].transpose(2, 0, 1), np.float32(mean), out=blob[0])
+            blob *= np.float32(1.0 / std)
+            state["blobs"][key] = blob
+        return blob
+
+
+class AlignedFacePipeline:
+    """
+    FaceAnalysis.get 대체 - 감지 후 얼굴마다 공유 크롭으로 인식/genderage 모델 실행
+
+    결과는 바로 CachedFace 로 만들고 genderage 원시 출력도 함께 담아, 성별 추정에서 이미지를 다시
+    디코딩하거나 크롭을 다시 만들지 않습니다. 랜드마크 모델(landmark_3d_68, landmark_2d_106) 출력은
+    분석 캐시가 보관하지 않으므로 실행하지 않습니다.
+    """
+
+    def __init__(self, app, crops: "AlignedCropCache" = None):
+        self.app = app
+        self.crops = crops or aligned_crop_cache
+        self.recognition_model = app.models.get("recognition")
+        self.genderage_model = app.models.get("genderage")
+
+    @staticmethod
+    def supports(app) -> bool:
+        """감지 모델과 하위 모델에 직접 접근할 수 있는 FaceAnalysis 인지"""
+        return (face_align is not None
+                and getattr(app, "det_model", None) is not None
+                and isinstance(getattr(app, "models", None), dict))
+
+    @staticmethod
+    def _run(model, blob: np.ndarray) -> np.ndarray:
+        return model.session.run(model.output_names, {model.input_name: blob})[0]
+
+    def get(self, img: np.ndarray) -> List[CachedFace]:
+        """얼굴 감지와 속성 추론 (FaceAnalysis.get(img) 과 같은 결과)"""
+        bboxes, kpss = self.app.det_model.detect(img, max_num=0, metric="default")
+        faces = []
+        for i in range(bboxes.shape[0]):
+            face = CachedFace(
+                bbox=bboxes[i, 0:4],
+                kps=None if kpss is None else kpss[i],
+                det_score=bboxes[i, 4],
+                normed_embedding=None
+            )
+            self.crops.reset(img, face)
+
+            model = self.recognition_model
+            if model is not None and face.kps is not None:
+                blob = self.crops.blob(ARCFACE, model.input_size[0], model.input_mean, model.input_std)
+                embedding = self._run(model, blob).flatten()
+                norm = float(np.linalg.norm(embedding)) or 1.0
+                face.normed_embedding = (embedding / norm).astype(np.float32)
+                face.embedding_norm = norm
+
+            model = self.genderage_model
+            if model is not None:
+                blob = self.crops.blob(CENTER, model.input_size[0], model.input_mean, model.input_std)
+                pred = self._run(model, blob)[0]
+                face.genderage = np.asarray(pred, dtype=np.float32)
+                face.gender = int(np.argmax(pred[:2]))
+                face.age = int(np.round(pred[2] * 100))
+
+            faces.append(face)
+        return faces
+
+
+# 전역 정렬 크롭 캐시 (스레드별 버퍼)
+aligned_crop_cache = AlignedCropCache()
@@ -2,10 +2,10 @@
 Enhanced Gender Probability Analyzer - InsightFace genderage 모델의 raw 확률값 활용
 """
 import numpy as np
-import cv2
 from typing import Dict, Any, List, Optional
 import logging
-from insightface.utils import face_align
+
+from .aligned_crops import aligned_crop_cache, AlignedCropCache, CENTER
 
 logger = logging.getLogger(__name__)
 
@@ -13,12 +13,14 @@ logger = logging.getLogger(__name__)
 class EnhancedGenderProbabilityAnalyzer:
     """InsightFace genderage 모델의 raw 확률값을 활용한 향상된 성별 분석기"""
     
-    def __init__(self, face_analyzer_app):
+    def __init__(self, face_analyzer_app, crops: Optional[AlignedCropCache] = None):
         """
         Args:
             face_analyzer_app: InsightFace FaceAnalysis 인스턴스
+            crops: 정렬 크롭 캐시 (기본값은 전역 캐시)
         """
         self.app = face_analyzer_app
+        self.crops = crops or aligned_crop_cache
         self.genderage_model = None
         
         if hasattr(face_analyzer_app, 'models') and 'genderage' in face_analyzer_app.models:
@@ -27,13 +29,21 @@ class EnhancedGenderProbabilityAnalyzer:
         else:
             logger.warning("⚠️ genderage 모델을 찾을 수 없음")
     
-    def get_gender_probabilities(self, face, img: np.ndarray) -> Dict[str, Any]:
+    def get_raw_output(self, face, img: np.ndarray) -> Optional[np.ndarray]:
+        """genderage 모델 raw 출력 [female_score, male_score, age_normalized] (모델이 없거나 실패하면 None)"""
+        if not self.genderage_model:
+            return None
+        return self._get_raw_genderage_output(face, img)
+    
+    def get_gender_probabilities(self, face, img: Optional[np.ndarray] = None,
+                                 raw_output: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """
         InsightFace genderage 모델에서 raw 확률값을 추출하여 정확한 성별 확률 반환
         
         Args:
             face: InsightFace face 객체
-            img: 원본 이미지 (cv2 형식)
+            img: 원본 이미지 (cv2 형식, raw_output 이 없을 때 사용)
+            raw_output: 미리 계산한 genderage raw 출력 (분석 캐시)
             
         Returns:
             Dict containing gender probabilities and confidence scores
@@ -45,7 +55,8 @@ class EnhancedGenderProbabilityAnalyzer:
         
         try:
             # genderage 모델에서 raw 출력 얻기
-            raw_output = self._get_raw_genderage_output(face, img)
+            if raw_output is None and img is not None:
+                raw_output = self._get_raw_genderage_output(face, img)
             
             if raw_output is None:
                 logger.warning("genderage raw 출력 실패. 기본값 반환")
@@ -98,33 +109,17 @@ class EnhancedGenderProbabilityAnalyzer:
     def _get_raw_genderage_output(self, face, img: np.ndarray) -> Optional[np.ndarray]:
         """
         genderage 모델에서 raw 출력을 직접 얻기
-        InsightFace의 attribute.py 코드를 참조하여 구현
+        InsightFace의 attribute.py 코드를 참조하여 구현 (정렬 파이프라인이 감지 때 채우지 못한 얼굴용)
         """
         
         try:
-            # 얼굴 영역 추출 및 정렬
-            bbox = face.bbox
-            w, h = (bbox[2] - bbox[0]), (bbox[3] - bbox[1])
-            center = (bbox[2] + bbox[0]) / 2, (bbox[3] + bbox[1]) / 2
-            rotate = 0
-            
-            # genderage 모델의 입력 크기 (96x96)
-            input_size = self.genderage_model.input_size  # (96, 96)
-            _scale = input_size[0] / (max(w, h) * 1.5)
-            
-            # 얼굴 정렬 및 크기 조정
-            aimg, M = face_align.transform(img, center, input_size[0], _scale, rotate)
-            
-            # 모델 입력을 위한 전처리
-            input_mean = self.genderage_model.input_mean  # 0.0
-            input_std = self.genderage_model.input_std    # 1.0
-            
-            blob = cv2.dnn.blobFromImage(
-                aimg, 
-                1.0 / input_std, 
-                input_size, 
-                (input_mean, input_mean, input_mean), 
-                swapRB=True
+            # 박스 중심 정렬 크롭과 블롭 (공유 버퍼에 한 번만 생성)
+            self.crops.reset(img, face)
+            blob = self.crops.blob(
+                CENTER,
+                self.genderage_model.input_size[0],  # 96
+                self.genderage_model.input_mean,     # 0.0
+                self.genderage_model.input_std       # 1.0
             )
             
             # 모델 실행
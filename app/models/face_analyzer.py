@@ -2,17 +2,39 @@
 얼굴 분석 클래스 - InsightFace 기반 얼굴 분석
 """
 import base64
+import functools
 import numpy as np
 import cv2
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Union
 from io import BytesIO
 from PIL import Image
 
+from ..core.config import settings
 from ..core.logging import get_logger
+from ..utils.embedding_codec import encode_embedding
+from ..utils.image_utils import get_image_hash
+from ..services.analysis_cache import analysis_cache, CachedFace
+from ..services.redis_cache import redis_cache
+from ..services.shm_cache import shm_cache
+from ..services.negative_cache import negative_cache
+from ..services.single_flight import single_flight
+from ..services.reference_faces import ReferenceFace
+from ..core.request_context import set_request_flag
+from .family_similarity import family_analyzer
+from .aligned_crops import AlignedFacePipeline
 
 logger = get_logger(__name__)
 
 
+def _async_variant(method):
+    """동기 분석 메서드의 async 판 - single_flight 작업 스레드 풀에서 실행해 이벤트 루프를 막지 않음"""
+    @functools.wraps(method)
+    async def variant(self, *args, **kwargs):
+        return await single_flight.submit(method, self, *args, **kwargs)
+    variant.__name__ = method.__name__[:-len("_sync")]
+    return variant
+
+
 class FaceAnalyzer:
     """InsightFace 기반 얼굴 분석기"""
     
@@ -27,6 +49,12 @@ class FaceAnalyzer:
             logger.info("✅ Enhanced Gender Analyzer 초기화 완료")
         else:
             self.enhanced_gender_analyzer = None
+        
+        # 하위 모델이 정렬 크롭을 공유하는 감지 파이프라인 (FaceAnalysis 가 아니면 app.get 사용)
+        self.pipeline = None
+        if self.is_loaded and settings.aligned_crop_reuse and AlignedFacePipeline.supports(face_analysis_app):
+            self.pipeline = AlignedFacePipeline(face_analysis_app)
+            logger.info("✅ 정렬 크롭 공유 파이프라인 사용")
     
     def _decode_base64_image(self, base64_string: str) -> np.ndarray:
         """Base64 문자열을 이미지로 디코딩"""
@@ -53,20 +81,126 @@ class FaceAnalyzer:
         except Exception as e:
             raise ValueError(f"이미지 디코딩 실패: {e}")
     
-    async def compare_faces(self, source_image: str, target_image: str, threshold: float = 0.01) -> Dict[str, Any]:
+    def _get_faces(self, image: Union[str, ReferenceFace]) -> List[CachedFace]:
+        """
+        이미지의 얼굴 감지 결과 (분석 캐시에 있으면 디코딩과 app.get 을 건너뜀)
+        
+        모든 분석 메서드가 이 함수를 거치므로 같은 이미지를 여러 엔드포인트에 보내도 감지는 한 번입니다.
+        이미지 대신 참조 얼굴이 오면 보관된 얼굴 하나를 그대로 돌려줍니다.
+        """
+        if isinstance(image, ReferenceFace):
+            return [image.face]
+        
+        key = get_image_hash(image)
+        cacheable = key != "unknown"
+        
+        # 최근 얼굴 없음으로 확인된 이미지는 추론 없이 바로 빈 결과
+        if cacheable and negative_cache.contains(key):
+            set_request_flag("no_face")
+            return []
+        
+        faces = analysis_cache.get(key) if cacheable else None
+        if faces is None and cacheable:
+            faces = self._get_shared_faces([key]).get(key)
+        if faces is None:
+            faces = self._detect(self._decode_base64_image(image))
+            for face in faces:
+                # 가족 분석용 기하 특징은 감지 시 한 번 계산해 캐시된 얼굴과 함께 보관
+                family_analyzer.face_descriptor(face)
+            if cacheable:
+                self._store_faces(key, faces)
+        
+        if not faces:
+            set_request_flag("no_face")
+        return faces
+    
+    def _detect(self, img: np.ndarray) -> List[CachedFace]:
+        """얼굴 감지와 속성 추론 (가능하면 정렬 크롭을 공유하는 파이프라인으로)"""
+        if self.pipeline is not None:
+            return self.pipeline.get(img)
+        return [CachedFace.from_face(face) for face in self.app.get(img)]
+    
+    def _store_faces(self, key: str, faces: List[CachedFace]):
+        """새로 계산한 감지 결과 저장 (얼굴 없음은 부정 캐시와 공유 계층에 짧은 TTL 로)"""
+        if not faces:
+            negative_cache.add(key)
+            shm_cache.put(key, faces, ttl=negative_cache.ttl)
+            redis_cache.put(key, faces, ttl=negative_cache.ttl)
+            return
+        
+        analysis_cache.put(key, faces)
+        shm_cache.put(key, faces)
+        redis_cache.put(key, faces)
+    
+    def _get_shared_faces(self, keys: List[str]) -> Dict[str, List[CachedFace]]:
+        """
+        다른 워커가 계산한 감지 결과 (같은 호스트 공유 메모리 -> Redis 순서)
+        
+        찾은 결과는 프로세스 캐시에 넣고, Redis 에서만 찾은 결과는 공유 메모리에도 넣습니다.
+        """
+        found = shm_cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        for key, faces in redis_cache.get_many(missing).items():
+            shm_cache.put(key, faces, ttl=None if faces else negative_cache.ttl)
+            found[key] = faces
+        
+        for key, faces in found.items():
+            if faces:
+                analysis_cache.put(key, faces)
+            else:
+                negative_cache.add(key)
+        return found
+    
+    def prefetch_faces(self, images: List[str]):
+        """
+        여러 이미지의 감지 결과를 공유 캐시에서 한 번에 가져와 프로세스 캐시에 채움
+        
+        배치 요청에서 이미지마다 Redis 왕복을 하지 않도록 _get_faces 호출 전에 부릅니다.
+        """
+        if not self.is_loaded:
+            return
+        
+        images = [image for image in images if isinstance(image, str)]
+        keys = [key for key in {get_image_hash(image) for image in images} if key != "unknown"]
+        self._get_shared_faces([
+            key for key in keys if not analysis_cache.contains(key) and not negative_cache.contains(key)
+        ])
+    
+    def analyze_reference_face_sync(self, image: str, face_id: int = 0) -> CachedFace:
+        """참조 얼굴로 보관할 얼굴 하나 분석 (face_id 번째 얼굴)"""
+        
+        if not self.is_loaded:
+            return self._dummy_reference_face(image)
+        
+        faces = self._get_faces(image)
+        if not faces:
+            raise ValueError("이미지에서 얼굴을 찾을 수 없습니다")
+        if face_id >= len(faces):
+            raise ValueError(f"face_id {face_id}가 범위를 벗어났습니다 (감지된 얼굴: {len(faces)}개)")
+        return faces[face_id]
+    
+    def _dummy_reference_face(self, image: str) -> CachedFace:
+        """더미 참조 얼굴 (InsightFace 없을 때)"""
+        result = self._dummy_extract_embedding(image, face_id=0, normalize=True)
+        return CachedFace(
+            bbox=[100, 50, 300, 300],
+            kps=result["landmarks"],
+            det_score=result["confidence"],
+            normed_embedding=np.asarray(result["embedding"], dtype=np.float32),
+            age=result["age"],
+            gender=1
+        )
+    
+    def compare_faces_sync(self, source_image: str, target_image: str, threshold: float = 0.01) -> Dict[str, Any]:
         """두 얼굴 이미지 비교"""
         
         if not self.is_loaded:
             return self._dummy_compare_faces(source_image, target_image, threshold)
         
         try:
-            # 이미지 디코딩
-            source_img = self._decode_base64_image(source_image)
-            target_img = self._decode_base64_image(target_image)
-            
-            # 얼굴 감지 및 임베딩 추출
-            source_faces = self.app.get(source_img)
-            target_faces = self.app.get(target_img)
+            # 얼굴 감지 및 임베딩 추출 (분석 캐시 우선)
+            source_faces = self._get_faces(source_image)
+            target_faces = self._get_faces(target_image)
             
             if not source_faces:
                 raise ValueError("원본 이미지에서 얼굴을 찾을 수 없습니다")
@@ -150,18 +284,15 @@ class FaceAnalyzer:
             logger.error(f"얼굴 비교 중 오류: {e}")
             raise RuntimeError(f"얼굴 비교 실패: {e}")
     
-    async def detect_faces(self, image: str, include_landmarks: bool = False, include_attributes: bool = True, max_faces: int = 10) -> Dict[str, Any]:
+    def detect_faces_sync(self, image: str, include_landmarks: bool = False, include_attributes: bool = True, max_faces: int = 10, embedding_format: str = "float_list") -> Dict[str, Any]:
         """얼굴 감지"""
         
         if not self.is_loaded:
-            return self._dummy_detect_faces(image, include_landmarks, include_attributes, max_faces)
+            return self._dummy_detect_faces(image, include_landmarks, include_attributes, max_faces, embedding_format)
         
         try:
-            # 이미지 디코딩
-            img = self._decode_base64_image(image)
-            
-            # 얼굴 감지
-            faces = self.app.get(img)
+            # 얼굴 감지 (분석 캐시 우선)
+            faces = self._get_faces(image)
             
             if not faces:
                 return {
@@ -198,7 +329,7 @@ class FaceAnalyzer:
                         }
                 
                 if hasattr(face, 'embedding') and face.embedding is not None:
-                    face_data["embedding"] = face.embedding.tolist()
+                    face_data["embedding"] = encode_embedding(face.embedding, embedding_format)
                     face_data["quality_score"] = float(np.linalg.norm(face.embedding))
                 
                 detected_faces.append(face_data)
@@ -212,18 +343,15 @@ class FaceAnalyzer:
             logger.error(f"얼굴 감지 중 오류: {e}")
             raise RuntimeError(f"얼굴 감지 실패: {e}")
     
-    async def extract_embedding(self, image: str, face_id: int = 0, normalize: bool = True) -> Dict[str, Any]:
+    def extract_embedding_sync(self, image: str, face_id: int = 0, normalize: bool = True, embedding_format: str = "float_list") -> Dict[str, Any]:
         """얼굴 임베딩 추출"""
         
         if not self.is_loaded:
-            return self._dummy_extract_embedding(image, face_id, normalize)
+            return self._dummy_extract_embedding(image, face_id, normalize, embedding_format)
         
         try:
-            # 이미지 디코딩
-            img = self._decode_base64_image(image)
-            
-            # 얼굴 감지
-            faces = self.app.get(img)
+            # 얼굴 감지 (분석 캐시 우선)
+            faces = self._get_faces(image)
             
             if not faces:
                 raise ValueError("이미지에서 얼굴을 찾을 수 없습니다")
@@ -238,7 +366,7 @@ class FaceAnalyzer:
                 embedding = embedding / np.linalg.norm(embedding)
             
             return {
-                "embedding": embedding.tolist(),
+                "embedding": encode_embedding(embedding, embedding_format),
                 "bounding_box": {
                     "x": float(face.bbox[0]),
                     "y": float(face.bbox[1]),
@@ -246,7 +374,10 @@ class FaceAnalyzer:
                     "height": float(face.bbox[3] - face.bbox[1])
                 },
                 "confidence": float(face.det_score),
-                "landmarks": face.landmark.tolist() if hasattr(face, 'landmark') and face.landmark is not None else []
+                "landmarks": face.landmark.tolist() if hasattr(face, 'landmark') and face.landmark is not None else [],
+                "keypoints": self._face_keypoints(face),
+                "age": int(face.age) if getattr(face, 'age', None) is not None else None,
+                "gender": ("male" if face.gender == 1 else "female") if getattr(face, 'gender', None) is not None else None
             }
             
         except Exception as e:
@@ -285,7 +416,7 @@ class FaceAnalyzer:
             "unmatched_faces": []
         }
     
-    def _dummy_detect_faces(self, image: str, include_landmarks: bool, include_attributes: bool, max_faces: int) -> Dict[str, Any]:
+    def _dummy_detect_faces(self, image: str, include_landmarks: bool, include_attributes: bool, max_faces: int, embedding_format: str = "float_list") -> Dict[str, Any]:
         """더미 얼굴 감지 (InsightFace 없을 때)"""
         return {
             "faces": [
@@ -295,14 +426,14 @@ class FaceAnalyzer:
                     "age": 30,
                     "gender": {"value": "Male", "confidence": 0.85},
                     "landmarks": [[120, 80], [180, 80], [150, 120], [130, 160], [170, 160]] if include_landmarks else [],
-                    "embedding": [0.1] * 512 if include_attributes else [],
+                    "embedding": encode_embedding(np.full(512, 0.1), embedding_format) if include_attributes else [],
                     "quality_score": 0.85
                 }
             ],
             "face_count": 1
         }
     
-    def _dummy_extract_embedding(self, image: str, face_id: int, normalize: bool) -> Dict[str, Any]:
+    def _dummy_extract_embedding(self, image: str, face_id: int, normalize: bool, embedding_format: str = "float_list") -> Dict[str, Any]:
         """더미 임베딩 추출 (InsightFace 없을 때)"""
         import random
         
@@ -314,26 +445,25 @@ class FaceAnalyzer:
             embedding = [x / norm for x in embedding]
         
         return {
-            "embedding": embedding,
+            "embedding": encode_embedding(np.array(embedding), embedding_format),
             "bounding_box": {"x": 100, "y": 50, "width": 200, "height": 250},
             "confidence": 0.95,
-            "landmarks": [[120, 80], [180, 80], [150, 120], [130, 160], [170, 160]]
+            "landmarks": [[120, 80], [180, 80], [150, 120], [130, 160], [170, 160]],
+            "keypoints": [{"x": x, "y": y} for x, y in [[120, 80], [180, 80], [150, 120], [130, 160], [170, 160]]],
+            "age": 30,
+            "gender": "male"
         }
     
-    async def analyze_family_similarity(self, parent_image: str, child_image: str, parent_age: Optional[int] = None, child_age: Optional[int] = None) -> Dict[str, Any]:
+    def analyze_family_similarity_sync(self, parent_image: str, child_image: str, parent_age: Optional[int] = None, child_age: Optional[int] = None) -> Dict[str, Any]:
         """가족 유사도 분석"""
         
         if not self.is_loaded:
             return self._dummy_family_similarity(parent_image, child_image, parent_age, child_age)
         
         try:
-            # 이미지 디코딩
-            parent_img = self._decode_base64_image(parent_image)
-            child_img = self._decode_base64_image(child_image)
-            
-            # 얼굴 감지 및 임베딩 추출
-            parent_faces = self.app.get(parent_img)
-            child_faces = self.app.get(child_img)
+            # 얼굴 감지 및 임베딩 추출 (분석 캐시 우선)
+            parent_faces = self._get_faces(parent_image)
+            child_faces = self._get_faces(child_image)
             
             if not parent_faces:
                 raise ValueError("부모 이미지에서 얼굴을 찾을 수 없습니다")
@@ -431,7 +561,7 @@ class FaceAnalyzer:
             }
         }
     
-    async def find_most_similar_parent(
+    def find_most_similar_parent_sync(
         self, 
         child_image: str, 
         parent_images: List[str], 
@@ -447,102 +577,21 @@ class FaceAnalyzer:
             logger.info(f"부모 찾기 시작 - 자녀: 1명, 부모 후보: {len(parent_images)}명")
             logger.info(f"가족 특화 분석 사용: {use_family_analysis}")
             
-            matches = []
+            self.prefetch_faces([child_image] + list(parent_images))
             
-            # 각 부모 이미지와 개별적으로 비교
-            for i, parent_image in enumerate(parent_images):
-                try:
-                    logger.info(f"부모 {i+1}/{len(parent_images)} 비교 시작")
-                    
-                    if use_family_analysis:
-                        # 가족 특화 분석 사용
-                        from .family_similarity import family_analyzer
-                        
-                        # 자녀 얼굴 정보 추출
-                        child_img = self._decode_base64_image(child_image)
-                        child_faces = self.app.get(child_img)
-                        
-                        if not child_faces:
-                            logger.warning(f"부모 {i+1} 비교에서 자녀 얼굴 감지 실패")
-                            matches.append({
-                                "image_index": i,
-                                "similarity": 0.0,
-                                "family_similarity": 0.0,
-                                "confidence": 0.0,
-                                "feature_breakdown": {},
-                                "similarity_level": "자녀 얼굴 감지 실패"
-                            })
-                            continue
-                        
-                        # 부모 얼굴 정보 추출
-                        parent_img = self._decode_base64_image(parent_image)
-                        parent_faces = self.app.get(parent_img)
-                        
-                        if not parent_faces:
-                            logger.warning(f"부모 {i+1} 얼굴 감지 실패")
-                            matches.append({
-                                "image_index": i,
-                                "similarity": 0.0,
-                                "family_similarity": 0.0,
-                                "confidence": 0.0,
-                                "feature_breakdown": {},
-                                "similarity_level": "부모 얼굴 감지 실패"
-                            })
-                            continue
-                        
-                        # 가족 특화 분석 수행
-                        child_face = child_faces[0]
-                        parent_face = parent_faces[0]
-                        
-                        parent_face_data = {
-                            "bounding_box": {
-                                "x": float(parent_face.bbox[0]),
-                                "y": float(parent_face.bbox[1]),
-                                "width": float(parent_face.bbox[2] - parent_face.bbox[0]),
-                                "height": float(parent_face.bbox[3] - parent_face.bbox[1])
-                            },
-                            "confidence": float(parent_face.det_score),
-                            "age": int(parent_face.age) if hasattr(parent_face, 'age') else None,
-                            "embedding": parent_face.embedding,
-                            "landmarks": parent_face.landmark.tolist() if hasattr(parent_face, 'landmark') and parent_face.landmark is not None else []
-                        }
-                        
-                        child_face_data = {
-                            "bounding_box": {
-                                "x": float(child_face.bbox[0]),
-                                "y": float(child_face.bbox[1]),
-                                "width": float(child_face.bbox[2] - child_face.bbox[0]),
-                                "height": float(child_face.bbox[3] - child_face.bbox[1])
-                            },
-                            "confidence": float(child_face.det_score),
-                            "age": int(child_face.age) if hasattr(child_face, 'age') else child_age,
-                            "embedding": child_face.embedding,
-                            "landmarks": child_face.landmark.tolist() if hasattr(child_face, 'landmark') and child_face.landmark is not None else []
-                        }
-                        
-                        # 가족 유사도 계산
-                        family_result = family_analyzer.calculate_family_similarity(
-                            parent_face_data,
-                            child_face_data,
-                            parent_face_data["age"],
-                            child_face_data["age"]
-                        )
-                        
-                        # 결과를 백분율로 변환
-                        matches.append({
-                            "image_index": i,
-                            "similarity": float(family_result["base_similarity"] * 100),
-                            "family_similarity": float(family_result["family_similarity"] * 100),
-                            "confidence": float(family_result["confidence"] * 100),
-                            "feature_breakdown": {k: float(v * 100) for k, v in family_result["feature_breakdown"].items()},
-                            "similarity_level": family_result["similarity_level"]
-                        })
-                        
-                        logger.info(f"부모 {i+1} 가족 분석 완료 - 가족 유사도: {family_result['family_similarity'] * 100:.1f}%")
+            if use_family_analysis:
+                # 가족 특화 분석: 모든 부모를 캐시된 기하 특징으로 한 번에 비교
+                matches = self._score_parents_by_family(child_image, parent_images, child_age)
+            else:
+                matches = []
+                
+                # 각 부모 이미지와 개별적으로 비교
+                for i, parent_image in enumerate(parent_images):
+                    try:
+                        logger.info(f"부모 {i+1}/{len(parent_images)} 비교 시작")
                         
-                    else:
                         # 기본 얼굴 비교 사용 (compare_faces 함수 활용)
-                        result = await self.compare_faces(child_image, parent_image, threshold=0.01)
+                        result = self.compare_faces_sync(child_image, parent_image, threshold=0.01)
                         
                         # 유사도가 있으면 추가
                         similarity = result.get("similarity", 0.0) * 100
@@ -559,16 +608,16 @@ class FaceAnalyzer:
                         
                         logger.info(f"부모 {i+1} 기본 비교 완료 - 유사도: {similarity:.1f}%")
                         
-                except Exception as e:
-                    logger.error(f"부모 {i+1} 비교 중 오류: {e}")
-                    matches.append({
-                        "image_index": i,
-                        "similarity": 0.0,
-                        "family_similarity": 0.0 if use_family_analysis else None,
-                        "confidence": 0.0,
-                        "feature_breakdown": {} if use_family_analysis else None,
-                        "similarity_level": "분석 실패"
-                    })
+                    except Exception as e:
+                        logger.error(f"부모 {i+1} 비교 중 오류: {e}")
+                        matches.append({
+                            "image_index": i,
+                            "similarity": 0.0,
+                            "family_similarity": None,
+                            "confidence": 0.0,
+                            "feature_breakdown": None,
+                            "similarity_level": "분석 실패"
+                        })
             
             # 유사도 기준으로 정렬
             if use_family_analysis:
@@ -591,6 +640,274 @@ class FaceAnalyzer:
             logger.error(f"부모 찾기 분석 중 전체 오류: {e}")
             raise RuntimeError(f"부모 찾기 분석 실패: {e}")
     
+    def _score_parents_by_family(
+        self,
+        child_image: Union[str, ReferenceFace],
+        parent_images: List[str],
+        child_age: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """
+        자녀 한 명 x 부모 후보들의 가족 유사도 (백분율)
+        
+        얼굴마다 저장된 기하 특징 벡터(face_descriptor)와 정규화된 임베딩으로 한 번에 계산하므로
+        같은 자녀/부모 얼굴의 랜드마크 특징은 요청이 바뀌어도 다시 계산하지 않습니다.
+        """
+        def failed(index: int, reason: str) -> Dict[str, Any]:
+            return {
+                "image_index": index,
+                "similarity": 0.0,
+                "family_similarity": 0.0,
+                "confidence": 0.0,
+                "feature_breakdown": {},
+                "similarity_level": reason
+            }
+        
+        try:
+            child_faces = self._get_faces(child_image)
+        except Exception as e:
+            logger.error(f"자녀 얼굴 분석 중 오류: {e}")
+            return [failed(i, "분석 실패") for i in range(len(parent_images))]
+        
+        if not child_faces:
+            logger.warning("부모 비교에서 자녀 얼굴 감지 실패")
+            return [failed(i, "자녀 얼굴 감지 실패") for i in range(len(parent_images))]
+        
+        matches = []
+        indexes = []
+        parent_faces = []
+        for i, parent_image in enumerate(parent_images):
+            try:
+                faces = self._get_faces(parent_image)
+            except Exception as e:
+                logger.error(f"부모 {i+1} 비교 중 오류: {e}")
+                matches.append(failed(i, "분석 실패"))
+                continue
+            
+            if not faces:
+                logger.warning(f"부모 {i+1} 얼굴 감지 실패")
+                matches.append(failed(i, "부모 얼굴 감지 실패"))
+                continue
+            
+            indexes.append(i)
+            parent_faces.append(faces[0])
+        
+        if not parent_faces:
+            return matches
+        
+        child_face = child_faces[0]
+        scores = family_analyzer.score_child_against_parents(
+            child_face.normed_embedding,
+            None,
+            np.stack([face.normed_embedding for face in parent_faces]),
+            None,
+            child_age=child_face.age if child_face.age is not None else child_age,
+            parent_ages=[face.age for face in parent_faces],
+            child_descriptor=family_analyzer.face_descriptor(child_face),
+            parent_descriptors=np.stack([family_analyzer.face_descriptor(face) for face in parent_faces])
+        )
+        
+        for j, i in enumerate(indexes):
+            breakdown = {feature: float(values[j]) for feature, values in scores["feature_breakdown"].items()}
+            family_similarity = float(scores["family_similarity"][j])
+            matches.append({
+                "image_index": i,
+                "similarity": float(scores["base_similarity"][j] * 100),
+                "family_similarity": family_similarity * 100,
+                "confidence": float(scores["confidence"][j] * 100),
+                "feature_breakdown": {feature: value * 100 for feature, value in breakdown.items()},
+                "similarity_level": family_analyzer.describe_similarity(family_similarity, breakdown)["similarity_level"]
+            })
+            logger.info(f"부모 {i+1} 가족 분석 완료 - 가족 유사도: {family_similarity * 100:.1f}%")
+        
+        return matches
+    
+    def _face_keypoints(self, face) -> List[Dict[str, float]]:
+        """5점 키포인트 (눈, 코, 입꼬리) 를 가족 분석용 랜드마크 형식으로 변환"""
+        kps = getattr(face, 'kps', None)
+        if kps is None:
+            return []
+        return [{"x": float(x), "y": float(y)} for x, y in kps]
+
+    def _detect_family_faces(self, images: List[Dict[str, Any]]) -> tuple:
+        """
+        이미지별 첫 번째 얼굴 감지 (같은 이미지는 한 번만 감지)
+
+        Returns:
+            (이미지 ID별 얼굴 정보, 실패한 이미지 ID 목록)
+        """
+        analyzed_by_hash: Dict[str, Optional[Dict[str, Any]]] = {}
+        faces: Dict[str, Dict[str, Any]] = {}
+        failed_ids = []
+        self.prefetch_faces([item["image"] for item in images])
+
+        for item in images:
+            image_hash = get_image_hash(item["image"])
+
+            if image_hash not in analyzed_by_hash:
+                try:
+                    detected = self._get_faces(item["image"])
+                except ValueError as e:
+                    logger.warning(f"이미지 {item['id']} 디코딩 실패: {e}")
+                    detected = []
+
+                if detected:
+                    face = detected[0]
+                    analyzed_by_hash[image_hash] = {
+                        "bounding_box": {
+                            "x": float(face.bbox[0]),
+                            "y": float(face.bbox[1]),
+                            "width": float(face.bbox[2] - face.bbox[0]),
+                            "height": float(face.bbox[3] - face.bbox[1])
+                        },
+                        "confidence": float(face.det_score),
+                        "detected_age": int(face.age) if getattr(face, 'age', None) is not None else None,
+                        "embedding": face.normed_embedding,
+                        "landmarks": self._face_keypoints(face),
+                        "descriptor": family_analyzer.face_descriptor(face)
+                    }
+                else:
+                    analyzed_by_hash[image_hash] = None
+
+            face_data = analyzed_by_hash[image_hash]
+            if face_data is None:
+                failed_ids.append(item["id"])
+                continue
+
+            faces[item["id"]] = {
+                **face_data,
+                "age": item.get("age") or face_data["detected_age"]
+            }
+
+        return faces, failed_ids
+
+    def analyze_family_matrix_sync(
+        self,
+        parent_images: List[Dict[str, Any]],
+        child_images: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        여러 자녀 x 여러 부모 가족 유사도 행렬
+
+        Args:
+            parent_images: 부모 이미지 목록 ({"id", "image", "age"})
+            child_images: 자녀 이미지 목록 ({"id", "image", "age"})
+        """
+
+        if not self.is_loaded:
+            return self._dummy_family_matrix(parent_images, child_images)
+
+        try:
+            faces, failed_ids = self._detect_family_faces(parent_images + child_images)
+
+            parent_ids = [item["id"] for item in parent_images if item["id"] in faces]
+            child_ids = [item["id"] for item in child_images if item["id"] in faces]
+
+            if not parent_ids:
+                raise ValueError("부모 이미지에서 얼굴을 찾을 수 없습니다")
+            if not child_ids:
+                raise ValueError("자녀 이미지에서 얼굴을 찾을 수 없습니다")
+
+            parent_faces = [faces[pid] for pid in parent_ids]
+            child_faces = [faces[cid] for cid in child_ids]
+
+            result = family_analyzer.calculate_family_similarity_matrix(
+                parent_faces,
+                child_faces,
+                [f["age"] for f in parent_faces],
+                [f["age"] for f in child_faces]
+            )
+
+            return self._format_family_matrix(result, parent_ids, child_ids, faces, failed_ids)
+
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"가족 유사도 행렬 분석 중 오류: {e}")
+            raise RuntimeError(f"가족 유사도 행렬 분석 실패: {e}")
+
+    def _format_family_matrix(
+        self,
+        result: Dict[str, Any],
+        parent_ids: List[str],
+        child_ids: List[str],
+        faces: Dict[str, Dict[str, Any]],
+        failed_ids: List[str]
+    ) -> Dict[str, Any]:
+        """가족 유사도 행렬 결과를 응답 형식으로 변환"""
+
+        family = result["family_similarity"]
+        pairs = []
+        for c, child_id in enumerate(child_ids):
+            for p, parent_id in enumerate(parent_ids):
+                breakdown = {f: float(m[c, p]) for f, m in result["feature_breakdown"].items()}
+                pairs.append({
+                    "child_id": child_id,
+                    "parent_id": parent_id,
+                    "family_similarity": float(family[c, p]),
+                    "base_similarity": float(result["base_similarity"][c, p]),
+                    "age_corrected_similarity": float(result["age_corrected_similarity"][c, p]),
+                    "feature_breakdown": breakdown,
+                    "confidence": float(result["confidence"][c, p]),
+                    **family_analyzer.describe_similarity(float(family[c, p]), breakdown)
+                })
+
+        best_parents = []
+        for c, child_id in enumerate(child_ids):
+            p = int(np.argmax(family[c]))
+            best_parents.append({
+                "child_id": child_id,
+                "parent_id": parent_ids[p],
+                "family_similarity": float(family[c, p])
+            })
+
+        return {
+            "parent_ids": parent_ids,
+            "child_ids": child_ids,
+            "family_similarity_matrix": family.tolist(),
+            "base_similarity_matrix": result["base_similarity"].tolist(),
+            "pairs": pairs,
+            "best_parent_per_child": best_parents,
+            "faces": {
+                face_id: {
+                    "bounding_box": face["bounding_box"],
+                    "confidence": face["confidence"],
+                    "age": face["detected_age"]
+                }
+                for face_id, face in faces.items()
+            },
+            "failed_ids": failed_ids
+        }
+
+    def _dummy_family_matrix(self, parent_images: List[Dict[str, Any]], child_images: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """더미 가족 유사도 행렬 (InsightFace 없을 때)"""
+
+        rng = np.random.default_rng()
+        faces = {}
+        for item in parent_images + child_images:
+            embedding = rng.normal(0, 1, 512)
+            faces[item["id"]] = {
+                "bounding_box": {"x": 100, "y": 50, "width": 160, "height": 200},
+                "confidence": 0.92,
+                "detected_age": item.get("age"),
+                "age": item.get("age"),
+                "embedding": embedding / np.linalg.norm(embedding),
+                "landmarks": [{"x": x, "y": y} for x, y in [[120, 80], [180, 80], [150, 120], [130, 160], [170, 160]]]
+            }
+
+        parent_ids = [item["id"] for item in parent_images]
+        child_ids = [item["id"] for item in child_images]
+        parent_faces = [faces[pid] for pid in parent_ids]
+        child_faces = [faces[cid] for cid in child_ids]
+
+        result = family_analyzer.calculate_family_similarity_matrix(
+            parent_faces,
+            child_faces,
+            [f["age"] for f in parent_faces],
+            [f["age"] for f in child_faces]
+        )
+
+        return self._format_family_matrix(result, parent_ids, child_ids, faces, [])
+
     def _get_similarity_level(self, similarity: float) -> str:
         """유사도 수준 분류"""
         if similarity > 80:
@@ -648,18 +965,15 @@ class FaceAnalyzer:
             "analysis_method": "family_analysis" if use_family_analysis else "basic_comparison"
         }
     
-    async def estimate_age(self, image: str) -> Dict[str, Any]:
+    def estimate_age_sync(self, image: str) -> Dict[str, Any]:
         """나이 추정"""
         
         if not self.is_loaded:
             return self._dummy_estimate_age(image)
         
         try:
-            # 이미지 디코딩
-            img = self._decode_base64_image(image)
-            
-            # 얼굴 감지
-            faces = self.app.get(img)
+            # 얼굴 감지 (분석 캐시 우선)
+            faces = self._get_faces(image)
             
             if not faces:
                 raise ValueError("이미지에서 얼굴을 찾을 수 없습니다")
@@ -720,18 +1034,15 @@ class FaceAnalyzer:
             "face_count": 1
         }
     
-    async def estimate_gender_probability(self, image: str) -> Dict[str, Any]:
+    def estimate_gender_probability_sync(self, image: str) -> Dict[str, Any]:
         """Enhanced Gender Analyzer를 활용한 정확한 성별 확률 추정"""
         
         if not self.is_loaded or not self.enhanced_gender_analyzer:
             return self._dummy_estimate_gender_probability(image)
         
         try:
-            # 이미지 디코딩
-            img = self._decode_base64_image(image)
-            
-            # 얼굴 감지
-            faces = self.app.get(img)
+            # 얼굴 감지 (분석 캐시 우선)
+            faces = self._get_faces(image)
             
             if not faces:
                 raise ValueError("이미지에서 얼굴을 찾을 수 없습니다")
@@ -739,8 +1050,12 @@ class FaceAnalyzer:
             # 첫 번째 얼굴 사용
             face = faces[0]
             
+            # genderage 원시 출력도 캐시된 얼굴에 보관 (없을 때만 이미지를 디코딩해 계산)
+            if face.genderage is None:
+                face.genderage = self.enhanced_gender_analyzer.get_raw_output(face, self._decode_base64_image(image))
+            
             # Enhanced Gender Analyzer로 정확한 확률 추출
-            enhanced_result = self.enhanced_gender_analyzer.get_gender_probabilities(face, img)
+            enhanced_result = self.enhanced_gender_analyzer.get_gender_probabilities(face, raw_output=face.genderage)
             
             # 간소화된 응답 구성
             return {
@@ -776,4 +1091,15 @@ class FaceAnalyzer:
                 "gender_confidence": max(male_prob, female_prob)
             },
             "face_count": 1
-        }
\ No newline at end of file
+        }
+
+    # await 하는 기존 호출부용 (참조 얼굴, 임베딩 입력 변환 등)
+    analyze_reference_face = _async_variant(analyze_reference_face_sync)
+    compare_faces = _async_variant(compare_faces_sync)
+    detect_faces = _async_variant(detect_faces_sync)
+    extract_embedding = _async_variant(extract_embedding_sync)
+    analyze_family_similarity = _async_variant(analyze_family_similarity_sync)
+    find_most_similar_parent = _async_variant(find_most_similar_parent_sync)
+    analyze_family_matrix = _async_variant(analyze_family_matrix_sync)
+    estimate_age = _async_variant(estimate_age_sync)
+    estimate_gender_probability = _async_variant(estimate_gender_probability_sync)
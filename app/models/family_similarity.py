@@ -3,12 +3,15 @@
 일반적인 얼굴 인식과는 다른 가족 유사도 측정 알고리즘
 """
 import numpy as np
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, Optional
 import cv2
 from ..core.logging import get_logger
 
 logger = get_logger(__name__)
 
+# 얼굴별 기하 특징 벡터 길이: [유효 여부, 눈 간격 비율, 코 수직 비율, 입 너비 비율, 얼굴형 좌표 10]
+DESCRIPTOR_SIZE = 14
+
 
 class FamilySimilarityAnalyzer:
     """부모-자녀 닮음 분석 전용 클래스"""
@@ -58,7 +61,7 @@ class FamilySimilarityAnalyzer:
             
             # 2. 부분별 특성 분석
             feature_similarities = self._analyze_facial_features(
-                parent_face, child_face
+                parent_face, child_face, base_similarity
             )
             
             # 3. 나이 차이 보정
@@ -89,8 +92,312 @@ class FamilySimilarityAnalyzer:
             logger.error(f"가족 유사도 계산 오류: {e}")
             raise
     
+    def calculate_family_similarity_matrix(
+        self,
+        parent_faces: List[Dict[str, Any]],
+        child_faces: List[Dict[str, Any]],
+        parent_ages: List[Optional[int]] = None,
+        child_ages: List[Optional[int]] = None
+    ) -> Dict[str, Any]:
+        """
+        여러 자녀 x 여러 부모 가족 유사도를 한 번에 계산
+
+        얼굴 정보(dict) 목록을 배열로 변환한 뒤 score_arrays 로 계산합니다.
+        얼굴 정보에 기하 특징 벡터('descriptor')가 있으면 랜드마크 대신 그대로 씁니다.
+
+        Args:
+            parent_faces: 부모 얼굴 정보 목록 (임베딩, 랜드마크 또는 기하 특징 포함)
+            child_faces: 자녀 얼굴 정보 목록 (임베딩, 랜드마크 또는 기하 특징 포함)
+            parent_ages: 부모 나이 목록 (없으면 None)
+            child_ages: 자녀 나이 목록 (없으면 None)
+
+        Returns:
+            (자녀 수, 부모 수) 크기의 결과 행렬들
+        """
+        return self.score_arrays(
+            np.stack([np.asarray(f['embedding'], dtype=np.float64) for f in parent_faces]),
+            None,
+            np.stack([np.asarray(f['embedding'], dtype=np.float64) for f in child_faces]),
+            None,
+            parent_ages,
+            child_ages,
+            parent_descriptors=self._face_info_descriptors(parent_faces),
+            child_descriptors=self._face_info_descriptors(child_faces)
+        )
+
+    def _face_info_descriptors(self, faces: List[Dict[str, Any]]) -> np.ndarray:
+        """얼굴 정보 목록의 (N, DESCRIPTOR_SIZE) 기하 특징 (없는 얼굴만 랜드마크로 계산)"""
+        descriptors = np.empty((len(faces), DESCRIPTOR_SIZE))
+        missing = []
+        for i, face in enumerate(faces):
+            if face.get('descriptor') is not None:
+                descriptors[i] = face['descriptor']
+            else:
+                missing.append(i)
+        if missing:
+            descriptors[missing] = self.compute_descriptor_array(
+                self.landmarks_to_array([faces[i].get('landmarks', []) for i in missing])
+            )
+        return descriptors
+
+    def score_child_against_parents(
+        self,
+        child_embedding: np.ndarray,
+        child_landmarks: Optional[np.ndarray],
+        parent_embeddings: np.ndarray,
+        parent_landmarks: Optional[np.ndarray],
+        child_age: Optional[int] = None,
+        parent_ages: List[Optional[int]] = None,
+        child_descriptor: Optional[np.ndarray] = None,
+        parent_descriptors: Optional[np.ndarray] = None
+    ) -> Dict[str, Any]:
+        """
+        자녀 한 명 x 부모 N명 가족 유사도
+
+        Args:
+            child_embedding: (D,) 자녀 임베딩
+            child_landmarks: (5, 2) 자녀 랜드마크 (child_descriptor 가 있으면 None)
+            parent_embeddings: (N, D) 부모 임베딩
+            parent_landmarks: (N, 5, 2) 부모 랜드마크 (parent_descriptors 가 있으면 None)
+            child_descriptor: (DESCRIPTOR_SIZE,) 자녀 기하 특징 (face_descriptor)
+            parent_descriptors: (N, DESCRIPTOR_SIZE) 부모 기하 특징
+
+        Returns:
+            (N,) 크기의 결과 배열들
+        """
+        result = self.score_arrays(
+            parent_embeddings,
+            parent_landmarks,
+            np.asarray(child_embedding, dtype=np.float64)[np.newaxis, :],
+            None if child_landmarks is None else np.asarray(child_landmarks, dtype=np.float64)[np.newaxis, :, :],
+            parent_ages,
+            [child_age],
+            parent_descriptors=parent_descriptors,
+            child_descriptors=None if child_descriptor is None else np.asarray(child_descriptor)[np.newaxis, :]
+        )
+        return {
+            key: ({f: m[0] for f, m in value.items()} if isinstance(value, dict) else value[0])
+            for key, value in result.items()
+        }
+
+    def score_arrays(
+        self,
+        parent_embeddings: np.ndarray,
+        parent_landmarks: np.ndarray,
+        child_embeddings: np.ndarray,
+        child_landmarks: np.ndarray,
+        parent_ages: List[Optional[int]] = None,
+        child_ages: List[Optional[int]] = None,
+        parent_descriptors: Optional[np.ndarray] = None,
+        child_descriptors: Optional[np.ndarray] = None
+    ) -> Dict[str, Any]:
+        """
+        배열 기반 가족 유사도 (M 자녀 x N 부모)
+
+        calculate_family_similarity 와 같은 규칙을 행렬 연산으로 계산합니다.
+        랜드마크가 없는 얼굴(NaN)은 단건 계산과 마찬가지로 임베딩 유사도 기반 추정값을 사용합니다.
+        미리 계산한 기하 특징(descriptors)을 주면 랜드마크에서 다시 계산하지 않습니다.
+
+        Args:
+            parent_embeddings: (N, D) 부모 임베딩
+            parent_landmarks: (N, 5, 2) 부모 랜드마크 (없으면 NaN, parent_descriptors 가 있으면 None)
+            child_embeddings: (M, D) 자녀 임베딩
+            child_landmarks: (M, 5, 2) 자녀 랜드마크 (없으면 NaN, child_descriptors 가 있으면 None)
+            parent_ages: 부모 나이 목록 (없으면 None)
+            child_ages: 자녀 나이 목록 (없으면 None)
+            parent_descriptors: (N, DESCRIPTOR_SIZE) 부모 기하 특징
+            child_descriptors: (M, DESCRIPTOR_SIZE) 자녀 기하 특징
+
+        Returns:
+            (M, N) 크기의 결과 행렬들
+        """
+        parent_embeddings = np.asarray(parent_embeddings, dtype=np.float64)
+        child_embeddings = np.asarray(child_embeddings, dtype=np.float64)
+        n_children, n_parents = child_embeddings.shape[0], parent_embeddings.shape[0]
+        features = list(self.feature_weights.keys())
+
+        # 1. 기본 얼굴 유사도 (M, N) - 한 번만 계산
+        base_similarity = np.clip((child_embeddings @ parent_embeddings.T) * 1.1, 0.0, 1.0)
+
+        # 2. 부분별 특성 분석 (M, N, F)
+        if parent_descriptors is None:
+            parent_descriptors = self.compute_descriptor_array(parent_landmarks)
+        if child_descriptors is None:
+            child_descriptors = self.compute_descriptor_array(child_landmarks)
+        parent_desc = self.unpack_descriptors(parent_descriptors)
+        child_desc = self.unpack_descriptors(child_descriptors)
+        feature_matrix = self._pairwise_feature_similarities(parent_desc, child_desc, features)
+
+        has_landmarks = child_desc['valid'][:, np.newaxis] & parent_desc['valid'][np.newaxis, :]
+        if not has_landmarks.all():
+            # 랜드마크가 없으면 전체 유사도 기반으로 추정
+            variation = np.random.uniform(-0.1, 0.1, feature_matrix.shape)
+            estimated = np.clip(base_similarity[:, :, np.newaxis] + variation, 0.2, 0.95)
+            feature_matrix = np.where(has_landmarks[:, :, np.newaxis], feature_matrix, estimated)
+
+        # 3. 나이 차이 보정
+        age_corrected_similarity = self._apply_age_compensation_matrix(
+            base_similarity,
+            parent_ages or [None] * n_parents,
+            child_ages or [None] * n_children
+        )
+
+        # 4. 가중 평균으로 최종 가족 유사도 계산
+        weights = np.array([self.feature_weights[f] for f in features])
+        feature_score = feature_matrix @ weights / weights.sum()
+        family_similarity = np.clip(0.7 * age_corrected_similarity + 0.3 * feature_score, 0.0, 1.0)
+
+        # 5. 신뢰도
+        confidence = np.clip(1.0 - np.minimum(np.var(feature_matrix, axis=2) * 2, 0.5), 0.3, 1.0)
+
+        return {
+            'family_similarity': family_similarity,
+            'base_similarity': base_similarity,
+            'age_corrected_similarity': age_corrected_similarity,
+            'feature_breakdown': {f: feature_matrix[:, :, i] for i, f in enumerate(features)},
+            'confidence': confidence
+        }
+
+    @staticmethod
+    def landmarks_to_array(landmarks_list: List[List[Dict]]) -> np.ndarray:
+        """랜드마크 dict 목록을 (N, 5, 2) 배열로 변환 (5점 미만은 NaN)"""
+        points = np.full((len(landmarks_list), 5, 2), np.nan)
+        for i, landmarks in enumerate(landmarks_list):
+            if len(landmarks) >= 5:
+                points[i] = [[lm['x'], lm['y']] for lm in landmarks[:5]]
+        return points
+
+    def compute_landmark_descriptors(self, landmarks: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        얼굴별 기하 특징 계산 (쌍마다 다시 계산하지 않도록 얼굴 단위로 한 번만)
+
+        Args:
+            landmarks: (N, 5, 2) 랜드마크 (0: 왼쪽 눈, 1: 오른쪽 눈, 2: 코, 3/4: 입꼬리)
+        """
+        pts = np.asarray(landmarks, dtype=np.float64).reshape(-1, 5, 2)
+        x, y = pts[:, :, 0], pts[:, :, 1]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 얼굴 너비 (두 눈 사이 x 거리)
+            face_width = np.abs(x[:, 1] - x[:, 0])
+            has_width = face_width > 0
+
+            # 얼굴 너비 대비 눈 간격 비율
+            eye_distance = np.sqrt((x[:, 1] - x[:, 0]) ** 2 + (y[:, 1] - y[:, 0]) ** 2)
+            eye_ratio = np.where(has_width, eye_distance / face_width, 0.0)
+
+            # 눈-코-입의 수직 비율
+            eye_center_y = (y[:, 0] + y[:, 1]) / 2
+            mouth_center_y = (y[:, 3] + y[:, 4]) / 2
+            nose_ratio = np.abs(y[:, 2] - eye_center_y) / (np.abs(mouth_center_y - y[:, 2]) + 0.001)
+
+            # 얼굴 너비 대비 입 너비 비율
+            mouth_ratio = np.where(has_width, np.abs(x[:, 4] - x[:, 3]) / face_width, 0.0)
+
+            # 얼굴형: 중심 정규화 후 표준화한 좌표 (쌍별 상관계수 = 내적 / 10)
+            centered = (pts - pts.mean(axis=1, keepdims=True)).reshape(len(pts), -1)
+            centered = centered - centered.mean(axis=1, keepdims=True)
+            shape = centered / centered.std(axis=1, keepdims=True)
+
+        return {
+            'valid': ~np.isnan(pts).any(axis=(1, 2)),
+            'eye_ratio': eye_ratio,
+            'nose_ratio': nose_ratio,
+            'mouth_ratio': mouth_ratio,
+            'shape': shape
+        }
+
+    def compute_descriptor_array(self, landmarks: np.ndarray) -> np.ndarray:
+        """랜드마크 (N, 5, 2) 의 기하 특징을 (N, DESCRIPTOR_SIZE) 벡터로 묶음"""
+        desc = self.compute_landmark_descriptors(landmarks)
+        return np.column_stack([
+            desc['valid'], desc['eye_ratio'], desc['nose_ratio'], desc['mouth_ratio'], desc['shape']
+        ])
+
+    @staticmethod
+    def unpack_descriptors(descriptors: np.ndarray) -> Dict[str, np.ndarray]:
+        """compute_descriptor_array 의 역변환"""
+        d = np.asarray(descriptors, dtype=np.float64).reshape(-1, DESCRIPTOR_SIZE)
+        return {
+            'valid': d[:, 0] > 0,
+            'eye_ratio': d[:, 1],
+            'nose_ratio': d[:, 2],
+            'mouth_ratio': d[:, 3],
+            'shape': d[:, 4:]
+        }
+
+    def face_descriptor(self, face) -> np.ndarray:
+        """
+        얼굴 객체의 기하 특징 벡터
+
+        분석 캐시의 얼굴(CachedFace)에 저장해 두므로 같은 얼굴이 여러 쌍에 쓰여도 키포인트에서 한 번만 계산합니다.
+        """
+        descriptor = getattr(face, 'descriptor', None)
+        if descriptor is None:
+            kps = getattr(face, 'kps', None)
+            points = np.full((1, 5, 2), np.nan)
+            if kps is not None and np.shape(kps) == (5, 2):
+                points[0] = kps
+            descriptor = self.compute_descriptor_array(points)[0]
+            face.descriptor = descriptor
+        return descriptor
+
+    def _pairwise_feature_similarities(
+        self,
+        parent_desc: Dict[str, np.ndarray],
+        child_desc: Dict[str, np.ndarray],
+        features: List[str]
+    ) -> np.ndarray:
+        """얼굴별 기하 특징으로 (M, N, F) 부위별 유사도 계산"""
+        def diff(key):
+            return np.abs(child_desc[key][:, np.newaxis] - parent_desc[key][np.newaxis, :])
+
+        with np.errstate(invalid='ignore'):
+            similarities = {
+                'eye_region': np.clip(1.0 - np.minimum(diff('eye_ratio') * 2, 0.5), 0.3, 1.0),
+                'nose_shape': np.clip(1.0 / (1.0 + diff('nose_ratio') * 2), 0.3, 0.95),
+                'mouth_region': np.clip(1.0 - np.minimum(diff('mouth_ratio') * 3, 0.6), 0.3, 1.0),
+                'face_shape': np.clip(
+                    np.abs(child_desc['shape'] @ parent_desc['shape'].T / child_desc['shape'].shape[1]),
+                    0.0, 1.0
+                )
+            }
+
+        return np.stack([similarities[f] for f in features], axis=2)
+
+    def _apply_age_compensation_matrix(
+        self,
+        base_similarity: np.ndarray,
+        parent_ages: List[Optional[int]],
+        child_ages: List[Optional[int]]
+    ) -> np.ndarray:
+        """나이 차이 보정 (행렬 버전, _apply_age_compensation 과 동일 규칙)"""
+        parent = np.array([np.nan if a is None else a for a in parent_ages], dtype=np.float64)
+        child = np.array([np.nan if a is None else a for a in child_ages], dtype=np.float64)
+
+        age_diff = np.abs(child[:, np.newaxis] - parent[np.newaxis, :])
+        known = ~np.isnan(age_diff)
+        age_diff = np.where(known, age_diff, 0.0)
+
+        compensation = np.where(
+            age_diff > 20,
+            self.age_compensation['child_to_adult'],
+            self.age_compensation['same_generation']
+        )
+        age_factor = 1.0 + (age_diff / 100.0)
+
+        compensated = np.clip(base_similarity * compensation * age_factor, 0.0, 1.0)
+        return np.where(known, compensated, base_similarity)
+
+    def describe_similarity(self, family_similarity: float, feature_similarities: Dict[str, float]) -> Dict[str, Any]:
+        """행렬 결과의 한 쌍에 대한 설명 및 수준 분류"""
+        return {
+            'explanation': self._generate_explanation(feature_similarities),
+            'similarity_level': self._classify_similarity_level(family_similarity)
+        }
+
     def _calculate_embedding_similarity(
-        self, 
+        self,
         parent_embedding: np.ndarray, 
         child_embedding: np.ndarray
     ) -> float:
@@ -107,7 +414,8 @@ class FamilySimilarityAnalyzer:
     def _analyze_facial_features(
         self, 
         parent_face: Dict[str, Any], 
-        child_face: Dict[str, Any]
+        child_face: Dict[str, Any],
+        base_similarity: float = None
     ) -> Dict[str, float]:
         """얼굴 부위별 특성 분석"""
         feature_similarities = {}
@@ -115,11 +423,12 @@ class FamilySimilarityAnalyzer:
         parent_landmarks = parent_face.get('landmarks', [])
         child_landmarks = child_face.get('landmarks', [])
         
-        # 전체 얼굴 유사도 (임베딩 기반)
-        base_similarity = self._calculate_embedding_similarity(
-            parent_face['embedding'], 
-            child_face['embedding']
-        )
+        # 전체 얼굴 유사도 (임베딩 기반, 호출자가 계산했으면 재사용)
+        if base_similarity is None:
+            base_similarity = self._calculate_embedding_similarity(
+                parent_face['embedding'], 
+                child_face['embedding']
+            )
         
         if len(parent_landmarks) >= 5 and len(child_landmarks) >= 5:
             # 랜드마크 기반 부위별 분석 (눈, 코, 입, 얼굴형)
@@ -0,0 +1,3 @@
+"""
+얼굴 갤러리 - 등록된 얼굴 임베딩 저장 및 1:N 검색
+"""
@@ -0,0 +1,118 @@
+"""
+중복 얼굴 억제 - 랜덤 초평면 LSH (SimHash)
+
+투영 부호 비트 bits 개를 묶은 키를 tables 개 만들고, 키가 하나라도 같은 행만 후보로 삼아
+정확한 유사도를 계산합니다. 두 벡터 사이 각도가 θ 이면 비트가 같을 확률은 1 - θ/π 이므로
+유사도 0.95 (θ≈18°) 인 쌍이 어느 한 표에서라도 만날 확률은 bits=16, tables=16 에서 약 0.96 이고,
+무관한 얼굴은 질의당 약 N x tables / 2^bits 개만 후보가 됩니다.
+"""
+from collections import defaultdict
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+class LSHTable:
+    """
+    랜덤 초평면 LSH 표
+
+    표마다 정렬된 (키, 행) 배열과 최근 추가분을 담는 꼬리 사전을 두고, 꼬리가
+    max(merge_threshold, 정렬된 행 수 / 4) 를 넘으면 병합해 다시 정렬합니다 (분할 상환 O(log N)).
+    정렬된 부분의 얼굴당 메모리는 tables x 8 바이트입니다.
+    삭제된 행이나 갱신 전 키가 후보로 나올 수 있으므로 호출 측에서 활성 여부와 실제 유사도를 확인합니다.
+    """
+
+    def __init__(self, dim: int, bits: int = 16, tables: int = 16, seed: int = 0, merge_threshold: int = 4096):
+        if not 1 <= bits <= 32:
+            raise ValueError("LSH 비트 수는 1~32 이어야 합니다")
+
+        self.dim = dim
+        self.bits = bits
+        self.tables = tables
+        self.seed = seed
+        self.merge_threshold = merge_threshold
+
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((tables * bits, dim)).astype(np.float32)
+        self._bit_weights = (np.uint64(1) << np.arange(bits, dtype=np.uint64)).astype(np.uint64)
+
+        self._keys = [np.zeros(0, dtype=np.uint32) for _ in range(tables)]
+        self._rows = [np.zeros(0, dtype=np.int32) for _ in range(tables)]
+        self._reset_tail()
+
+    def _reset_tail(self):
+        self._tail: List[Dict[int, List[int]]] = [defaultdict(list) for _ in range(self.tables)]
+        self._tail_keys: List[np.ndarray] = []
+        self._tail_rows: List[np.ndarray] = []
+        self._tail_size = 0
+
+    def empty_like(self) -> "LSHTable":
+        """같은 초평면을 쓰는 빈 표"""
+        return LSHTable(self.dim, self.bits, self.tables, self.seed, self.merge_threshold)
+
+    def __len__(self) -> int:
+        return int(self._rows[0].shape[0]) + self._tail_size
+
+    def keys(self, vectors: np.ndarray) -> np.ndarray:
+        """벡터별 표 키 (n, tables)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[np.newaxis, :]
+        signs = (vectors @ self.planes.T > 0).reshape(-1, self.tables, self.bits)
+        return (signs.astype(np.uint64) @ self._bit_weights).astype(np.uint32)
+
+    def add(self, rows: Sequence[int], vectors: np.ndarray):
+        """행 추가"""
+        self.add_keys(rows, self.keys(vectors))
+
+    def add_keys(self, rows: Sequence[int], keys: np.ndarray):
+        """미리 계산한 키로 행 추가"""
+        rows = np.asarray(rows, dtype=np.int32).reshape(-1)
+        if rows.size == 0:
+            return
+
+        keys = np.asarray(keys, dtype=np.uint32).reshape(rows.size, self.tables)
+        self._tail_rows.append(rows)
+        self._tail_keys.append(keys)
+        self._tail_size += rows.size
+
+        # 대량 추가는 사전을 거치지 않고 바로 정렬 배열에 병합
+        if self._tail_size >= max(self.merge_threshold, self._rows[0].shape[0] // 4):
+            self._merge()
+            return
+
+        for row, row_keys in zip(rows.tolist(), keys.tolist()):
+            for t, key in enumerate(row_keys):
+                self._tail[t][key].append(row)
+
+    def _merge(self):
+        """꼬리 버퍼를 정렬된 배열에 병합"""
+        if not self._tail_size:
+            return
+
+        tail_rows = np.concatenate(self._tail_rows)
+        tail_keys = np.concatenate(self._tail_keys)
+        for t in range(self.tables):
+            keys = np.concatenate([self._keys[t], tail_keys[:, t]])
+            rows = np.concatenate([self._rows[t], tail_rows])
+            order = np.argsort(keys, kind="stable")
+            self._keys[t] = keys[order]
+            self._rows[t] = rows[order]
+
+        self._reset_tail()
+
+    def candidates(self, keys: np.ndarray) -> np.ndarray:
+        """키 (tables,) 중 하나라도 같은 행 (중복 제거)"""
+        found = []
+        for t in range(self.tables):
+            lo = np.searchsorted(self._keys[t], keys[t], side="left")
+            hi = np.searchsorted(self._keys[t], keys[t], side="right")
+            if hi > lo:
+                found.append(self._rows[t][lo:hi])
+            tail = self._tail[t].get(int(keys[t]))
+            if tail:
+                found.append(np.asarray(tail, dtype=np.int32))
+
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(found)).astype(np.int64)
@@ -0,0 +1,1060 @@
+"""
+얼굴 갤러리 - 등록(enroll), 삭제, 1:N 검색
+"""
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .store import EmbeddingStore
+from .hnsw import HNSWIndex
+from .ivfpq import IVFPQIndex
+from .range_search import BlockBounds
+from .templates import IdentityExemplars
+from .dedupe import LSHTable
+from .kinship import rank_relatives
+from .persistence import (
+    GalleryLock,
+    GalleryWAL,
+    wal_path,
+    list_wal_generations,
+    write_snapshot,
+    load_latest_snapshot,
+    remove_old_files
+)
+from ...core.config import settings
+from ...core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class FaceGallery:
+    """
+    영속 얼굴 갤러리
+
+    정규화된 임베딩을 EmbeddingStore 의 연속 행렬에 보관하므로
+    전수 검색은 행렬-벡터 곱 한 번과 부분 정렬(argpartition)로 끝납니다.
+    index_type 이 "hnsw" 또는 "ivfpq" 이면 근사 인덱스로 검색합니다.
+    IVF-PQ 는 train_index() 로 학습하기 전까지 전수 검색을 사용합니다.
+    범위 검색(range_search)은 블록/리스트 유사도 상한으로 가망 없는 구간을 건너뛰며 전수 비교합니다.
+
+    같은 사람의 사진은 add_samples() 로 기존 행의 품질 가중 평균 템플릿에 합치므로
+    검색 비용은 사진 수가 아니라 사람 수에 비례합니다. max_exemplars 가 0보다 크면
+    신원별 대표 표본을 보관해 상위 exemplar_rerank 개 후보의 점수 보정에만 씁니다.
+    템플릿이 바뀌어도 HNSW 연결은 그대로 두고(같은 사람의 평균 쪽으로 조금 이동),
+    IVF-PQ 는 해당 행을 다시 인코딩합니다.
+
+    dedupe_threshold 가 0보다 크면 등록 전에 LSH 후보와 비교해 유사도가 임계값 이상인
+    얼굴은 새로 넣지 않고 건너뛰거나(skip) 기존 신원 템플릿에 합칩니다(merge).
+    기존 데이터는 dedupe() 로 일괄 정리합니다.
+
+    kinship_search() 는 인덱스로 임베딩 유사도 상위 후보만 뽑고, 그 후보에만 가족 유사도
+    (랜드마크 기하 특징 + 나이 보정)를 계산해 재정렬합니다 (kinship 모듈 참고).
+
+    등록/삭제는 WAL 에 먼저 기록한 뒤 적용하고, WAL 이 compaction_wal_records 건을 넘으면
+    백그라운드 스레드가 스냅샷을 새로 쓰고 이전 WAL 을 지웁니다 (persistence 모듈 참고).
+    open() 은 최신 스냅샷을 매핑하고 WAL 을 재생하며, 호출하지 않으면 첫 사용 시 열립니다.
+    """
+
+    def __init__(self, path: str, dim: int = 512, index_type: str = "flat", index_params: Dict[str, Any] = None,
+                 wal_fsync: bool = True, compaction_wal_records: int = 10000, filter_exact_limit: int = 2048,
+                 range_block_size: int = 4096, max_exemplars: int = 0, exemplar_rerank: int = 50,
+                 dedupe_threshold: float = 0.0, dedupe_action: str = "skip", lsh_bits: int = 16, lsh_tables: int = 16):
+        if dedupe_action not in ("skip", "merge"):
+            raise ValueError(f"지원하지 않는 중복 처리 방식입니다: {dedupe_action}")
+
+        self.store = EmbeddingStore(path, dim=dim)
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.index = None
+        self.wal_fsync = wal_fsync
+        self.compaction_wal_records = compaction_wal_records
+        self.filter_exact_limit = filter_exact_limit
+        self.range_block_size = range_block_size
+        self._block_bounds = BlockBounds(self.store, range_block_size)
+        self.max_exemplars = max_exemplars
+        self.exemplar_rerank = exemplar_rerank
+        self.exemplars = IdentityExemplars(max_exemplars)
+        self.dedupe_threshold = dedupe_threshold
+        self.dedupe_action = dedupe_action
+        self.lsh_bits = lsh_bits
+        self.lsh_tables = lsh_tables
+        self._lsh: Optional[LSHTable] = None
+        self._dedupe_counts = {"skipped": 0, "merged": 0}
+
+        self._wal: Optional[GalleryWAL] = None
+        self._wal_generation = 0
+        self._lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        self._dir_lock = GalleryLock(self.root)
+        self._opened = False
+
+    @property
+    def root(self) -> Path:
+        return self.store.path
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened
+
+    @property
+    def size(self) -> int:
+        self._ensure_open()
+        return self.store.size
+
+    def _ensure_open(self):
+        """저장소가 열려 있지 않으면 열기"""
+        if not self._opened:
+            self.open()
+
+    def open(self) -> Dict[str, Any]:
+        """
+        최신 스냅샷을 매핑하고 이후 WAL 을 재생
+
+        디렉토리를 다른 프로세스가 열어 두었으면 GalleryLockedError (워커마다 같은 디렉토리에 쓰면
+        WAL 과 벡터 파일이 섞이고 압축이 다른 프로세스의 WAL 을 지움).
+
+        Returns:
+            {"snapshot_generation", "replayed_records", "size", "elapsed_seconds"}
+        """
+        with self._lock:
+            if self._opened:
+                return {"snapshot_generation": None, "replayed_records": 0, "size": self.store.size,
+                        "elapsed_seconds": 0.0}
+
+            start_time = time.time()
+            # 실패해도 잠금은 유지 (같은 프로세스의 재시도는 그대로 열림)
+            self._dir_lock.acquire()
+            self.store.open()
+            self.exemplars = IdentityExemplars(self.max_exemplars)
+            self._lsh = None
+
+            snapshot = load_latest_snapshot(self.root)
+            generation = 0
+            index_state = None
+            if snapshot is not None:
+                if snapshot["dim"] != self.store.dim:
+                    raise ValueError(
+                        f"스냅샷 임베딩 차원({snapshot['dim']})이 설정({self.store.dim})과 다릅니다"
+                    )
+                self.store.restore(
+                    snapshot["count"], snapshot["ids"], snapshot["metadata"], snapshot["deleted"],
+                    snapshot.get("attributes"), snapshot.get("templates")
+                )
+                self.exemplars.load_state(snapshot.get("exemplars"), self.store.dim)
+                generation = snapshot["generation"]
+                if snapshot["index_type"] == self.index_type:
+                    index_state = snapshot["index_state"]
+
+            self.index = self._build_index(index_state)
+            # 스냅샷 없이 다시 만든 그래프는 바로 스냅샷으로 남겨 다음 시작부터 매핑
+            rebuilt = isinstance(self.index, HNSWIndex) and index_state is None and len(self.index) > 0
+            self._block_bounds = BlockBounds(self.store, self.range_block_size)
+
+            wal_generations = [g for g in list_wal_generations(self.root) if g >= generation]
+            replayed = sum(self._replay(wal_path(self.root, g)) for g in wal_generations)
+
+            # 재생한 WAL 에는 이어 쓰지 않고 새 세대로 시작 (잘린 마지막 줄 보호)
+            self._start_wal(max(wal_generations + [generation]) + 1)
+            self._opened = True
+
+            elapsed = time.time() - start_time
+            logger.info(
+                f"갤러리 복원: 스냅샷 세대 {generation}, WAL {replayed}건 재생, "
+                f"{self.store.size}개 얼굴 ({elapsed:.2f}초)"
+            )
+
+        if wal_generations or rebuilt:
+            self._schedule_compaction()
+
+        return {
+            "snapshot_generation": generation,
+            "replayed_records": replayed,
+            "size": self.store.size,
+            "elapsed_seconds": elapsed
+        }
+
+    def _build_index(self, index_state: Optional[Dict[str, np.ndarray]] = None):
+        """설정된 인덱스 생성 - 스냅샷 구조가 있으면 적용, 없으면 저장된 얼굴로 채우기"""
+        if self.index_type == "flat":
+            return None
+
+        if self.index_type == "hnsw":
+            index = HNSWIndex(self.store, **self.index_params)
+            if index_state:
+                index.load_state(index_state)
+            else:
+                for row in np.flatnonzero(self.store.active):
+                    index.add(int(row))
+            logger.info(f"갤러리 HNSW 인덱스 구성: {len(index)}개 노드")
+            return index
+
+        if self.index_type == "ivfpq":
+            index = IVFPQIndex(self.store, **self.index_params)
+            if index_state:
+                index.load_state(index_state)
+                logger.info(f"갤러리 IVF-PQ 인덱스 구성: {len(index)}개 얼굴")
+            return index
+
+        raise ValueError(f"지원하지 않는 갤러리 인덱스입니다: {self.index_type}")
+
+    def _start_wal(self, generation: int):
+        """새 세대 WAL 시작"""
+        if self._wal is not None:
+            self._wal.close()
+        self._wal = GalleryWAL(wal_path(self.root, generation), fsync=self.wal_fsync)
+        self._wal.open()
+        self._wal_generation = generation
+
+    def _replay(self, path: Path) -> int:
+        """WAL 재생, 적용한 레코드 수 반환 (연속된 등록은 묶어서 적용)"""
+        applied = 0
+        pending = []
+
+        for record in GalleryWAL.read(path):
+            if record["op"] == "enroll":
+                pending.append((record["id"], record["vector"], record.get("metadata"), record.get("attributes"),
+                                record.get("weight", 1.0)))
+                continue
+
+            applied += self._apply_enroll(pending)
+            pending = []
+            if record["op"] == "delete" and self._apply_delete(record["id"]):
+                applied += 1
+            elif record["op"] == "sample" and self._apply_sample(record):
+                applied += 1
+
+        applied += self._apply_enroll(pending)
+        return applied
+
+    def _apply_enroll(self, items: List[Tuple[str, np.ndarray, Optional[Dict[str, Any]], Optional[Dict[str, Any]], float]]) -> int:
+        """저장소와 인덱스에 등록 적용 (ID, 벡터, 메타데이터, 필터 속성, 템플릿 가중치)"""
+        rows = []
+        for face_id, vector, metadata, attributes, weight in items:
+            try:
+                rows.append(self.store.add(face_id, vector, metadata, attributes, weight))
+            except ValueError as e:
+                logger.warning(f"갤러리 등록 적용 건너뜀: {e}")
+
+        if rows and self._lsh is not None:
+            self._lsh.add(rows, self.store.vectors[rows])
+
+        if rows and self.index is not None and self.index.is_trained:
+            if isinstance(self.index, IVFPQIndex):
+                self.index.add_rows(np.array(rows))
+            else:
+                for row in rows:
+                    self.index.add(row)
+        return len(rows)
+
+    def _apply_delete(self, face_id: str) -> bool:
+        self.exemplars.remove(face_id)
+        row = self.store.delete(face_id)
+        if row is None:
+            return False
+        if isinstance(self.index, HNSWIndex):
+            self.index.remove(row)
+        return True
+
+    def _apply_sample(self, record: Dict[str, Any]) -> bool:
+        """템플릿 갱신 적용 - 레코드의 결과 템플릿으로 행을 교체하고 인덱스/상한 갱신"""
+        row = self.store.row_of.get(record["id"])
+        if row is None:
+            logger.warning(f"갤러리 템플릿 갱신 건너뜀: 등록되지 않은 ID {record['id']}")
+            return False
+
+        previous = np.array(self.store.vectors[row])
+        if "previous" in record:
+            self.exemplars.add(record["id"], record["previous"], self.store.template_info(row)["norm"])
+        self.exemplars.add(record["id"], record["vector"], record["weight"])
+
+        self.store.set_template(row, record["template"], record["norm"], record["samples"])
+        self._block_bounds.invalidate(row)
+        if self._lsh is not None:
+            self._lsh.add([row], record["template"][np.newaxis, :])
+        if isinstance(self.index, IVFPQIndex):
+            self.index.update(row, previous)
+        return True
+
+    def compact(self, wait: bool = False) -> bool:
+        """
+        WAL 을 새 스냅샷으로 합치고 이전 스냅샷/WAL 삭제
+
+        상태 복사와 WAL 교체만 잠금 안에서 하고, 스냅샷 기록은 잠금 밖에서 수행하므로
+        그동안의 등록/삭제는 새 WAL 에 쌓입니다.
+
+        Args:
+            wait: 다른 압축이 진행 중이면 끝날 때까지 기다림 (False 면 바로 반환)
+
+        Returns:
+            스냅샷을 기록했으면 True
+        """
+        if not self._compaction_lock.acquire(blocking=wait):
+            return False
+
+        try:
+            with self._lock:
+                if not self._opened:
+                    return False
+                self.store.flush()
+                state = self.store.get_state()
+                state["exemplars"] = self.exemplars.get_state()
+                index_state = self.index.get_state() if self.index is not None else None
+                generation = self._wal_generation + 1
+                self._start_wal(generation)
+
+            start_time = time.time()
+            write_snapshot(self.root, generation, self.store.dim, self.index_type, state, index_state)
+            remove_old_files(self.root, generation)
+            logger.info(
+                f"갤러리 스냅샷 기록: 세대 {generation}, {state['count']}행 ({time.time() - start_time:.2f}초)"
+            )
+            return True
+
+        finally:
+            self._compaction_lock.release()
+
+    def _schedule_compaction(self):
+        """백그라운드 압축 시작 (이미 진행 중이면 무시)"""
+        if self._compaction_lock.locked():
+            return
+        threading.Thread(target=self.compact, name="gallery-compaction", daemon=True).start()
+
+    def _after_write(self):
+        """WAL 이 임계값을 넘으면 압축 예약"""
+        if self.compaction_wal_records and self._wal.records >= self.compaction_wal_records:
+            self._schedule_compaction()
+
+    def train_index(self, sample_size: Optional[int] = None, seed: int = 0) -> Dict[str, Any]:
+        """
+        IVF-PQ 인덱스 학습 후 등록된 얼굴 전체를 인코딩 (학습 결과는 새 스냅샷에 기록)
+
+        Args:
+            sample_size: 학습에 쓸 얼굴 수 (없으면 전체)
+            seed: 표본 추출 시드
+
+        Returns:
+            인덱스 통계
+        """
+        self._ensure_open()
+        if not isinstance(self.index, IVFPQIndex):
+            raise ValueError("학습이 필요한 인덱스는 ivfpq 뿐입니다")
+
+        with self._lock:
+            rows = np.flatnonzero(self.store.active)
+            if sample_size is not None and sample_size < rows.size:
+                rows = np.sort(np.random.default_rng(seed).choice(rows, sample_size, replace=False))
+
+            self.index.train(self.store.vectors[rows])
+            self.index.add_rows(np.flatnonzero(self.store.active))
+
+        logger.info(f"갤러리 IVF-PQ 인덱스 학습 완료: {rows.size}개 표본, {len(self.index)}개 얼굴")
+        self.compact(wait=True)
+        return self.index.get_stats()
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        """임베딩을 L2 정규화된 float32 벡터로 변환"""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            raise ValueError("임베딩의 크기가 0입니다")
+        return vector / norm
+
+    def enroll(self, embedding, face_id: Optional[str] = None, metadata: Dict[str, Any] = None,
+               attributes: Dict[str, Any] = None, quality: float = 1.0, dedupe: bool = True,
+               outcomes: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        얼굴 등록
+
+        Args:
+            embedding: 얼굴 임베딩 (정규화 여부 무관)
+            face_id: 갤러리 ID (없으면 생성)
+            metadata: 함께 저장할 메타데이터
+            attributes: 필터 검색용 속성 {"age", "gender", "tenant"}
+            quality: 템플릿 가중치 (templates.face_quality_weight 참고)
+            dedupe: 중복 억제 적용 여부 (enroll_many 참고)
+            outcomes: 전달하면 등록 결과 상태로 채움
+
+        Returns:
+            등록된 (중복이면 기존) 갤러리 ID
+        """
+        return self.enroll_many(
+            [embedding], [face_id or str(uuid.uuid4())], [metadata], [attributes], [quality],
+            dedupe=dedupe, outcomes=outcomes
+        )[0]
+
+    def enroll_many(self, embeddings, face_ids: Optional[List[str]] = None,
+                    metadata: Optional[List[Dict[str, Any]]] = None,
+                    attributes: Optional[List[Dict[str, Any]]] = None,
+                    qualities: Optional[List[float]] = None, dedupe: bool = True,
+                    outcomes: Optional[List[Dict[str, Any]]] = None,
+                    duplicates: Optional[List[Optional[Tuple[str, float]]]] = None) -> List[str]:
+        """
+        여러 얼굴 일괄 등록 (WAL fsync 와 인덱스 인코딩을 한 번에 수행)
+
+        중복 억제가 켜져 있으면(dedupe_threshold > 0, dedupe=True) 기존 얼굴이나 같은 요청의
+        앞선 얼굴과 거의 같은 얼굴은 새로 등록하지 않고, 그 얼굴의 ID 를 대신 반환합니다.
+
+        Args:
+            outcomes: 전달하면 항목별 {"id", "status": enrolled/skipped/merged, "duplicate_of", "similarity"} 로 채움
+            duplicates: 항목별 중복 대상 (ID, 유사도) 또는 None - 샤딩 코디네이터가 모든 샤드에서 미리 찾은 값으로,
+                주면 직접 찾지 않음 (대상은 이 갤러리나 같은 요청에 있어야 함)
+
+        Returns:
+            등록된 (중복이면 기존) 갤러리 ID 목록
+        """
+        self._ensure_open()
+        vectors = [self._normalize(e) for e in embeddings]
+        face_ids = face_ids or [str(uuid.uuid4()) for _ in vectors]
+        metadata = [m or {} for m in (metadata or [None] * len(vectors))]
+        attributes = [self.store.normalize_attributes(a) for a in (attributes or [None] * len(vectors))]
+        qualities = [float(q) for q in (qualities or [1.0] * len(vectors))]
+        if not len(face_ids) == len(metadata) == len(attributes) == len(qualities) == len(vectors):
+            raise ValueError("임베딩, ID, 메타데이터, 속성, 품질 수가 일치하지 않습니다")
+        if any(q <= 0 for q in qualities):
+            raise ValueError("품질 가중치는 0보다 커야 합니다")
+        if len(set(face_ids)) != len(face_ids):
+            raise ValueError("일괄 등록 ID가 중복되었습니다")
+
+        if outcomes is None:
+            outcomes = []
+        outcomes.clear()
+
+        with self._lock:
+            for face_id, vector in zip(face_ids, vectors):
+                self.store.check_add(face_id, vector)
+
+            if duplicates is not None:
+                if len(duplicates) != len(vectors):
+                    raise ValueError("중복 대상 수가 임베딩 수와 일치하지 않습니다")
+                enrolling = {face_id for face_id, duplicate in zip(face_ids, duplicates) if duplicate is None}
+                for duplicate in duplicates:
+                    if duplicate is not None and duplicate[0] not in self.store.row_of and duplicate[0] not in enrolling:
+                        raise ValueError(f"중복 대상이 갤러리에 없습니다: {duplicate[0]}")
+            elif dedupe and self.dedupe_threshold > 0 and vectors:
+                duplicates = self._find_duplicates(face_ids, np.stack(vectors), self.dedupe_threshold)
+            else:
+                duplicates = [None] * len(vectors)
+
+            items = [
+                item for item, duplicate in zip(zip(face_ids, vectors, metadata, attributes, qualities), duplicates)
+                if duplicate is None
+            ]
+            if items:
+                self._wal.append([
+                    {"op": "enroll", "id": face_id, "vector": vector, "metadata": meta, "attributes": attrs,
+                     "weight": weight}
+                    for face_id, vector, meta, attrs, weight in items
+                ])
+                self._apply_enroll(items)
+
+            result_ids = []
+            for face_id, vector, weight, duplicate in zip(face_ids, vectors, qualities, duplicates):
+                if duplicate is None:
+                    result_ids.append(face_id)
+                    outcomes.append({"id": face_id, "status": "enrolled", "duplicate_of": None, "similarity": None})
+                    continue
+
+                target, similarity = duplicate
+                if self.dedupe_action == "merge":
+                    self.add_samples(target, [vector], [weight])
+                self._dedupe_counts["merged" if self.dedupe_action == "merge" else "skipped"] += 1
+                result_ids.append(target)
+                outcomes.append({
+                    "id": target,
+                    "status": "merged" if self.dedupe_action == "merge" else "skipped",
+                    "duplicate_of": target,
+                    "similarity": similarity
+                })
+
+            self._after_write()
+
+        return result_ids
+
+    def _get_lsh(self) -> LSHTable:
+        """중복 검사용 LSH 표 (첫 사용 시 활성 행으로 구성)"""
+        if self._lsh is None:
+            self._lsh = LSHTable(self.store.dim, bits=self.lsh_bits, tables=self.lsh_tables)
+            rows = np.flatnonzero(self.store.active)
+            self._lsh.add(rows, self.store.vectors[rows])
+        return self._lsh
+
+    def _find_duplicates(self, face_ids: List[str], vectors: np.ndarray,
+                         threshold: float) -> List[Optional[Tuple[str, float]]]:
+        """
+        항목별 중복 대상 (ID, 유사도) 또는 None
+
+        기존 갤러리는 LSH 후보만, 같은 요청 안의 앞선 항목은 같은 초평면의 임시 표로 비교합니다.
+        """
+        lsh = self._get_lsh()
+        batch = lsh.empty_like()
+        keys = lsh.keys(vectors)
+        duplicates = []
+
+        for i, vector in enumerate(vectors):
+            best = self._existing_duplicate(lsh, keys[i], vector, threshold)
+
+            if best is None:
+                earlier = batch.candidates(keys[i])
+                if earlier.size:
+                    scores = vectors[earlier] @ vector
+                    top = int(np.argmax(scores))
+                    if scores[top] >= threshold and duplicates[earlier[top]] is None:
+                        best = (face_ids[earlier[top]], min(float(scores[top]), 1.0))
+
+            if best is None:
+                batch.add_keys([i], keys[i:i + 1])
+            duplicates.append(best)
+
+        return duplicates
+
+    def _existing_duplicate(self, lsh: LSHTable, key: np.ndarray, vector: np.ndarray,
+                            threshold: float) -> Optional[Tuple[str, float]]:
+        """LSH 후보 중 임계값 이상인 가장 가까운 기존 얼굴 (ID, 유사도)"""
+        rows = lsh.candidates(key)
+        rows = rows[self.store.active[rows]]
+        if rows.size:
+            scores = self.store.vectors[rows] @ vector
+            top = int(np.argmax(scores))
+            if scores[top] >= threshold:
+                return self.store.ids[rows[top]], min(float(scores[top]), 1.0)
+        return None
+
+    def find_duplicates(self, embeddings, threshold: Optional[float] = None) -> List[Optional[Tuple[str, float]]]:
+        """
+        항목별로 가장 가까운 기존 얼굴 (ID, 유사도) 또는 None - 같은 요청 안의 중복은 보지 않음
+
+        해시 분할 샤딩에서 코디네이터가 모든 샤드에 물어 전체 갤러리 기준 중복을 찾을 때 씁니다.
+        """
+        self._ensure_open()
+        threshold = self.dedupe_threshold if threshold is None else threshold
+        vectors = [self._normalize(e) for e in embeddings]
+        if threshold <= 0 or not vectors:
+            return [None] * len(vectors)
+
+        with self._lock:
+            lsh = self._get_lsh()
+            vectors = np.stack(vectors)
+            keys = lsh.keys(vectors)
+            return [self._existing_duplicate(lsh, keys[i], vector, threshold) for i, vector in enumerate(vectors)]
+
+    def dedupe(self, threshold: Optional[float] = None, action: str = "merge", dry_run: bool = False,
+               max_pairs: int = 1000) -> Dict[str, Any]:
+        """
+        기존 갤러리 일괄 중복 정리
+
+        등록 순서대로 훑으면서 앞서 남긴 얼굴과 유사도가 threshold 이상이면 중복으로 봅니다.
+        후보 탐색은 이 작업 전용 LSH 표로 잠금 밖에서 하고, 정리만 delete/add_samples 로 적용합니다.
+
+        Args:
+            threshold: 중복 유사도 (없으면 dedupe_threshold)
+            action: "merge" (남길 신원 템플릿에 합친 뒤 삭제) 또는 "delete"
+            dry_run: 찾기만 하고 적용하지 않음
+            max_pairs: 응답에 포함할 최대 쌍 수
+
+        Returns:
+            {"scanned", "duplicates", "applied", "pairs": [{"id", "duplicate_of", "similarity"}]}
+        """
+        self._ensure_open()
+        threshold = threshold if threshold is not None else self.dedupe_threshold
+        if not 0 < threshold <= 1:
+            raise ValueError("중복 유사도 임계값은 0보다 크고 1 이하여야 합니다")
+        if action not in ("merge", "delete"):
+            raise ValueError(f"지원하지 않는 중복 처리 방식입니다: {action}")
+
+        with self._lock:
+            rows = np.flatnonzero(self.store.active)
+            vectors = self.store.vectors
+            ids = list(self.store.ids)
+            norms = self.store.template_norms.copy()
+
+        table = LSHTable(self.store.dim, bits=self.lsh_bits, tables=self.lsh_tables)
+        pairs = []
+        for start in range(0, rows.size, 4096):
+            chunk = rows[start:start + 4096]
+            keys = table.keys(vectors[chunk])
+            for row, row_keys in zip(chunk.tolist(), keys):
+                kept = table.candidates(row_keys)
+                if kept.size:
+                    scores = vectors[kept] @ vectors[row]
+                    top = int(np.argmax(scores))
+                    if scores[top] >= threshold:
+                        pairs.append((row, int(kept[top]), min(float(scores[top]), 1.0)))
+                        continue
+                table.add_keys([row], row_keys[np.newaxis, :])
+
+        applied = 0
+        if not dry_run:
+            for row, kept_row, _ in pairs:
+                face_id, target = ids[row], ids[kept_row]
+                with self._lock:
+                    if face_id not in self.store.row_of or target not in self.store.row_of:
+                        continue
+                    if action == "merge":
+                        self.add_samples(target, [self.store.vectors[self.store.row_of[face_id]]], [float(norms[row])])
+                    self.delete(face_id)
+                    applied += 1
+            logger.info(f"갤러리 중복 정리: {rows.size}개 중 {len(pairs)}개 중복, {applied}개 적용 ({action})")
+
+        return {
+            "scanned": int(rows.size),
+            "duplicates": len(pairs),
+            "applied": applied,
+            "pairs": [
+                {"id": ids[row], "duplicate_of": ids[kept_row], "similarity": similarity}
+                for row, kept_row, similarity in pairs[:max_pairs]
+            ]
+        }
+
+    def add_samples(self, face_id: str, embeddings, qualities: Optional[List[float]] = None) -> Dict[str, Any]:
+        """
+        등록된 신원에 사진을 더해 템플릿 갱신 (새 행을 만들지 않음)
+
+        템플릿 = normalize(S + Σ w_i e_i), S 는 지금까지의 품질 가중 합입니다.
+
+        Args:
+            face_id: 등록된 갤러리 ID
+            embeddings: 추가할 얼굴 임베딩들
+            qualities: 표본별 템플릿 가중치 (없으면 1.0)
+
+        Returns:
+            {"id", "samples", "exemplars"}
+        """
+        self._ensure_open()
+        vectors = [self._normalize(e) for e in embeddings]
+        qualities = [float(q) for q in (qualities or [1.0] * len(vectors))]
+        if len(qualities) != len(vectors):
+            raise ValueError("임베딩과 품질 수가 일치하지 않습니다")
+        if any(q <= 0 for q in qualities):
+            raise ValueError("품질 가중치는 0보다 커야 합니다")
+        for vector in vectors:
+            if vector.shape[0] != self.store.dim:
+                raise ValueError(f"임베딩 차원이 갤러리와 일치하지 않습니다 (갤러리 {self.store.dim}, 입력 {vector.shape[0]})")
+
+        with self._lock:
+            row = self.store.row_of.get(face_id)
+            if row is None:
+                raise ValueError(f"갤러리에 등록되지 않은 ID입니다: {face_id}")
+
+            info = self.store.template_info(row)
+            total = np.array(self.store.vectors[row], dtype=np.float64) * info["norm"]
+            samples = info["samples"]
+            records = []
+            for vector, weight in zip(vectors, qualities):
+                previous = (total / np.linalg.norm(total)).astype(np.float32)
+                total += weight * vector
+                samples += 1
+                norm = float(np.linalg.norm(total))
+                if norm == 0:
+                    raise ValueError("템플릿 가중 합의 크기가 0이 되었습니다")
+
+                record = {"op": "sample", "id": face_id, "vector": vector, "weight": weight,
+                          "template": (total / norm).astype(np.float32), "norm": norm, "samples": samples}
+                # 첫 번째 사진은 템플릿 자체이므로 두 번째 사진이 들어올 때 표본으로 보관
+                if self.exemplars.enabled and samples == 2:
+                    record["previous"] = previous
+                records.append(record)
+
+            self._wal.append(records)
+            for record in records:
+                self._apply_sample(record)
+            self._after_write()
+
+            return {"id": face_id, "samples": samples, "exemplars": self.exemplars.count(face_id)}
+
+    def delete(self, face_id: str) -> bool:
+        """얼굴 삭제, 존재하지 않았으면 False"""
+        self._ensure_open()
+        with self._lock:
+            if face_id not in self.store.row_of:
+                return False
+            self._wal.append([{"op": "delete", "id": face_id}])
+            self._apply_delete(face_id)
+            self._after_write()
+        return True
+
+    def get(self, face_id: str) -> Optional[Dict[str, Any]]:
+        """등록된 얼굴 정보 조회"""
+        self._ensure_open()
+        if face_id not in self.store.row_of:
+            return None
+        return {
+            "id": face_id,
+            "metadata": self.store.metadata.get(face_id, {}),
+            "attributes": self.store.attributes.get(face_id, {}),
+            "samples": self.store.template_info(self.store.row_of[face_id])["samples"],
+            "exemplars": self.exemplars.count(face_id)
+        }
+
+    def _exact_search(self, query: np.ndarray, k: int, allowed: np.ndarray = None):
+        """
+        전수 검색 - 행렬-벡터 곱 한 번
+
+        허용 행이 절반 미만이면 해당 행만 모아서 곱합니다.
+        """
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        if allowed is None:
+            allowed = self.store.active
+
+        candidates = np.flatnonzero(allowed)
+        k = min(k, candidates.size)
+        if k == 0:
+            return empty
+
+        if candidates.size * 2 < self.store.count:
+            scores = self.store.vectors[candidates] @ query
+        else:
+            candidates = None
+            scores = self.store.vectors @ query
+            scores[~allowed] = -np.inf
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        rows = candidates[top] if candidates is not None else top
+        return rows, scores[top]
+
+    def _prepare_query(self, embedding) -> np.ndarray:
+        """질의 정규화 및 차원 검사"""
+        query = self._normalize(embedding)
+        if query.shape[0] != self.store.dim:
+            raise ValueError(f"임베딩 차원이 갤러리와 일치하지 않습니다 (갤러리 {self.store.dim}, 입력 {query.shape[0]})")
+        return query
+
+    def _search_rows(self, embedding, top_k: int, exact: bool = False,
+                     ef_search: int = None, nprobe: int = None, filters: Dict[str, Any] = None):
+        """질의 정규화 후 (행 번호, 유사도) 검색"""
+        query = self._prepare_query(embedding)
+
+        if self.store.size == 0 or top_k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        allowed = self.store.filter_mask(filters)
+        # 필터가 매우 선택적이면 인덱스 탐색보다 허용 행만 전수 비교하는 편이 빠르고 정확함
+        if filters and np.count_nonzero(allowed) <= self.filter_exact_limit:
+            exact = True
+
+        if exact or self.index is None or not self.index.is_trained:
+            return self._exact_search(query, top_k, allowed)
+        if isinstance(self.index, IVFPQIndex):
+            return self.index.search(query, top_k, nprobe=nprobe, allowed=allowed)
+        return self.index.search(query, top_k, ef=ef_search, allowed=allowed)
+
+    def _rerank_with_exemplars(self, query: np.ndarray, rows: np.ndarray, scores: np.ndarray):
+        """후보 점수를 max(템플릿, 대표 표본) 유사도로 보정 후 다시 정렬"""
+        scores = scores.copy()
+        for i, row in enumerate(rows.tolist()):
+            best = self.exemplars.best_score(self.store.ids[row], query)
+            if best is not None and best > scores[i]:
+                scores[i] = best
+
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
+
+    def search(self, embedding, top_k: int = 10, threshold: float = -1.0, exact: bool = False,
+               ef_search: int = None, nprobe: int = None, filters: Dict[str, Any] = None,
+               use_exemplars: bool = True, stats: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """
+        1:N 검색
+
+        Args:
+            embedding: 질의 임베딩
+            top_k: 반환할 최대 결과 수
+            threshold: 최소 유사도
+            exact: 인덱스를 쓰지 않고 전수 검색
+            ef_search: HNSW 탐색 후보 수 (기본값은 인덱스 설정)
+            nprobe: IVF-PQ 탐색 리스트 수 (기본값은 인덱스 설정)
+            filters: 속성 필터 {"tenant", "gender", "age_min", "age_max"} - 스캔/탐색 중에 적용
+            use_exemplars: 대표 표본이 있으면 상위 후보 점수를 보정
+            stats: 전달하면 {"candidates"} (인덱스에서 가져온 후보 수) 로 채움
+
+        Returns:
+            유사도 내림차순 [{"id", "similarity", "metadata", "attributes"}]
+        """
+        self._ensure_open()
+
+        with self._lock:
+            rerank = use_exemplars and len(self.exemplars) > 0
+            rows, scores = self._search_rows(
+                embedding, max(top_k, self.exemplar_rerank) if rerank else top_k,
+                exact=exact, ef_search=ef_search, nprobe=nprobe, filters=filters
+            )
+            if stats is not None:
+                stats["candidates"] = int(rows.size)
+            if rerank:
+                rows, scores = self._rerank_with_exemplars(self._prepare_query(embedding), rows, scores)
+                rows, scores = rows[:top_k], scores[:top_k]
+
+            results = []
+            for row, score in zip(rows.tolist(), scores.tolist()):
+                score = min(score, 1.0)
+                if score < threshold:
+                    break
+                results.append(self._match(row, score))
+
+        return results
+
+    def kinship_search(self, embedding, landmarks=None, age: Optional[int] = None, top_k: int = 10,
+                       shortlist: int = 100, min_family_similarity: float = 0.0,
+                       filters: Dict[str, Any] = None, exclude_ids: Optional[List[str]] = None,
+                       ef_search: int = None, nprobe: int = None,
+                       stats: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """
+        친족 검색 - 임베딩 유사도 상위 shortlist 개를 가족 유사도로 재정렬
+
+        Args:
+            embedding: 질의 임베딩
+            landmarks: 질의 5점 랜드마크 (등록 얼굴에도 랜드마크가 있어야 기하 특징 비교)
+            age: 질의 얼굴 나이 (등록 얼굴 나이와의 차이로 보정)
+            top_k: 반환할 최대 결과 수
+            shortlist: 가족 유사도를 계산할 후보 수 (top_k 보다 작으면 top_k)
+            min_family_similarity: 최소 가족 유사도
+            filters: 속성 필터
+            exclude_ids: 후보에서 뺄 ID (질의 본인 등)
+            stats: 전달하면 {"candidates"} (가족 유사도를 계산한 후보 수) 로 채움
+
+        Returns:
+            가족 유사도 내림차순 [{"id", "similarity", "metadata", "attributes", "family_similarity",
+            "age_corrected_similarity", "confidence", "feature_breakdown", "explanation", "similarity_level"}]
+        """
+        self._ensure_open()
+        shortlist = max(shortlist, top_k)
+        exclude = set(exclude_ids or [])
+
+        with self._lock:
+            query = self._prepare_query(embedding)
+            rows, scores = self._search_rows(
+                query, shortlist + len(exclude), ef_search=ef_search, nprobe=nprobe, filters=filters
+            )
+            keep = [i for i, row in enumerate(rows.tolist()) if self.store.ids[row] not in exclude][:shortlist]
+            rows, scores = rows[keep], scores[keep]
+            candidates = [self._match(row, min(score, 1.0)) for row, score in zip(rows.tolist(), scores.tolist())]
+            vectors = self.store.vectors[rows]
+
+        if stats is not None:
+            stats["candidates"] = len(candidates)
+
+        # 가족 유사도는 후보 벡터 사본으로 잠금 밖에서 계산
+        return rank_relatives(query, vectors, candidates, landmarks=landmarks, age=age, top_k=top_k,
+                              min_family_similarity=min_family_similarity)
+
+    def _match(self, row: int, score: float) -> Dict[str, Any]:
+        """검색 결과 항목"""
+        face_id = self.store.ids[row]
+        return {
+            "id": face_id,
+            "similarity": score,
+            "metadata": self.store.metadata.get(face_id, {}),
+            "attributes": self.store.attributes.get(face_id, {})
+        }
+
+    def iter_range_search(self, embedding, threshold: float, filters: Dict[str, Any] = None,
+                          stats: Dict[str, Any] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        범위 검색 - 유사도가 threshold 이상인 얼굴을 블록 단위로 생성
+
+        유사도 상한(블록 중심·질의 + 블록 반지름)이 threshold 미만인 블록은 읽지 않고,
+        상한이 높은 블록부터 스캔합니다. 학습된 IVF-PQ 는 역리스트를 블록으로 씁니다.
+        잠금은 블록마다 잡으므로 결과가 많아도 등록/검색을 오래 막지 않습니다.
+        신원 템플릿 행만 비교하며 대표 표본 보정은 하지 않습니다.
+
+        Args:
+            embedding: 질의 임베딩
+            threshold: 최소 유사도 (포함)
+            filters: 속성 필터
+            stats: 전달하면 {"total_blocks", "candidate_blocks", "scanned_rows", "matches"} 로 채움
+
+        Returns:
+            블록별 매칭 목록 (블록 내 유사도 내림차순) 을 생성하는 이터레이터.
+            질의 검사와 블록 선정은 호출 시점에 끝나므로 잘못된 입력은 바로 ValueError 가 됩니다.
+        """
+        self._ensure_open()
+        if stats is None:
+            stats = {}
+
+        with self._lock:
+            query = self._prepare_query(embedding)
+            allowed = self.store.filter_mask(filters)
+
+            if isinstance(self.index, IVFPQIndex) and self.index.is_trained:
+                blocks = [rows for _, rows in self.index.range_candidates(query, threshold, allowed)]
+                total_blocks = self.index.nlist
+            else:
+                bounds = self._block_bounds.upper_bounds(query)
+                candidates = np.flatnonzero(bounds >= threshold)
+                candidates = candidates[np.argsort(-bounds[candidates], kind="stable")]
+                blocks = [self._block_bounds.block_rows(block) for block in candidates.tolist()]
+                total_blocks = bounds.shape[0]
+
+        stats.update({"total_blocks": int(total_blocks), "candidate_blocks": len(blocks),
+                      "scanned_rows": 0, "matches": 0})
+        return self._scan_range_blocks(query, threshold, allowed, blocks, stats)
+
+    def _scan_range_blocks(self, query: np.ndarray, threshold: float, allowed: np.ndarray,
+                           blocks: List, stats: Dict[str, Any]) -> Iterator[List[Dict[str, Any]]]:
+        """범위 검색 후보 블록 스캔 - (시작, 끝) 행 범위 또는 행 번호 배열"""
+        for block in blocks:
+            with self._lock:
+                if not self._opened:
+                    return
+
+                if isinstance(block, tuple):
+                    start, end = block
+                    mask = allowed[start:end] & self.store.active[start:end]
+                    if not mask.any():
+                        continue
+                    rows = np.arange(start, end)[mask]
+                    scores = self.store.vectors[start:end] @ query
+                    scores = scores[mask]
+                else:
+                    rows = block[self.store.active[block]]
+                    if rows.size == 0:
+                        continue
+                    scores = self.store.vectors[rows] @ query
+
+                stats["scanned_rows"] += int(rows.size)
+                hits = np.flatnonzero(scores >= threshold)
+                if hits.size == 0:
+                    continue
+
+                hits = hits[np.argsort(-scores[hits], kind="stable")]
+                matches = [self._match(row, min(score, 1.0))
+                           for row, score in zip(rows[hits].tolist(), scores[hits].tolist())]
+                stats["matches"] += len(matches)
+
+            yield matches
+
+    def range_search(self, embedding, threshold: float, filters: Dict[str, Any] = None,
+                     max_results: Optional[int] = None) -> Dict[str, Any]:
+        """
+        유사도가 threshold 이상인 모든 얼굴 검색 (top_k 대신 임계값 기준)
+
+        Args:
+            embedding: 질의 임베딩
+            threshold: 최소 유사도 (포함)
+            filters: 속성 필터
+            max_results: 반환할 최대 결과 수 (초과분은 유사도가 낮은 쪽부터 잘림)
+
+        Returns:
+            {"matches", "total_matches", "truncated", "stats"} - matches 는 유사도 내림차순
+        """
+        stats = {}
+        matches = []
+        for block in self.iter_range_search(embedding, threshold, filters=filters, stats=stats):
+            matches.extend(block)
+
+        matches.sort(key=lambda match: -match["similarity"])
+        total = len(matches)
+        if max_results is not None:
+            matches = matches[:max_results]
+
+        return {
+            "matches": matches,
+            "total_matches": total,
+            "truncated": len(matches) < total,
+            "stats": stats
+        }
+
+    def evaluate_recall(self, queries, k: int = 10, ef_search: int = None, nprobe: int = None,
+                        filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        인덱스 검색 결과의 recall@k 를 전수 검색 대비로 측정
+
+        Args:
+            queries: 질의 임베딩들 (갤러리에 없는 held-out 집합 권장)
+            k: 비교할 상위 결과 수
+            ef_search: HNSW 탐색 후보 수
+            nprobe: IVF-PQ 탐색 리스트 수
+            filters: 속성 필터
+
+        Returns:
+            {"recall", "k", "queries", "index_type"}
+        """
+        self._ensure_open()
+        hits = 0
+        total = 0
+
+        with self._lock:
+            for query in queries:
+                exact_rows, _ = self._search_rows(query, k, exact=True, filters=filters)
+                approx_rows, _ = self._search_rows(
+                    query, k, ef_search=ef_search, nprobe=nprobe, filters=filters
+                )
+                hits += len(set(exact_rows.tolist()) & set(approx_rows.tolist()))
+                total += len(exact_rows)
+
+        return {
+            "recall": hits / total if total else 1.0,
+            "k": k,
+            "queries": len(queries),
+            "index_type": self.index_type
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """갤러리 통계"""
+        self._ensure_open()
+        return {
+            "size": self.store.size,
+            "wal_generation": self._wal_generation,
+            "wal_records": self._wal.records,
+            "dim": self.store.dim,
+            "rows": self.store.count,
+            "capacity": self.store.capacity,
+            "deleted_rows": self.store.count - self.store.size,
+            "dedupe": {"threshold": self.dedupe_threshold, "action": self.dedupe_action, **self._dedupe_counts},
+            "path": str(self.store.path),
+            "index": self.index.get_stats() if self.index is not None else {"type": "flat"}
+        }
+
+    def close(self):
+        """최종 스냅샷을 기록하고 저장소 닫기 (종료 시)"""
+        if not self._opened:
+            return
+
+        self.compact(wait=True)
+        with self._lock:
+            if self._opened:
+                self._wal.close()
+                self._wal = None
+                self.store.close()
+                self.index = None
+                self._opened = False
+                self._dir_lock.release()
+
+
+def create_face_gallery():
+    """설정에 따라 단일 프로세스 갤러리 또는 샤딩 갤러리 생성"""
+    gallery_kwargs = {
+        "dim": settings.gallery_embedding_dim,
+        "index_type": settings.gallery_index_type,
+        "index_params": settings.get_gallery_index_params(),
+        "wal_fsync": settings.gallery_wal_fsync,
+        "compaction_wal_records": settings.gallery_compaction_wal_records,
+        "filter_exact_limit": settings.gallery_filter_exact_limit,
+        "range_block_size": settings.gallery_range_block_size,
+        "max_exemplars": settings.gallery_max_exemplars,
+        "exemplar_rerank": settings.gallery_exemplar_rerank,
+        "dedupe_threshold": settings.gallery_dedupe_threshold,
+        "dedupe_action": settings.gallery_dedupe_action,
+        "lsh_bits": settings.gallery_dedupe_lsh_bits,
+        "lsh_tables": settings.gallery_dedupe_lsh_tables
+    }
+
+    if settings.gallery_shards > 0:
+        from .sharding import ShardedGallery
+        return ShardedGallery(
+            settings.gallery_path,
+            num_shards=settings.gallery_shards,
+            partition=settings.gallery_shard_partition,
+            shard_timeout=settings.gallery_shard_timeout,
+            **gallery_kwargs
+        )
+
+    return FaceGallery(settings.gallery_path, **gallery_kwargs)
+
+
+# 전역 얼굴 갤러리 인스턴스 (GALLERY_SHARDS > 0 이면 ShardedGallery)
+face_gallery = create_face_gallery()
@@ -0,0 +1,418 @@
+"""
+HNSW 근사 최근접 이웃 인덱스 (CPU, 프로세스 내부)
+
+Malkov & Yashunin, "Efficient and robust approximate nearest neighbor search
+using Hierarchical Navigable Small World graphs" 의 구현입니다.
+벡터는 EmbeddingStore 의 memmap 행렬에서 행 번호로 직접 읽고, 인덱스는 그래프만 보관합니다.
+정규화된 벡터를 가정하므로 유사도는 내적입니다.
+
+그래프는 두 부분입니다.
+- 기준 그래프: 스냅샷의 레이어별 CSR 배열 (np.load(mmap_mode="r") 그대로, 파이썬 객체로 바꾸지 않음)
+- 덮어쓰기: 스냅샷 이후 추가/수정된 노드의 이웃 목록 (dict) - 있으면 기준 그래프보다 우선
+
+그래서 스냅샷에서 여는 시간은 노드 수와 거의 무관하고, 메모리는 변경된 노드만큼만 늘어납니다.
+삭제된 노드는 remove() 에서 이웃들의 연결을 복구한 뒤 탐색에서 건너뛰고, 다음 스냅샷에서 빠집니다.
+
+스냅샷 없이 열면(인덱스 유형 변경, 스냅샷 유실) 모든 행을 하나씩 삽입하므로 행 수에 비례해
+오래 걸립니다 (benchmarks/bench_gallery_index.py 의 "재구성" 참고). FaceGallery 는 이 경우
+바로 스냅샷을 기록해 다음 시작부터는 CSR 을 매핑합니다.
+"""
+import heapq
+import json
+import math
+from typing import Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+
+class HNSWIndex:
+    """
+    HNSW 그래프 인덱스
+
+    Args:
+        store: ``vectors`` (행 번호로 접근하는 정규화된 행렬) 와 ``active`` 를 제공하는 저장소
+        m: 상위 레이어의 노드당 최대 이웃 수 (레이어 0 은 2*m)
+        ef_construction: 삽입 시 후보 목록 크기
+        ef_search: 검색 시 기본 후보 목록 크기
+    """
+
+    def __init__(self, store, m: int = 16, ef_construction: int = 200, ef_search: int = 64, seed: int = 0):
+        if m < 2:
+            raise ValueError("HNSW M 은 2 이상이어야 합니다")
+
+        self.store = store
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = max(ef_construction, m)
+        self.ef_search = ef_search
+        self.level_mult = 1.0 / math.log(m)
+
+        self._rng = np.random.default_rng(seed)
+
+        # 스냅샷 기준 그래프: 레이어별 (nodes, indptr, indices, 노드 번호가 0..n-1 인지)
+        self._base: List[Tuple[np.ndarray, np.ndarray, np.ndarray, bool]] = []
+        self._base_levels = np.zeros(0, dtype=np.int16)
+
+        # 스냅샷 이후 변경분
+        self._layers: List[Dict[int, List[int]]] = []
+        self._new_levels: Dict[int, int] = {}
+        self._removed: Set[int] = set()
+
+        self._count = 0
+        self._max_level = -1
+        self.entry_point = -1
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def is_trained(self) -> bool:
+        """HNSW 는 학습이 필요 없음"""
+        return True
+
+    @property
+    def max_level(self) -> int:
+        return self._max_level
+
+    def _random_level(self) -> int:
+        return int(-math.log(1.0 - self._rng.random()) * self.level_mult)
+
+    def _max_neighbors(self, layer: int) -> int:
+        return self.m0 if layer == 0 else self.m
+
+    def _level(self, row: int) -> int:
+        """노드 최상위 레이어 (그래프에 없거나 삭제되었으면 -1)"""
+        if row in self._removed:
+            return -1
+        level = self._new_levels.get(row)
+        if level is not None:
+            return level
+        if row < self._base_levels.shape[0]:
+            return int(self._base_levels[row])
+        return -1
+
+    def _neighbors(self, layer: int, node: int) -> Sequence[int]:
+        """이웃 목록 (덮어쓰기 -> 기준 CSR 순서로 조회, 삭제된 노드가 섞여 있을 수 있음)"""
+        links = self._layers[layer].get(node)
+        if links is not None:
+            return links
+
+        if layer < len(self._base):
+            nodes, indptr, indices, dense = self._base[layer]
+            if dense:
+                pos = node if node < nodes.shape[0] else -1
+            else:
+                pos = int(np.searchsorted(nodes, node))
+                if pos >= nodes.shape[0] or nodes[pos] != node:
+                    pos = -1
+            if pos >= 0:
+                return indices[indptr[pos]:indptr[pos + 1]].tolist()
+        return ()
+
+    def _editable(self, layer: int, node: int) -> List[int]:
+        """수정할 이웃 목록 (기준 그래프 노드는 덮어쓰기로 복사)"""
+        links = self._layers[layer].get(node)
+        if links is None:
+            links = self._layers[layer][node] = list(self._neighbors(layer, node))
+        return links
+
+    def _search_layer(self, query: np.ndarray, entry_points: List[int], ef: int, layer: int,
+                      allowed: np.ndarray = None) -> List[Tuple[float, int]]:
+        """
+        한 레이어에서 탐욕 탐색, 유사도 내림차순 (유사도, 노드) 목록 반환
+
+        allowed 가 주어지면 허용되지 않은 노드도 탐색 경로로는 쓰되 결과에는 넣지 않습니다.
+        """
+        vectors = self.store.vectors
+        removed = self._removed
+
+        visited = set(entry_points)
+        sims = (vectors[entry_points] @ query).tolist()
+        candidates = [(-s, n) for s, n in zip(sims, entry_points)]  # 유사도 최대 힙
+        results = [(s, n) for s, n in zip(sims, entry_points)       # 유사도 최소 힙 (크기 ef)
+                   if allowed is None or allowed[n]]
+        heapq.heapify(candidates)
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            neg_sim, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_sim < results[0][0]:
+                break
+
+            neighbors = [n for n in self._neighbors(layer, node) if n not in visited and n not in removed]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+
+            for sim, n in zip((vectors[neighbors] @ query).tolist(), neighbors):
+                if len(results) < ef or sim > results[0][0]:
+                    heapq.heappush(candidates, (-sim, n))
+                    if allowed is None or allowed[n]:
+                        heapq.heappush(results, (sim, n))
+                        if len(results) > ef:
+                            heapq.heappop(results)
+
+        return sorted(results, reverse=True)
+
+    def _select_neighbors(self, candidates: List[Tuple[float, int]], max_count: int) -> List[int]:
+        """
+        이웃 선택 휴리스틱 - 이미 선택된 이웃보다 기준점에 더 가까운 후보만 선택해
+        그래프가 여러 방향으로 연결되도록 함 (부족하면 가까운 순으로 채움)
+        """
+        if len(candidates) <= max_count:
+            return [n for _, n in candidates]
+
+        nodes = [n for _, n in candidates]
+        base_sims = np.array([s for s, _ in candidates], dtype=np.float32)
+        block = self.store.vectors[nodes]
+        pair_sims = block @ block.T
+
+        # 선택된 이웃과의 최대 유사도를 누적해 후보마다 한 번만 비교
+        closest_selected = np.full(len(nodes), -np.inf, dtype=np.float32)
+        selected: List[int] = []
+        skipped: List[int] = []
+        for i in range(len(nodes)):
+            if len(selected) >= max_count:
+                break
+            if base_sims[i] > closest_selected[i]:
+                selected.append(i)
+                np.maximum(closest_selected, pair_sims[i], out=closest_selected)
+            else:
+                skipped.append(i)
+
+        for i in skipped:
+            if len(selected) >= max_count:
+                break
+            selected.append(i)
+
+        return [nodes[i] for i in selected]
+
+    def _reselect(self, node: int, layer: int, candidates: List[int]):
+        """후보들 중에서 노드의 이웃 목록을 다시 선택"""
+        vectors = self.store.vectors
+        sims = (vectors[candidates] @ vectors[node]).tolist()
+        ranked = sorted(zip(sims, candidates), reverse=True)
+        self._layers[layer][node] = self._select_neighbors(ranked, self._max_neighbors(layer))
+
+    def _shrink(self, node: int, layer: int):
+        """이웃 수가 한도를 넘은 노드의 이웃 목록 재선택"""
+        links = [n for n in self._editable(layer, node) if n not in self._removed]
+        self._reselect(node, layer, links)
+
+    def add(self, row: int):
+        """저장소의 행을 그래프에 삽입"""
+        if row in self._removed or self._level(row) >= 0:
+            return
+
+        query = np.asarray(self.store.vectors[row])
+        level = self._random_level()
+        self._new_levels[row] = level
+        self._count += 1
+        while len(self._layers) <= level:
+            self._layers.append({})
+
+        if self.entry_point < 0:
+            for layer in range(level + 1):
+                self._layers[layer][row] = []
+            self.entry_point = row
+            self._max_level = level
+            return
+
+        entry = [self.entry_point]
+        for layer in range(self._max_level, level, -1):
+            entry = [self._search_layer(query, entry, 1, layer)[0][1]]
+
+        for layer in range(min(level, self._max_level), -1, -1):
+            candidates = self._search_layer(query, entry, self.ef_construction, layer)
+            neighbors = self._select_neighbors(candidates, self.m)
+            self._layers[layer][row] = neighbors
+
+            max_count = self._max_neighbors(layer)
+            for n in neighbors:
+                links = self._editable(layer, n)
+                links.append(row)
+                if len(links) > max_count:
+                    self._shrink(n, layer)
+
+            entry = [n for _, n in candidates]
+
+        if level > self._max_level:
+            for layer in range(self._max_level + 1, level + 1):
+                self._layers[layer][row] = []
+            self._max_level = level
+            self.entry_point = row
+
+    def remove(self, row: int):
+        """
+        삭제된 행을 그래프에서 빼고 주변 연결 복구
+
+        삭제된 벡터는 0 이라 탐색 경로로 쓸 수 없으므로, 그 행을 이웃으로 두던 노드들은 자기 이웃과
+        삭제된 행의 이웃을 합친 후보에서 이웃 목록을 다시 고릅니다. 그 밖의 노드에 남은 연결은
+        탐색에서 건너뛰고 다음 스냅샷에서 빠집니다.
+        """
+        level = self._level(row)
+        if level < 0:
+            return
+
+        self._removed.add(row)
+        self._new_levels.pop(row, None)
+        self._count -= 1
+
+        for layer in range(level + 1):
+            orphans = [n for n in self._neighbors(layer, row) if n not in self._removed]
+            self._layers[layer].pop(row, None)
+            for n in orphans:
+                links = self._editable(layer, n)
+                if row not in links:
+                    continue
+                candidates = {l for l in links if l not in self._removed}
+                candidates.update(o for o in orphans if o != n)
+                self._reselect(n, layer, list(candidates))
+
+        if row == self.entry_point:
+            self._reset_entry_point()
+
+    def _reset_entry_point(self):
+        """진입점이 삭제되면 가장 높은 레이어의 남은 노드로 교체"""
+        best, best_level = -1, -1
+        for row, level in self._new_levels.items():
+            if level > best_level:
+                best, best_level = row, level
+
+        if self._base_levels.shape[0]:
+            levels = np.array(self._base_levels)
+            removed = [row for row in self._removed if row < levels.shape[0]]
+            levels[removed] = -1
+            row = int(np.argmax(levels))
+            if levels[row] > best_level:
+                best, best_level = row, int(levels[row])
+
+        # 남은 노드가 없는 상위 레이어는 버림
+        for layer in range(best_level + 1, len(self._layers)):
+            self._layers[layer] = {}
+        self.entry_point = best
+        self._max_level = best_level
+
+    def search(self, query: np.ndarray, k: int, ef: int = None,
+               allowed: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        근사 top-k 검색
+
+        Args:
+            allowed: 결과에 허용할 행 마스크 (기본값은 삭제되지 않은 행)
+
+        Returns:
+            (행 번호 배열, 유사도 배열) - 유사도 내림차순
+        """
+        if self.entry_point < 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        ef = max(ef or self.ef_search, k)
+        query = np.asarray(query, dtype=np.float32)
+
+        entry = [self.entry_point]
+        for layer in range(self._max_level, 0, -1):
+            entry = [self._search_layer(query, entry, 1, layer)[0][1]]
+
+        # 필터에 걸린 행은 탐색 경로로만 쓰고 결과에서 제외
+        if allowed is None:
+            allowed = self.store.active
+        hits = self._search_layer(query, entry, ef, 0, allowed=allowed)[:k]
+
+        rows = np.array([n for _, n in hits], dtype=np.int64)
+        scores = np.array([s for s, _ in hits], dtype=np.float32)
+        return rows, scores
+
+    def _layer_csr(self, layer: int, removed: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """기준 CSR 과 덮어쓰기를 합친 레이어 CSR (삭제된 노드와 그 노드로의 연결 제외)"""
+        overlay = {
+            node: [n for n in links if n not in self._removed]
+            for node, links in self._layers[layer].items() if node not in self._removed
+        }
+        overlay_nodes = np.fromiter(overlay, dtype=np.int64, count=len(overlay))
+        lengths = [np.array([len(overlay[n]) for n in overlay_nodes.tolist()], dtype=np.int64)]
+        chunks = [np.fromiter((n for node in overlay_nodes.tolist() for n in overlay[node]), dtype=np.int64)]
+        node_parts = [overlay_nodes]
+
+        if layer < len(self._base):
+            nodes, indptr, indices, _ = (np.asarray(part) for part in self._base[layer])
+            keep_node = ~(np.isin(nodes, removed) | np.isin(nodes, overlay_nodes))
+            owner = np.repeat(np.arange(nodes.shape[0]), np.diff(indptr))
+            keep_link = keep_node[owner] & ~np.isin(indices, removed)
+            node_parts.append(nodes[keep_node])
+            lengths.append(np.bincount(owner[keep_link], minlength=nodes.shape[0])[keep_node])
+            chunks.append(indices[keep_link])
+
+        all_nodes = np.concatenate(node_parts)
+        all_lengths = np.concatenate(lengths)
+        all_indices = np.concatenate(chunks)
+        offsets = np.zeros(all_nodes.shape[0], dtype=np.int64)
+        np.cumsum(all_lengths[:-1], out=offsets[1:])
+
+        # 노드 번호 순서로 재배열
+        order = np.argsort(all_nodes, kind="stable")
+        sorted_lengths = all_lengths[order]
+        indptr_out = np.zeros(all_nodes.shape[0] + 1, dtype=np.int64)
+        np.cumsum(sorted_lengths, out=indptr_out[1:])
+        gather = (np.arange(indptr_out[-1], dtype=np.int64)
+                  - np.repeat(indptr_out[:-1], sorted_lengths)
+                  + np.repeat(offsets[order], sorted_lengths))
+        return all_nodes[order], indptr_out, all_indices[gather]
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """스냅샷용 그래프 배열 (레이어별 CSR, 삭제된 노드 제외)"""
+        removed = np.fromiter(self._removed, dtype=np.int64, count=len(self._removed))
+        size = max([self._base_levels.shape[0]] + [row + 1 for row in self._new_levels])
+        levels = np.full(size, -1, dtype=np.int16)
+        levels[:self._base_levels.shape[0]] = self._base_levels
+        levels[removed[removed < self._base_levels.shape[0]]] = -1
+        for row, level in self._new_levels.items():
+            levels[row] = level
+
+        state = {
+            "levels": levels,
+            "entry_point": np.array([self.entry_point], dtype=np.int64),
+            "rng_state": np.frombuffer(json.dumps(self._rng.bit_generator.state).encode(), dtype=np.uint8)
+        }
+        for layer in range(self._max_level + 1):
+            nodes, indptr, indices = self._layer_csr(layer, removed)
+            state[f"layer{layer}_nodes"] = nodes
+            state[f"layer{layer}_indptr"] = indptr
+            state[f"layer{layer}_indices"] = indices
+        return state
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        """스냅샷 그래프 적용 (배열은 복사하지 않고 그대로 기준 그래프로 사용)"""
+        self._base_levels = state["levels"]
+        self._count = int(np.count_nonzero(np.asarray(self._base_levels) >= 0))
+        self.entry_point = int(state["entry_point"][0])
+        if "rng_state" in state:
+            self._rng.bit_generator.state = json.loads(np.asarray(state["rng_state"]).tobytes().decode())
+
+        self._base = []
+        while f"layer{len(self._base)}_nodes" in state:
+            layer = len(self._base)
+            nodes = state[f"layer{layer}_nodes"]
+            dense = nodes.shape[0] == 0 or int(nodes[-1]) == nodes.shape[0] - 1
+            self._base.append((nodes, state[f"layer{layer}_indptr"], state[f"layer{layer}_indices"], dense))
+
+        self._layers = [{} for _ in self._base]
+        self._new_levels = {}
+        self._removed = set()
+        self._max_level = len(self._base) - 1 if self.entry_point >= 0 else -1
+
+    def get_stats(self) -> Dict[str, int]:
+        """인덱스 통계"""
+        return {
+            "type": "hnsw",
+            "nodes": len(self),
+            "levels": self._max_level + 1,
+            "m": self.m,
+            "ef_construction": self.ef_construction,
+            "ef_search": self.ef_search,
+            "snapshot_nodes": int(self._base[0][0].shape[0]) if self._base else 0,
+            "modified_nodes": sum(len(layer) for layer in self._layers),
+            "removed_nodes": len(self._removed)
+        }
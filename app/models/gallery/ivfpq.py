@@ -0,0 +1,329 @@
+"""
+IVF-PQ 압축 인덱스 (CPU, 프로세스 내부)
+
+- 역파일(IVF): k-means 로 학습한 nlist 개의 거친 중심(coarse centroid) 중 가까운 nprobe 개 리스트만 탐색
+- 곱 양자화(PQ): 중심과의 잔차를 m 개의 부분 벡터로 나눠 각각 8비트(256개 코드워드) 코드로 저장
+  (512차원, m=64 이면 얼굴당 코드 64바이트)
+- 재정렬: PQ 점수 상위 후보만 디스크(memmap)의 원본 벡터로 정확한 유사도를 다시 계산
+
+정규화된 벡터를 가정하므로 유사도는 내적이며, q·x ≈ q·c + Σ q_j·codebook_j[code_j] 로 근사합니다.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+PQ_CODEBOOK_SIZE = 256  # 8비트 코드
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """
+    L2 k-means (Lloyd), (k, D) 중심 반환
+
+    빈 클러스터는 임의의 데이터 점으로 다시 초기화합니다.
+    """
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    if data.shape[0] < k:
+        raise ValueError(f"k-means 학습 데이터가 부족합니다 (필요 {k}개, 입력 {data.shape[0]}개)")
+
+    centroids = data[rng.choice(data.shape[0], k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = nearest_centroids(data, centroids)
+        counts = np.bincount(assign, minlength=k)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, np.newaxis]
+        if empty.any():
+            centroids[empty] = data[rng.choice(data.shape[0], int(empty.sum()), replace=False)]
+
+    return centroids
+
+
+def nearest_centroids(data: np.ndarray, centroids: np.ndarray, count: int = 1) -> np.ndarray:
+    """L2 기준 가장 가까운 중심 (argmin ||x-c||² = argmax x·c - ||c||²/2)"""
+    scores = data @ centroids.T - 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    if count == 1:
+        return np.argmax(scores, axis=-1)
+    top = np.argpartition(-scores, count - 1, axis=-1)[..., :count]
+    return top
+
+
+class IVFPQIndex:
+    """
+    IVF-PQ 인덱스
+
+    Args:
+        store: ``vectors`` (행 번호로 접근하는 정규화된 행렬) 와 ``active`` 를 제공하는 저장소
+        nlist: 거친 중심(역파일 리스트) 수
+        m: PQ 부분 양자화기 수 (차원을 나눠떨어지게 해야 함, 얼굴당 m 바이트)
+        nprobe: 검색 시 탐색할 리스트 수
+        rerank: 원본 벡터로 재정렬할 PQ 후보 수
+    """
+
+    def __init__(self, store, nlist: int = 1024, m: int = 64, nprobe: int = 16, rerank: int = 100,
+                 iterations: int = 20, seed: int = 0):
+        if store.dim % m != 0:
+            raise ValueError(f"PQ 부분 양자화기 수({m})가 임베딩 차원({store.dim})을 나눠떨어지게 해야 합니다")
+
+        self.store = store
+        self.nlist = nlist
+        self.m = m
+        self.sub_dim = store.dim // m
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.iterations = iterations
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None   # (nlist, D)
+        self.codebooks: Optional[np.ndarray] = None   # (m, 256, sub_dim)
+        self._reset_lists()
+
+    def _reset_lists(self):
+        self._list_rows: List[np.ndarray] = [np.zeros(0, dtype=np.int32) for _ in range(self.nlist)]
+        self._list_codes: List[np.ndarray] = [np.zeros((0, self.m), dtype=np.uint8) for _ in range(self.nlist)]
+        self._list_sizes = np.zeros(self.nlist, dtype=np.int64)
+        self._list_radius = np.zeros(self.nlist, dtype=np.float32)  # 리스트별 max ||x - c||
+        self._rows = set()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        return int(self._list_sizes.sum())
+
+    def train(self, vectors: np.ndarray):
+        """거친 중심과 PQ 코드북 학습 (기존 리스트는 비워짐)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[0] < max(self.nlist, PQ_CODEBOOK_SIZE):
+            raise ValueError(
+                f"IVF-PQ 학습에는 최소 {max(self.nlist, PQ_CODEBOOK_SIZE)}개의 얼굴이 필요합니다 "
+                f"(현재 {vectors.shape[0]}개)"
+            )
+
+        centroids = kmeans(vectors, self.nlist, self.iterations, self.seed)
+        residuals = vectors - centroids[nearest_centroids(vectors, centroids)]
+
+        codebooks = np.empty((self.m, PQ_CODEBOOK_SIZE, self.sub_dim), dtype=np.float32)
+        for j in range(self.m):
+            sub = residuals[:, j * self.sub_dim:(j + 1) * self.sub_dim]
+            codebooks[j] = kmeans(sub, PQ_CODEBOOK_SIZE, self.iterations, self.seed + j + 1)
+
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self._reset_lists()
+
+    def load_trained(self, centroids: np.ndarray, codebooks: np.ndarray):
+        """저장된 학습 결과 적용 (리스트는 비워짐)"""
+        self.centroids = np.array(centroids, dtype=np.float32)
+        self.codebooks = np.array(codebooks, dtype=np.float32)
+        self.nlist = self.centroids.shape[0]
+        self.m = self.codebooks.shape[0]
+        self.sub_dim = self.codebooks.shape[2]
+        self._reset_lists()
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """벡터들을 (리스트 번호, PQ 코드) 로 인코딩"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        lists = nearest_centroids(vectors, self.centroids)
+        residuals = vectors - self.centroids[lists]
+
+        codes = np.empty((vectors.shape[0], self.m), dtype=np.uint8)
+        for j in range(self.m):
+            sub = residuals[:, j * self.sub_dim:(j + 1) * self.sub_dim]
+            codes[:, j] = nearest_centroids(sub, self.codebooks[j])
+        return lists, codes
+
+    def add_rows(self, rows: np.ndarray):
+        """저장소의 행들을 인코딩해 리스트에 추가"""
+        if not self.is_trained:
+            raise ValueError("IVF-PQ 인덱스가 학습되지 않았습니다")
+
+        rows = np.asarray([r for r in np.asarray(rows).tolist() if r not in self._rows], dtype=np.int64)
+        if rows.size == 0:
+            return
+
+        vectors = self.store.vectors[rows]
+        lists, codes = self.encode(vectors)
+        residual_norms = np.linalg.norm(vectors - self.centroids[lists], axis=1)
+        for list_id in np.unique(lists):
+            mask = lists == list_id
+            self._append(int(list_id), rows[mask], codes[mask])
+            self._list_radius[list_id] = max(self._list_radius[list_id], float(residual_norms[mask].max()))
+        self._rows.update(rows.tolist())
+
+    def add(self, row: int):
+        """저장소의 행 하나를 추가"""
+        self.add_rows(np.array([row]))
+
+    def update(self, row: int, previous: np.ndarray):
+        """
+        행 벡터가 바뀐 뒤 다시 인코딩 (신원 템플릿 갱신)
+
+        이전 벡터로 원래 리스트를 찾아 빼고 새 벡터로 다시 추가합니다.
+        이전 벡터가 정확하지 않으면(WAL 재생 등) 전체 리스트에서 찾습니다.
+        """
+        if not self.is_trained or row not in self._rows:
+            return
+
+        expected = int(nearest_centroids(np.asarray(previous, dtype=np.float32)[np.newaxis, :], self.centroids)[0])
+        for list_id in [expected] + [i for i in range(self.nlist) if i != expected]:
+            size = self._list_sizes[list_id]
+            position = np.flatnonzero(self._list_rows[list_id][:size] == row)
+            if position.size:
+                last = size - 1
+                self._list_rows[list_id][position[0]] = self._list_rows[list_id][last]
+                self._list_codes[list_id][position[0]] = self._list_codes[list_id][last]
+                self._list_sizes[list_id] = last
+                break
+
+        self._rows.discard(row)
+        self.add_rows(np.array([row]))
+
+    def _append(self, list_id: int, rows: np.ndarray, codes: np.ndarray):
+        """리스트 버퍼에 추가 (용량 2배 확장)"""
+        size = self._list_sizes[list_id]
+        required = size + rows.shape[0]
+        if required > self._list_rows[list_id].shape[0]:
+            capacity = max(required, 2 * self._list_rows[list_id].shape[0], 16)
+            new_rows = np.zeros(capacity, dtype=np.int32)
+            new_codes = np.zeros((capacity, self.m), dtype=np.uint8)
+            new_rows[:size] = self._list_rows[list_id][:size]
+            new_codes[:size] = self._list_codes[list_id][:size]
+            self._list_rows[list_id] = new_rows
+            self._list_codes[list_id] = new_codes
+
+        self._list_rows[list_id][size:required] = rows
+        self._list_codes[list_id][size:required] = codes
+        self._list_sizes[list_id] = required
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = None, rerank: int = None,
+               allowed: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        근사 top-k 검색
+
+        Args:
+            allowed: 결과에 허용할 행 마스크 (기본값은 삭제되지 않은 행)
+
+        Returns:
+            (행 번호 배열, 유사도 배열) - 유사도 내림차순, 유사도는 원본 벡터 기준
+        """
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        if not self.is_trained or k <= 0:
+            return empty
+
+        query = np.asarray(query, dtype=np.float32)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        shortlist = max(rerank or self.rerank, k)
+
+        probe = nearest_centroids(query[np.newaxis, :], self.centroids, nprobe).reshape(-1)
+        probe = probe[self._list_sizes[probe] > 0]
+        if probe.size == 0:
+            return empty
+
+        # 질의 부분 벡터와 코드워드의 내적 표 (m, 256) - 모든 리스트에 공통
+        table = np.einsum("jd,jcd->jc", query.reshape(self.m, self.sub_dim), self.codebooks)
+        columns = np.arange(self.m)
+
+        if allowed is None:
+            allowed = self.store.active
+
+        # 코드 점수 계산 전에 마스크를 적용해 걸러질 얼굴의 점수는 계산하지 않음
+        row_blocks = []
+        score_blocks = []
+        for p in probe:
+            list_rows = self._list_rows[p][:self._list_sizes[p]]
+            codes = self._list_codes[p][:self._list_sizes[p]]
+            keep = allowed[list_rows]
+            if not keep.all():
+                if not keep.any():
+                    continue
+                list_rows, codes = list_rows[keep], codes[keep]
+            row_blocks.append(list_rows)
+            score_blocks.append(self.centroids[p] @ query + table[columns, codes].sum(axis=1))
+
+        if not row_blocks:
+            return empty
+        rows = np.concatenate(row_blocks)
+        scores = np.concatenate(score_blocks)
+
+        if rows.size > shortlist:
+            top = np.argpartition(-scores, shortlist - 1)[:shortlist]
+            rows = rows[top]
+
+        # 원본 벡터로 정확한 재정렬
+        rows = np.sort(rows).astype(np.int64)
+        exact = self.store.vectors[rows] @ query
+        order = np.argsort(-exact, kind="stable")[:k]
+        return rows[order], exact[order]
+
+    def get_state(self) -> Optional[Dict[str, np.ndarray]]:
+        """스냅샷용 배열 (학습 전이면 None)"""
+        if not self.is_trained:
+            return None
+        return {
+            "centroids": self.centroids,
+            "codebooks": self.codebooks,
+            "list_sizes": self._list_sizes.copy(),
+            "list_radius": self._list_radius.copy(),
+            "rows": np.concatenate([self._list_rows[i][:self._list_sizes[i]] for i in range(self.nlist)]),
+            "codes": np.concatenate([self._list_codes[i][:self._list_sizes[i]] for i in range(self.nlist)])
+        }
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        """스냅샷 적용 - 코드를 다시 인코딩하지 않고 리스트를 그대로 복원"""
+        self.load_trained(state["centroids"], state["codebooks"])
+
+        sizes = np.asarray(state["list_sizes"], dtype=np.int64)
+        offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        rows = np.asarray(state["rows"], dtype=np.int32)
+        codes = np.asarray(state["codes"], dtype=np.uint8)
+
+        for i in range(self.nlist):
+            self._list_rows[i] = rows[offsets[i]:offsets[i + 1]].copy()
+            self._list_codes[i] = codes[offsets[i]:offsets[i + 1]].copy()
+        self._list_sizes = sizes.copy()
+        self._rows = set(rows.tolist())
+
+        if "list_radius" in state:
+            self._list_radius = np.array(state["list_radius"], dtype=np.float32)
+        else:
+            vectors = self.store.vectors
+            for i in range(self.nlist):
+                list_rows = self._list_rows[i]
+                if list_rows.size:
+                    self._list_radius[i] = np.linalg.norm(vectors[list_rows] - self.centroids[i], axis=1).max()
+
+    def range_candidates(self, query: np.ndarray, threshold: float, allowed: np.ndarray = None):
+        """
+        범위 검색 후보 - 유사도 상한 q·c + max||x - c|| 이 임계값 이상인 리스트의 행만 반환
+
+        Yields:
+            (리스트 번호, 행 번호 배열) - 상한이 높은 리스트부터
+        """
+        if allowed is None:
+            allowed = self.store.active
+
+        bounds = self.centroids @ np.asarray(query, dtype=np.float32) + self._list_radius
+        candidates = np.flatnonzero((bounds >= threshold) & (self._list_sizes > 0))
+        for list_id in candidates[np.argsort(-bounds[candidates], kind="stable")].tolist():
+            list_rows = self._list_rows[list_id][:self._list_sizes[list_id]]
+            yield list_id, list_rows[allowed[list_rows]].astype(np.int64)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """인덱스 통계"""
+        return {
+            "type": "ivfpq",
+            "trained": self.is_trained,
+            "vectors": len(self),
+            "nlist": self.nlist,
+            "m": self.m,
+            "nprobe": self.nprobe,
+            "rerank": self.rerank,
+            "code_bytes_per_face": self.m + 4,  # PQ 코드 + int32 행 번호
+            "non_empty_lists": int((self._list_sizes > 0).sum())
+        }
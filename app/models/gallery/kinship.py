@@ -0,0 +1,72 @@
+"""
+친족 검색 - 갤러리 ANN 후보를 가족 유사도로 재정렬
+
+가족 유사도(FamilySimilarityAnalyzer)는 랜드마크 기하 특징과 나이 보정이 들어가 임베딩 내적보다
+비싸므로, 인덱스로 임베딩 유사도 상위 shortlist 개만 뽑은 뒤 그 후보들에만 행렬 연산으로 계산합니다.
+가족 유사도의 70% 는 임베딩 유사도에서 오므로 임베딩 상위 후보 밖의 얼굴이 최종 상위에 들 가능성은 낮습니다.
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .store import EmbeddingStore, LANDMARK_POINTS
+from ..family_similarity import family_analyzer
+
+
+def landmarks_array(landmarks_list: List[Optional[List[List[float]]]]) -> np.ndarray:
+    """저장된 랜드마크 ([x, y] x 5 또는 None) 목록을 (N, 5, 2) 배열로 변환 (없으면 NaN)"""
+    points = np.full((len(landmarks_list), LANDMARK_POINTS, 2), np.nan)
+    for i, landmarks in enumerate(landmarks_list):
+        if landmarks:
+            points[i] = landmarks
+    return points
+
+
+def rank_relatives(query: np.ndarray, vectors: np.ndarray, candidates: List[Dict[str, Any]],
+                   landmarks=None, age: Optional[int] = None, top_k: int = 10,
+                   min_family_similarity: float = 0.0) -> List[Dict[str, Any]]:
+    """
+    후보를 가족 유사도 내림차순으로 정렬
+
+    Args:
+        query: 정규화된 질의 임베딩 (D,)
+        vectors: 후보 임베딩 (N, D) - candidates 와 같은 순서
+        candidates: 갤러리 검색 결과 항목 [{"id", "similarity", "metadata", "attributes"}]
+        landmarks: 질의 5점 랜드마크 (없으면 임베딩 유사도 기반 추정)
+        age: 질의 얼굴 나이 (없으면 나이 보정 없음)
+        top_k: 반환할 최대 결과 수
+        min_family_similarity: 최소 가족 유사도
+
+    Returns:
+        검색 결과 항목에 가족 유사도 분석 결과를 더한 목록
+    """
+    if not candidates:
+        return []
+
+    query_landmarks = EmbeddingStore.normalize_attributes({"landmarks": landmarks}).get("landmarks")
+    scores = family_analyzer.score_child_against_parents(
+        query,
+        landmarks_array([query_landmarks])[0],
+        vectors,
+        landmarks_array([c["attributes"].get("landmarks") for c in candidates]),
+        child_age=age,
+        parent_ages=[c["attributes"].get("age") for c in candidates]
+    )
+
+    family = scores["family_similarity"]
+    order = np.argsort(-family, kind="stable")[:top_k]
+
+    results = []
+    for i in order.tolist():
+        if family[i] < min_family_similarity:
+            break
+        breakdown = {f: float(values[i]) for f, values in scores["feature_breakdown"].items()}
+        results.append({
+            **candidates[i],
+            "family_similarity": float(family[i]),
+            "age_corrected_similarity": float(scores["age_corrected_similarity"][i]),
+            "confidence": float(scores["confidence"][i]),
+            "feature_breakdown": breakdown,
+            **family_analyzer.describe_similarity(float(family[i]), breakdown)
+        })
+    return results
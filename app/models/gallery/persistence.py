@@ -0,0 +1,289 @@
+"""
+갤러리 영속화 - 스냅샷과 WAL(write-ahead log)
+
+디렉토리 구조:
+    vectors.f32                 추가 전용 임베딩 행렬 (EmbeddingStore)
+    snapshots/<세대>/            스냅샷 (세대 번호가 가장 큰 것이 최신)
+        manifest.json           세대, 행 수, 차원, 인덱스 유형
+        records.json            행별 ID, 메타데이터, 필터 속성, 신원 템플릿/표본, 삭제된 행
+        index/<이름>.npy         인덱스 구조 배열 (np.load(mmap_mode="r") 로 매핑)
+    wal-<세대>.log              해당 세대 스냅샷 이후의 등록/삭제 기록 (JSON Lines)
+    gallery.lock                디렉토리 소유 프로세스의 배타 잠금 (GalleryLock)
+
+스냅샷에는 벡터를 복사하지 않습니다. 스냅샷의 벡터는 vectors.f32 의 앞 count 행이고, 이 파일은
+스냅샷 뒤에도 삭제(0으로 지움)와 템플릿 갱신으로 제자리에서 바뀝니다. 그래서 복원에는 스냅샷만이 아니라
+vectors.f32 와 그 세대 이후의 WAL 이 모두 필요합니다. 재시작 시 최신 스냅샷을 매핑하고 그 세대 이후의
+WAL 들을 순서대로 재생하면, 스냅샷 뒤에 바뀐 행은 모두 WAL 에 결과 값(등록 벡터, 갱신된 템플릿, 삭제)으로
+남아 있으므로 다시 같은 값으로 쓰입니다. 이전 스냅샷과 WAL 은 새 스냅샷이 디스크에 남은 뒤에만 지우므로
+압축 도중에 죽어도 이전 스냅샷과 남은 WAL 들로 복원됩니다.
+"""
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
+
+import numpy as np
+
+from ...core.logging import get_logger
+from ...utils.embedding_codec import encode_embedding, decode_embedding
+
+try:
+    import fcntl
+except ImportError:  # Windows - 잠금 없이 동작 (단일 프로세스 개발 환경)
+    fcntl = None
+
+logger = get_logger(__name__)
+
+SNAPSHOT_DIR = "snapshots"
+WAL_PREFIX = "wal-"
+WAL_SUFFIX = ".log"
+LOCK_FILE = "gallery.lock"
+
+
+class GalleryLockedError(RuntimeError):
+    """다른 프로세스가 같은 갤러리 디렉토리를 열어 둠"""
+
+
+class GalleryLock:
+    """
+    갤러리 디렉토리 배타 잠금 (flock)
+
+    WAL 과 vectors.f32 는 한 프로세스만 쓸 수 있으므로, gunicorn 워커 여러 개가 같은
+    디렉토리를 열면 두 번째부터는 기다리지 않고 GalleryLockedError 를 냅니다.
+    잠금은 프로세스가 죽으면 커널이 풀어 주므로 다음 소유자가 바로 열 수 있습니다.
+    """
+
+    def __init__(self, root: Path):
+        self.path = Path(root) / LOCK_FILE
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self):
+        if self._fd is not None or fcntl is None:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            owner = os.read(fd, 32).decode("ascii", "ignore").strip() or "?"
+            os.close(fd)
+            raise GalleryLockedError(
+                f"다른 프로세스(pid {owner})가 갤러리 디렉토리를 사용 중입니다: {self.path.parent}"
+            )
+
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode("ascii"))
+        self._fd = fd
+
+    def release(self):
+        if self._fd is None:
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+class GalleryWAL:
+    """
+    추가 전용 WAL
+
+    레코드 한 줄:
+        {"op": "enroll", "id", "vector", "metadata", "attributes", "weight"}
+        {"op": "sample", "id", "vector", "weight", "template", "norm", "samples", "previous"(선택)}
+        {"op": "delete", "id"}
+    벡터 필드는 base64 float32 로 기록하므로 재생 결과가 원본과 비트 단위로 같습니다.
+    """
+
+    VECTOR_FIELDS = ("vector", "template", "previous")
+
+    def __init__(self, path: Path, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        self.records = 0
+        self._file = None
+
+    def open(self):
+        """추가 모드로 열기"""
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def append(self, records: List[Dict[str, Any]]):
+        """레코드 기록 (한 번에 flush/fsync)"""
+        lines = []
+        for record in records:
+            record = dict(record)
+            for field in self.VECTOR_FIELDS:
+                if field in record:
+                    record[field] = encode_embedding(record[field], "base64_float32")["data"]
+            lines.append(json.dumps(record, ensure_ascii=False))
+
+        self._file.write("\n".join(lines) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.records += len(records)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def read(path: Path) -> Iterator[Dict[str, Any]]:
+        """레코드 읽기 (마지막 줄이 잘려 있으면 무시)"""
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.endswith("\n"):
+                    logger.warning(f"WAL 끝의 불완전한 레코드 무시: {path.name}:{line_no}")
+                    break
+                record = json.loads(line)
+                for field in GalleryWAL.VECTOR_FIELDS:
+                    if field in record:
+                        record[field] = decode_embedding({"format": "base64_float32", "data": record[field]})
+                yield record
+
+
+def wal_path(root: Path, generation: int) -> Path:
+    return root / f"{WAL_PREFIX}{generation:08d}{WAL_SUFFIX}"
+
+
+def list_wal_generations(root: Path) -> List[int]:
+    """존재하는 WAL 세대 번호 (오름차순)"""
+    generations = []
+    for path in root.glob(f"{WAL_PREFIX}*{WAL_SUFFIX}"):
+        try:
+            generations.append(int(path.name[len(WAL_PREFIX):-len(WAL_SUFFIX)]))
+        except ValueError:
+            continue
+    return sorted(generations)
+
+
+def _snapshot_generations(root: Path) -> List[int]:
+    snapshot_root = root / SNAPSHOT_DIR
+    if not snapshot_root.exists():
+        return []
+    return sorted(int(p.name) for p in snapshot_root.iterdir() if p.is_dir() and p.name.isdigit())
+
+
+def _fsync_file(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _fsync_dir(path: Path):
+    """디렉토리 항목(파일 생성, 이름 변경) 기록 - Windows 는 디렉토리를 열 수 없어 건너뜀"""
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_snapshot(root: Path, generation: int, dim: int, index_type: str,
+                   state: Dict[str, Any], index_state: Optional[Dict[str, np.ndarray]]) -> Path:
+    """
+    스냅샷 기록 - 임시 디렉토리에 쓴 뒤 이름을 바꿔 원자적으로 공개
+
+    모든 파일과 임시 디렉토리, 이름 변경 후의 상위 디렉토리까지 fsync 하므로 반환 뒤에는
+    이전 스냅샷과 WAL 을 지워도 됩니다.
+
+    Args:
+        state: EmbeddingStore.get_state() 결과
+        index_state: 인덱스의 get_state() 결과 (없으면 None)
+    """
+    snapshot_root = root / SNAPSHOT_DIR
+    snapshot_root.mkdir(parents=True, exist_ok=True)
+    final_dir = snapshot_root / f"{generation:08d}"
+    tmp_dir = snapshot_root / f"{generation:08d}.tmp"
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir()
+
+    with open(tmp_dir / "records.json", "w", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "ids": state["ids"],
+            "metadata": state["metadata"],
+            "attributes": state["attributes"],
+            "templates": state.get("templates", {}),
+            "exemplars": state.get("exemplars", {}),
+            "deleted": state["deleted"]
+        }, ensure_ascii=False))
+        _fsync_file(f)
+
+    if index_state:
+        index_dir = tmp_dir / "index"
+        index_dir.mkdir()
+        for name, array in index_state.items():
+            with open(index_dir / f"{name}.npy", "wb") as f:
+                np.save(f, np.asarray(array))
+                _fsync_file(f)
+        _fsync_dir(index_dir)
+
+    # manifest 를 마지막에 기록 - manifest 가 있으면 완전한 스냅샷
+    with open(tmp_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "generation": generation,
+            "count": state["count"],
+            "dim": dim,
+            "index_type": index_type if index_state else "flat",
+            "created_at": time.time()
+        }, f)
+        _fsync_file(f)
+    _fsync_dir(tmp_dir)
+
+    # 이름 변경까지 디스크에 남긴 뒤에야 호출자가 이전 세대를 지움
+    os.replace(tmp_dir, final_dir)
+    _fsync_dir(snapshot_root)
+    return final_dir
+
+
+def load_latest_snapshot(root: Path) -> Optional[Dict[str, Any]]:
+    """
+    최신 스냅샷 로드 (없으면 None, 읽을 수 없는 세대는 건너뛰고 이전 세대 사용)
+
+    Returns:
+        {"generation", "count", "dim", "index_type", "ids", "metadata", "attributes", "templates",
+         "exemplars", "deleted", "index_state"}
+    """
+    for generation in reversed(_snapshot_generations(root)):
+        snapshot_dir = root / SNAPSHOT_DIR / f"{generation:08d}"
+        manifest_path = snapshot_dir / "manifest.json"
+        if not manifest_path.exists():
+            continue
+
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            with open(snapshot_dir / "records.json", "r", encoding="utf-8") as f:
+                snapshot.update(json.load(f))
+
+            index_dir = snapshot_dir / "index"
+            snapshot["index_state"] = {
+                p.stem: np.load(p, mmap_mode="r") for p in sorted(index_dir.glob("*.npy"))
+            } if index_dir.exists() else None
+        except (OSError, ValueError) as e:
+            logger.error(f"읽을 수 없는 갤러리 스냅샷 건너뜀: 세대 {generation} ({e})")
+            continue
+        return snapshot
+
+    return None
+
+
+def remove_old_files(root: Path, generation: int):
+    """세대 이전의 스냅샷과 WAL, 중단된 압축이 남긴 임시 디렉토리 삭제"""
+    for old in _snapshot_generations(root):
+        if old < generation:
+            shutil.rmtree(root / SNAPSHOT_DIR / f"{old:08d}", ignore_errors=True)
+    for tmp_dir in (root / SNAPSHOT_DIR).glob("*.tmp"):
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    for old in list_wal_generations(root):
+        if old < generation:
+            wal_path(root, old).unlink(missing_ok=True)
@@ -0,0 +1,73 @@
+"""
+범위 검색 가지치기 - 블록 단위 유사도 상한
+
+정규화된 질의 q 와 블록 중심 c, 블록 반지름 r = max ||x - c|| 에 대해
+q·x = q·c + q·(x - c) <= q·c + r 이므로, q·c + r 이 임계값보다 작은 블록은 읽지 않아도 됩니다.
+같은 사람/테넌트의 얼굴이 연달아 등록된 갤러리일수록 반지름이 작아 많이 건너뜁니다.
+"""
+from typing import Tuple
+
+import numpy as np
+
+
+class BlockBounds:
+    """
+    저장소 행 블록별 중심/반지름 캐시
+
+    저장소는 뒤에 추가만 되므로 행 수가 바뀐 블록(보통 마지막 블록)만 다시 계산합니다.
+    삭제는 반지름을 줄이지 않지만 상한은 그대로 유효합니다.
+    행 벡터가 제자리에서 바뀌면(신원 템플릿 갱신) invalidate() 로 해당 블록을 다시 계산하게 합니다.
+    """
+
+    def __init__(self, store, block_size: int = 4096):
+        self.store = store
+        self.block_size = block_size
+        self._centroids = np.zeros((0, store.dim), dtype=np.float32)
+        self._radii = np.zeros(0, dtype=np.float32)
+        self._rows = np.zeros(0, dtype=np.int64)  # 계산 당시 블록의 행 수
+
+    def block_rows(self, block: int) -> Tuple[int, int]:
+        """블록의 [시작, 끝) 행 범위"""
+        start = block * self.block_size
+        return start, min(start + self.block_size, self.store.count)
+
+    def invalidate(self, row: int):
+        """행이 속한 블록을 다음 조회 때 다시 계산"""
+        block = row // self.block_size
+        if block < self._rows.shape[0]:
+            self._rows[block] = -1
+
+    def refresh(self) -> int:
+        """행 수가 바뀐 블록 갱신, 블록 수 반환"""
+        count = self.store.count
+        n_blocks = (count + self.block_size - 1) // self.block_size
+
+        if n_blocks > self._radii.shape[0]:
+            grow = n_blocks - self._radii.shape[0]
+            self._centroids = np.vstack([self._centroids, np.zeros((grow, self.store.dim), dtype=np.float32)])
+            self._radii = np.concatenate([self._radii, np.zeros(grow, dtype=np.float32)])
+            self._rows = np.concatenate([self._rows, np.zeros(grow, dtype=np.int64)])
+
+        vectors = self.store.vectors
+        active = self.store.active
+        for block in range(n_blocks):
+            start, end = self.block_rows(block)
+            if self._rows[block] == end - start:
+                continue
+
+            rows = vectors[start:end][active[start:end]]
+            if rows.shape[0] == 0:
+                self._centroids[block] = 0.0
+                self._radii[block] = -np.inf  # 활성 행이 없으면 항상 건너뜀
+            else:
+                centroid = rows.mean(axis=0)
+                self._centroids[block] = centroid
+                self._radii[block] = np.sqrt(np.max(np.einsum("ij,ij->i", rows - centroid, rows - centroid)))
+            self._rows[block] = end - start
+
+        return n_blocks
+
+    def upper_bounds(self, query: np.ndarray) -> np.ndarray:
+        """블록별 유사도 상한 (n_blocks,)"""
+        n_blocks = self.refresh()
+        return self._centroids[:n_blocks] @ query + self._radii[:n_blocks]
@@ -0,0 +1,626 @@
+"""
+샤딩 갤러리 - 로컬 샤드 프로세스 N개에 얼굴을 나눠 저장하고 검색은 scatter-gather
+
+각 샤드는 별도 프로세스에서 자기 디렉토리(<path>/shard-<번호>)의 FaceGallery 를 열고
+파이프로 받은 메서드 호출을 처리합니다. API 프로세스의 ShardedGallery 는 코디네이터로서
+다음을 담당합니다.
+
+- 등록: 해시(face_id) 또는 테넌트 분할로 샤드 하나에 보냄
+- 검색: 대상 샤드 전체에 동시에 보내고 샤드별 top-k 를 합쳐 전체 top-k 를 만듦
+- 장애: 시간 초과/오류 샤드는 결과에서 빼고 failed_shards 로 알림 (부분 결과),
+        죽은 샤드 프로세스만 다음 호출 때 다시 띄움 (스냅샷 + WAL 로 복원)
+
+메시지마다 요청 번호를 붙이므로, 시간 초과된 호출의 늦은 응답은 다음 호출이 받아서 버립니다.
+느린 샤드는 죽이지 않고 (재시작은 스냅샷 매핑과 WAL 재생이 필요해 더 느림), 앞선 호출을
+처리하는 동안에는 새 호출을 보내지 않고 시간 초과로 빼기만 합니다.
+
+테스트와 단일 서버 배포에서는 모든 샤드가 같은 머신에서 실행됩니다.
+"""
+import heapq
+import json
+import multiprocessing
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from ...core.logging import get_logger
+from .persistence import GalleryLock
+
+logger = get_logger(__name__)
+
+SHARDING_FILE = "sharding.json"
+PARTITIONS = ("hash", "tenant")
+
+# 호출 후 워커 쪽 값을 코디네이터로 돌려받는 출력 인자
+_OUT_PARAMS = ("outcomes", "stats")
+
+# 학습/중복 정리처럼 오래 걸리는 관리 작업의 샤드 호출 시간 초과 (초)
+MAINTENANCE_TIMEOUT = 3600.0
+
+
+def _shard_worker(conn, path: str, gallery_kwargs: Dict[str, Any]):
+    """샤드 프로세스 본체 - (요청 번호, 메서드, args, kwargs) 를 받아 FaceGallery 에 적용"""
+    from .gallery import FaceGallery
+
+    gallery = FaceGallery(path, **gallery_kwargs)
+    try:
+        conn.send(("ready", gallery.open()))
+    except Exception as e:
+        conn.send(("error", type(e).__name__, str(e)))
+        return
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        request_id, method, args, kwargs = message
+        try:
+            target = getattr(gallery, method)
+            result = target(*args, **kwargs) if callable(target) else target
+            conn.send((request_id, "ok", result, {name: kwargs[name] for name in _OUT_PARAMS if name in kwargs}))
+        except Exception as e:
+            conn.send((request_id, "error", type(e).__name__, str(e)))
+
+    gallery.close()
+
+
+class ShardUnavailableError(RuntimeError):
+    """샤드 프로세스가 응답하지 않음"""
+
+
+class ShardClient:
+    """샤드 프로세스 하나와의 연결 (호출은 한 번에 하나씩)"""
+
+    def __init__(self, shard_id: int, path: Path, gallery_kwargs: Dict[str, Any], timeout: float,
+                 start_timeout: float = 60.0):
+        self.shard_id = shard_id
+        self.path = path
+        self.gallery_kwargs = gallery_kwargs
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._next_request = 0
+        # 시간 초과로 아직 응답을 받지 못한 요청 번호 (샤드가 처리 중)
+        self._pending: Optional[int] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        """샤드 프로세스 시작 후 갤러리가 열릴 때까지 대기"""
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_shard_worker,
+            args=(child_conn, str(self.path), self.gallery_kwargs),
+            name=f"gallery-shard-{self.shard_id}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+
+        if not parent_conn.poll(self.start_timeout):
+            process.kill()
+            raise ShardUnavailableError(f"샤드 {self.shard_id} 시작 시간 초과")
+        status, *payload = parent_conn.recv()
+        if status != "ready":
+            process.join(timeout=1.0)
+            raise ShardUnavailableError(f"샤드 {self.shard_id} 시작 실패: {payload[-1]}")
+
+        self.process = process
+        self.conn = parent_conn
+        self._pending = None
+        logger.info(f"갤러리 샤드 {self.shard_id} 시작: {payload[0]['size']}개 얼굴")
+
+    def _kill(self):
+        """죽었거나 연결이 끊긴 샤드 정리 (다음 호출 때 재시작)"""
+        if self.process is not None:
+            self.process.kill()
+            self.process.join(timeout=1.0)
+        if self.conn is not None:
+            self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def _receive(self, request_id: int, deadline: float) -> Optional[Tuple]:
+        """요청 번호의 응답 (status, *payload) - 이전 요청의 응답은 버리고, 기한까지 없으면 None"""
+        while self.conn.poll(max(deadline - time.monotonic(), 0.0)):
+            reply_id, *reply = self.conn.recv()
+            if reply_id == request_id:
+                return tuple(reply)
+            logger.debug(f"갤러리 샤드 {self.shard_id} 의 늦은 응답 버림: 요청 {reply_id}")
+        return None
+
+    def call(self, method: str, *args, timeout: Optional[float] = None, **kwargs):
+        """샤드 갤러리 메서드 호출 (죽어 있으면 재시작 후 호출, 느린 샤드는 죽이지 않음)"""
+        with self._lock:
+            if not self.alive:
+                if self.process is not None:
+                    logger.warning(f"갤러리 샤드 {self.shard_id} 재시작")
+                    self._kill()
+                    self.restarts += 1
+                self.start()
+
+            deadline = time.monotonic() + (timeout or self.timeout)
+            try:
+                # 앞선 호출의 늦은 응답을 먼저 받아 버림 - 아직 처리 중이면 쌓지 않고 실패
+                if self._pending is not None:
+                    if self._receive(self._pending, deadline) is None:
+                        raise ShardUnavailableError(f"샤드 {self.shard_id} 가 앞선 호출을 처리 중 ({method})")
+                    self._pending = None
+
+                self._next_request += 1
+                self.conn.send((self._next_request, method, args, kwargs))
+                self._pending = self._next_request
+                reply = self._receive(self._pending, deadline)
+                if reply is None:
+                    raise ShardUnavailableError(f"샤드 {self.shard_id} 응답 시간 초과 ({method})")
+                self._pending = None
+                status, *payload = reply
+            except (EOFError, OSError, BrokenPipeError) as e:
+                self._kill()
+                raise ShardUnavailableError(f"샤드 {self.shard_id} 연결 끊김 ({method}): {e}")
+
+        if status == "error":
+            error_type, message = payload
+            if error_type == "ValueError":
+                raise ValueError(message)
+            raise RuntimeError(f"샤드 {self.shard_id} 오류 ({error_type}): {message}")
+
+        result, out_params = payload
+        for name, value in out_params.items():
+            target = kwargs[name]
+            if isinstance(target, list):
+                target[:] = value
+            else:
+                target.update(value)
+        return result
+
+    def stop(self, timeout: float = 30.0):
+        """샤드 종료 (갤러리 최종 스냅샷 기록 후)"""
+        with self._lock:
+            if self.alive:
+                try:
+                    self.conn.send(None)
+                    self.process.join(timeout=timeout)
+                except (OSError, BrokenPipeError):
+                    pass
+            self._kill()
+
+
+class ShardedGallery:
+    """
+    FaceGallery 와 같은 인터페이스의 샤딩 코디네이터
+
+    Args:
+        path: 샤드 디렉토리의 상위 경로
+        num_shards: 샤드 프로세스 수
+        partition: "hash" (face_id 해시) 또는 "tenant" (테넌트 해시, 테넌트가 없으면 face_id)
+        shard_timeout: 샤드 호출 시간 초과 (초) - 넘으면 그 샤드는 부분 결과에서 빠짐
+        gallery_kwargs: 샤드마다 FaceGallery 에 전달할 인자 (dim, index_type 등)
+
+    테넌트 분할에서 테넌트 필터 검색은 해당 테넌트 샤드에만 보냅니다.
+    등록 중복 억제는 해시 분할이면 모든 샤드에 LSH 검사를 보내 전체 갤러리에서 찾고, 중복 항목은
+    대상 얼굴이 있는 샤드로 보내 합칩니다. 테넌트 분할이면 그 테넌트의 샤드 안에서만 찾습니다
+    (다른 테넌트 얼굴에 합치지 않음). 일괄 중복 정리(dedupe)는 샤드 안에서만 이뤄집니다.
+    """
+
+    def __init__(self, path: str, num_shards: int, partition: str = "hash", shard_timeout: float = 10.0,
+                 **gallery_kwargs):
+        if num_shards < 1:
+            raise ValueError("샤드 수는 1 이상이어야 합니다")
+        if partition not in PARTITIONS:
+            raise ValueError(f"지원하지 않는 샤드 분할 방식입니다: {partition}")
+
+        self.path = Path(path)
+        self.num_shards = num_shards
+        self.partition = partition
+        self.shard_timeout = shard_timeout
+        self.index_type = gallery_kwargs.get("index_type", "flat")
+        self.dedupe_threshold = gallery_kwargs.get("dedupe_threshold", 0.0)
+        self.shards = [
+            ShardClient(i, self.path / f"shard-{i:02d}", gallery_kwargs, shard_timeout)
+            for i in range(num_shards)
+        ]
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._opened = False
+        self._open_lock = threading.Lock()
+        self._dir_lock = GalleryLock(self.path)
+
+    def _check_layout(self):
+        """기존 샤드 구성과 다르면 거부 (다시 나누려면 재색인 필요)"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        layout_path = self.path / SHARDING_FILE
+        layout = {"num_shards": self.num_shards, "partition": self.partition}
+        if layout_path.exists():
+            with open(layout_path, "r", encoding="utf-8") as f:
+                existing = json.load(f)
+            if existing != layout:
+                raise ValueError(f"기존 샤드 구성({existing})과 설정({layout})이 다릅니다")
+        else:
+            with open(layout_path, "w", encoding="utf-8") as f:
+                json.dump(layout, f)
+
+    def open(self) -> Dict[str, Any]:
+        """
+        모든 샤드 프로세스를 동시에 시작
+
+        상위 디렉토리를 먼저 잠그므로, 다른 워커가 이미 샤드들을 띄웠으면 샤드 프로세스를
+        만들지 않고 바로 GalleryLockedError 를 냅니다.
+        """
+        with self._open_lock:
+            if self._opened:
+                return {"shards": self.num_shards, "size": self.size, "elapsed_seconds": 0.0}
+
+            start_time = time.time()
+            self._dir_lock.acquire()
+            self._check_layout()
+            self._executor = ThreadPoolExecutor(max_workers=self.num_shards, thread_name_prefix="gallery-shard")
+            for future in [self._executor.submit(shard.start) for shard in self.shards]:
+                future.result()
+            self._opened = True
+
+        elapsed = time.time() - start_time
+        size = self.size
+        logger.info(f"샤딩 갤러리 시작: 샤드 {self.num_shards}개, {size}개 얼굴 ({elapsed:.2f}초)")
+        return {"shards": self.num_shards, "size": size, "elapsed_seconds": elapsed}
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened
+
+    def _ensure_open(self):
+        if not self._opened:
+            self.open()
+
+    def close(self):
+        """모든 샤드 종료"""
+        with self._open_lock:
+            if not self._opened:
+                return
+            for future in [self._executor.submit(shard.stop) for shard in self.shards]:
+                future.result()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._opened = False
+            self._dir_lock.release()
+
+    # 분할
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        """프로세스와 무관하게 안정적인 해시 (내장 hash 는 실행마다 달라짐)"""
+        return zlib.crc32(key.encode("utf-8"))
+
+    def shard_for(self, face_id: str, attributes: Optional[Dict[str, Any]] = None) -> int:
+        """얼굴이 저장될 샤드 번호"""
+        tenant = (attributes or {}).get("tenant")
+        if self.partition == "tenant" and tenant is not None:
+            return self._hash(f"tenant:{tenant}") % self.num_shards
+        return self._hash(face_id) % self.num_shards
+
+    def _target_shards(self, filters: Optional[Dict[str, Any]] = None) -> List[int]:
+        """검색 대상 샤드 - 테넌트 분할의 테넌트 필터는 해당 샤드만"""
+        tenant = (filters or {}).get("tenant")
+        if self.partition == "tenant" and tenant is not None:
+            tenants = [tenant] if isinstance(tenant, str) else list(tenant)
+            return sorted({self._hash(f"tenant:{t}") % self.num_shards for t in tenants})
+        return list(range(self.num_shards))
+
+    # scatter-gather
+
+    def _scatter(self, method: str, *args, shards: Optional[List[int]] = None,
+                 shard_kwargs: Optional[Dict[int, Dict[str, Any]]] = None, **kwargs) -> Tuple[Dict[int, Any], List[int]]:
+        """
+        샤드들에 동시에 호출
+
+        Returns:
+            ({샤드 번호: 결과}, 실패한 샤드 번호 목록) - ValueError 는 그대로 전파
+        """
+        self._ensure_open()
+        shards = list(range(self.num_shards)) if shards is None else shards
+        futures = {
+            self._executor.submit(
+                self.shards[i].call, method, *args, **{**kwargs, **(shard_kwargs or {}).get(i, {})}
+            ): i
+            for i in shards
+        }
+
+        results, failed = {}, []
+        for future in as_completed(futures):
+            shard_id = futures[future]
+            try:
+                results[shard_id] = future.result()
+            except ValueError:
+                raise
+            except Exception as e:
+                logger.warning(f"갤러리 샤드 {shard_id} 호출 실패 ({method}): {e}")
+                failed.append(shard_id)
+        return results, sorted(failed)
+
+    def _locate(self, face_id: str) -> Optional[int]:
+        """얼굴이 있는 샤드 (해시 분할은 계산, 테넌트 분할은 조회)"""
+        if self.partition == "hash":
+            return self.shard_for(face_id)
+        results, _ = self._scatter("get", face_id)
+        for shard_id, face in results.items():
+            if face is not None:
+                return shard_id
+        return None
+
+    # FaceGallery 인터페이스
+
+    @property
+    def size(self) -> int:
+        results, _ = self._scatter("size")
+        return int(sum(results.values()))
+
+    def enroll(self, embedding, face_id: Optional[str] = None, metadata: Dict[str, Any] = None,
+               attributes: Dict[str, Any] = None, quality: float = 1.0, dedupe: bool = True,
+               outcomes: Optional[List[Dict[str, Any]]] = None) -> str:
+        """얼굴 등록 (담당 샤드 하나에 기록)"""
+        return self.enroll_many(
+            [embedding], [face_id] if face_id else None, [metadata], [attributes], [quality],
+            dedupe=dedupe, outcomes=outcomes
+        )[0]
+
+    def enroll_many(self, embeddings, face_ids: Optional[List[str]] = None,
+                    metadata: Optional[List[Dict[str, Any]]] = None,
+                    attributes: Optional[List[Dict[str, Any]]] = None,
+                    qualities: Optional[List[float]] = None, dedupe: bool = True,
+                    outcomes: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        """
+        일괄 등록 - 샤드별로 나눠 동시에 기록
+
+        쓰기는 부분 성공을 허용하지 않으므로 실패한 샤드가 있으면 ShardUnavailableError 를 냅니다
+        (그 전에 성공한 샤드의 등록은 유지됨).
+        """
+        count = len(embeddings)
+        face_ids = list(face_ids) if face_ids else [str(uuid.uuid4()) for _ in range(count)]
+        metadata = list(metadata) if metadata else [None] * count
+        attributes = list(attributes) if attributes else [None] * count
+        qualities = list(qualities) if qualities else [1.0] * count
+        if not len(face_ids) == len(metadata) == len(attributes) == len(qualities) == count:
+            raise ValueError("임베딩, ID, 메타데이터, 속성, 품질 수가 일치하지 않습니다")
+
+        homes = [self.shard_for(face_id, attrs) for face_id, attrs in zip(face_ids, attributes)]
+        duplicates = None
+        if dedupe and self.dedupe_threshold > 0 and self.partition == "hash" and self.num_shards > 1 and count:
+            duplicates = self._find_duplicates(face_ids, embeddings, homes)
+
+        # 중복 항목은 대상 얼굴이 있는 샤드에서 합침
+        groups: Dict[int, List[int]] = {}
+        for i, home in enumerate(homes):
+            shard_id = duplicates[i][2] if duplicates and duplicates[i] else home
+            groups.setdefault(shard_id, []).append(i)
+
+        shard_kwargs = {
+            shard_id: {
+                "embeddings": [np.asarray(embeddings[i], dtype=np.float32) for i in items],
+                "face_ids": [face_ids[i] for i in items],
+                "metadata": [metadata[i] for i in items],
+                "attributes": [attributes[i] for i in items],
+                "qualities": [qualities[i] for i in items],
+                "outcomes": [],
+                **({"duplicates": [duplicates[i] and duplicates[i][:2] for i in items]} if duplicates else {})
+            }
+            for shard_id, items in groups.items()
+        }
+        results, failed = self._scatter(
+            "enroll_many", shards=sorted(groups), shard_kwargs=shard_kwargs, dedupe=dedupe
+        )
+        if failed:
+            raise ShardUnavailableError(f"샤드 {failed} 에 등록하지 못했습니다")
+
+        result_ids: List[Optional[str]] = [None] * count
+        item_outcomes: List[Optional[Dict[str, Any]]] = [None] * count
+        for shard_id, items in groups.items():
+            for position, i in enumerate(items):
+                result_ids[i] = results[shard_id][position]
+                item_outcomes[i] = shard_kwargs[shard_id]["outcomes"][position]
+
+        if outcomes is not None:
+            outcomes[:] = item_outcomes
+        return result_ids
+
+    def _find_duplicates(self, face_ids: List[str], embeddings,
+                         homes: List[int]) -> List[Optional[Tuple[str, float, int]]]:
+        """
+        항목별 중복 대상 (ID, 유사도, 샤드) 또는 None - 해시 분할 등록용
+
+        모든 샤드에 LSH 검사를 보내 가장 가까운 기존 얼굴을 고르고, 기존 얼굴이 없으면
+        같은 요청의 앞선 (중복이 아닌) 항목과 비교합니다. 샤드 하나라도 답하지 못하면 등록하지 않습니다.
+        """
+        vectors = np.stack([np.asarray(e, dtype=np.float32) for e in embeddings])
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        results, failed = self._scatter("find_duplicates", vectors, self.dedupe_threshold)
+        if failed:
+            raise ShardUnavailableError(f"샤드 {failed} 에서 중복을 확인하지 못했습니다")
+
+        batch_scores = vectors @ vectors.T
+        duplicates = []
+        for i in range(len(face_ids)):
+            found = [(matches[i][1], matches[i][0], shard_id) for shard_id, matches in results.items()
+                     if matches[i] is not None]
+            best = None
+            if found:
+                similarity, target, shard_id = max(found)
+                best = (target, similarity, shard_id)
+            else:
+                earlier = [j for j in range(i) if duplicates[j] is None
+                           and batch_scores[i, j] >= self.dedupe_threshold]
+                if earlier:
+                    j = max(earlier, key=lambda j: batch_scores[i, j])
+                    best = (face_ids[j], min(float(batch_scores[i, j]), 1.0), homes[j])
+            duplicates.append(best)
+        return duplicates
+
+    def add_samples(self, face_id: str, embeddings, qualities: Optional[List[float]] = None) -> Dict[str, Any]:
+        """등록된 신원의 템플릿 갱신 (얼굴이 있는 샤드에서)"""
+        shard_id = self._locate(face_id)
+        if shard_id is None:
+            raise ValueError(f"갤러리에 등록되지 않은 ID입니다: {face_id}")
+        return self.shards[shard_id].call("add_samples", face_id, embeddings, qualities)
+
+    def delete(self, face_id: str) -> bool:
+        shard_id = self._locate(face_id)
+        if shard_id is None:
+            return False
+        return self.shards[shard_id].call("delete", face_id)
+
+    def get(self, face_id: str) -> Optional[Dict[str, Any]]:
+        shard_id = self._locate(face_id)
+        if shard_id is None:
+            return None
+        return self.shards[shard_id].call("get", face_id)
+
+    def search(self, embedding, top_k: int = 10, threshold: float = -1.0, exact: bool = False,
+               ef_search: int = None, nprobe: int = None, filters: Dict[str, Any] = None,
+               use_exemplars: bool = True, stats: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """
+        scatter-gather 검색 - 샤드별 top-k 를 합쳐 전체 top-k
+
+        Args:
+            stats: 전달하면 {"candidates", "shards", "failed_shards"} 로 채움 (실패 샤드가 있으면 부분 결과)
+        """
+        shards = self._target_shards(filters)
+        results, failed = self._scatter(
+            "search", np.asarray(embedding, dtype=np.float32), top_k=top_k, threshold=threshold, exact=exact,
+            ef_search=ef_search, nprobe=nprobe, filters=filters, use_exemplars=use_exemplars, shards=shards
+        )
+        merged = heapq.nlargest(top_k, (m for matches in results.values() for m in matches),
+                                key=lambda match: match["similarity"])
+
+        if stats is not None:
+            stats.update({
+                "candidates": sum(len(matches) for matches in results.values()),
+                "shards": len(shards),
+                "failed_shards": failed
+            })
+        return merged
+
+    def kinship_search(self, embedding, landmarks=None, age: Optional[int] = None, top_k: int = 10,
+                       shortlist: int = 100, min_family_similarity: float = 0.0,
+                       filters: Dict[str, Any] = None, exclude_ids: Optional[List[str]] = None,
+                       ef_search: int = None, nprobe: int = None,
+                       stats: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """
+        친족 검색 - 샤드마다 shortlist 후보를 가족 유사도로 재정렬한 top-k 를 합침
+
+        Args:
+            stats: 전달하면 {"candidates", "shards", "failed_shards"} 로 채움
+        """
+        shards = self._target_shards(filters)
+        shard_stats = {i: {} for i in shards}
+        results, failed = self._scatter(
+            "kinship_search", np.asarray(embedding, dtype=np.float32), landmarks=landmarks, age=age,
+            top_k=top_k, shortlist=shortlist, min_family_similarity=min_family_similarity, filters=filters,
+            exclude_ids=exclude_ids, ef_search=ef_search, nprobe=nprobe, shards=shards,
+            shard_kwargs={i: {"stats": shard_stats[i]} for i in shards}
+        )
+        merged = heapq.nlargest(top_k, (m for matches in results.values() for m in matches),
+                                key=lambda match: match["family_similarity"])
+
+        if stats is not None:
+            stats.update({
+                "candidates": sum(shard_stats[i].get("candidates", 0) for i in results),
+                "shards": len(shards),
+                "failed_shards": failed
+            })
+        return merged
+
+    def range_search(self, embedding, threshold: float, filters: Dict[str, Any] = None,
+                     max_results: Optional[int] = None) -> Dict[str, Any]:
+        """샤드별 범위 검색 결과 병합"""
+        stats = {}
+        matches = []
+        for block in self.iter_range_search(embedding, threshold, filters=filters, stats=stats):
+            matches.extend(block)
+
+        matches.sort(key=lambda match: -match["similarity"])
+        total = len(matches)
+        if max_results is not None:
+            matches = matches[:max_results]
+
+        return {"matches": matches, "total_matches": total, "truncated": len(matches) < total, "stats": stats}
+
+    def iter_range_search(self, embedding, threshold: float, filters: Dict[str, Any] = None,
+                          stats: Dict[str, Any] = None) -> Iterator[List[Dict[str, Any]]]:
+        """샤드별 범위 검색 결과를 끝나는 순서대로 생성 (stats 에 샤드 통계 합계와 failed_shards)"""
+        self._ensure_open()
+        if stats is None:
+            stats = {}
+        shards = self._target_shards(filters)
+        stats.update({"total_blocks": 0, "candidate_blocks": 0, "scanned_rows": 0, "matches": 0,
+                      "shards": len(shards), "failed_shards": []})
+        query = np.asarray(embedding, dtype=np.float32)
+
+        futures = {
+            self._executor.submit(self.shards[i].call, "range_search", query, threshold, filters=filters): i
+            for i in shards
+        }
+        return self._gather_range_blocks(futures, stats)
+
+    def _gather_range_blocks(self, futures, stats: Dict[str, Any]) -> Iterator[List[Dict[str, Any]]]:
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except ValueError:
+                raise
+            except Exception as e:
+                logger.warning(f"갤러리 샤드 {futures[future]} 범위 검색 실패: {e}")
+                stats["failed_shards"].append(futures[future])
+                continue
+
+            for key in ("total_blocks", "candidate_blocks", "scanned_rows"):
+                stats[key] += result["stats"].get(key, 0)
+            stats["matches"] += result["total_matches"]
+            if result["matches"]:
+                yield result["matches"]
+
+    def dedupe(self, threshold: Optional[float] = None, action: str = "merge", dry_run: bool = False,
+               max_pairs: int = 1000) -> Dict[str, Any]:
+        """샤드별 일괄 중복 정리 (샤드 사이의 중복은 찾지 않음)"""
+        results, failed = self._scatter("dedupe", threshold, action, dry_run, max_pairs,
+                                        timeout=MAINTENANCE_TIMEOUT)
+        if failed:
+            raise ShardUnavailableError(f"샤드 {failed} 에서 중복 정리를 하지 못했습니다")
+        return {
+            "scanned": sum(r["scanned"] for r in results.values()),
+            "duplicates": sum(r["duplicates"] for r in results.values()),
+            "applied": sum(r["applied"] for r in results.values()),
+            "pairs": [p for shard_id in sorted(results) for p in results[shard_id]["pairs"]][:max_pairs]
+        }
+
+    def train_index(self, sample_size: Optional[int] = None, seed: int = 0) -> Dict[str, Any]:
+        """샤드별 인덱스 학습 (sample_size 는 샤드마다 적용)"""
+        results, failed = self._scatter("train_index", sample_size, seed, timeout=MAINTENANCE_TIMEOUT)
+        if failed:
+            raise ShardUnavailableError(f"샤드 {failed} 에서 인덱스를 학습하지 못했습니다")
+        return {"shards": [results[i] for i in sorted(results)]}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """샤드별 통계와 합계"""
+        results, failed = self._scatter("get_stats")
+        return {
+            "size": sum(r["size"] for r in results.values()),
+            "num_shards": self.num_shards,
+            "partition": self.partition,
+            "failed_shards": failed,
+            "restarts": sum(shard.restarts for shard in self.shards),
+            "shards": {str(i): results[i] for i in sorted(results)}
+        }
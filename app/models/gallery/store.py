@@ -0,0 +1,330 @@
+"""
+갤러리 임베딩 저장소 - 메모리 매핑된 연속 float32 행렬
+"""
+import os
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from ...core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 필터용 성별 코드 (-1 은 알 수 없음)
+GENDER_CODES = {"female": 0, "male": 1}
+
+# 랜드마크 점 수 (왼쪽 눈, 오른쪽 눈, 코, 왼쪽/오른쪽 입꼬리)
+LANDMARK_POINTS = 5
+
+
+class EmbeddingStore:
+    """
+    정규화된 임베딩을 (capacity, dim) float32 memmap 파일(vectors.f32)에 행 단위로 저장
+
+    행은 뒤에 추가만 되고 다시 쓰이지 않으므로(삭제 시 0으로 지우기와 템플릿 갱신 제외),
+    스냅샷은 앞 count 행을 그대로 가리킬 수 있습니다.
+    ID, 메타데이터, 삭제 표시는 메모리에 두고 스냅샷/WAL 로 영속화합니다.
+
+    필터 검색용 속성(나이, 성별, 테넌트)은 행 번호로 접근하는 열 배열로도 유지하므로
+    필터 조건은 스캔/그래프 탐색 전에 bool 마스크 하나로 계산됩니다.
+
+    신원 템플릿(templates 모듈)은 행 벡터를 제자리에서 갱신하며, 가중 합의 크기와
+    표본 수는 열 배열로 둡니다. 갱신은 WAL 에 결과값으로 기록되므로 다시 재생해도 같습니다.
+    """
+
+    VECTORS_FILE = "vectors.f32"
+
+    def __init__(self, path: str, dim: int = 512, initial_capacity: int = 1024):
+        self.path = Path(path)
+        self.dim = dim
+        self.initial_capacity = initial_capacity
+
+        self.count = 0
+        self.capacity = 0
+        self.ids: List[str] = []
+        self.metadata: Dict[str, Dict[str, Any]] = {}
+        self.attributes: Dict[str, Dict[str, Any]] = {}
+        self.row_of: Dict[str, int] = {}
+        self.tenant_codes: Dict[str, int] = {}
+
+        self._vectors: Optional[np.memmap] = None
+        self._active: np.ndarray = np.zeros(0, dtype=bool)
+        self._age = np.zeros(0, dtype=np.int16)
+        self._gender = np.zeros(0, dtype=np.int8)
+        self._tenant = np.zeros(0, dtype=np.int32)
+        self._template_norm = np.zeros(0, dtype=np.float32)
+        self._sample_count = np.zeros(0, dtype=np.int32)
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.path / self.VECTORS_FILE
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """유효한 행 (count, dim) - 삭제된 행 포함"""
+        if self._vectors is None:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        # memmap 서브클래스의 인덱싱 오버헤드를 피하기 위해 일반 ndarray 뷰로 반환
+        return self._vectors[:self.count].view(np.ndarray)
+
+    @property
+    def active(self) -> np.ndarray:
+        """행별 활성 여부 (count,)"""
+        return self._active[:self.count]
+
+    @property
+    def template_norms(self) -> np.ndarray:
+        """행별 템플릿 가중 합 크기 (count,)"""
+        return self._template_norm[:self.count]
+
+    @property
+    def size(self) -> int:
+        """활성 얼굴 수"""
+        return len(self.row_of)
+
+    def open(self):
+        """vectors 파일 매핑 (없으면 생성), 상태는 비어 있는 채로 시작"""
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        file_rows = 0
+        if self.vectors_path.exists():
+            file_rows = self.vectors_path.stat().st_size // (self.dim * 4)
+
+        self.capacity = max(file_rows, self.initial_capacity)
+        self._map(self.capacity)
+        self._active = np.zeros(self.capacity, dtype=bool)
+        self._age = np.full(self.capacity, -1, dtype=np.int16)
+        self._gender = np.full(self.capacity, -1, dtype=np.int8)
+        self._tenant = np.full(self.capacity, -1, dtype=np.int32)
+        self._template_norm = np.ones(self.capacity, dtype=np.float32)
+        self._sample_count = np.ones(self.capacity, dtype=np.int32)
+        self.count = 0
+        self.ids = []
+        self.metadata = {}
+        self.attributes = {}
+        self.row_of = {}
+        self.tenant_codes = {}
+
+    def restore(self, count: int, ids: List[str], metadata: Dict[str, Dict[str, Any]], deleted: List[int],
+                attributes: Optional[Dict[str, Dict[str, Any]]] = None,
+                templates: Optional[Dict[str, List[float]]] = None):
+        """스냅샷 상태 적용 (vectors 파일의 앞 count 행 사용)"""
+        if count > self.capacity:
+            raise ValueError(f"스냅샷 행 수({count})가 vectors 파일 크기({self.capacity})보다 큽니다")
+
+        self.count = count
+        self.ids = list(ids)
+        self.metadata = dict(metadata)
+        self._active[:] = False
+        self._active[:count] = True
+        if deleted:
+            self._active[np.asarray(deleted, dtype=np.int64)] = False
+
+        self.row_of = {
+            face_id: row for row, face_id in enumerate(self.ids) if self._active[row]
+        }
+
+        self.attributes = {}
+        for face_id, attrs in (attributes or {}).items():
+            if face_id in self.row_of:
+                self._set_attributes(self.row_of[face_id], face_id, attrs)
+
+        for face_id, (norm, samples) in (templates or {}).items():
+            if face_id in self.row_of:
+                self._template_norm[self.row_of[face_id]] = norm
+                self._sample_count[self.row_of[face_id]] = samples
+
+    def get_state(self) -> Dict[str, Any]:
+        """스냅샷용 상태 복사본 (templates 는 표본이 2개 이상인 신원만)"""
+        merged = np.flatnonzero(self.active & (self._sample_count[:self.count] > 1))
+        return {
+            "count": self.count,
+            "ids": list(self.ids),
+            "metadata": dict(self.metadata),
+            "attributes": dict(self.attributes),
+            "templates": {
+                self.ids[row]: [float(self._template_norm[row]), int(self._sample_count[row])]
+                for row in merged.tolist()
+            },
+            "deleted": np.flatnonzero(~self.active).tolist()
+        }
+
+    def template_info(self, row: int) -> Dict[str, Any]:
+        """템플릿 가중 합 크기와 표본 수"""
+        return {"norm": float(self._template_norm[row]), "samples": int(self._sample_count[row])}
+
+    def set_template(self, row: int, vector: np.ndarray, norm: float, samples: int):
+        """행 벡터를 새 템플릿으로 교체"""
+        self._vectors[row] = vector
+        self._template_norm[row] = norm
+        self._sample_count[row] = samples
+
+    @staticmethod
+    def normalize_attributes(attributes: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        필터 속성 정리 (age: int, gender: male/female, tenant: str, 없으면 None)
+
+        landmarks 는 주어진 경우에만 [[x, y]] x 5 로 정리해 포함합니다
+        ({"x", "y"} 목록과 [x, y] 목록 모두 허용, 5점 미만이면 제외).
+        """
+        attributes = attributes or {}
+        age = attributes.get("age")
+        gender = attributes.get("gender")
+        tenant = attributes.get("tenant")
+
+        if gender is not None:
+            gender = str(gender).lower()
+            if gender not in GENDER_CODES:
+                raise ValueError(f"지원하지 않는 성별 값입니다: {gender}")
+
+        normalized = {
+            "age": int(age) if age is not None else None,
+            "gender": gender,
+            "tenant": str(tenant) if tenant is not None else None
+        }
+
+        landmarks = attributes.get("landmarks")
+        if landmarks is not None and len(landmarks) >= LANDMARK_POINTS:
+            try:
+                normalized["landmarks"] = [
+                    [float(p["x"]), float(p["y"])] if isinstance(p, dict) else [float(p[0]), float(p[1])]
+                    for p in landmarks[:LANDMARK_POINTS]
+                ]
+            except (KeyError, IndexError, TypeError, ValueError):
+                raise ValueError("랜드마크는 [x, y] 또는 {\"x\", \"y\"} 5점 목록이어야 합니다")
+
+        return normalized
+
+    def _set_attributes(self, row: int, face_id: str, attributes: Optional[Dict[str, Any]]):
+        """속성 사전과 열 배열 갱신"""
+        attributes = self.normalize_attributes(attributes)
+        self.attributes[face_id] = attributes
+
+        self._age[row] = attributes["age"] if attributes["age"] is not None else -1
+        self._gender[row] = GENDER_CODES.get(attributes["gender"], -1)
+        if attributes["tenant"] is None:
+            self._tenant[row] = -1
+        else:
+            self._tenant[row] = self.tenant_codes.setdefault(attributes["tenant"], len(self.tenant_codes))
+
+    def filter_mask(self, filters: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """
+        필터 조건을 만족하는 활성 행 마스크 (count,)
+
+        Args:
+            filters: {"tenant": str 또는 목록, "gender": "male"/"female", "age_min", "age_max"}
+                     (나이 조건이 있으면 나이를 모르는 얼굴은 제외)
+        """
+        mask = self.active.copy()
+        if not filters:
+            return mask
+
+        tenant = filters.get("tenant")
+        if tenant is not None:
+            tenants = [tenant] if isinstance(tenant, str) else list(tenant)
+            codes = [self.tenant_codes[t] for t in tenants if t in self.tenant_codes]
+            mask &= np.isin(self._tenant[:self.count], codes)
+
+        gender = filters.get("gender")
+        if gender is not None:
+            code = GENDER_CODES.get(str(gender).lower())
+            if code is None:
+                raise ValueError(f"지원하지 않는 성별 값입니다: {gender}")
+            mask &= self._gender[:self.count] == code
+
+        age_min = filters.get("age_min")
+        age_max = filters.get("age_max")
+        if age_min is not None or age_max is not None:
+            ages = self._age[:self.count]
+            mask &= ages >= 0
+            if age_min is not None:
+                mask &= ages >= age_min
+            if age_max is not None:
+                mask &= ages <= age_max
+
+        return mask
+
+    def _map(self, capacity: int):
+        """vectors 파일을 capacity 행 크기로 맞추고 memmap 생성"""
+        required = capacity * self.dim * 4
+        mode = "r+b" if self.vectors_path.exists() else "w+b"
+        with open(self.vectors_path, mode) as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < required:
+                f.truncate(required)
+
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _grow(self, required: int):
+        """용량 확장 (파일 크기만 늘리고 기존 행은 그대로)"""
+        new_capacity = max(required, self.capacity * 2)
+        self._map(new_capacity)
+
+        active = np.zeros(new_capacity, dtype=bool)
+        active[:self.capacity] = self._active
+        self._active = active
+
+        for name, dtype, fill in (("_age", np.int16, -1), ("_gender", np.int8, -1), ("_tenant", np.int32, -1),
+                                  ("_template_norm", np.float32, 1), ("_sample_count", np.int32, 1)):
+            column = np.full(new_capacity, fill, dtype=dtype)
+            column[:self.capacity] = getattr(self, name)
+            setattr(self, name, column)
+
+        self.capacity = new_capacity
+
+    def check_add(self, face_id: str, vector: np.ndarray):
+        """추가 가능 여부 검사 (WAL 기록 전에 호출)"""
+        if face_id in self.row_of:
+            raise ValueError(f"이미 등록된 ID입니다: {face_id}")
+        if vector.shape != (self.dim,):
+            raise ValueError(f"임베딩 차원이 갤러리와 일치하지 않습니다 (갤러리 {self.dim}, 입력 {vector.shape[0]})")
+
+    def add(self, face_id: str, vector: np.ndarray, metadata: Dict[str, Any] = None,
+            attributes: Dict[str, Any] = None, weight: float = 1.0) -> int:
+        """정규화된 벡터 추가 (weight 는 템플릿 가중치), 행 번호 반환"""
+        self.check_add(face_id, vector)
+
+        if self.count >= self.capacity:
+            self._grow(self.count + 1)
+
+        row = self.count
+        self._vectors[row] = vector
+        self._active[row] = True
+        self._template_norm[row] = weight
+        self._sample_count[row] = 1
+        self.count += 1
+
+        self.ids.append(face_id)
+        self.row_of[face_id] = row
+        self.metadata[face_id] = metadata or {}
+        self._set_attributes(row, face_id, attributes)
+        return row
+
+    def delete(self, face_id: str) -> Optional[int]:
+        """얼굴 삭제 (비활성 표시 후 벡터를 0으로 지움), 삭제된 행 번호 반환"""
+        row = self.row_of.pop(face_id, None)
+        if row is None:
+            return None
+
+        self._active[row] = False
+        self._vectors[row] = 0.0
+        self.metadata.pop(face_id, None)
+        self.attributes.pop(face_id, None)
+        return row
+
+    def flush(self):
+        """vectors 를 디스크에 기록"""
+        if self._vectors is not None:
+            self._vectors.flush()
+
+    def close(self):
+        """저장소 닫기"""
+        if self._vectors is not None:
+            self.flush()
+            del self._vectors
+            self._vectors = None
@@ -0,0 +1,107 @@
+"""
+신원 템플릿 - 한 사람의 여러 사진을 갤러리 행 하나로 집계
+
+템플릿은 품질 가중 합 S = Σ w_i e_i 의 방향 S / |S| 이고, 갤러리 행에는 이 방향을,
+저장소의 열 배열에는 |S| 와 표본 수를 둡니다. 새 표본은 S' = S + w e 로 합치므로
+사진이 늘어도 검색 대상 행 수는 사람 수와 같습니다.
+선택적으로 품질이 높은 표본 몇 개(exemplar)를 보관해 후보 재정렬에만 사용합니다.
+"""
+import math
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from ...utils.embedding_codec import encode_embedding, decode_embedding
+
+# ArcFace 입력 크기 - 이보다 작은 얼굴은 업샘플링되므로 가중치를 낮춤
+REFERENCE_FACE_SIZE = 112.0
+
+
+def face_quality_weight(confidence: Optional[float], bounding_box: Optional[Dict[str, Any]] = None,
+                        reference_size: float = REFERENCE_FACE_SIZE) -> float:
+    """
+    얼굴 분석 결과로 템플릿 가중치 계산 - det_score x min(1, 얼굴 크기 / 기준 크기)
+
+    Args:
+        confidence: 검출 점수 (FaceAnalysis det_score)
+        bounding_box: {"width", "height"} (없으면 크기 감쇠 없음)
+    """
+    weight = float(confidence) if confidence is not None else 1.0
+    if bounding_box:
+        size = math.sqrt(max(float(bounding_box.get("width", 0)), 0.0) * max(float(bounding_box.get("height", 0)), 0.0))
+        weight *= min(1.0, size / reference_size)
+    return max(weight, 1e-3)
+
+
+class IdentityExemplars:
+    """
+    신원별 대표 표본 (품질 가중치가 높은 순으로 최대 max_exemplars 개)
+
+    템플릿 검색으로 찾은 후보의 점수를 max(템플릿, 표본) 유사도로 보정할 때만 쓰며,
+    인덱스에는 들어가지 않습니다.
+    """
+
+    def __init__(self, max_exemplars: int = 0):
+        self.max_exemplars = max_exemplars
+        self._items: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_exemplars > 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def count(self, face_id: str) -> int:
+        item = self._items.get(face_id)
+        return 0 if item is None else int(item[0].shape[0])
+
+    def add(self, face_id: str, vector: np.ndarray, weight: float):
+        """표본 추가 (가득 차면 가중치가 가장 낮은 표본과 교체)"""
+        if not self.enabled:
+            return
+
+        weights, vectors = self._items.get(face_id, (np.zeros(0, dtype=np.float32), None))
+        vector = np.asarray(vector, dtype=np.float32)[np.newaxis, :]
+        if vectors is None:
+            weights, vectors = np.array([weight], dtype=np.float32), vector
+        elif weights.shape[0] < self.max_exemplars:
+            weights = np.append(weights, np.float32(weight))
+            vectors = np.vstack([vectors, vector])
+        else:
+            weakest = int(np.argmin(weights))
+            if weight <= weights[weakest]:
+                return
+            weights, vectors = weights.copy(), vectors.copy()
+            weights[weakest] = weight
+            vectors[weakest] = vector[0]
+
+        self._items[face_id] = (weights, vectors)
+
+    def remove(self, face_id: str):
+        self._items.pop(face_id, None)
+
+    def best_score(self, face_id: str, query: np.ndarray) -> Optional[float]:
+        """질의와 가장 가까운 표본 유사도 (표본이 없으면 None)"""
+        item = self._items.get(face_id)
+        if item is None:
+            return None
+        return float(np.max(item[1] @ query))
+
+    def get_state(self) -> Dict[str, Dict[str, Any]]:
+        """스냅샷용 상태 (JSON 직렬화 가능)"""
+        return {
+            face_id: {
+                "weights": weights.tolist(),
+                "vectors": encode_embedding(vectors.reshape(-1), "base64_float32")["data"]
+            }
+            for face_id, (weights, vectors) in self._items.items()
+        }
+
+    def load_state(self, state: Optional[Dict[str, Dict[str, Any]]], dim: int):
+        """스냅샷 상태 적용"""
+        self._items = {}
+        for face_id, item in (state or {}).items():
+            weights = np.asarray(item["weights"], dtype=np.float32)
+            vectors = decode_embedding({"format": "base64_float32", "data": item["vectors"]}).reshape(-1, dim)
+            self._items[face_id] = (weights, vectors)
@@ -7,6 +7,7 @@ import time
 from contextlib import asynccontextmanager
 
 from ..core.logging import get_logger
+from ..core.request_context import set_operation, reset_operation
 
 logger = get_logger(__name__)
 
@@ -139,10 +140,12 @@ class ModelManager:
         """요청 컨텍스트 관리"""
         start_time = time.time()
         logger.debug(f"시작: {operation_type}")
+        token = set_operation(operation_type)
         
         try:
             yield
         finally:
+            reset_operation(token)
             processing_time = time.time() - start_time
             logger.debug(f"완료: {operation_type} (소요시간: {processing_time:.3f}초)")
     
@@ -1,12 +1,14 @@
 """
 API 요청 스키마 정의
 """
-from typing import List, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 from pydantic import BaseModel, Field, validator
 import base64
 import io
 from PIL import Image
 
+from ..utils.embedding_codec import EMBEDDING_FORMAT_PATTERN, decode_embedding
+
 
 class ImageData(BaseModel):
     """이미지 데이터 스키마"""
@@ -33,10 +35,25 @@ class ImageData(BaseModel):
         return v
 
 
+def _validate_optional_image(v):
+    """이미지 유효성 검사 (참조 얼굴 ID 를 대신 쓰면 None)"""
+    if v is None:
+        return v
+    return ImageData(image=v).image
+
+
+def _require_image_or_reference(image: Optional[str], reference_id: Optional[str], label: str):
+    """이미지와 참조 얼굴 ID 중 정확히 하나만 허용"""
+    if (image is None) == (reference_id is None):
+        raise ValueError(f"{label}_image 또는 {label}_reference_id 중 정확히 하나를 지정해야 합니다")
+
+
 class FaceComparisonRequest(BaseModel):
     """얼굴 비교 요청"""
-    source_image: str = Field(..., description="원본 이미지 (Base64)")
-    target_image: str = Field(..., description="비교할 이미지 (Base64)")
+    source_image: Optional[str] = Field(None, description="원본 이미지 (Base64)")
+    target_image: Optional[str] = Field(None, description="비교할 이미지 (Base64)")
+    source_reference_id: Optional[str] = Field(None, description="원본 이미지 대신 쓸 참조 얼굴 ID (/references)")
+    target_reference_id: Optional[str] = Field(None, description="비교할 이미지 대신 쓸 참조 얼굴 ID (/references)")
     similarity_threshold: float = Field(
         default=0.01, 
         ge=0.0, 
@@ -47,7 +64,14 @@ class FaceComparisonRequest(BaseModel):
     @validator("source_image", "target_image")
     def validate_images(cls, v):
         """이미지 유효성 검사"""
-        return ImageData(image=v).image
+        return _validate_optional_image(v)
+    
+    @validator("target_reference_id", always=True)
+    def validate_one_of(cls, v, values):
+        """원본/대상마다 이미지와 참조 얼굴 ID 중 하나"""
+        _require_image_or_reference(values.get("source_image"), values.get("source_reference_id"), "source")
+        _require_image_or_reference(values.get("target_image"), v, "target")
+        return v
 
 
 class FaceDetectionRequest(BaseModel):
@@ -56,6 +80,11 @@ class FaceDetectionRequest(BaseModel):
     include_landmarks: bool = Field(default=False, description="랜드마크 포함 여부")
     include_attributes: bool = Field(default=True, description="속성 분석 포함 여부")
     max_faces: int = Field(default=10, ge=1, le=50, description="최대 감지할 얼굴 수")
+    embedding_format: str = Field(
+        default="float_list",
+        pattern=EMBEDDING_FORMAT_PATTERN,
+        description="응답 임베딩 포맷 (float_list, base64_float32, base64_float16, int8)"
+    )
     
     @validator("image")
     def validate_image(cls, v):
@@ -91,6 +120,35 @@ class BatchAnalysisRequest(BaseModel):
     )
 
 
+class BatchSessionCreateRequest(BaseModel):
+    """배치 세션 생성 요청"""
+    images: List[BatchImage] = Field(default_factory=list, max_items=20, description="초기 이미지들 (선택사항)")
+    similarity_threshold: float = Field(
+        default=0.6, 
+        ge=0.0, 
+        le=1.0, 
+        description="그룹화 유사도 임계값"
+    )
+
+
+class BatchSessionAddImagesRequest(BaseModel):
+    """배치 세션 이미지 추가 요청"""
+    images: List[BatchImage] = Field(..., min_items=1, max_items=20, description="추가할 이미지들")
+
+
+class ReferenceFaceCreateRequest(BaseModel):
+    """참조 얼굴 생성 요청"""
+    image: str = Field(..., description="참조할 얼굴 이미지 (Base64)")
+    face_id: int = Field(default=0, ge=0, description="사용할 얼굴 인덱스")
+    age: Optional[int] = Field(None, ge=0, le=120, description="나이 (선택사항, 가족 분석에서 감지된 나이 대신 사용)")
+    name: Optional[str] = Field(None, description="이름 (선택사항)")
+    
+    @validator("image")
+    def validate_image(cls, v):
+        """이미지 유효성 검사"""
+        return ImageData(image=v).image
+
+
 class FaceTrackingFrame(BaseModel):
     """얼굴 추적용 프레임"""
     timestamp: int = Field(..., ge=0, description="타임스탬프 (ms)")
@@ -119,6 +177,11 @@ class EmbeddingExtractionRequest(BaseModel):
     image: str = Field(..., description="이미지 (Base64)")
     face_id: int = Field(default=0, ge=0, description="얼굴 ID (여러 얼굴 중 선택)")
     normalize: bool = Field(default=True, description="임베딩 정규화 여부")
+    embedding_format: str = Field(
+        default="float_list",
+        pattern=EMBEDDING_FORMAT_PATTERN,
+        description="응답 임베딩 포맷 (float_list, base64_float32, base64_float16, int8)"
+    )
     
     @validator("image")
     def validate_image(cls, v):
@@ -128,20 +191,30 @@ class EmbeddingExtractionRequest(BaseModel):
 
 class FamilySimilarityRequest(BaseModel):
     """가족 유사도 분석 요청"""
-    parent_image: str = Field(..., description="부모 이미지 (Base64)")
-    child_image: str = Field(..., description="자녀 이미지 (Base64)")
+    parent_image: Optional[str] = Field(None, description="부모 이미지 (Base64)")
+    child_image: Optional[str] = Field(None, description="자녀 이미지 (Base64)")
+    parent_reference_id: Optional[str] = Field(None, description="부모 이미지 대신 쓸 참조 얼굴 ID (/references)")
+    child_reference_id: Optional[str] = Field(None, description="자녀 이미지 대신 쓸 참조 얼굴 ID (/references)")
     parent_age: Optional[int] = Field(None, ge=0, le=120, description="부모 나이 (선택사항)")
     child_age: Optional[int] = Field(None, ge=0, le=120, description="자녀 나이 (선택사항)")
     
     @validator("parent_image", "child_image")
     def validate_images(cls, v):
         """이미지 유효성 검사"""
-        return ImageData(image=v).image
+        return _validate_optional_image(v)
+    
+    @validator("child_reference_id", always=True)
+    def validate_one_of(cls, v, values):
+        """부모/자녀마다 이미지와 참조 얼굴 ID 중 하나"""
+        _require_image_or_reference(values.get("parent_image"), values.get("parent_reference_id"), "parent")
+        _require_image_or_reference(values.get("child_image"), v, "child")
+        return v
 
 
 class FindMostSimilarParentRequest(BaseModel):
     """여러 부모 중 가장 닮은 부모 찾기 요청"""
-    child_image: str = Field(..., description="자녀 이미지 (Base64)")
+    child_image: Optional[str] = Field(None, description="자녀 이미지 (Base64)")
+    child_reference_id: Optional[str] = Field(None, description="자녀 이미지 대신 쓸 참조 얼굴 ID (/references)")
     parent_images: List[str] = Field(..., min_items=2, max_items=10, description="부모 후보 이미지들 (Base64)")
     child_age: Optional[int] = Field(None, ge=0, le=120, description="자녀 나이 (선택사항)")
     use_family_analysis: bool = Field(default=True, description="가족 특화 분석 사용 여부")
@@ -149,7 +222,13 @@ class FindMostSimilarParentRequest(BaseModel):
     @validator("child_image")
     def validate_child_image(cls, v):
         """자녀 이미지 유효성 검사"""
-        return ImageData(image=v).image
+        return _validate_optional_image(v)
+    
+    @validator("child_reference_id", always=True)
+    def validate_one_of(cls, v, values):
+        """자녀 이미지와 참조 얼굴 ID 중 하나"""
+        _require_image_or_reference(values.get("child_image"), v, "child")
+        return v
     
     @validator("parent_images")
     def validate_parent_images(cls, v):
@@ -164,6 +243,251 @@ class FindMostSimilarParentRequest(BaseModel):
         return validated_images
 
 
+class FamilyMatrixImage(BatchImage):
+    """가족 유사도 행렬용 이미지"""
+    age: Optional[int] = Field(None, ge=0, le=120, description="나이 (선택사항, 보정에 사용)")
+
+
+class FamilyMatrixRequest(BaseModel):
+    """여러 자녀 x 여러 부모 가족 유사도 행렬 요청"""
+    parent_images: List[FamilyMatrixImage] = Field(..., min_items=1, max_items=10, description="부모 이미지들")
+    child_images: List[FamilyMatrixImage] = Field(..., min_items=1, max_items=10, description="자녀 이미지들")
+    
+    @validator("child_images")
+    def validate_unique_ids(cls, v, values):
+        """부모/자녀 이미지 ID 중복 검사"""
+        ids = [img.id for img in values.get("parent_images", [])] + [img.id for img in v]
+        if len(ids) != len(set(ids)):
+            raise ValueError("이미지 ID는 부모/자녀 전체에서 고유해야 합니다")
+        return v
+
+
+class EncodedEmbedding(BaseModel):
+    """바이너리 인코딩된 임베딩 (embedding_format 응답과 같은 형식)"""
+    format: str = Field(..., pattern="^(base64_float32|base64_float16|int8)$", description="인코딩 포맷")
+    data: str = Field(..., description="Base64 인코딩된 바이트")
+    dim: Optional[int] = Field(None, ge=1, description="차원 수")
+    scale: Optional[float] = Field(None, gt=0.0, description="int8 스케일")
+
+
+class EmbeddingInput(BaseModel):
+    """임베딩 또는 이미지 입력 (둘 중 하나)"""
+    id: Optional[str] = Field(None, description="식별자 (선택사항)")
+    embedding: Optional[Union[List[float], EncodedEmbedding]] = Field(
+        None, description="/extract-embedding 으로 얻은 임베딩 (float 리스트 또는 인코딩된 형식)"
+    )
+    image: Optional[str] = Field(None, description="이미지 (Base64, 임베딩이 없을 때)")
+    
+    @validator("image")
+    def validate_image(cls, v):
+        """이미지 유효성 검사"""
+        if v is None:
+            return v
+        return ImageData(image=v).image
+    
+    @validator("embedding")
+    def validate_embedding(cls, v):
+        """임베딩 유효성 검사"""
+        if v is None:
+            return v
+        vector = decode_embedding(v)
+        if vector.size == 0 or not vector.any():
+            raise ValueError("임베딩이 비어 있거나 0 벡터입니다")
+        return v
+    
+    @validator("image", always=True)
+    def validate_one_of(cls, v, values):
+        """embedding 과 image 중 정확히 하나만 허용"""
+        if (values.get("embedding") is None) == (v is None):
+            raise ValueError("embedding 또는 image 중 정확히 하나를 지정해야 합니다")
+        return v
+
+
+class EmbeddingComparisonRequest(BaseModel):
+    """임베딩 1:1 비교 요청"""
+    source: EmbeddingInput = Field(..., description="원본 임베딩 또는 이미지")
+    target: EmbeddingInput = Field(..., description="비교할 임베딩 또는 이미지")
+    similarity_threshold: float = Field(
+        default=0.6, 
+        ge=0.0, 
+        le=1.0, 
+        description="일치 판정 임계값"
+    )
+
+
+class EmbeddingSearchRequest(BaseModel):
+    """임베딩 1:N 비교 요청"""
+    query: EmbeddingInput = Field(..., description="질의 임베딩 또는 이미지")
+    candidates: List[EmbeddingInput] = Field(..., min_items=1, description="후보 임베딩 또는 이미지들")
+    top_k: int = Field(default=10, ge=1, le=1000, description="반환할 최대 결과 수")
+    similarity_threshold: float = Field(
+        default=0.0, 
+        ge=0.0, 
+        le=1.0, 
+        description="최소 유사도"
+    )
+
+
+class EmbeddingBatchAnalysisRequest(BaseModel):
+    """임베딩 배치 분석 요청 (유사도 행렬, 최고 매칭, 그룹화)"""
+    items: List[EmbeddingInput] = Field(..., min_items=2, description="분석할 임베딩 또는 이미지들")
+    analysis_type: str = Field(
+        ..., 
+        pattern="^(similarity_matrix|find_best_match|group_similar)$",
+        description="분석 유형"
+    )
+    similarity_threshold: float = Field(
+        default=0.6, 
+        ge=0.0, 
+        le=1.0, 
+        description="유사도 임계값"
+    )
+    
+    @validator("items")
+    def validate_ids(cls, v):
+        """배치 분석 항목은 고유 ID 필수"""
+        ids = [item.id for item in v]
+        if any(i is None for i in ids) or len(set(ids)) != len(ids):
+            raise ValueError("배치 분석 항목은 모두 고유한 id가 필요합니다")
+        return v
+
+
+class GalleryEnrollRequest(EmbeddingInput):
+    """갤러리 얼굴 등록 요청 (id 가 없으면 서버가 생성)"""
+    metadata: Dict[str, Any] = Field(default_factory=dict, description="함께 저장할 메타데이터")
+    tenant: Optional[str] = Field(None, max_length=128, description="테넌트 (필터 검색용)")
+    age: Optional[int] = Field(None, ge=0, le=120, description="나이 (없으면 이미지 분석 결과 사용)")
+    gender: Optional[str] = Field(
+        None, 
+        pattern="^(?i:male|female)$", 
+        description="성별 male/female (없으면 이미지 분석 결과 사용)"
+    )
+    quality: Optional[float] = Field(
+        None, 
+        gt=0.0, 
+        le=1.0, 
+        description="템플릿 가중치 (없으면 검출 점수와 얼굴 크기로 계산, 임베딩 입력은 1.0)"
+    )
+    merge: bool = Field(
+        default=False, 
+        description="같은 id 가 이미 있으면 새로 등록하지 않고 그 신원의 템플릿에 합침"
+    )
+    dedupe: bool = Field(
+        default=True, 
+        description="서버 중복 억제 설정 적용 (거의 같은 얼굴이 있으면 건너뛰거나 합침)"
+    )
+    landmarks: Optional[List[List[float]]] = Field(
+        None, 
+        description="5점 랜드마크 [[x, y]] x 5 (친족 검색용, 없으면 이미지 분석 결과 사용)"
+    )
+    
+    @validator("gender")
+    def normalize_gender(cls, v):
+        """성별 소문자 변환"""
+        return v.lower() if v is not None else v
+
+
+class GallerySearchFilter(BaseModel):
+    """갤러리 검색 속성 필터 (모든 조건을 만족하는 얼굴만 검색)"""
+    tenant: Optional[Union[str, List[str]]] = Field(None, description="테넌트 또는 테넌트 목록")
+    gender: Optional[str] = Field(None, pattern="^(?i:male|female)$", description="성별 male/female")
+    age_min: Optional[int] = Field(None, ge=0, le=120, description="최소 나이 (포함)")
+    age_max: Optional[int] = Field(None, ge=0, le=120, description="최대 나이 (포함)")
+    
+    @validator("gender")
+    def normalize_gender(cls, v):
+        """성별 소문자 변환"""
+        return v.lower() if v is not None else v
+    
+    @validator("age_max")
+    def validate_age_range(cls, v, values):
+        """나이 범위 검사"""
+        age_min = values.get("age_min")
+        if v is not None and age_min is not None and v < age_min:
+            raise ValueError("age_max 는 age_min 보다 작을 수 없습니다")
+        return v
+
+
+class GallerySearchRequest(BaseModel):
+    """갤러리 1:N 검색 요청"""
+    query: EmbeddingInput = Field(..., description="질의 임베딩 또는 이미지")
+    top_k: int = Field(default=10, ge=1, le=1000, description="반환할 최대 결과 수")
+    similarity_threshold: float = Field(
+        default=0.0, 
+        ge=0.0, 
+        le=1.0, 
+        description="최소 유사도"
+    )
+    ef_search: Optional[int] = Field(None, ge=1, le=4096, description="HNSW 탐색 후보 수 (기본값은 서버 설정)")
+    nprobe: Optional[int] = Field(None, ge=1, le=65536, description="IVF-PQ 탐색 리스트 수 (기본값은 서버 설정)")
+    exact: bool = Field(default=False, description="인덱스 대신 전수 검색")
+    filters: Optional[GallerySearchFilter] = Field(None, description="속성 필터")
+
+
+class GalleryRangeSearchRequest(BaseModel):
+    """갤러리 범위 검색 요청 - 임계값 이상인 모든 얼굴"""
+    query: EmbeddingInput = Field(..., description="질의 임베딩 또는 이미지")
+    similarity_threshold: float = Field(..., ge=0.0, le=1.0, description="최소 유사도 (포함)")
+    filters: Optional[GallerySearchFilter] = Field(None, description="속성 필터")
+    max_results: Optional[int] = Field(None, ge=1, description="최대 결과 수 (없으면 서버 설정, 스트리밍은 제한 없음)")
+    stream: bool = Field(default=False, description="결과를 NDJSON 으로 스트리밍")
+
+
+class BatchSessionRangeSearchRequest(BaseModel):
+    """배치 세션 범위 검색 요청 (image_id 또는 query 중 하나)"""
+    image_id: Optional[str] = Field(None, description="세션 안의 기준 이미지 ID")
+    query: Optional[EmbeddingInput] = Field(None, description="세션 밖의 질의 임베딩 또는 이미지")
+    similarity_threshold: float = Field(..., ge=0.0, le=1.0, description="최소 유사도 (포함)")
+    
+    @validator("query", always=True)
+    def validate_query(cls, v, values):
+        """image_id 와 query 중 하나만 허용"""
+        if (v is None) == (values.get("image_id") is None):
+            raise ValueError("image_id 와 query 중 하나만 지정해야 합니다")
+        return v
+
+
+class GalleryDedupeRequest(BaseModel):
+    """갤러리 일괄 중복 정리 요청"""
+    similarity_threshold: Optional[float] = Field(
+        None, 
+        gt=0.0, 
+        le=1.0, 
+        description="중복 유사도 (없으면 서버 설정)"
+    )
+    action: str = Field(
+        default="merge", 
+        pattern="^(merge|delete)$", 
+        description="merge (남길 신원 템플릿에 합친 뒤 삭제) 또는 delete"
+    )
+    dry_run: bool = Field(default=False, description="찾기만 하고 적용하지 않음")
+
+
+class GalleryKinshipSearchRequest(BaseModel):
+    """갤러리 친족 검색 요청 - 임베딩 유사도 상위 후보를 가족 유사도로 재정렬"""
+    query: EmbeddingInput = Field(..., description="질의 임베딩 또는 이미지")
+    landmarks: Optional[List[List[float]]] = Field(
+        None, 
+        description="질의 5점 랜드마크 [[x, y]] x 5 (없으면 이미지 분석 결과 사용)"
+    )
+    age: Optional[int] = Field(None, ge=0, le=120, description="질의 얼굴 나이 (없으면 이미지 분석 결과 사용)")
+    top_k: int = Field(default=10, ge=1, le=100, description="반환할 최대 결과 수")
+    shortlist: Optional[int] = Field(
+        None, 
+        ge=1, 
+        le=1000, 
+        description="가족 유사도를 계산할 임베딩 상위 후보 수 (없으면 서버 설정)"
+    )
+    min_family_similarity: float = Field(default=0.0, ge=0.0, le=1.0, description="최소 가족 유사도")
+    exclude_ids: List[str] = Field(default_factory=list, description="결과에서 뺄 갤러리 ID (질의 본인 등)")
+    filters: Optional[GallerySearchFilter] = Field(None, description="속성 필터")
+
+
+class GalleryIndexTrainRequest(BaseModel):
+    """갤러리 IVF-PQ 인덱스 학습 요청"""
+    sample_size: Optional[int] = Field(None, ge=1, description="학습에 쓸 얼굴 수 (없으면 전체)")
+
+
 class AgeEstimationRequest(BaseModel):
     """나이 추정 요청"""
     image: str = Field(..., description="분석할 이미지 (Base64)")
@@ -41,7 +41,7 @@ class FaceDetail(BaseModel):
     gender: Optional[Gender] = None
     emotions: Optional[List[Emotion]] = None
     landmarks: Optional[List[Landmark]] = None
-    embedding: Optional[List[float]] = None
+    embedding: Optional[Union[List[float], Dict[str, Any]]] = Field(None, description="임베딩 (embedding_format 에 따라 리스트 또는 인코딩 객체)")
     quality_score: Optional[float] = Field(None, ge=0.0, le=1.0, description="이미지 품질 점수")
 
 
@@ -124,6 +124,34 @@ class BatchAnalysisResponse(BaseResponse):
         groups: Optional[List[SimilarGroup]] = None
 
 
+class SimilarityBlock(BaseModel):
+    """새로 추가된 이미지와 세션 전체 간 유사도 블록"""
+    row_ids: List[str] = Field(..., description="새로 추가된 이미지 ID (행)")
+    column_ids: List[str] = Field(..., description="세션 전체 이미지 ID (열)")
+    matrix: List[List[float]] = Field(..., description="K x N 유사도 블록")
+
+
+class BatchSessionResponse(BaseResponse):
+    """배치 세션 응답"""
+    data: Optional[Dict[str, Any]] = Field(None, description="배치 세션 정보")
+    
+    class SessionData(BaseModel):
+        session_id: str = Field(..., description="세션 ID")
+        image_count: int = Field(..., ge=0, description="세션 이미지 수")
+        image_ids: List[str] = Field(..., description="세션 이미지 ID (추가 순서)")
+        similarity_threshold: float = Field(..., ge=0.0, le=1.0, description="그룹화 임계값")
+        expires_at: float = Field(..., description="만료 시각 (Unix time)")
+        added_ids: Optional[List[str]] = None
+        failed_ids: Optional[List[str]] = None
+        similarity_block: Optional[SimilarityBlock] = None
+        groups: Optional[List[SimilarGroup]] = None
+
+
+class ReferenceFaceResponse(BaseResponse):
+    """참조 얼굴 응답"""
+    data: Optional[Dict[str, Any]] = Field(None, description="참조 얼굴 정보 (임베딩 제외)")
+
+
 class TrackFrame(BaseModel):
     """추적 프레임"""
     timestamp: int = Field(..., description="타임스탬프")
@@ -151,12 +179,78 @@ class EmbeddingResponse(BaseResponse):
     data: Optional[Dict[str, Any]] = Field(None, description="임베딩 결과")
     
     class EmbeddingData(BaseModel):
-        embedding: List[float] = Field(..., description="512차원 임베딩 벡터")
+        embedding: Union[List[float], Dict[str, Any]] = Field(..., description="512차원 임베딩 벡터 (embedding_format 에 따라 리스트 또는 인코딩 객체)")
         bounding_box: BoundingBox
         confidence: float = Field(..., ge=0.0, le=1.0, description="신뢰도")
         landmarks: Optional[List[Landmark]] = None
 
 
+class EmbeddingSearchMatch(BaseModel):
+    """1:N 비교 매칭 결과"""
+    id: Optional[str] = Field(None, description="후보 식별자")
+    index: int = Field(..., ge=0, description="후보 인덱스")
+    similarity: float = Field(..., description="코사인 유사도")
+
+
+class EmbeddingComparisonResponse(BaseResponse):
+    """임베딩 1:1 비교 응답"""
+    data: Optional[Dict[str, Any]] = Field(None, description="비교 결과")
+    
+    class EmbeddingComparisonData(BaseModel):
+        similarity: float = Field(..., description="코사인 유사도")
+        is_match: bool = Field(..., description="임계값 이상 여부")
+        similarity_threshold: float = Field(..., description="사용된 임계값")
+        computed_from_images: int = Field(..., ge=0, description="이미지에서 임베딩을 추출한 입력 수")
+
+
+class EmbeddingSearchResponse(BaseResponse):
+    """임베딩 1:N 비교 응답"""
+    data: Optional[Dict[str, Any]] = Field(None, description="검색 결과")
+    
+    class EmbeddingSearchData(BaseModel):
+        matches: List[EmbeddingSearchMatch] = Field(..., description="유사도 순 매칭 결과")
+        total_candidates: int = Field(..., ge=0, description="후보 수")
+        computed_from_images: int = Field(..., ge=0, description="이미지에서 임베딩을 추출한 입력 수")
+
+
+class GalleryMatch(BaseModel):
+    """갤러리 검색 결과 항목"""
+    id: str = Field(..., description="갤러리 ID")
+    similarity: float = Field(..., ge=-1.0, le=1.0, description="코사인 유사도")
+    metadata: Dict[str, Any] = Field(default_factory=dict, description="등록 시 저장한 메타데이터")
+    attributes: Dict[str, Any] = Field(default_factory=dict, description="필터 속성 (age, gender, tenant, 있으면 landmarks)")
+
+
+class GalleryKinshipMatch(GalleryMatch):
+    """갤러리 친족 검색 결과 항목 (similarity 는 임베딩 코사인 유사도)"""
+    family_similarity: float = Field(..., ge=0.0, le=1.0, description="가족 유사도")
+    age_corrected_similarity: float = Field(..., description="나이 보정 유사도")
+    confidence: float = Field(..., description="분석 신뢰도")
+    feature_breakdown: Dict[str, float] = Field(..., description="부위별 유사도")
+    explanation: Dict[str, str] = Field(..., description="부위별 설명")
+    similarity_level: str = Field(..., description="닮음 수준")
+
+
+class GalleryResponse(BaseResponse):
+    """얼굴 갤러리 응답 (등록, 삭제, 검색, 통계)"""
+    data: Optional[Dict[str, Any]] = Field(None, description="갤러리 처리 결과")
+    
+    class GallerySearchData(BaseModel):
+        matches: List[GalleryMatch] = Field(..., description="유사도 순 매칭 결과")
+        gallery_size: int = Field(..., ge=0, description="갤러리에 등록된 얼굴 수")
+    
+    class GalleryRangeSearchData(BaseModel):
+        matches: List[GalleryMatch] = Field(..., description="임계값 이상 매칭 (유사도 순)")
+        total_matches: int = Field(..., ge=0, description="잘리기 전 매칭 수")
+        truncated: bool = Field(..., description="max_results 로 잘렸는지 여부")
+        stats: Dict[str, Any] = Field(..., description="스캔 통계 (전체/후보 블록 수, 스캔 행 수)")
+    
+    class GalleryKinshipSearchData(BaseModel):
+        matches: List[GalleryKinshipMatch] = Field(..., description="가족 유사도 순 매칭 결과")
+        candidates: int = Field(..., ge=0, description="가족 유사도를 계산한 후보 수")
+        gallery_size: int = Field(..., ge=0, description="갤러리에 등록된 얼굴 수")
+
+
 class HealthResponse(BaseModel):
     """헬스체크 응답"""
     status: str = Field(..., description="서비스 상태")
@@ -192,6 +286,9 @@ class MetricsResponse(BaseModel):
     active_requests: int = Field(..., description="활성 요청 수")
     usage_stats: UsageStats = Field(..., description="사용량 통계")
     system_info: Dict[str, Any] = Field(..., description="시스템 정보")
+    cache_stats: Dict[str, Any] = Field(default_factory=dict, description="캐시 통계 (히트/미스/제거 수)")
+    single_flight_stats: Dict[str, Any] = Field(default_factory=dict, description="처리 중 동일 요청 합침 통계")
+    client_stats: Dict[str, Any] = Field(default_factory=dict, description="클라이언트별 얼굴 없음/실패 비율")
 
 
 class FamilySimilarityResponse(BaseResponse):
@@ -229,6 +326,34 @@ class FindMostSimilarParentResponse(BaseResponse):
         analysis_method: str = Field(..., description="분석 방법 (family_analysis 또는 basic_comparison)")
 
 
+class FamilyPairResult(BaseModel):
+    """자녀-부모 한 쌍의 가족 유사도"""
+    child_id: str = Field(..., description="자녀 이미지 ID")
+    parent_id: str = Field(..., description="부모 이미지 ID")
+    family_similarity: float = Field(..., ge=0.0, le=1.0, description="가족 유사도 점수")
+    base_similarity: float = Field(..., ge=0.0, le=1.0, description="기본 얼굴 유사도")
+    age_corrected_similarity: float = Field(..., ge=0.0, le=1.0, description="나이 보정 유사도")
+    feature_breakdown: Dict[str, float] = Field(..., description="부위별 유사도 분석")
+    confidence: float = Field(..., ge=0.0, le=1.0, description="분석 신뢰도")
+    explanation: Dict[str, str] = Field(..., description="부위별 설명")
+    similarity_level: str = Field(..., description="유사도 수준 분류")
+
+
+class FamilyMatrixResponse(BaseResponse):
+    """가족 유사도 행렬 응답"""
+    data: Optional[Dict[str, Any]] = Field(None, description="가족 유사도 행렬 결과")
+    
+    class FamilyMatrixData(BaseModel):
+        parent_ids: List[str] = Field(..., description="부모 이미지 ID (열 순서)")
+        child_ids: List[str] = Field(..., description="자녀 이미지 ID (행 순서)")
+        family_similarity_matrix: List[List[float]] = Field(..., description="자녀 x 부모 가족 유사도")
+        base_similarity_matrix: List[List[float]] = Field(..., description="자녀 x 부모 기본 유사도")
+        pairs: List[FamilyPairResult] = Field(..., description="모든 쌍의 상세 결과")
+        best_parent_per_child: List[Dict[str, Any]] = Field(..., description="자녀별 가장 닮은 부모")
+        faces: Dict[str, Dict[str, Any]] = Field(..., description="이미지 ID별 얼굴 정보")
+        failed_ids: List[str] = Field(..., description="얼굴 감지 실패 이미지 ID")
+
+
 class AgeEstimationResponse(BaseResponse):
     """나이 추정 응답"""
     data: Optional[Dict[str, Any]] = Field(None, description="나이 추정 결과")
@@ -0,0 +1,353 @@
+"""
+얼굴 분석 캐시 - 같은 이미지의 감지 결과를 엔드포인트 사이에서 재사용
+
+키는 이미지 내용 해시(get_image_hash)이고, 값은 감지된 얼굴 목록(박스, 키포인트, 정규화된 임베딩,
+나이, 성별, genderage 원시 출력)입니다. /detect-faces 다음 /estimate-age 처럼 같은 이미지를
+연달아 보내는 흐름에서 두 번째부터는 디코딩과 app.get 을 건너뜁니다.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..core.logging import get_logger
+from ..core.request_context import get_operation
+
+logger = get_logger(__name__)
+
+
+class CachedFace:
+    """
+    캐시에 보관하는 얼굴 (InsightFace Face 에서 쓰는 속성만)
+
+    FaceAnalyzer 코드가 Face 객체와 같은 방식(face.bbox, face.embedding, face.age ...)으로 접근하며,
+    임베딩은 정규화된 벡터와 원래 크기로 나눠 저장합니다. descriptor 는 가족 분석용 기하 특징 벡터로,
+    키포인트에서 다시 만들 수 있으므로 공유 계층(공유 메모리/Redis)에는 저장하지 않습니다.
+    """
+
+    # InsightFace Face 와 같이 없는 속성은 None
+    landmark = None
+
+    def __init__(self, bbox, kps, det_score: float, normed_embedding: Optional[np.ndarray],
+                 embedding_norm: float = 1.0, age: Optional[int] = None, gender: Optional[int] = None,
+                 genderage: Optional[np.ndarray] = None, descriptor: Optional[np.ndarray] = None):
+        self.bbox = np.asarray(bbox, dtype=np.float32)
+        self.kps = None if kps is None else np.asarray(kps, dtype=np.float32)
+        self.det_score = float(det_score)
+        self.normed_embedding = None if normed_embedding is None else np.asarray(normed_embedding, dtype=np.float32)
+        self.embedding_norm = float(embedding_norm)
+        self.age = age
+        self.gender = gender
+        self.genderage = None if genderage is None else np.asarray(genderage, dtype=np.float32)
+        self.descriptor = descriptor
+
+    @property
+    def embedding(self) -> Optional[np.ndarray]:
+        """정규화 전 임베딩 (InsightFace Face.embedding 과 같은 값)"""
+        if self.normed_embedding is None:
+            return None
+        return self.normed_embedding * self.embedding_norm
+
+    @classmethod
+    def from_face(cls, face) -> "CachedFace":
+        """InsightFace Face 변환"""
+        embedding = getattr(face, "embedding", None)
+        norm = 1.0
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            norm = float(np.linalg.norm(embedding)) or 1.0
+            embedding = embedding / norm
+
+        age = getattr(face, "age", None)
+        gender = getattr(face, "gender", None)
+        return cls(
+            bbox=face.bbox,
+            kps=getattr(face, "kps", None),
+            det_score=face.det_score,
+            normed_embedding=embedding,
+            embedding_norm=norm,
+            age=int(age) if age is not None else None,
+            gender=int(gender) if gender is not None else None
+        )
+
+
+class FrequencySketch:
+    """
+    TinyLFU 접근 빈도 추정 (Count-Min Sketch)
+
+    키마다 depth 개 행의 카운터(최대 15)를 올리고 그중 최솟값을 빈도로 씁니다. 기록 수가 sample_size 에
+    이르면 모든 카운터를 절반으로 줄여, 예전에 자주 쓰였지만 지금은 안 쓰는 키가 계속 이기지 않게 합니다.
+    """
+
+    MAX_COUNT = 15
+
+    def __init__(self, width: int, depth: int = 4, sample_size: int = None):
+        self.width = 1 << max(6, (max(width, 1) - 1).bit_length())
+        self.depth = depth
+        self.sample_size = sample_size if sample_size is not None else 10 * self.width
+        self._table = np.zeros((depth, self.width), dtype=np.uint8)
+        self._rows = np.arange(depth)
+        self._additions = 0
+
+    def _indexes(self, key: str) -> np.ndarray:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=4 * self.depth).digest()
+        return np.frombuffer(digest, dtype="<u4") & (self.width - 1)
+
+    def increment(self, key: str):
+        indexes = self._indexes(key)
+        counters = self._table[self._rows, indexes]
+        self._table[self._rows, indexes] = np.minimum(counters + 1, self.MAX_COUNT)
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._table >>= 1
+            self._additions //= 2
+
+    def estimate(self, key: str) -> int:
+        return int(self._table[self._rows, self._indexes(key)].min())
+
+    def clear(self):
+        self._table[:] = 0
+        self._additions = 0
+
+
+class _CacheEntry:
+    """캐시 항목 (만료 시각, 얼굴 목록, 추정 크기, 적중 수)"""
+
+    __slots__ = ("expires_at", "faces", "size", "hits")
+
+    def __init__(self, expires_at: float, faces: List[CachedFace], size: int):
+        self.expires_at = expires_at
+        self.faces = faces
+        self.size = size
+        self.hits = 0
+
+
+# 얼굴 객체와 캐시 항목의 파이썬 객체 오버헤드 (추정치)
+_FACE_OVERHEAD = 400
+_ENTRY_OVERHEAD = 200
+
+
+def estimate_entry_size(key: str, faces: List[CachedFace]) -> int:
+    """캐시 항목의 메모리 사용량 추정 (numpy 배열 크기 + 객체 오버헤드)"""
+    size = _ENTRY_OVERHEAD + len(key)
+    for face in faces:
+        size += _FACE_OVERHEAD
+        for array in (face.bbox, face.kps, face.normed_embedding, face.genderage, face.descriptor):
+            if array is not None:
+                size += array.nbytes
+    return size
+
+
+class FaceAnalysisCache:
+    """
+    프로세스 내 바이트 제한 + TTL 캐시 (W-TinyLFU 입장 정책)
+
+    새 이미지는 작은 창(window) 구역에 LRU 로 들어가고, 창에서 밀려날 때 주 구역의 가장 오래 쓰지 않은
+    항목(희생자)과 접근 빈도를 비교해 더 자주 쓰인 쪽만 남깁니다. 한 번 올리고 마는 배치 업로드가 주 구역의
+    자주 쓰는 이미지(참조 얼굴, 반복 비교 대상)를 밀어내지 못하게 하기 위함입니다. 크기는 항목 수가 아니라
+    감지 결과의 추정 바이트로 제한하며, ttl 초가 지난 항목은 조회 시 만료로 처리합니다.
+
+    요청 처리 스레드와 이벤트 루프에서 함께 쓰므로 잠금으로 보호합니다.
+    """
+
+    def __init__(self, max_bytes: int = None, ttl: int = None, enabled: bool = None, window_ratio: float = None):
+        self.max_bytes = max_bytes if max_bytes is not None else settings.cache_max_bytes
+        self.ttl = ttl if ttl is not None else settings.cache_ttl
+        self.enabled = enabled if enabled is not None else settings.cache_enabled
+        ratio = window_ratio if window_ratio is not None else settings.cache_window_ratio
+        self.window_capacity = int(self.max_bytes * ratio)
+        self.main_capacity = self.max_bytes - self.window_capacity
+        # 임베딩 512차원 얼굴 하나짜리 항목 기준으로 예상 항목 수를 잡아 스케치 크기 결정
+        self._sketch = FrequencySketch(max(self.max_bytes // 2048, 16))
+        self._window: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._main: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._window_size = 0
+        self._main_size = 0
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "rejections": 0}
+        self._by_operation: Dict[str, Dict[str, int]] = {}
+
+    def _find(self, key: str) -> Tuple[Optional["OrderedDict[str, _CacheEntry]"], Optional[_CacheEntry]]:
+        for segment in (self._window, self._main):
+            entry = segment.get(key)
+            if entry is not None:
+                return segment, entry
+        return None, None
+
+    def _remove(self, segment: "OrderedDict[str, _CacheEntry]", key: str) -> _CacheEntry:
+        entry = segment.pop(key)
+        if segment is self._window:
+            self._window_size -= entry.size
+        else:
+            self._main_size -= entry.size
+        return entry
+
+    def _record(self, hit: bool):
+        """전체/작업별 히트·미스 집계 (잠금 안에서 호출)"""
+        name = "hits" if hit else "misses"
+        self._counts[name] += 1
+        operation = get_operation() or "other"
+        counts = self._by_operation.setdefault(operation, {"hits": 0, "misses": 0})
+        counts[name] += 1
+
+    def get(self, key: str) -> Optional[List[CachedFace]]:
+        """캐시된 얼굴 목록 (없거나 만료되면 None, 적중 여부와 무관하게 접근 빈도 기록)"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            self._sketch.increment(key)
+            segment, entry = self._find(key)
+            if entry is None:
+                self._record(hit=False)
+                return None
+
+            if entry.expires_at <= time.monotonic():
+                self._remove(segment, key)
+                self._counts["expirations"] += 1
+                self._record(hit=False)
+                return None
+
+            segment.move_to_end(key)
+            entry.hits += 1
+            self._record(hit=True)
+            return entry.faces
+
+    def contains(self, key: str) -> bool:
+        """만료되지 않은 항목 존재 여부 (통계, 빈도와 LRU 순서는 바꾸지 않음)"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            _, entry = self._find(key)
+            return entry is not None and entry.expires_at > time.monotonic()
+
+    def put(self, key: str, faces: List[CachedFace]):
+        """얼굴 목록 저장 (같은 키면 교체하고 TTL 갱신, 새 키는 창 구역으로)"""
+        if not self.enabled or self.max_bytes <= 0:
+            return
+
+        size = estimate_entry_size(key, faces)
+        with self._lock:
+            if size > self.main_capacity:
+                self._counts["rejections"] += 1
+                return
+
+            segment, entry = self._find(key)
+            if entry is not None:
+                self._remove(segment, key)
+            else:
+                segment = self._window
+
+            segment[key] = _CacheEntry(time.monotonic() + self.ttl, faces, size)
+            if segment is self._window:
+                self._window_size += size
+            else:
+                self._main_size += size
+
+            self._shrink_window()
+            self._shrink_main()
+
+    def _shrink_window(self):
+        """창 구역이 넘치면 오래된 항목을 주 구역 입장 후보로 넘김"""
+        while self._window_size > self.window_capacity and self._window:
+            key = next(iter(self._window))
+            self._admit(key, self._remove(self._window, key))
+
+    def _admit(self, key: str, candidate: _CacheEntry):
+        """
+        후보를 주 구역에 넣을지 결정
+
+        자리를 만들려면 밀어내야 할 희생자(주 구역 LRU 끝부터)를 모두 모은 뒤, 만료되지 않은 희생자 중
+        하나라도 후보보다 자주 쓰였으면(같아도) 후보를 버리고 주 구역은 그대로 둡니다.
+        """
+        now = time.monotonic()
+        needed = self._main_size + candidate.size - self.main_capacity
+        victims = []
+        if needed > 0:
+            frequency = self._sketch.estimate(key)
+            for victim_key, victim in self._main.items():
+                if victim.expires_at > now and self._sketch.estimate(victim_key) >= frequency:
+                    self._counts["rejections"] += 1
+                    return
+                victims.append(victim_key)
+                needed -= victim.size
+                if needed <= 0:
+                    break
+
+        for victim_key in victims:
+            victim = self._remove(self._main, victim_key)
+            self._counts["expirations" if victim.expires_at <= now else "evictions"] += 1
+
+        self._main[key] = candidate
+        self._main_size += candidate.size
+
+    def _shrink_main(self):
+        """교체로 주 구역이 커졌을 때 LRU 순서로 제거"""
+        while self._main_size > self.main_capacity and self._main:
+            self._remove(self._main, next(iter(self._main)))
+            self._counts["evictions"] += 1
+
+    def clear(self) -> Dict[str, int]:
+        """모든 항목과 접근 빈도 기록 삭제 (삭제한 항목 수와 크기 반환)"""
+        with self._lock:
+            removed = {
+                "entries": len(self._window) + len(self._main),
+                "bytes": self._window_size + self._main_size
+            }
+            self._window.clear()
+            self._main.clear()
+            self._window_size = self._main_size = 0
+            self._sketch.clear()
+            return removed
+
+    def get_top_keys(self, top: int = 20) -> List[Dict[str, Any]]:
+        """적중 수가 많은 순서의 항목 (키는 이미지 해시)"""
+        now = time.monotonic()
+        with self._lock:
+            entries = [
+                {
+                    "key": key,
+                    "segment": name,
+                    "faces": len(entry.faces),
+                    "bytes": entry.size,
+                    "hits": entry.hits,
+                    "frequency": self._sketch.estimate(key),
+                    "expires_in": max(entry.expires_at - now, 0.0)
+                }
+                for name, segment in (("window", self._window), ("main", self._main))
+                for key, entry in segment.items()
+            ]
+        entries.sort(key=lambda e: (e["hits"], e["frequency"]), reverse=True)
+        return entries[:top]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """크기, 히트/미스/제거/입장 거부 통계와 작업별 적중률"""
+        with self._lock:
+            lookups = self._counts["hits"] + self._counts["misses"]
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._window) + len(self._main),
+                "bytes": self._window_size + self._main_size,
+                "max_bytes": self.max_bytes,
+                "window_capacity": self.window_capacity,
+                "window_bytes": self._window_size,
+                "main_bytes": self._main_size,
+                "ttl": self.ttl,
+                **self._counts,
+                "hit_rate": self._counts["hits"] / lookups if lookups else 0.0,
+                "by_operation": {
+                    operation: {
+                        **counts,
+                        "hit_rate": counts["hits"] / (counts["hits"] + counts["misses"])
+                    }
+                    for operation, counts in self._by_operation.items()
+                }
+            }
+
+
+# 전역 얼굴 분석 캐시
+analysis_cache = FaceAnalysisCache()
@@ -0,0 +1,318 @@
+"""
+배치 세션 - 임베딩을 서버에 보관하고 유사도 행렬을 점진적으로 확장
+
+세션은 만든 워커 프로세스의 메모리에만 있습니다. 이미지를 추가할 때마다 유사도 행렬을 그 자리에서
+확장하므로 워커 사이에 나눠 쓰지 않으며, gunicorn 워커를 여러 개 띄우면 후속 요청이 다른 워커로 가서
+404 가 됩니다. 배치 세션을 쓰는 배포는 WORKERS=1 로 실행하거나 세션 ID 기준 고정 라우팅을 두어야 합니다.
+"""
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..core.logging import get_logger
+from ..utils.similarity_utils import (
+    to_normalized_matrix,
+    similarity_matrix_result,
+    best_matches_from_matrix,
+    greedy_groups_from_matrix,
+    group_average_similarity,
+    cosine_similarity_matrix,
+    threshold_matches
+)
+
+logger = get_logger(__name__)
+
+
+class BatchSession:
+    """
+    앨범 단위 배치 세션
+
+    이미지 K개를 추가하면 새 임베딩 K개와 K x N 유사도 블록만 계산합니다.
+    그룹은 기존 /batch-analysis 의 그룹화 규칙(앞에서부터 대표 선정)과
+    동일한 결과가 되도록 새 이미지만 대표들과 비교해 갱신합니다.
+    """
+
+    def __init__(self, session_id: str, similarity_threshold: float, ttl: int):
+        self.session_id = session_id
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.created_at = time.time()
+        self.last_accessed = self.created_at
+
+        self.image_ids: List[str] = []
+        self.face_info: Dict[str, Dict[str, Any]] = {}
+        self._index: Dict[str, int] = {}
+
+        # 용량을 두 배씩 늘리는 버퍼 (앞 n개만 유효)
+        self._embeddings: Optional[np.ndarray] = None
+        self._similarity: Optional[np.ndarray] = None
+
+        # 그룹 대표 인덱스 (추가 순서) 와 대표별 멤버 인덱스
+        self._leaders: List[int] = []
+        self._members: Dict[int, List[int]] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.image_ids)
+
+    @property
+    def expires_at(self) -> float:
+        return self.last_accessed + self.ttl
+
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) > self.expires_at
+
+    def touch(self):
+        """만료 시간 연장 (슬라이딩 TTL)"""
+        self.last_accessed = time.time()
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        if self._embeddings is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._embeddings[:self.size]
+
+    @property
+    def similarity(self) -> np.ndarray:
+        if self._similarity is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._similarity[:self.size, :self.size]
+
+    def _ensure_capacity(self, required: int, dim: int):
+        """버퍼 용량 확보"""
+        capacity = 0 if self._embeddings is None else self._embeddings.shape[0]
+        if required <= capacity:
+            return
+
+        new_capacity = max(required, capacity * 2, 16)
+        n = self.size
+
+        embeddings = np.zeros((new_capacity, dim), dtype=np.float32)
+        similarity = np.zeros((new_capacity, new_capacity), dtype=np.float32)
+        if n:
+            embeddings[:n] = self._embeddings[:n]
+            similarity[:n, :n] = self._similarity[:n, :n]
+
+        self._embeddings = embeddings
+        self._similarity = similarity
+
+    def add(self, items: List[Tuple[str, List[float], Dict[str, Any]]]) -> List[str]:
+        """
+        이미지 임베딩 추가
+
+        Args:
+            items: (이미지 ID, 임베딩, 얼굴 정보) 목록
+
+        Returns:
+            추가된 이미지 ID 목록
+        """
+        if not items:
+            return []
+
+        new_ids = [image_id for image_id, _, _ in items]
+        duplicated = [image_id for image_id in new_ids if image_id in self._index]
+        if duplicated or len(set(new_ids)) != len(new_ids):
+            raise ValueError(f"이미 세션에 존재하는 이미지 ID입니다: {duplicated or new_ids}")
+
+        new_embeddings = to_normalized_matrix([embedding for _, embedding, _ in items])
+        if self.size and new_embeddings.shape[1] != self._embeddings.shape[1]:
+            raise ValueError("임베딩 차원이 세션과 일치하지 않습니다")
+
+        n, k = self.size, len(items)
+        self._ensure_capacity(n + k, new_embeddings.shape[1])
+        self._embeddings[n:n + k] = new_embeddings
+
+        # 새 블록만 계산: (K, N+K)
+        block = cosine_similarity_matrix(new_embeddings, self._embeddings[:n + k])
+        self._similarity[n:n + k, :n + k] = block
+        self._similarity[:n + k, n:n + k] = block.T
+
+        for offset, (image_id, _, info) in enumerate(items):
+            self._index[image_id] = n + offset
+            self.image_ids.append(image_id)
+            self.face_info[image_id] = info
+
+        for idx in range(n, n + k):
+            self._assign_group(idx)
+
+        self.touch()
+        return new_ids
+
+    def _assign_group(self, idx: int):
+        """새 이미지를 첫 번째로 임계값을 넘는 대표의 그룹에 배정"""
+        if self._leaders:
+            leaders = np.asarray(self._leaders)
+            matched = np.flatnonzero(self._similarity[leaders, idx] >= self.similarity_threshold)
+            if matched.size:
+                self._members[self._leaders[matched[0]]].append(idx)
+                return
+
+        self._leaders.append(idx)
+        self._members[idx] = [idx]
+
+    def get_groups(self) -> Dict[str, Any]:
+        """점진적으로 유지된 그룹 반환"""
+        sim = self.similarity
+        groups = []
+
+        for leader in self._leaders:
+            members = self._members[leader]
+            if len(members) >= 2:
+                groups.append({
+                    "group_id": len(groups),
+                    "members": [self.image_ids[m] for m in members],
+                    "avg_similarity": group_average_similarity(sim, members)
+                })
+
+        return {"groups": groups}
+
+    def get_similarity_block(self, row_ids: List[str]) -> Dict[str, Any]:
+        """지정한 이미지들과 세션 전체 간 유사도 블록"""
+        rows = [self._index[image_id] for image_id in row_ids]
+        block = np.array(self.similarity[rows], dtype=np.float64)
+        for r, idx in enumerate(rows):
+            block[r, idx] = 1.0
+
+        return {
+            "row_ids": list(row_ids),
+            "column_ids": list(self.image_ids),
+            "matrix": block.tolist()
+        }
+
+    def range_search(self, threshold: float, image_id: Optional[str] = None,
+                     embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """
+        세션에서 유사도가 임계값 이상인 모든 이미지 검색
+
+        image_id 가 주어지면 이미 계산된 유사도 행을 그대로 쓰고 (자기 자신 제외),
+        embedding 이 주어지면 세션 임베딩과 한 번만 곱합니다.
+
+        Returns:
+            {"matches": [{"image_id", "similarity"}], "total_matches"} - 유사도 내림차순
+        """
+        if (image_id is None) == (embedding is None):
+            raise ValueError("image_id 와 embedding 중 하나만 지정해야 합니다")
+
+        self.touch()
+        if self.size == 0:
+            return {"matches": [], "total_matches": 0}
+
+        if image_id is not None:
+            if image_id not in self._index:
+                raise ValueError(f"세션에 존재하지 않는 이미지 ID입니다: {image_id}")
+            scores = np.array(self.similarity[self._index[image_id]], dtype=np.float32)
+            scores[self._index[image_id]] = -np.inf
+        else:
+            query = to_normalized_matrix(embedding)
+            if query.shape[1] != self._embeddings.shape[1]:
+                raise ValueError("임베딩 차원이 세션과 일치하지 않습니다")
+            scores = cosine_similarity_matrix(query, self.embeddings)[0]
+
+        hits = threshold_matches(scores, threshold)
+        return {
+            "matches": [
+                {"image_id": self.image_ids[i], "similarity": float(scores[i])} for i in hits.tolist()
+            ],
+            "total_matches": int(hits.size)
+        }
+
+    def analyze(self, analysis_type: str, similarity_threshold: Optional[float] = None) -> Dict[str, Any]:
+        """세션에 저장된 임베딩으로 배치 분석 결과 생성"""
+        threshold = self.similarity_threshold if similarity_threshold is None else similarity_threshold
+        self.touch()
+
+        if analysis_type == "similarity_matrix":
+            return similarity_matrix_result(self.similarity, self.image_ids)
+        elif analysis_type == "find_best_match":
+            return best_matches_from_matrix(self.similarity, self.image_ids, threshold)
+        elif analysis_type == "group_similar":
+            if threshold == self.similarity_threshold:
+                return self.get_groups()
+            return greedy_groups_from_matrix(self.similarity, self.image_ids, threshold)
+
+        raise ValueError(f"지원하지 않는 분석 유형입니다: {analysis_type}")
+
+    def get_summary(self) -> Dict[str, Any]:
+        """세션 요약 정보"""
+        return {
+            "session_id": self.session_id,
+            "image_count": self.size,
+            "image_ids": list(self.image_ids),
+            "similarity_threshold": self.similarity_threshold,
+            "created_at": self.created_at,
+            "expires_at": self.expires_at
+        }
+
+
+class BatchSessionManager:
+    """배치 세션 저장소 (프로세스 내, TTL 기반 - 워커 사이에 공유하지 않음)"""
+
+    def __init__(self, ttl: int = None, max_sessions: int = None, max_images: int = None):
+        self.ttl = ttl or settings.batch_session_ttl
+        self.max_sessions = max_sessions or settings.max_batch_sessions
+        self.max_images = max_images or settings.batch_session_max_images
+        self._sessions: Dict[str, BatchSession] = {}
+
+    def _purge_expired(self):
+        """만료된 세션 정리"""
+        now = time.time()
+        expired = [sid for sid, session in self._sessions.items() if session.is_expired(now)]
+        for sid in expired:
+            del self._sessions[sid]
+        if expired:
+            logger.info(f"만료된 배치 세션 {len(expired)}개 정리")
+
+    def create(self, similarity_threshold: float,
+               items: Optional[List[Tuple[str, List[float], Dict[str, Any]]]] = None) -> BatchSession:
+        """
+        새 세션 생성
+
+        초기 이미지는 등록 전에 검증하고 추가하므로, 실패하면 빈 세션이 자리를 차지하지 않습니다.
+        """
+        session = BatchSession(str(uuid.uuid4()), similarity_threshold, self.ttl)
+        if items:
+            self.check_capacity(session, len(items))
+            session.add(items)
+
+        self._purge_expired()
+
+        if len(self._sessions) >= self.max_sessions:
+            # 가장 오래 사용되지 않은 세션 제거
+            oldest = min(self._sessions.values(), key=lambda s: s.last_accessed)
+            del self._sessions[oldest.session_id]
+            logger.warning(f"배치 세션 수 초과로 세션 제거: {oldest.session_id}")
+
+        self._sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[BatchSession]:
+        """세션 조회 (만료 시 None)"""
+        self._purge_expired()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.touch()
+        return session
+
+    def check_capacity(self, session: BatchSession, additional: int):
+        """세션 최대 이미지 수 검사"""
+        if session.size + additional > self.max_images:
+            raise ValueError(f"세션 이미지 수가 최대값을 초과했습니다 (최대 {self.max_images}개)")
+
+    def delete(self, session_id: str) -> bool:
+        """세션 삭제"""
+        return self._sessions.pop(session_id, None) is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """세션 통계"""
+        self._purge_expired()
+        return {
+            "active_sessions": len(self._sessions),
+            "total_images": sum(s.size for s in self._sessions.values())
+        }
+
+
+# 전역 배치 세션 매니저
+batch_session_manager = BatchSessionManager()
@@ -0,0 +1,65 @@
+"""
+임베딩 입력 해석 - 저장된 임베딩과 이미지를 섞어서 받는 엔드포인트용
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..models.model_manager import model_manager
+from ..utils.embedding_codec import decode_embedding
+from ..utils.similarity_utils import to_normalized_matrix
+
+
+async def resolve_embedding_inputs(items: List, max_items: Optional[int] = None) -> Tuple[np.ndarray, int]:
+    """
+    EmbeddingInput 목록을 L2 정규화된 (N, D) 행렬로 변환
+
+    임베딩이 주어진 항목은 디코딩만 하고, 이미지가 주어진 항목만 얼굴 분석을 수행합니다.
+
+    Args:
+        items: EmbeddingInput 목록
+        max_items: 최대 항목 수 (기본 MAX_EMBEDDING_BATCH_SIZE)
+
+    Returns:
+        (정규화된 임베딩 행렬, 이미지에서 추출한 항목 수)
+    """
+    matrix, image_count, _ = await resolve_embedding_inputs_with_details(items, max_items)
+    return matrix, image_count
+
+
+async def resolve_embedding_inputs_with_details(items: List, max_items: Optional[int] = None) -> Tuple[np.ndarray, int, List[Optional[Dict[str, Any]]]]:
+    """
+    resolve_embedding_inputs 와 같으며, 이미지 항목의 얼굴 분석 결과(나이, 성별 등)도 반환
+
+    Returns:
+        (정규화된 임베딩 행렬, 이미지에서 추출한 항목 수, 항목별 분석 결과 또는 None)
+    """
+    image_count = sum(1 for item in items if item.embedding is None)
+    if image_count > settings.max_batch_size:
+        raise ValueError(f"이미지 입력 수가 최대값을 초과했습니다 (최대 {settings.max_batch_size}개)")
+    max_items = max_items if max_items is not None else settings.max_embedding_batch_size
+    if len(items) > max_items:
+        raise ValueError(f"임베딩 입력 수가 최대값을 초과했습니다 (최대 {max_items}개)")
+
+    analyzer = model_manager.get_face_analyzer() if image_count else None
+    vectors = []
+    details = []
+
+    for i, item in enumerate(items):
+        if item.embedding is not None:
+            vectors.append(decode_embedding(item.embedding))
+            details.append(None)
+        else:
+            try:
+                result = await analyzer.extract_embedding(item.image, face_id=0)
+            except Exception as e:
+                raise ValueError(f"입력 {item.id or i}의 이미지에서 임베딩을 추출할 수 없습니다: {e}")
+            vectors.append(result["embedding"])
+            details.append(result)
+
+    dims = {len(v) for v in vectors}
+    if len(dims) != 1:
+        raise ValueError(f"임베딩 차원이 일치하지 않습니다: {sorted(dims)}")
+
+    return to_normalized_matrix(vectors), image_count, details
@@ -0,0 +1,130 @@
+"""
+부정 캐시 - 얼굴이 없는 이미지의 감지 결과를 짧게 기억
+
+얼굴 없는 이미지도 640x640 감지를 한 번 다 돌린 뒤에야 실패하는데, 클라이언트는 같은 이미지를 반복해서
+재시도합니다. 이런 이미지는 분석 캐시(LRU) 대신 여기에 짧은 TTL 로 넣어, 재시도는 추론 없이 바로 실패하고
+얼굴 있는 이미지의 캐시 항목을 밀어내지도 않게 합니다.
+
+클라이언트별 요청 수와 얼굴 없음/실패 수도 함께 집계해 어떤 클라이언트가 이런 요청을 반복하는지 보여줍니다.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from ..core.config import settings
+from ..core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class NegativeCache:
+    """얼굴 없음 이미지 해시 -> 만료 시각"""
+
+    def __init__(self, ttl: int = None, max_entries: int = None, enabled: bool = None):
+        self.ttl = ttl if ttl is not None else settings.cache_negative_ttl
+        self.max_entries = max_entries if max_entries is not None else settings.cache_negative_max_entries
+        self.enabled = enabled if enabled is not None else settings.cache_enabled
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "additions": 0, "evictions": 0}
+
+    def contains(self, key: str) -> bool:
+        """얼굴 없음으로 기억된 이미지인지 (적중이면 hits 증가)"""
+        if not self.enabled:
+            return False
+
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return False
+            self._counts["hits"] += 1
+            return True
+
+    def add(self, key: str):
+        """얼굴 없음 이미지 기록 (TTL 은 갱신하지 않고 처음 기록 기준)"""
+        if not self.enabled or self.max_entries <= 0:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = time.monotonic() + self.ttl
+            self._counts["additions"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counts["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "ttl": self.ttl,
+                **self._counts
+            }
+
+
+class ClientFailureStats:
+    """
+    클라이언트별 분석 요청/얼굴 없음/실패 수
+
+    클라이언트는 X-Client-ID 헤더, 없으면 IP 로 구분하며 식별자는 해시로만 보관합니다.
+    max_clients 를 넘으면 가장 오래 요청이 없던 클라이언트부터 버립니다.
+    """
+
+    def __init__(self, max_clients: int = None):
+        self.max_clients = max_clients if max_clients is not None else settings.client_stats_max_clients
+        self._clients: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def client_id(client_header: Optional[str], client_ip: Optional[str]) -> str:
+        """클라이언트 식별자 (개인정보 보호를 위해 해시)"""
+        if client_header:
+            source = f"id:{client_header}"
+        else:
+            source = f"ip:{client_ip or 'unknown'}"
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+
+    def record(self, client_id: str, status_code: int, no_face: bool = False):
+        """분석 요청 결과 기록"""
+        with self._lock:
+            stats = self._clients.pop(client_id, None) or {"requests": 0, "no_face": 0, "failed": 0}
+            stats["requests"] += 1
+            stats["no_face"] += int(no_face)
+            stats["failed"] += int(status_code >= 400)
+            stats["last_seen"] = time.time()
+            self._clients[client_id] = stats
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+
+    def get_stats(self, top: int = 20) -> Dict[str, Any]:
+        """얼굴 없음 요청이 많은 순서의 클라이언트 목록"""
+        with self._lock:
+            clients: List[Dict[str, Any]] = [
+                {
+                    "client": client_id,
+                    **stats,
+                    "no_face_rate": stats["no_face"] / stats["requests"],
+                    "failure_rate": stats["failed"] / stats["requests"]
+                }
+                for client_id, stats in self._clients.items()
+            ]
+        clients.sort(key=lambda c: (c["no_face"], c["failed"]), reverse=True)
+        return {"tracked_clients": len(clients), "clients": clients[:top]}
+
+
+# 전역 부정 캐시
+negative_cache = NegativeCache()
+
+# 전역 클라이언트별 실패 통계
+client_stats = ClientFailureStats()
@@ -0,0 +1,251 @@
+"""
+Redis 얼굴 분석 캐시 - 워커 프로세스 사이에서 감지 결과 공유
+
+gunicorn 워커가 N 개면 프로세스 내 캐시(analysis_cache)는 같은 이미지가 같은 워커로 갈 때만 적중하므로
+적중률이 약 1/N 로 떨어집니다. 이 계층은 프로세스 캐시 뒤에 놓여 다른 워커가 계산한 결과를 가져옵니다.
+
+값은 pickle 대신 고정 길이 레코드의 바이너리로 저장합니다 (얼굴당 헤더 80 바이트 + float32 임베딩,
+512차원 약 2.1KB). 임베딩을 그대로 저장하므로 캐시 적중 결과가 직접 계산한 결과와 비트 단위로 같습니다.
+float16 저장(CACHE_REDIS_FLOAT16)은 크기를 절반으로 줄이는 대신 임베딩이 바뀌는(약 1e-3) 선택 모드입니다.
+Redis 에 연결할 수 없으면 retry_interval 초 동안 호출을 건너뛰고 로컬 계산으로 넘어갑니다.
+"""
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..core.config import settings
+from ..core.logging import get_logger
+from .analysis_cache import CachedFace
+
+try:
+    import redis
+except ImportError:  # 선택 의존성 - 없으면 Redis 계층을 끔
+    redis = None
+
+logger = get_logger(__name__)
+
+# 헤더: 매직(임베딩 형식), 얼굴 수, 임베딩 차원
+_HEADER = struct.Struct("<4sHH")
+_MAGIC = b"FAC2"
+_MAGIC_FLOAT16 = b"FAC1"
+_EMBEDDING_DTYPES = {_MAGIC: "<f4", _MAGIC_FLOAT16: "<f2"}
+
+# 레코드 플래그
+_HAS_KPS = 1
+_HAS_EMBEDDING = 2
+_HAS_GENDERAGE = 4
+
+
+def _record_dtype(dim: int, embedding_dtype: str = "<f4") -> np.dtype:
+    """얼굴 하나의 고정 길이 레코드"""
+    return np.dtype([
+        ("bbox", "<f4", (4,)),
+        ("kps", "<f4", (5, 2)),
+        ("det_score", "<f4"),
+        ("embedding_norm", "<f4"),
+        ("age", "<i2"),
+        ("gender", "i1"),
+        ("flags", "u1"),
+        ("genderage", "<f4", (3,)),
+        ("embedding", embedding_dtype, (dim,))
+    ])
+
+
+def serialize_faces(faces: Sequence[CachedFace], float16: bool = False) -> bytes:
+    """얼굴 목록을 바이너리로 변환 (임베딩은 정규화된 벡터를 float32, float16 이면 손실 있는 float16 으로 저장)"""
+    magic = _MAGIC_FLOAT16 if float16 else _MAGIC
+    dim = next((f.normed_embedding.shape[0] for f in faces if f.normed_embedding is not None), 0)
+    records = np.zeros(len(faces), dtype=_record_dtype(dim, _EMBEDDING_DTYPES[magic]))
+
+    for record, face in zip(records, faces):
+        flags = 0
+        record["bbox"] = face.bbox[:4]
+        record["det_score"] = face.det_score
+        record["embedding_norm"] = face.embedding_norm
+        record["age"] = -1 if face.age is None else face.age
+        record["gender"] = -1 if face.gender is None else face.gender
+        if face.kps is not None and face.kps.shape == (5, 2):
+            record["kps"] = face.kps
+            flags |= _HAS_KPS
+        if face.normed_embedding is not None:
+            record["embedding"] = face.normed_embedding
+            flags |= _HAS_EMBEDDING
+        if face.genderage is not None and face.genderage.size == 3:
+            record["genderage"] = face.genderage.reshape(3)
+            flags |= _HAS_GENDERAGE
+        record["flags"] = flags
+
+    return _HEADER.pack(magic, len(faces), dim) + records.tobytes()
+
+
+def deserialize_faces(data: bytes) -> List[CachedFace]:
+    """serialize_faces 의 역변환"""
+    magic, count, dim = _HEADER.unpack_from(data)
+    if magic not in _EMBEDDING_DTYPES:
+        raise ValueError("알 수 없는 캐시 값 형식입니다")
+
+    records = np.frombuffer(data, dtype=_record_dtype(dim, _EMBEDDING_DTYPES[magic]), count=count,
+                            offset=_HEADER.size)
+    faces = []
+    for record in records:
+        flags = int(record["flags"])
+        faces.append(CachedFace(
+            bbox=record["bbox"],
+            kps=record["kps"] if flags & _HAS_KPS else None,
+            det_score=float(record["det_score"]),
+            normed_embedding=record["embedding"].astype(np.float32) if flags & _HAS_EMBEDDING else None,
+            embedding_norm=float(record["embedding_norm"]),
+            age=int(record["age"]) if record["age"] >= 0 else None,
+            gender=int(record["gender"]) if record["gender"] >= 0 else None,
+            genderage=record["genderage"] if flags & _HAS_GENDERAGE else None
+        ))
+    return faces
+
+
+class RedisAnalysisCache:
+    """
+    Redis 에 저장하는 얼굴 분석 캐시 계층
+
+    조회는 MGET 한 번, 저장은 파이프라인 한 번으로 처리하므로 배치 요청도 왕복 1회입니다.
+    Redis 오류는 예외로 올리지 않고 캐시 미스로 처리합니다.
+    """
+
+    def __init__(self, url: str = None, ttl: int = None, enabled: bool = None,
+                 prefix: str = None, retry_interval: float = 30.0, client=None, float16: bool = None):
+        self.url = url if url is not None else settings.redis_url
+        self.ttl = ttl if ttl is not None else settings.cache_ttl
+        self.enabled = enabled if enabled is not None else settings.cache_redis_enabled
+        self.prefix = prefix if prefix is not None else f"face-analysis:{settings.model_name}:"
+        self.retry_interval = retry_interval
+        self.float16 = float16 if float16 is not None else settings.cache_redis_float16
+        self._client = client
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "errors": 0, "skipped": 0}
+
+        if self.enabled and client is None and redis is None:
+            logger.warning("redis 패키지가 없어 Redis 캐시를 사용하지 않습니다")
+            self.enabled = False
+
+    def _get_client(self):
+        """연결 가능한 클라이언트 (사용 안 함이거나 장애 대기 중이면 None)"""
+        if not self.enabled:
+            return None
+        if time.monotonic() < self._down_until:
+            self._count("skipped")
+            return None
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def _mark_down(self, error: Exception):
+        """장애 표시 - retry_interval 동안 Redis 호출을 건너뜀"""
+        self._count("errors")
+        self._down_until = time.monotonic() + self.retry_interval
+        logger.warning(f"Redis 캐시 사용 불가, {self.retry_interval:.0f}초 동안 로컬 계산으로 대체: {error}")
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[CachedFace]]:
+        """여러 이미지의 얼굴 목록을 한 번에 조회 (찾은 키만 반환)"""
+        keys = list(dict.fromkeys(keys))
+        client = self._get_client() if keys else None
+        if client is None:
+            return {}
+
+        try:
+            values = client.mget([self.prefix + key for key in keys])
+        except Exception as e:
+            self._mark_down(e)
+            return {}
+
+        found = {}
+        for key, value in zip(keys, values):
+            if value is None:
+                continue
+            try:
+                found[key] = deserialize_faces(value)
+            except Exception as e:
+                logger.warning(f"Redis 캐시 값 해석 실패 ({key}): {e}")
+
+        self._count("hits", len(found))
+        self._count("misses", len(keys) - len(found))
+        return found
+
+    def get(self, key: str) -> Optional[List[CachedFace]]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, entries: Dict[str, List[CachedFace]], ttl: Optional[int] = None):
+        """여러 이미지의 얼굴 목록을 파이프라인으로 저장 (ttl 이 없으면 기본 TTL)"""
+        client = self._get_client() if entries else None
+        if client is None:
+            return
+
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for key, faces in entries.items():
+                pipeline.set(self.prefix + key, serialize_faces(faces, self.float16), ex=ttl if ttl is not None else self.ttl)
+            pipeline.execute()
+        except Exception as e:
+            self._mark_down(e)
+
+    def put(self, key: str, faces: List[CachedFace], ttl: Optional[int] = None):
+        self.put_many({key: faces}, ttl=ttl)
+
+    def get_bytes(self, key: str, ttl: Optional[int] = None) -> Optional[bytes]:
+        """얼굴 목록이 아닌 값 조회 (참조 얼굴 등, ttl 이 주어지면 만료 시각도 연장)"""
+        client = self._get_client()
+        if client is None:
+            return None
+
+        try:
+            pipeline = client.pipeline(transaction=False)
+            pipeline.get(self.prefix + key)
+            if ttl is not None:
+                pipeline.expire(self.prefix + key, ttl)
+            return pipeline.execute()[0]
+        except Exception as e:
+            self._mark_down(e)
+            return None
+
+    def put_bytes(self, key: str, value: bytes, ttl: Optional[int] = None):
+        """얼굴 목록이 아닌 값 저장"""
+        client = self._get_client()
+        if client is None:
+            return
+
+        try:
+            client.set(self.prefix + key, value, ex=ttl if ttl is not None else self.ttl)
+        except Exception as e:
+            self._mark_down(e)
+
+    def delete(self, key: str):
+        client = self._get_client()
+        if client is None:
+            return
+
+        try:
+            client.delete(self.prefix + key)
+        except Exception as e:
+            self._mark_down(e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """히트/미스/오류 통계"""
+        with self._lock:
+            lookups = self._counts["hits"] + self._counts["misses"]
+            return {
+                "enabled": self.enabled,
+                "available": self.enabled and time.monotonic() >= self._down_until,
+                "float16": self.float16,
+                **self._counts,
+                "hit_rate": self._counts["hits"] / lookups if lookups else 0.0
+            }
+
+
+# 전역 Redis 얼굴 분석 캐시
+redis_cache = RedisAnalysisCache()
@@ -0,0 +1,192 @@
+"""
+참조 얼굴 - 한 번 올린 얼굴을 ID 로 여러 비교 요청에 재사용
+
+같은 자녀 사진을 수십 번의 /compare-faces, /compare-family-faces 호출에 보내는 흐름에서
+매번 업로드와 분석을 반복하지 않도록, 얼굴 하나(임베딩, 키포인트, 나이)를 TTL 동안 서버에 보관하고
+비교 엔드포인트에서 이미지 대신 reference_id 를 받습니다.
+
+참조 얼굴은 프로세스 안에 보관하고, Redis 계층(CACHE_REDIS_ENABLED)이 켜져 있으면 Redis 에도 저장해
+gunicorn 워커 여러 개 중 어느 워커가 요청을 받아도 찾을 수 있습니다. Redis 없이 워커를 여러 개 띄우면
+참조 얼굴은 만든 워커에서만 보이므로 WORKERS=1 로 실행해야 합니다. 다른 워커에서 삭제한 참조 얼굴은
+이 워커의 사본이 만료될 때까지 계속 쓰일 수 있습니다.
+
+/family-matrix 와 /embeddings/* 는 reference_id 를 받지 않습니다. /family-matrix 는 이미지 목록 전체를
+해시로 중복 제거해 한 번씩 분석하고, /embeddings/* 는 /extract-embedding 결과 임베딩을 그대로 받으므로
+같은 얼굴을 다시 분석하지 않는다는 참조 얼굴의 목적을 이미 충족합니다.
+"""
+import copy
+import json
+import struct
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from ..core.config import settings
+from ..core.logging import get_logger
+from .analysis_cache import CachedFace
+from .redis_cache import redis_cache, serialize_faces, deserialize_faces
+
+logger = get_logger(__name__)
+
+# 공유 저장 값: 메타데이터(JSON) 길이 + 메타데이터 + 얼굴 레코드
+_META_LENGTH = struct.Struct("<I")
+
+
+class ReferenceFace:
+    """보관 중인 참조 얼굴 (마지막 사용 기준 TTL)"""
+
+    def __init__(self, reference_id: str, face: CachedFace, ttl: int, name: Optional[str] = None):
+        self.reference_id = reference_id
+        self.face = face
+        self.ttl = ttl
+        self.name = name
+        self.created_at = time.time()
+        self.last_accessed = self.created_at
+        self.use_count = 0
+
+    @property
+    def token(self) -> str:
+        """단일 실행/ETag 키에서 이미지 대신 쓰는 식별 문자열"""
+        return f"reference:{self.reference_id}"
+
+    @property
+    def expires_at(self) -> float:
+        return self.last_accessed + self.ttl
+
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) >= self.expires_at
+
+    def touch(self):
+        """사용 시각 갱신 (TTL 연장)"""
+        self.last_accessed = time.time()
+        self.use_count += 1
+
+    def get_summary(self) -> Dict[str, Any]:
+        """참조 얼굴 정보 (임베딩 제외)"""
+        face = self.face
+        return {
+            "reference_id": self.reference_id,
+            "name": self.name,
+            "bounding_box": {
+                "x": float(face.bbox[0]),
+                "y": float(face.bbox[1]),
+                "width": float(face.bbox[2] - face.bbox[0]),
+                "height": float(face.bbox[3] - face.bbox[1])
+            },
+            "confidence": float(face.det_score),
+            "age": face.age,
+            "has_landmarks": face.kps is not None,
+            "use_count": self.use_count,
+            "created_at": self.created_at,
+            "expires_at": self.expires_at
+        }
+
+
+def _pack_reference(reference: ReferenceFace) -> bytes:
+    """공유 저장용 바이너리 (임베딩은 손실 없이 float32)"""
+    meta = json.dumps({"name": reference.name, "created_at": reference.created_at}).encode("utf-8")
+    return _META_LENGTH.pack(len(meta)) + meta + serialize_faces([reference.face], float16=False)
+
+
+def _unpack_reference(reference_id: str, data: bytes, ttl: int) -> ReferenceFace:
+    """_pack_reference 의 역변환"""
+    (length,) = _META_LENGTH.unpack_from(data)
+    meta = json.loads(data[_META_LENGTH.size:_META_LENGTH.size + length])
+    face = deserialize_faces(data[_META_LENGTH.size + length:])[0]
+    reference = ReferenceFace(reference_id, face, ttl, meta.get("name"))
+    reference.created_at = meta.get("created_at", reference.created_at)
+    return reference
+
+
+class ReferenceFaceManager:
+    """참조 얼굴 저장소 (프로세스 내 + 선택적 Redis 공유, TTL 기반)"""
+
+    def __init__(self, ttl: int = None, max_references: int = None, shared=None):
+        self.ttl = ttl or settings.reference_face_ttl
+        self.max_references = max_references or settings.max_reference_faces
+        self.shared = shared if shared is not None else redis_cache
+        self._references: Dict[str, ReferenceFace] = {}
+
+    @staticmethod
+    def _shared_key(reference_id: str) -> str:
+        return f"reference:{reference_id}"
+
+    def _purge_expired(self):
+        """만료된 참조 얼굴 정리"""
+        now = time.time()
+        expired = [rid for rid, ref in self._references.items() if ref.is_expired(now)]
+        for rid in expired:
+            del self._references[rid]
+        if expired:
+            logger.info(f"만료된 참조 얼굴 {len(expired)}개 정리")
+
+    def _store(self, reference: ReferenceFace):
+        """프로세스 내 보관 (최대 수를 넘으면 가장 오래 사용되지 않은 참조 얼굴 제거)"""
+        if len(self._references) >= self.max_references:
+            oldest = min(self._references.values(), key=lambda r: r.last_accessed)
+            del self._references[oldest.reference_id]
+            logger.warning(f"참조 얼굴 수 초과로 제거: {oldest.reference_id}")
+        self._references[reference.reference_id] = reference
+
+    def create(self, face: CachedFace, age: Optional[int] = None, name: Optional[str] = None) -> ReferenceFace:
+        """
+        참조 얼굴 생성
+
+        분석 캐시의 얼굴 객체와 공유하지 않도록 복사하며, age 가 주어지면 감지된 나이 대신 사용합니다.
+        """
+        self._purge_expired()
+
+        face = copy.copy(face)
+        if age is not None:
+            face.age = age
+
+        reference = ReferenceFace(str(uuid.uuid4()), face, self.ttl, name)
+        self._store(reference)
+        self.shared.put_bytes(self._shared_key(reference.reference_id), _pack_reference(reference), ttl=self.ttl)
+        return reference
+
+    def get(self, reference_id: str) -> Optional[ReferenceFace]:
+        """
+        참조 얼굴 조회 (만료 시 None, 조회하면 TTL 연장)
+
+        이 프로세스에 없으면 다른 워커가 공유 저장소에 넣은 참조 얼굴을 가져와 보관합니다.
+        """
+        self._purge_expired()
+        reference = self._references.get(reference_id)
+        # 다른 워커의 사용으로도 만료되지 않도록 공유 저장소의 TTL 도 연장
+        data = self.shared.get_bytes(self._shared_key(reference_id), ttl=self.ttl)
+        if reference is None and data is not None:
+            try:
+                reference = _unpack_reference(reference_id, data, self.ttl)
+            except Exception as e:
+                logger.warning(f"공유 참조 얼굴 해석 실패 ({reference_id}): {e}")
+                return None
+            self._store(reference)
+        if reference is not None:
+            reference.touch()
+        return reference
+
+    def resolve(self, reference_id: str) -> ReferenceFace:
+        """비교 요청용 조회 (없으면 ValueError)"""
+        reference = self.get(reference_id)
+        if reference is None:
+            raise ValueError(f"참조 얼굴을 찾을 수 없거나 만료되었습니다: {reference_id}")
+        return reference
+
+    def delete(self, reference_id: str) -> bool:
+        """참조 얼굴 삭제"""
+        self.shared.delete(self._shared_key(reference_id))
+        return self._references.pop(reference_id, None) is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """참조 얼굴 통계"""
+        self._purge_expired()
+        return {
+            "active_references": len(self._references),
+            "shared": self.shared.enabled,
+            "total_uses": sum(r.use_count for r in self._references.values())
+        }
+
+
+# 전역 참조 얼굴 매니저
+reference_face_manager = ReferenceFaceManager()
@@ -0,0 +1,119 @@
+"""
+응답 캐시 - 멱등 분석 응답의 ETag 와 직렬화된 본문 재사용
+
+ETag 는 (엔드포인트, 이미지 해시, 파라미터, 모델 버전) 에서 만들므로 같은 입력에는 항상 같은 값입니다.
+클라이언트가 If-None-Match 로 보내면 모델을 거치지 않고 304 를 돌려주고, 다른 클라이언트의 반복 요청은
+저장해 둔 data 의 JSON 바이트에 새 메타데이터(request_id, timestamp, processing_time)만 붙여 돌려줘
+추론과 결과 재직렬화를 모두 건너뜁니다.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from ..core.logging import get_logger
+from .single_flight import SingleFlight
+
+logger = get_logger(__name__)
+
+
+def make_etag(endpoint: str, images: List[str], params: Dict[str, Any], model_version: str) -> str:
+    """강한 ETag (따옴표 포함)"""
+    key = f"{SingleFlight.make_key(endpoint, images, params)}:{model_version}"
+    return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 헤더가 ETag 와 일치하는지 (약한 비교, * 허용)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    ETag 별 직렬화된 응답 data LRU 캐시
+
+    항목 수(max_entries)와 본문 바이트 합(max_bytes) 둘 다로 제한하며, ttl 초가 지난 항목은 조회 시 버립니다.
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None, ttl: int = None, enabled: bool = None):
+        self.max_entries = max_entries if max_entries is not None else settings.response_cache_max_entries
+        self.max_bytes = max_bytes if max_bytes is not None else settings.response_cache_max_bytes
+        self.ttl = ttl if ttl is not None else settings.cache_ttl
+        self.enabled = enabled if enabled is not None else settings.response_cache_enabled
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0}
+
+    def get(self, etag: str) -> Optional[bytes]:
+        """저장된 응답 본문 (없거나 만료되면 None)"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(etag)
+                entry = None
+            if entry is None:
+                self._counts["misses"] += 1
+                return None
+
+            self._entries.move_to_end(etag)
+            self._counts["hits"] += 1
+            return entry[1]
+
+    def put(self, etag: str, body: bytes):
+        """응답 본문 저장 (한도를 넘으면 오래된 항목부터 제거)"""
+        if not self.enabled or len(body) > self.max_bytes:
+            return
+
+        with self._lock:
+            if etag in self._entries:
+                self._remove(etag)
+            self._entries[etag] = (time.monotonic() + self.ttl, body)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._counts["evictions"] += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self._counts["not_modified"] += 1
+
+    def _remove(self, etag: str):
+        _, body = self._entries.pop(etag)
+        self._bytes -= len(body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """히트/미스/304 통계"""
+        with self._lock:
+            lookups = self._counts["hits"] + self._counts["misses"]
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                **self._counts,
+                "hit_rate": self._counts["hits"] / lookups if lookups else 0.0
+            }
+
+
+# 전역 응답 캐시
+response_cache = ResponseCache()
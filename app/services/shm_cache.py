@@ -0,0 +1,255 @@
+"""
+공유 메모리 얼굴 분석 캐시 - 같은 호스트의 워커 프로세스끼리 Redis 없이 감지 결과 공유
+
+multiprocessing.shared_memory 세그먼트 하나에 고정 크기 슬롯을 두고, 이미지 해시로 슬롯 묶음(버킷)을
+고르는 집합 연관(set-associative) 해시 인덱스로 찾습니다. 값은 Redis 계층과 같은 바이너리 형식
+(serialize_faces) 입니다.
+
+동시성:
+- 읽기는 잠금 없이 슬롯별 시퀀스 번호(seqlock)로 확인합니다. 쓰는 중(홀수)이거나 읽는 동안 번호가
+  바뀌었으면 미스로 처리합니다.
+- 쓰기는 버킷을 stripes 개로 나눈 줄무늬 잠금을 잡습니다. gunicorn 워커처럼 서로 관련 없는 프로세스도
+  같이 쓸 수 있도록 잠금 파일의 바이트 범위 잠금(fcntl.lockf)과 프로세스 내 스레드 잠금을 함께 씁니다.
+
+세그먼트는 어느 워커가 종료돼도 남아 있도록 resource_tracker 등록을 해제하며, 호스트 재시작 또는
+unlink() 호출 때 사라집니다. 서비스를 재시작해도 세그먼트가 남으므로 슬롯 키에는 Redis 계층의 키 접두사처럼
+모델 이름(MODEL_NAME)을 섞습니다.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..core.config import settings
+from ..core.logging import get_logger
+from .analysis_cache import CachedFace
+from .redis_cache import serialize_faces, deserialize_faces
+
+try:
+    import fcntl
+except ImportError:  # Windows - 프로세스 내 잠금만 사용
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# 슬롯 헤더: 시퀀스 번호(짝수면 안정), 키, 만료 시각(time.time), 값 길이
+_SLOT_HEADER = np.dtype([
+    ("seq", "<u8"),
+    ("key", "<u8"),
+    ("expires", "<f8"),
+    ("length", "<u4"),
+    ("pad", "<u4")
+])
+
+
+def _slot_key(key: str) -> int:
+    """캐시 키 문자열을 64비트 키로 변환 (0 은 빈 슬롯 표시라 쓰지 않음)"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+class SharedMemoryAnalysisCache:
+    """
+    호스트 공유 메모리 얼굴 분석 캐시
+
+    슬롯 slots 개를 ways 개씩 묶은 버킷 안에서만 찾고 교체하므로 조회는 슬롯 ways 개 확인입니다.
+    버킷이 차면 만료 시각이 가장 이른 슬롯을 덮어씁니다. 직렬화한 값이 slot_bytes 를 넘는
+    (얼굴이 많은) 이미지는 저장하지 않습니다.
+    """
+
+    def __init__(self, name: str = None, slots: int = None, slot_bytes: int = None, ttl: int = None,
+                 enabled: bool = None, ways: int = 4, stripes: int = 64, namespace: str = None):
+        self.name = name if name is not None else settings.cache_shm_name
+        # 슬롯 키에 섞는 모델 이름
+        self.namespace = namespace if namespace is not None else settings.model_name
+        self.slot_bytes = slot_bytes if slot_bytes is not None else settings.cache_shm_slot_bytes
+        self.ttl = ttl if ttl is not None else settings.cache_ttl
+        self.enabled = enabled if enabled is not None else settings.cache_shm_enabled
+        self.ways = ways
+        slots = slots if slots is not None else settings.cache_shm_slots
+        self.buckets = max(1, slots // ways)
+        self.slots = self.buckets * ways
+        self.stripes = min(stripes, self.buckets)
+
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._lock_fd: Optional[int] = None
+        self._thread_locks = [threading.Lock() for _ in range(self.stripes)]
+        self._stats_lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "torn_reads": 0, "writes": 0, "evictions": 0, "oversize": 0}
+
+        if self.enabled:
+            try:
+                self._attach()
+            except Exception as e:
+                logger.warning(f"공유 메모리 캐시를 열 수 없어 사용하지 않습니다: {e}")
+                self.close()
+                self.enabled = False
+
+    @property
+    def size_bytes(self) -> int:
+        return self.slots * (_SLOT_HEADER.itemsize + self.slot_bytes)
+
+    def _attach(self):
+        """세그먼트 생성 또는 다른 워커가 만든 세그먼트에 연결"""
+        try:
+            self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=self.size_bytes)
+            logger.info(f"공유 메모리 캐시 생성: {self.name} ({self.size_bytes / 1024 / 1024:.1f}MB, 슬롯 {self.slots}개)")
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=self.name)
+            if self._shm.size < self.size_bytes:
+                raise ValueError(f"기존 세그먼트 크기({self._shm.size})가 설정과 다릅니다")
+
+        # 워커 하나가 종료될 때 세그먼트가 지워지지 않도록 추적 해제
+        resource_tracker.unregister(self._shm._name, "shared_memory")
+
+        self._headers = np.ndarray((self.slots,), dtype=_SLOT_HEADER, buffer=self._shm.buf)
+        self._payloads = np.ndarray(
+            (self.slots, self.slot_bytes), dtype=np.uint8, buffer=self._shm.buf,
+            offset=self.slots * _SLOT_HEADER.itemsize
+        )
+
+        if fcntl is not None:
+            lock_path = os.path.join(tempfile.gettempdir(), f"{self.name}.lock")
+            self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self._counts[name] += amount
+
+    def _bucket(self, slot_key: int) -> range:
+        start = (slot_key % self.buckets) * self.ways
+        return range(start, start + self.ways)
+
+    def _read(self, slot_key: int, now: float) -> Optional[bytes]:
+        """잠금 없이 버킷에서 키 검색 (쓰는 중이거나 찢어진 읽기면 None)"""
+        headers = self._headers
+        for slot in self._bucket(slot_key):
+            seq = int(headers["seq"][slot])
+            if seq & 1 or int(headers["key"][slot]) != slot_key:
+                continue
+            if headers["expires"][slot] <= now:
+                return None
+
+            length = int(headers["length"][slot])
+            data = self._payloads[slot, :length].tobytes()
+            if int(headers["seq"][slot]) != seq or int(headers["key"][slot]) != slot_key:
+                self._count("torn_reads")
+                return None
+            return data
+        return None
+
+    def get(self, key: str) -> Optional[List[CachedFace]]:
+        """공유 메모리에서 얼굴 목록 조회"""
+        if not self.enabled:
+            return None
+
+        data = self._read(_slot_key(f"{self.namespace}:{key}"), time.time())
+        if data is not None:
+            try:
+                faces = deserialize_faces(data)
+                self._count("hits")
+                return faces
+            except Exception as e:
+                logger.warning(f"공유 메모리 캐시 값 해석 실패 ({key}): {e}")
+        self._count("misses")
+        return None
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[CachedFace]]:
+        """여러 이미지 조회 (찾은 키만 반환)"""
+        found = {}
+        for key in dict.fromkeys(keys):
+            faces = self.get(key)
+            if faces is not None:
+                found[key] = faces
+        return found
+
+    def put(self, key: str, faces: List[CachedFace], ttl: Optional[int] = None):
+        """얼굴 목록 저장 (버킷이 차면 가장 먼저 만료될 슬롯을 교체, ttl 이 없으면 기본 TTL)"""
+        if not self.enabled:
+            return
+
+        data = serialize_faces(faces)
+        if len(data) > self.slot_bytes:
+            self._count("oversize")
+            return
+
+        slot_key = _slot_key(f"{self.namespace}:{key}")
+        bucket = self._bucket(slot_key)
+        stripe = (slot_key % self.buckets) % self.stripes
+        headers = self._headers
+        now = time.time()
+
+        with self._thread_locks[stripe]:
+            if self._lock_fd is not None:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                slot = next((s for s in bucket if int(headers["key"][s]) == slot_key), None)
+                if slot is None:
+                    slot = min(bucket, key=lambda s: headers["expires"][s])
+                    if headers["key"][slot] != 0 and headers["expires"][slot] > now:
+                        self._count("evictions")
+
+                # 시퀀스 번호를 홀수로 올려 읽기 측에 쓰는 중임을 알린 뒤 값을 바꾸고 다시 짝수로
+                headers["seq"][slot] += 1
+                headers["key"][slot] = slot_key
+                headers["length"][slot] = len(data)
+                headers["expires"][slot] = now + (ttl if ttl is not None else self.ttl)
+                self._payloads[slot, :len(data)] = np.frombuffer(data, dtype=np.uint8)
+                headers["seq"][slot] += 1
+            finally:
+                if self._lock_fd is not None:
+                    fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe)
+
+        self._count("writes")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """히트/미스/교체 통계와 사용 중인 슬롯 수"""
+        used = 0
+        if self.enabled:
+            used = int(np.count_nonzero(
+                (self._headers["key"] != 0) & (self._headers["expires"] > time.time())
+            ))
+        with self._stats_lock:
+            lookups = self._counts["hits"] + self._counts["misses"]
+            return {
+                "enabled": self.enabled,
+                "name": self.name,
+                "slots": self.slots,
+                "used_slots": used,
+                "slot_bytes": self.slot_bytes,
+                **self._counts,
+                "hit_rate": self._counts["hits"] / lookups if lookups else 0.0
+            }
+
+    def close(self):
+        """이 프로세스의 연결만 닫음 (세그먼트는 유지)"""
+        self._headers = self._payloads = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def unlink(self):
+        """세그먼트와 잠금 파일 삭제 (배포 종료나 테스트 정리용)"""
+        name = self.name
+        self.close()
+        try:
+            segment = shared_memory.SharedMemory(name=name)
+            segment.close()
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            os.remove(os.path.join(tempfile.gettempdir(), f"{name}.lock"))
+        except FileNotFoundError:
+            pass
+
+
+# 전역 공유 메모리 얼굴 분석 캐시
+shm_cache = SharedMemoryAnalysisCache()
@@ -0,0 +1,123 @@
+"""
+단일 실행 (single-flight) - 처리 중인 동일 요청을 하나의 계산으로 합침
+
+프런트엔드 이중 제출이나 재시도처럼 같은 (엔드포인트, 이미지 해시, 파라미터) 요청이 처리 중에 또 들어오면
+새로 계산하지 않고 먼저 들어온 요청(리더)의 결과를 기다려 함께 받습니다.
+
+분석은 동기 추론이라 이벤트 루프에서 그대로 실행하면 두 번째 요청이 첫 번째가 끝난 뒤에야 들어옵니다.
+그래서 리더의 계산은 크기가 정해진 작업 스레드 풀(ANALYSIS_WORKERS)에서 동기 분석 메서드를 바로 호출해
+실행하고, 이벤트 루프는 그동안 들어오는 동일 요청을 대기열에 붙입니다. 풀 크기가 동시에 실행되는 추론
+수의 상한이므로 기본 스레드 풀(asyncio.to_thread)을 다른 작업과 나눠 쓰지 않습니다. 같은 워커 프로세스 안에서만 합쳐지며, 다른 워커의 중복은
+공유 분석 캐시(공유 메모리/Redis)가 감지 결과 재사용으로 줄입니다.
+"""
+import asyncio
+import contextvars
+import copy
+import functools
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from ..core.config import settings
+from ..core.logging import get_logger
+from ..core.request_context import get_request_flags
+from ..utils.image_utils import get_image_hash
+
+logger = get_logger(__name__)
+
+
+class SingleFlight:
+    """
+    처리 중인 요청 키별 공유 작업
+
+    리더 계산은 별도 태스크로 돌리고 모든 요청이 shield 로 기다리므로, 리더 요청의 클라이언트가 끊겨도
+    뒤따르는 요청은 결과를 받습니다. 결과 dict 는 라우트에서 후처리로 수정하므로 뒤따르는 요청에는 사본을 줍니다.
+    """
+
+    def __init__(self, enabled: bool = None, max_workers: int = None):
+        self.enabled = enabled if enabled is not None else settings.single_flight_enabled
+        self.max_workers = max_workers if max_workers is not None else settings.analysis_workers
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="analysis")
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._counts = {"leaders": 0, "coalesced": 0, "failures": 0}
+        self._coalesced_by_endpoint: Dict[str, int] = {}
+
+    @staticmethod
+    def make_key(endpoint: str, images: List[str], params: Dict[str, Any]) -> str:
+        """(엔드포인트, 이미지 해시, 파라미터) 키"""
+        image_hashes = ",".join(get_image_hash(image) for image in images)
+        params_hash = hashlib.sha256(
+            json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:16]
+        return f"{endpoint}:{image_hashes}:{params_hash}"
+
+    async def run(self, endpoint: str, images: List[str], params: Dict[str, Any],
+                  func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        분석 메서드 실행 (같은 키가 처리 중이면 그 결과를 기다림)
+
+        Args:
+            endpoint: 엔드포인트 이름
+            images: 요청 이미지 (Base64)
+            params: 결과에 영향을 주는 나머지 요청 파라미터
+            func: 동기 분석 함수 (리더만 작업 스레드에서 실행)
+        """
+        if not self.enabled:
+            return await self.submit(func, *args, **kwargs)
+
+        key = self.make_key(endpoint, images, params)
+        task = self._inflight.get(key)
+        if task is not None:
+            with self._lock:
+                self._counts["coalesced"] += 1
+                self._coalesced_by_endpoint[endpoint] = self._coalesced_by_endpoint.get(endpoint, 0) + 1
+            logger.debug(f"처리 중인 동일 요청에 합류: {endpoint}")
+            try:
+                return copy.deepcopy(await asyncio.shield(task))
+            finally:
+                # 리더 계산 중 남긴 요청 표시 (얼굴 없음 등) 를 이 요청에도 반영
+                flags = get_request_flags()
+                if flags is not None:
+                    flags.update(task.leader_flags)
+
+        with self._lock:
+            self._counts["leaders"] += 1
+        task = self.submit(func, *args, **kwargs)
+        leader_flags = get_request_flags()
+        task.leader_flags = leader_flags if leader_flags is not None else {}
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def submit(self, func: Callable[..., Any], *args, **kwargs) -> asyncio.Future:
+        """작업 스레드에서 실행 (요청 컨텍스트를 복사해 요청 표시가 이 요청에 남음, 합치지 않는 호출도 같은 풀을 씀)"""
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, func, *args, **kwargs)
+        return asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def _finish(self, key: str, task: asyncio.Future):
+        """리더 계산 종료 시 키 제거"""
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            with self._lock:
+                self._counts["failures"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """리더/합류 요청 수 통계"""
+        with self._lock:
+            total = self._counts["leaders"] + self._counts["coalesced"]
+            return {
+                "enabled": self.enabled,
+                "max_workers": self.max_workers,
+                "in_flight": len(self._inflight),
+                **self._counts,
+                "coalesced_by_endpoint": dict(self._coalesced_by_endpoint),
+                "coalesced_rate": self._counts["coalesced"] / total if total else 0.0
+            }
+
+
+# 전역 단일 실행 조정기
+single_flight = SingleFlight()
@@ -0,0 +1,84 @@
+"""
+임베딩 직렬화 - JSON float 리스트 대신 쓸 수 있는 압축 바이너리 인코딩
+"""
+import base64
+from typing import Any, Dict, Union
+
+import numpy as np
+
+# 지원 포맷
+#   float_list      : JSON float 리스트 (기본값, 기존 응답 형식)
+#   base64_float32  : little-endian float32 바이트의 Base64 (무손실, 512차원 약 2.7KB)
+#   base64_float16  : little-endian float16 바이트의 Base64 (512차원 약 1.4KB)
+#   int8            : int8 바이트의 Base64 + scale (값 = int8 * scale, 512차원 약 0.7KB)
+EMBEDDING_FORMATS = ("float_list", "base64_float32", "base64_float16", "int8")
+EMBEDDING_FORMAT_PATTERN = "^(" + "|".join(EMBEDDING_FORMATS) + ")$"
+
+_BINARY_DTYPES = {
+    "base64_float32": np.dtype("<f4"),
+    "base64_float16": np.dtype("<f2"),
+    "int8": np.dtype("i1"),
+}
+
+
+def encode_embedding(embedding: np.ndarray, embedding_format: str = "float_list") -> Union[list, Dict[str, Any]]:
+    """임베딩을 지정한 포맷으로 인코딩"""
+    if embedding_format == "float_list":
+        return np.asarray(embedding).tolist()
+
+    if embedding_format not in _BINARY_DTYPES:
+        raise ValueError(f"지원하지 않는 임베딩 포맷입니다: {embedding_format}")
+
+    vector = np.asarray(embedding, dtype=np.float32)
+    encoded = {"format": embedding_format, "dim": int(vector.shape[0])}
+
+    if embedding_format == "int8":
+        max_abs = float(np.max(np.abs(vector))) if vector.size else 0.0
+        scale = max_abs / 127.0 if max_abs > 0 else 1.0
+        data = np.clip(np.round(vector / scale), -127, 127).astype(_BINARY_DTYPES["int8"])
+        encoded["scale"] = scale
+    else:
+        data = vector.astype(_BINARY_DTYPES[embedding_format])
+
+    encoded["data"] = base64.b64encode(data.tobytes()).decode("ascii")
+    return encoded
+
+
+def decode_embedding(value: Union[list, Dict[str, Any], Any]) -> np.ndarray:
+    """float 리스트 또는 인코딩된 임베딩을 float32 배열로 디코딩 (NaN/inf 가 있으면 ValueError)"""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return _check_finite(np.asarray(value, dtype=np.float32))
+
+    # pydantic 모델도 허용
+    if hasattr(value, "dict") and not isinstance(value, dict):
+        value = value.dict()
+
+    embedding_format = value.get("format")
+    if embedding_format not in _BINARY_DTYPES:
+        raise ValueError(f"지원하지 않는 임베딩 포맷입니다: {embedding_format}")
+
+    try:
+        raw = base64.b64decode(value["data"], validate=True)
+        data = np.frombuffer(raw, dtype=_BINARY_DTYPES[embedding_format])
+    except Exception as e:
+        raise ValueError(f"임베딩 디코딩 실패: {e}")
+
+    dim = value.get("dim")
+    if dim is not None and data.shape[0] != dim:
+        raise ValueError(f"임베딩 차원이 일치하지 않습니다 (dim={dim}, 실제 {data.shape[0]})")
+
+    vector = data.astype(np.float32)
+    if embedding_format == "int8":
+        scale = value.get("scale")
+        if scale is None:
+            raise ValueError("int8 임베딩에는 scale 이 필요합니다")
+        vector *= np.float32(scale)
+
+    return _check_finite(vector)
+
+
+def _check_finite(vector: np.ndarray) -> np.ndarray:
+    """NaN/inf 거부 - 유사도가 nan 이 되어 검색 순위와 JSON 응답을 깨뜨림"""
+    if not np.isfinite(vector).all():
+        raise ValueError("임베딩에 NaN 또는 무한대 값이 있습니다")
+    return vector
@@ -0,0 +1,107 @@
+"""
+임베딩 유사도 계산 유틸리티 (numpy 벡터화)
+"""
+from typing import Dict, Any, List, Sequence
+
+import numpy as np
+
+
+def to_normalized_matrix(embeddings: Sequence) -> np.ndarray:
+    """임베딩 목록을 L2 정규화된 (N, D) float32 행렬로 변환"""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0  # 0으로 나누기 방지
+
+    return matrix / norms
+
+
+def cosine_similarity_matrix(a: np.ndarray, b: np.ndarray = None) -> np.ndarray:
+    """정규화된 임베딩 간 코사인 유사도 행렬 (a @ b.T)"""
+    if b is None:
+        b = a
+    # float32 반올림 오차로 1.0을 넘지 않도록 제한
+    return np.clip(a @ b.T, -1.0, 1.0)
+
+
+def similarity_matrix_result(sim: np.ndarray, image_ids: List[str]) -> Dict[str, Any]:
+    """유사도 행렬 응답 생성 (대각선은 1.0)"""
+    matrix = np.array(sim, dtype=np.float64)
+    np.fill_diagonal(matrix, 1.0)
+
+    return {
+        "similarity_matrix": {
+            "matrix": matrix.tolist(),
+            "image_ids": list(image_ids)
+        }
+    }
+
+
+def best_matches_from_matrix(sim: np.ndarray, image_ids: List[str], threshold: float) -> Dict[str, Any]:
+    """유사도 행렬에서 이미지별 최고 매칭 찾기"""
+    n = len(image_ids)
+    if n < 2:
+        return {"best_matches": []}
+
+    masked = np.array(sim, dtype=np.float64)
+    np.fill_diagonal(masked, -np.inf)  # 자기 자신 제외
+
+    best_idx = np.argmax(masked, axis=1)
+    best_sim = masked[np.arange(n), best_idx]
+
+    best_matches = []
+    for i in np.flatnonzero((best_sim > 0.0) & (best_sim >= threshold)):
+        best_matches.append({
+            "source_id": image_ids[i],
+            "target_id": image_ids[best_idx[i]],
+            "similarity": float(best_sim[i])
+        })
+
+    return {"best_matches": best_matches}
+
+
+def threshold_matches(scores: np.ndarray, threshold: float) -> np.ndarray:
+    """유사도가 임계값 이상인 인덱스 (유사도 내림차순)"""
+    hits = np.flatnonzero(scores >= threshold)
+    return hits[np.argsort(-scores[hits], kind="stable")]
+
+
+def group_average_similarity(sim: np.ndarray, members: List[int]) -> float:
+    """그룹 내 쌍별 평균 유사도"""
+    if len(members) < 2:
+        return 0.0
+    block = sim[np.ix_(members, members)]
+    upper = block[np.triu_indices(len(members), k=1)]
+    return float(np.mean(upper))
+
+
+def greedy_groups_from_matrix(sim: np.ndarray, image_ids: List[str], threshold: float) -> Dict[str, Any]:
+    """
+    유사한 얼굴 그룹화
+
+    앞에서부터 방문하지 않은 이미지를 그룹 대표로 삼고, 대표와의 유사도가
+    임계값 이상인 나머지 미방문 이미지를 같은 그룹에 넣습니다.
+    """
+    n = len(image_ids)
+    visited = np.zeros(n, dtype=bool)
+    groups = []
+
+    for i in range(n):
+        if visited[i]:
+            continue
+
+        candidates = (~visited) & (sim[i] >= threshold)
+        candidates[i] = False
+        members = [i] + np.flatnonzero(candidates).tolist()
+        visited[members] = True
+
+        if len(members) >= 2:
+            groups.append({
+                "group_id": len(groups),
+                "members": [image_ids[m] for m in members],
+                "avg_similarity": group_average_similarity(sim, members)
+            })
+
+    return {"groups": groups}
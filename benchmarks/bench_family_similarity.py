@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+가족 유사도 벤치마크 - 쌍별 calculate_family_similarity vs 배열 기반 score_arrays
+
+사용법:
+    python benchmarks/bench_family_similarity.py --children 10 --parents 50
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.family_similarity import FamilySimilarityAnalyzer  # noqa: E402
+
+
+def make_faces(rng, count):
+    """랜덤 얼굴 정보 생성 (정규화된 임베딩 + 5점 랜드마크)"""
+    base = np.array([[30, 40], [70, 40], [50, 60], [35, 80], [65, 80]], dtype=np.float64)
+    faces = []
+    for _ in range(count):
+        embedding = rng.normal(0, 1, 512)
+        points = base * rng.uniform(0.8, 1.2) + rng.normal(0, 3, base.shape)
+        faces.append({
+            "embedding": embedding / np.linalg.norm(embedding),
+            "landmarks": [{"x": float(x), "y": float(y)} for x, y in points]
+        })
+    return faces
+
+
+def main():
+    parser = argparse.ArgumentParser(description="가족 유사도 계산 벤치마크")
+    parser.add_argument("--children", type=int, default=10)
+    parser.add_argument("--parents", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    analyzer = FamilySimilarityAnalyzer()
+    parents = make_faces(rng, args.parents)
+    children = make_faces(rng, args.children)
+    parent_ages = [int(a) for a in rng.integers(25, 70, args.parents)]
+    child_ages = [int(a) for a in rng.integers(0, 20, args.children)]
+
+    # 배열은 얼굴 분석 시점에 한 번 만들어진다고 가정
+    parent_embeddings = np.stack([f["embedding"] for f in parents])
+    child_embeddings = np.stack([f["embedding"] for f in children])
+    parent_landmarks = analyzer.landmarks_to_array([f["landmarks"] for f in parents])
+    child_landmarks = analyzer.landmarks_to_array([f["landmarks"] for f in children])
+
+    pairs = args.children * args.parents
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        per_pair = np.empty((args.children, args.parents))
+        for c, child in enumerate(children):
+            for p, parent in enumerate(parents):
+                per_pair[c, p] = analyzer.calculate_family_similarity(
+                    parent, child, parent_ages[p], child_ages[c]
+                )["family_similarity"]
+    per_pair_time = (time.perf_counter() - start) / args.repeat
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        batched = analyzer.score_arrays(
+            parent_embeddings, parent_landmarks, child_embeddings, child_landmarks,
+            parent_ages, child_ages
+        )["family_similarity"]
+    batched_time = (time.perf_counter() - start) / args.repeat
+
+    max_diff = float(np.max(np.abs(per_pair - batched)))
+
+    print(f"쌍 수: {pairs} ({args.children} 자녀 x {args.parents} 부모)")
+    print(f"쌍별 계산:   {per_pair_time * 1000:9.2f} ms ({per_pair_time / pairs * 1e6:8.2f} us/쌍)")
+    print(f"배열 계산:   {batched_time * 1000:9.2f} ms ({batched_time / pairs * 1e6:8.2f} us/쌍)")
+    print(f"속도 향상:   {per_pair_time / batched_time:9.1f}x")
+    print(f"최대 오차:   {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
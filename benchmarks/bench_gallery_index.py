@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+갤러리 인덱스 벤치마크 - 전수 검색 vs HNSW / IVF-PQ (held-out 질의의 recall@k 와 QPS)
+
+마지막에 닫고 다시 열어 시작 시간을 잽니다. HNSW 는 스냅샷의 CSR 그래프를 매핑하므로 시작 시간이
+얼굴 수와 거의 무관하지만, 스냅샷 없이 열면(인덱스 유형 변경 등) "구성 시간" 만큼 걸려 다시 삽입합니다.
+순수 파이썬 삽입은 얼굴당 수 ms 라 100만 명이면 재구성이 한 시간을 넘을 수 있습니다.
+
+사용법:
+    python benchmarks/bench_gallery_index.py --index hnsw --size 20000 --m 16 --ef-construction 200
+    python benchmarks/bench_gallery_index.py --index ivfpq --size 100000 --nlist 256 --pq-m 64
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.gallery.gallery import FaceGallery  # noqa: E402
+
+
+def make_embeddings(rng, centers, count, noise):
+    """신원 중심 주변에 분포한 임베딩 생성 (같은 사람의 여러 사진을 흉내)"""
+    labels = rng.integers(0, len(centers), count)
+    return (centers[labels] + rng.normal(0, noise, (count, centers.shape[1]))).astype(np.float32)
+
+
+def measure_qps(gallery, queries, k, **params):
+    """질의 처리량 측정"""
+    start = time.perf_counter()
+    for query in queries:
+        gallery.search(query, top_k=k, **params)
+    return len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="갤러리 인덱스 벤치마크")
+    parser.add_argument("--index", choices=["hnsw", "ivfpq"], default="hnsw")
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--identities", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    # HNSW
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    # IVF-PQ
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument("--rerank", type=int, default=100)
+    parser.add_argument("--train-size", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(0, 1, (args.identities, args.dim))
+    vectors = make_embeddings(rng, centers, args.size, noise=0.8)
+    queries = make_embeddings(rng, centers, args.queries, noise=0.8)  # 갤러리에 없는 held-out 질의
+
+    if args.index == "hnsw":
+        params = {"m": args.m, "ef_construction": args.ef_construction}
+    else:
+        params = {"nlist": args.nlist, "m": args.pq_m, "rerank": args.rerank}
+
+    with tempfile.TemporaryDirectory() as path:
+        gallery = FaceGallery(path, dim=args.dim, index_type=args.index, index_params=params)
+
+        start = time.perf_counter()
+        gallery.enroll_many(vectors, [str(i) for i in range(args.size)])
+        if args.index == "ivfpq":
+            gallery.train_index(sample_size=args.train_size)
+        build_time = time.perf_counter() - start
+
+        print(f"갤러리: {args.size}개 x {args.dim}차원, 인덱스 {args.index} {params}")
+        print(f"구성 시간: {build_time:.1f} s ({build_time / args.size * 1000:.2f} ms/얼굴)")
+        if args.index == "ivfpq":
+            stats = gallery.get_stats()["index"]
+            print(f"인덱스 메모리: 얼굴당 {stats['code_bytes_per_face']} B "
+                  f"(float32 원본 {args.dim * 4} B 는 디스크 memmap 에서 재정렬 시에만 읽음)")
+        print(f"전수 검색:            QPS {measure_qps(gallery, queries, args.k, exact=True):9.1f}")
+
+        if args.index == "hnsw":
+            sweep = [("efSearch", {"ef_search": ef}) for ef in args.ef_search]
+        else:
+            sweep = [("nprobe", {"nprobe": nprobe}) for nprobe in args.nprobe]
+
+        for name, search_params in sweep:
+            value = next(iter(search_params.values()))
+            recall = gallery.evaluate_recall(queries, k=args.k, **search_params)["recall"]
+            qps = measure_qps(gallery, queries, args.k, **search_params)
+            print(f"{args.index} {name}={value:<5} QPS {qps:9.1f}  recall@{args.k} {recall:.4f}")
+
+        gallery.close()
+
+        reopened = FaceGallery(path, dim=args.dim, index_type=args.index, index_params=params)
+        report = reopened.open()
+        recall = reopened.evaluate_recall(queries, k=args.k)["recall"]
+        qps = measure_qps(reopened, queries, args.k)
+        print(f"스냅샷에서 시작: {report['elapsed_seconds']:.2f} s (QPS {qps:.1f}, recall@{args.k} {recall:.4f}, "
+              f"재구성이 필요하면 약 {build_time:.0f} s)")
+        reopened.close()
+
+
+if __name__ == "__main__":
+    main()
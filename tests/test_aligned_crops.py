@@ -0,0 +1,169 @@
+"""
+정렬 크롭 재사용 테스트
+"""
+import cv2
+import numpy as np
+import pytest
+
+from app.models import aligned_crops
+from app.models.aligned_crops import AlignedCropCache, AlignedFacePipeline, CENTER, center_transform
+from app.models.enhanced_gender_analyzer import EnhancedGenderProbabilityAnalyzer
+from app.services.analysis_cache import CachedFace
+
+
+class FakeModel:
+    """InsightFace 하위 모델 대용 (session.run 입력 기록)"""
+
+    def __init__(self, size, mean, std, output):
+        self.input_size = (size, size)
+        self.input_mean = mean
+        self.input_std = std
+        self.input_name = "input"
+        self.output_names = ["output"]
+        self.output = np.asarray(output, dtype=np.float32)
+        self.session = self
+        self.inputs = []
+
+    def run(self, output_names, feed):
+        self.inputs.append(feed[self.input_name].copy())
+        return [self.output[None]]
+
+    def get(self, img, face):
+        raise AssertionError("하위 모델이 직접 크롭을 만들면 안 됨")
+
+
+class FakeDetector:
+    def detect(self, img, max_num=0, metric="default"):
+        bboxes = np.array([[10, 20, 110, 150, 0.9], [120, 30, 180, 110, 0.8]], dtype=np.float32)
+        kpss = np.array([
+            [[40, 60], [80, 60], [60, 90], [45, 120], [75, 120]],
+            [[135, 55], [165, 55], [150, 75], [138, 95], [162, 95]]
+        ], dtype=np.float32)
+        return bboxes, kpss
+
+
+class FakeFaceAnalysis:
+    def __init__(self):
+        self.det_model = FakeDetector()
+        self.models = {
+            "detection": self.det_model,
+            "landmark_2d_106": FakeModel(192, 0.0, 1.0, np.zeros(212)),
+            "recognition": FakeModel(112, 127.5, 127.5, np.full(512, 2.0)),
+            "genderage": FakeModel(96, 0.0, 1.0, [0.2, 0.9, 0.31])
+        }
+
+
+class FakeFaceAlign:
+    """insightface.utils.face_align 대용 (키포인트 중심으로 옮기는 변환)"""
+
+    @staticmethod
+    def estimate_norm(kps, size):
+        cx, cy = kps.mean(axis=0)
+        return np.array([[1.0, 0.0, size / 2 - cx], [0.0, 1.0, size / 2 - cy]])
+
+
+@pytest.fixture
+def image():
+    return np.random.default_rng(0).integers(0, 255, (200, 200, 3), dtype=np.uint8)
+
+
+@pytest.fixture
+def warp_calls(monkeypatch):
+    """cv2.warpAffine 호출 기록"""
+    calls = []
+    warp = cv2.warpAffine
+
+    def counting_warp(img, M, dsize, **kwargs):
+        calls.append(dsize)
+        return warp(img, M, dsize, **kwargs)
+
+    monkeypatch.setattr(aligned_crops.cv2, "warpAffine", counting_warp)
+    monkeypatch.setattr(aligned_crops, "face_align", FakeFaceAlign())
+    return calls
+
+
+def make_face():
+    return CachedFace(bbox=[10, 20, 110, 150], kps=None, det_score=0.9, normed_embedding=None)
+
+
+class TestAlignedCropCache:
+    """크롭/블롭 캐시 테스트"""
+
+    def test_blob_matches_blob_from_image(self, image):
+        """직접 쓴 블롭이 warpAffine + blobFromImage 결과와 같은지 확인"""
+        crops = AlignedCropCache()
+        face = make_face()
+        crops.reset(image, face)
+
+        blob = crops.blob(CENTER, 96, 127.5, 128.0)
+
+        M = center_transform(face.bbox, 96)
+        aimg = cv2.warpAffine(image, M, (96, 96), borderValue=0.0)
+        expected = cv2.dnn.blobFromImage(aimg, 1.0 / 128.0, (96, 96), (127.5, 127.5, 127.5), swapRB=True)
+        assert blob.shape == (1, 3, 96, 96)
+        np.testing.assert_allclose(blob, expected, atol=1e-5)
+
+    def test_same_geometry_is_warped_once_and_buffers_reused(self, image, warp_calls):
+        crops = AlignedCropCache()
+        crops.reset(image, make_face())
+
+        blob = crops.blob(CENTER, 96, 0.0, 1.0)
+        crop, _ = crops.crop(CENTER, 96)
+        other = crops.blob(CENTER, 96, 127.5, 127.5)
+        assert warp_calls == [(96, 96)]
+        assert crops.blob(CENTER, 96, 0.0, 1.0) is blob and other is not blob
+
+        # 다음 얼굴은 다시 warp 하지만 같은 버퍼에 씀
+        crops.reset(image, make_face())
+        assert crops.crop(CENTER, 96)[0] is crop
+        assert crops.blob(CENTER, 96, 0.0, 1.0) is blob
+        assert len(warp_calls) == 2
+
+
+class TestAlignedFacePipeline:
+    """정렬 크롭 공유 파이프라인 테스트"""
+
+    def test_one_warp_per_geometry_and_outputs(self, image, warp_calls):
+        app = FakeFaceAnalysis()
+        assert AlignedFacePipeline.supports(app)
+        pipeline = AlignedFacePipeline(app, AlignedCropCache())
+
+        faces = pipeline.get(image)
+
+        assert len(faces) == 2
+        assert sorted(warp_calls) == [(96, 96), (96, 96), (112, 112), (112, 112)]
+        assert app.models["landmark_2d_106"].inputs == []
+
+        face = faces[0]
+        assert np.linalg.norm(face.normed_embedding) == pytest.approx(1.0, abs=1e-5)
+        assert face.embedding_norm == pytest.approx(np.sqrt(512) * 2.0, rel=1e-5)
+        assert face.gender == 1 and face.age == 31
+        np.testing.assert_allclose(face.genderage, [0.2, 0.9, 0.31])
+
+        recognition_blob = app.models["recognition"].inputs[0]
+        assert recognition_blob.shape == (1, 3, 112, 112)
+        assert recognition_blob.min() >= -1.0 and recognition_blob.max() <= 1.0
+
+    def test_enhanced_analyzer_uses_same_crop(self, image, warp_calls):
+        """성별 분석기의 genderage 입력이 파이프라인 입력과 같은지 확인"""
+        app = FakeFaceAnalysis()
+        crops = AlignedCropCache()
+        face = AlignedFacePipeline(app, crops).get(image)[0]
+        analyzer = EnhancedGenderProbabilityAnalyzer(app, crops)
+
+        raw = analyzer.get_raw_output(face, image)
+
+        np.testing.assert_allclose(raw, face.genderage)
+        genderage = app.models["genderage"]
+        np.testing.assert_array_equal(genderage.inputs[-1], genderage.inputs[0])
+
+    def test_not_supported_without_detector(self):
+        class PlainApp:
+            def get(self, img):
+                return []
+
+        assert not AlignedFacePipeline.supports(PlainApp())
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,504 @@
+"""
+얼굴 분석 캐시 테스트
+"""
+import asyncio
+import base64
+import io
+import multiprocessing
+import uuid
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from starlette.requests import Request
+
+from app.api.routes import cache as cache_routes
+from app.core.config import settings
+from app.models import face_analyzer as face_analyzer_module
+from app.models.face_analyzer import FaceAnalyzer
+from app.services.analysis_cache import FaceAnalysisCache, CachedFace, FrequencySketch, estimate_entry_size
+from app.services.redis_cache import RedisAnalysisCache, serialize_faces, deserialize_faces
+from app.services.shm_cache import SharedMemoryAnalysisCache
+from app.services.negative_cache import NegativeCache, ClientFailureStats
+from app.core.request_context import start_request, set_operation, reset_operation
+
+
+class FakeFace:
+    """InsightFace Face 대용 (테스트용)"""
+
+    def __init__(self, seed):
+        rng = np.random.default_rng(seed)
+        self.bbox = np.array([10, 20, 110, 150], dtype=np.float32)
+        self.kps = np.array([[40, 60], [80, 60], [60, 90], [45, 120], [75, 120]], dtype=np.float32)
+        self.det_score = 0.9
+        self.embedding = rng.normal(0, 3, 512).astype(np.float32)
+        self.age = 34
+        self.gender = 0
+
+
+class FakeApp:
+    """app.get 호출 수를 세는 FaceAnalysis 대용"""
+
+    def __init__(self, faces_per_image=1):
+        self.calls = 0
+        self.faces_per_image = faces_per_image
+
+    def get(self, img):
+        self.calls += 1
+        return [FakeFace(int(img.sum()) + i) for i in range(self.faces_per_image)]
+
+
+def make_image(color=(200, 100, 50)):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    """가짜 모델과 새 캐시를 쓰는 FaceAnalyzer"""
+    cache = FaceAnalysisCache(max_bytes=1024 * 1024, ttl=60, enabled=True)
+    monkeypatch.setattr(face_analyzer_module, "analysis_cache", cache)
+    monkeypatch.setattr(face_analyzer_module, "negative_cache", NegativeCache(ttl=30, max_entries=8, enabled=True))
+    analyzer = FaceAnalyzer(None)
+    analyzer.app = FakeApp()
+    analyzer.is_loaded = True
+    return analyzer, cache
+
+
+def make_faces(seed, count=1):
+    return [CachedFace.from_face(FakeFace(seed + i)) for i in range(count)]
+
+
+class TestFaceAnalysisCache:
+    """바이트 제한 + W-TinyLFU 입장 + TTL 캐시 동작 테스트"""
+
+    def test_byte_bound_and_frequency_admission(self):
+        """용량을 넘으면 자주 쓰인 후보만 주 구역의 LRU 항목을 밀어내는지 확인"""
+        entry_size = estimate_entry_size("a", make_faces(0))
+        cache = FaceAnalysisCache(max_bytes=3 * entry_size, ttl=60, enabled=True, window_ratio=0.0)
+        for seed, key in enumerate("abc"):
+            cache.put(key, make_faces(seed))
+        assert cache.get("a") is not None
+
+        # 한 번도 조회되지 않은 d 는 LRU 끝의 b 와 빈도가 같아 입장 거부
+        cache.put("d", make_faces(3))
+        assert not cache.contains("d") and cache.contains("b")
+
+        # 조회(미스)로 빈도가 오른 d 는 b 를 밀어냄
+        assert cache.get("d") is None
+        cache.put("d", make_faces(3))
+        assert cache.contains("d") and not cache.contains("b")
+
+        stats = cache.get_stats()
+        assert stats["bytes"] == 3 * entry_size <= stats["max_bytes"]
+        assert (stats["hits"], stats["misses"], stats["evictions"], stats["rejections"]) == (1, 1, 1, 1)
+
+    def test_one_off_batch_does_not_flush_hot_keys(self):
+        """한 번씩만 쓰는 배치 이미지가 자주 쓰는 이미지를 밀어내지 않는지 확인"""
+        entry_size = estimate_entry_size("hot", make_faces(0))
+        cache = FaceAnalysisCache(max_bytes=5 * entry_size, ttl=60, enabled=True, window_ratio=0.2)
+        cache.get("hot")
+        cache.put("hot", make_faces(0))
+        for _ in range(3):
+            assert cache.get("hot") is not None
+
+        for i in range(50):
+            key = f"batch-{i:03d}"
+            assert cache.get(key) is None
+            cache.put(key, make_faces(i + 1))
+
+        assert cache.get("hot") is not None
+        assert cache.get_stats()["rejections"] > 0
+        assert cache.get_top_keys(1)[0]["key"] == "hot"
+
+    def test_oversized_entry_rejected(self):
+        cache = FaceAnalysisCache(max_bytes=1000, ttl=60, enabled=True)
+        cache.put("a", make_faces(0))
+        assert not cache.contains("a") and cache.get_stats()["rejections"] == 1
+
+    def test_stats_by_operation_and_clear(self):
+        """작업별 적중률 집계와 수동 비우기 확인"""
+        cache = FaceAnalysisCache(max_bytes=1024 * 1024, ttl=60, enabled=True)
+        cache.put("a", make_faces(0))
+        token = set_operation("face_detection")
+        try:
+            cache.get("a")
+            cache.get("b")
+        finally:
+            reset_operation(token)
+        cache.get("a")
+
+        by_operation = cache.get_stats()["by_operation"]
+        assert by_operation["face_detection"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+        assert by_operation["other"]["hits"] == 1
+
+        removed = cache.clear()
+        assert removed == {"entries": 1, "bytes": estimate_entry_size("a", make_faces(0))}
+        assert cache.get_stats()["bytes"] == 0 and cache.get("a") is None
+
+    def test_frequency_sketch_ages(self):
+        """기록 수가 sample_size 에 이르면 빈도가 절반으로 줄어드는지 확인"""
+        sketch = FrequencySketch(64, sample_size=20)
+        for _ in range(12):
+            sketch.increment("a")
+        assert sketch.estimate("a") == 12
+        for _ in range(8):
+            sketch.increment("b")
+        assert sketch.estimate("a") == 6 and sketch.estimate("b") == 4
+        assert sketch.estimate("never") <= 1
+
+    def test_ttl_expiry(self, monkeypatch):
+        """TTL 이 지난 항목은 미스로 처리되는지 확인"""
+        now = [1000.0]
+        monkeypatch.setattr("app.services.analysis_cache.time.monotonic", lambda: now[0])
+        cache = FaceAnalysisCache(max_bytes=64 * 1024, ttl=10, enabled=True)
+        cache.put("a", [])
+        now[0] += 9
+        assert cache.get("a") == []
+        now[0] += 2
+        assert cache.get("a") is None
+        assert cache.get_stats()["expirations"] == 1
+
+    def test_disabled_cache(self):
+        cache = FaceAnalysisCache(max_bytes=64 * 1024, ttl=10, enabled=False)
+        cache.put("a", [])
+        assert cache.get("a") is None
+
+    def test_cached_face_keeps_embedding(self):
+        """정규화 임베딩 + 크기로 원래 임베딩이 복원되는지 확인"""
+        face = FakeFace(0)
+        cached = CachedFace.from_face(face)
+        assert np.linalg.norm(cached.normed_embedding) == pytest.approx(1.0, abs=1e-5)
+        assert np.allclose(cached.embedding, face.embedding, atol=1e-4)
+        assert cached.age == 34 and cached.gender == 0 and cached.landmark is None
+
+
+class TestFaceAnalyzerCaching:
+    """FaceAnalyzer 메서드가 캐시를 공유하는지 테스트"""
+
+    def test_endpoints_share_one_detection(self, analyzer):
+        """감지, 나이, 임베딩 추출이 같은 이미지에 대해 app.get 을 한 번만 호출하는지 확인"""
+        analyzer, cache = analyzer
+        image = make_image()
+
+        detected = asyncio.run(analyzer.detect_faces(image))
+        age = asyncio.run(analyzer.estimate_age(image))
+        embedding = asyncio.run(analyzer.extract_embedding(image))
+
+        assert analyzer.app.calls == 1
+        assert detected["face_count"] == 1 and age["age"] == 34
+        assert len(embedding["keypoints"]) == 5
+        assert cache.get_stats()["hits"] == 2
+
+        asyncio.run(analyzer.estimate_age(make_image((0, 0, 0))))
+        assert analyzer.app.calls == 2
+
+    def test_compare_uses_cached_embeddings(self, analyzer):
+        """비교 결과가 캐시 적중 여부와 관계없이 같은지 확인"""
+        analyzer, _ = analyzer
+        source, target = make_image(), make_image((10, 20, 30))
+
+        first = asyncio.run(analyzer.compare_faces(source, target))
+        second = asyncio.run(analyzer.compare_faces(source, target))
+
+        assert analyzer.app.calls == 2
+        assert first["similarity"] == pytest.approx(second["similarity"])
+
+
+class InMemoryRedis:
+    """redis.Redis 의 mget/get/set/expire/delete/pipeline 만 흉내 내는 메모리 저장소 (TTL 은 무시)"""
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+        self.round_trips = 0
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError("redis down")
+        self.round_trips += 1
+
+    def mget(self, keys):
+        self._check()
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self._check()
+        self.data[key] = bytes(value)
+        return True
+
+    def delete(self, key):
+        self._check()
+        return int(self.data.pop(key, None) is not None)
+
+    def pipeline(self, transaction=True):
+        return InMemoryPipeline(self)
+
+
+class InMemoryPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def set(self, key, value, ex=None):
+        self.commands.append(lambda data: data.__setitem__(key, bytes(value)) or True)
+
+    def get(self, key):
+        self.commands.append(lambda data: data.get(key))
+
+    def expire(self, key, ttl):
+        self.commands.append(lambda data: key in data)
+
+    def execute(self):
+        self.client._check()
+        return [command(self.client.data) for command in self.commands]
+
+
+@pytest.fixture
+def redis_tier(analyzer, monkeypatch):
+    """메모리 Redis 를 쓰는 Redis 계층 (워커 간 공유 흉내)"""
+    tier = RedisAnalysisCache(ttl=60, enabled=True, prefix="test:", client=InMemoryRedis())
+    monkeypatch.setattr(face_analyzer_module, "redis_cache", tier)
+    return analyzer + (tier,)
+
+
+class TestRedisAnalysisCache:
+    """Redis 계층 직렬화와 장애 대체 테스트"""
+
+    def test_serialization_round_trip(self):
+        """바이너리 변환 후에도 얼굴 속성과 임베딩이 유지되는지 확인"""
+        face = CachedFace.from_face(FakeFace(1))
+        face.genderage = np.array([0.2, 0.8, 0.34], dtype=np.float32)
+        no_kps = CachedFace(bbox=[0, 0, 5, 5], kps=None, det_score=0.5, normed_embedding=None)
+
+        data = serialize_faces([face, no_kps])
+        restored = deserialize_faces(data)
+
+        assert len(serialize_faces([face])) == 8 + 80 + 512 * 4
+        np.testing.assert_array_equal(restored[0].normed_embedding, face.normed_embedding)
+        assert np.allclose(restored[0].kps, face.kps) and np.allclose(restored[0].genderage, face.genderage)
+        assert (restored[0].age, restored[0].gender) == (34, 0)
+        assert restored[1].kps is None and restored[1].embedding is None and restored[1].age is None
+        assert deserialize_faces(serialize_faces([])) == []
+
+    def test_float16_is_opt_in(self):
+        """float16 저장은 명시했을 때만 쓰고, 크기가 절반인 대신 임베딩이 근사값인지 확인"""
+        face = CachedFace.from_face(FakeFace(1))
+        data = serialize_faces([face], float16=True)
+        restored = deserialize_faces(data)[0]
+
+        assert len(data) == 8 + 80 + 512 * 2
+        assert np.allclose(restored.normed_embedding, face.normed_embedding, atol=1e-3)
+        assert not RedisAnalysisCache(enabled=False).float16
+
+    def test_other_worker_reuses_results(self, redis_tier):
+        """프로세스 캐시가 비어도 Redis 에 있는 결과로 app.get 을 건너뛰는지 확인"""
+        analyzer, local, tier = redis_tier
+        image = make_image()
+
+        first = asyncio.run(analyzer.extract_embedding(image))
+        local.clear()  # 다른 워커
+        second = asyncio.run(analyzer.extract_embedding(image))
+
+        assert analyzer.app.calls == 1
+        assert tier.get_stats()["hits"] == 1
+        assert np.allclose(first["embedding"], second["embedding"], atol=5e-3)
+
+    def test_prefetch_is_one_round_trip(self, redis_tier):
+        """배치 선조회가 이미지 수와 관계없이 MGET 한 번인지 확인"""
+        analyzer, local, tier = redis_tier
+        images = [make_image((i * 40, 0, 0)) for i in range(4)]
+        for image in images:
+            asyncio.run(analyzer.estimate_age(image))
+        local.clear()
+        tier._client.round_trips = 0
+
+        analyzer.prefetch_faces(images)
+        for image in images:
+            asyncio.run(analyzer.estimate_age(image))
+
+        assert tier._client.round_trips == 1
+        assert analyzer.app.calls == 4
+
+    def test_falls_through_when_redis_down(self, redis_tier):
+        """Redis 장애 시 로컬 계산으로 대체하고 재시도 간격 동안 호출을 건너뛰는지 확인"""
+        analyzer, local, tier = redis_tier
+        tier._client.down = True
+
+        result = asyncio.run(analyzer.estimate_age(make_image()))
+        local.clear()
+        asyncio.run(analyzer.estimate_age(make_image()))
+
+        stats = tier.get_stats()
+        assert result["age"] == 34 and analyzer.app.calls == 2
+        assert stats["errors"] == 1 and stats["skipped"] >= 1 and not stats["available"]
+
+
+def _write_from_other_process(name, key):
+    """다른 워커 프로세스 흉내 - 같은 이름의 세그먼트에 연결해 저장"""
+    cache = SharedMemoryAnalysisCache(name=name, slots=64, slot_bytes=4608, ttl=60, enabled=True)
+    cache.put(key, [CachedFace.from_face(FakeFace(7))])
+    cache.close()
+
+
+@pytest.fixture
+def shm_name():
+    name = f"face_cache_test_{uuid.uuid4().hex[:12]}"
+    yield name
+    SharedMemoryAnalysisCache(name=name, slots=64, enabled=False).unlink()
+
+
+class TestSharedMemoryAnalysisCache:
+    """공유 메모리 계층 테스트"""
+
+    def test_shared_between_attachments(self, shm_name):
+        """한 연결에서 저장한 값을 다른 연결에서 읽는지 확인"""
+        first = SharedMemoryAnalysisCache(name=shm_name, slots=64, slot_bytes=4608, ttl=60, enabled=True)
+        second = SharedMemoryAnalysisCache(name=shm_name, slots=64, slot_bytes=4608, ttl=60, enabled=True)
+        face = CachedFace.from_face(FakeFace(3))
+
+        first.put("image-a", [face])
+        restored = second.get("image-a")
+
+        assert np.allclose(restored[0].embedding, face.embedding, atol=5e-3)
+        assert second.get("image-b") is None
+        assert second.get_stats()["used_slots"] == 1
+        first.close()
+        second.close()
+
+    def test_model_change_does_not_read_old_results(self, shm_name):
+        """세그먼트가 남아 있어도 다른 모델로 띄운 워커는 이전 모델 결과를 읽지 않는지 확인"""
+        old = SharedMemoryAnalysisCache(name=shm_name, slots=64, slot_bytes=4608, ttl=60, enabled=True,
+                                        namespace="buffalo_s")
+        new = SharedMemoryAnalysisCache(name=shm_name, slots=64, slot_bytes=4608, ttl=60, enabled=True,
+                                        namespace="buffalo_l")
+
+        old.put("image-a", [CachedFace.from_face(FakeFace(3))])
+
+        assert new.get("image-a") is None and old.get("image-a") is not None
+        old.close()
+        new.close()
+
+    def test_shared_across_processes(self, shm_name):
+        """다른 프로세스가 저장한 결과를 읽는지 확인"""
+        cache = SharedMemoryAnalysisCache(name=shm_name, slots=64, slot_bytes=4608, ttl=60, enabled=True)
+        process = multiprocessing.get_context("spawn").Process(
+            target=_write_from_other_process, args=(shm_name, "image-x")
+        )
+        process.start()
+        process.join(60)
+
+        assert process.exitcode == 0
+        assert cache.get("image-x")[0].age == 34
+        cache.close()
+
+    def test_bucket_eviction_ttl_and_oversize(self, shm_name, monkeypatch):
+        """버킷이 차면 교체하고, 만료와 크기 초과를 처리하는지 확인"""
+        now = [1000.0]
+        monkeypatch.setattr("app.services.shm_cache.time.time", lambda: now[0])
+        cache = SharedMemoryAnalysisCache(name=shm_name, slots=4, slot_bytes=4608, ttl=10, enabled=True, ways=4)
+        faces = [CachedFace.from_face(FakeFace(0))]
+
+        for i in range(5):
+            cache.put(f"image-{i}", faces)
+            now[0] += 1
+        assert cache.get("image-0") is None and cache.get("image-4") is not None
+
+        now[0] += 10
+        assert cache.get("image-4") is None
+
+        cache.put("crowd", [CachedFace.from_face(FakeFace(i)) for i in range(5)])
+        stats = cache.get_stats()
+        assert (stats["evictions"], stats["oversize"]) == (1, 1)
+        cache.close()
+
+    def test_analyzer_uses_shared_tier(self, analyzer, shm_name, monkeypatch):
+        """프로세스 캐시가 비어도 공유 메모리 결과로 app.get 을 건너뛰는지 확인"""
+        analyzer, local = analyzer
+        tier = SharedMemoryAnalysisCache(name=shm_name, slots=64, slot_bytes=4608, ttl=60, enabled=True)
+        monkeypatch.setattr(face_analyzer_module, "shm_cache", tier)
+        image = make_image()
+
+        asyncio.run(analyzer.detect_faces(image))
+        local.clear()
+        analyzer.prefetch_faces([image])
+        result = asyncio.run(analyzer.estimate_age(image))
+
+        assert analyzer.app.calls == 1 and result["age"] == 34
+        assert tier.get_stats()["hits"] == 1
+        tier.close()
+
+
+class TestNegativeCache:
+    """얼굴 없음 이미지 부정 캐시와 클라이언트별 집계 테스트"""
+
+    def test_repeat_no_face_fails_fast(self, analyzer, monkeypatch):
+        """얼굴 없는 이미지 재요청은 추론 없이 실패하고, TTL 후에는 다시 감지하는지 확인"""
+        analyzer, local = analyzer
+        analyzer.app.faces_per_image = 0
+        negative = face_analyzer_module.negative_cache
+        now = [1000.0]
+        monkeypatch.setattr("app.services.negative_cache.time.monotonic", lambda: now[0])
+        image = make_image()
+
+        for _ in range(3):
+            flags = start_request()
+            with pytest.raises(RuntimeError, match="얼굴을 찾을 수 없습니다"):
+                asyncio.run(analyzer.estimate_age(image))
+            assert flags["no_face"] is True
+
+        assert analyzer.app.calls == 1
+        assert negative.get_stats()["hits"] == 2
+        assert local.get_stats()["entries"] == 0
+
+        now[0] += 31
+        assert asyncio.run(analyzer.detect_faces(image))["face_count"] == 0
+        assert analyzer.app.calls == 2
+
+    def test_client_failure_ranking(self):
+        """얼굴 없음 요청이 많은 클라이언트가 먼저 나오고 오래된 클라이언트는 버리는지 확인"""
+        stats = ClientFailureStats(max_clients=2)
+        noisy = ClientFailureStats.client_id("kiosk-7", "10.0.0.1")
+        quiet = ClientFailureStats.client_id(None, "10.0.0.2")
+
+        for i in range(4):
+            stats.record(noisy, 400 if i else 200, no_face=True)
+        stats.record(quiet, 200)
+
+        report = stats.get_stats()
+        assert [c["client"] for c in report["clients"]] == [noisy, quiet]
+        assert report["clients"][0]["no_face_rate"] == 1.0
+        assert report["clients"][0]["failure_rate"] == 0.75
+        assert "kiosk-7" not in noisy and "10.0.0.2" not in quiet
+
+        stats.record(ClientFailureStats.client_id(None, "10.0.0.3"), 200)
+        assert noisy not in [c["client"] for c in stats.get_stats()["clients"]]
+
+
+class TestCacheAdminRoute:
+    """캐시 비우기 관리 인증 테스트"""
+
+    @staticmethod
+    def admin_request(key=None):
+        headers = [(b"x-admin-key", key.encode())] if key else []
+        return Request({"type": "http", "method": "DELETE", "path": "/cache/analysis", "headers": headers})
+
+    def test_flush_requires_admin_key_or_api_key(self, monkeypatch):
+        """관리 키나 API 키 인증이 없으면 403, 관리 키가 다르면 401 인지 확인"""
+        monkeypatch.setattr(settings, "admin_api_key", None)
+        monkeypatch.setattr(settings, "api_key_enabled", False)
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(cache_routes.require_admin(self.admin_request()))
+        assert error.value.status_code == 403
+
+        monkeypatch.setattr(settings, "api_key_enabled", True)
+        monkeypatch.setattr(settings, "api_key", "api-secret")
+        asyncio.run(cache_routes.require_admin(self.admin_request()))
+
+        monkeypatch.setattr(settings, "admin_api_key", "admin-secret")
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(cache_routes.require_admin(self.admin_request("wrong")))
+        assert error.value.status_code == 401
+        asyncio.run(cache_routes.require_admin(self.admin_request("admin-secret")))
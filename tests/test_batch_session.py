@@ -0,0 +1,132 @@
+"""
+배치 세션 테스트
+"""
+import numpy as np
+import pytest
+
+from app.services.batch_session import BatchSession, BatchSessionManager
+from app.utils.similarity_utils import (
+    to_normalized_matrix,
+    cosine_similarity_matrix,
+    greedy_groups_from_matrix,
+    best_matches_from_matrix
+)
+
+
+def make_items(rng, count, start=0, dim=512, centers=None):
+    """테스트용 임베딩 (몇 개의 중심 주변에 분포)"""
+    items = []
+    for i in range(count):
+        if centers is not None:
+            vec = centers[(start + i) % len(centers)] + rng.normal(0, 0.02, dim)
+        else:
+            vec = rng.normal(0, 1, dim)
+        items.append((f"img{start + i}", vec.tolist(), {"name": None}))
+    return items
+
+
+class TestBatchSession:
+    """배치 세션 점진 계산 테스트"""
+
+    def test_incremental_matrix_matches_full(self):
+        """점진적으로 만든 유사도 행렬이 전체 재계산과 같은지 확인"""
+        rng = np.random.default_rng(0)
+        items = make_items(rng, 13)
+
+        session = BatchSession("s", 0.5, ttl=60)
+        session.add(items[:5])
+        session.add(items[5:6])
+        session.add(items[6:])
+
+        full = cosine_similarity_matrix(to_normalized_matrix([e for _, e, _ in items]))
+        assert np.allclose(session.similarity, full, atol=1e-5)
+
+    def test_incremental_groups_match_full(self):
+        """점진적 그룹이 전체 재계산 그룹과 같은지 확인"""
+        rng = np.random.default_rng(1)
+        centers = rng.normal(0, 1, (3, 512))
+        items = make_items(rng, 12, centers=centers)
+        ids = [image_id for image_id, _, _ in items]
+
+        session = BatchSession("s", 0.6, ttl=60)
+        for start in range(0, len(items), 4):
+            session.add(items[start:start + 4])
+
+        full = greedy_groups_from_matrix(session.similarity, ids, 0.6)
+        assert session.get_groups() == full
+        assert len(full["groups"]) == 3
+
+    def test_analyze_best_match(self):
+        """세션 분석 결과가 배치 분석 함수와 같은지 확인"""
+        rng = np.random.default_rng(2)
+        items = make_items(rng, 6)
+
+        session = BatchSession("s", 0.0, ttl=60)
+        session.add(items)
+
+        expected = best_matches_from_matrix(session.similarity, session.image_ids, 0.0)
+        assert session.analyze("find_best_match") == expected
+
+    def test_duplicate_id_rejected(self):
+        """중복 이미지 ID는 거부"""
+        rng = np.random.default_rng(3)
+        items = make_items(rng, 2)
+
+        session = BatchSession("s", 0.5, ttl=60)
+        session.add(items)
+        with pytest.raises(ValueError):
+            session.add(items[:1])
+
+
+    def test_range_search(self):
+        """범위 검색 결과가 유사도 행렬의 임계값 필터와 같은지 확인"""
+        rng = np.random.default_rng(4)
+        centers = rng.normal(0, 1, (3, 512))
+        items = make_items(rng, 9, centers=centers)
+
+        session = BatchSession("s", 0.6, ttl=60)
+        session.add(items)
+
+        result = session.range_search(0.6, image_id="img0")
+        assert [m["image_id"] for m in result["matches"]] == ["img3", "img6"]
+        assert result["total_matches"] == 2
+
+        result = session.range_search(0.6, embedding=items[1][1])
+        assert {m["image_id"] for m in result["matches"]} == {"img1", "img4", "img7"}
+        assert all(m["similarity"] <= 1.0 for m in result["matches"])
+
+        with pytest.raises(ValueError):
+            session.range_search(0.6)
+
+
+class TestBatchSessionManager:
+    """배치 세션 매니저 테스트"""
+
+    def test_expired_session_removed(self):
+        """TTL이 지난 세션은 조회되지 않음"""
+        manager = BatchSessionManager(ttl=60, max_sessions=10, max_images=10)
+        session = manager.create(0.5)
+        session.last_accessed -= 120
+
+        assert manager.get(session.session_id) is None
+
+    def test_capacity_limit(self):
+        """세션 최대 이미지 수 초과 시 오류"""
+        manager = BatchSessionManager(ttl=60, max_sessions=10, max_images=3)
+        session = manager.create(0.5)
+
+        with pytest.raises(ValueError):
+            manager.check_capacity(session, 4)
+
+    def test_failed_create_does_not_register_session(self):
+        """초기 이미지 검증에 실패하면 세션이 남지 않음"""
+        manager = BatchSessionManager(ttl=60, max_sessions=10, max_images=3)
+        items = [(f"img{i}", [1.0, 0.0], {}) for i in range(4)]
+
+        with pytest.raises(ValueError):
+            manager.create(0.5, items)
+        with pytest.raises(ValueError):
+            manager.create(0.5, [items[0], items[0]])
+
+        assert manager.get_stats()["active_sessions"] == 0
+        assert manager.create(0.5, items[:2]).size == 2
@@ -0,0 +1,73 @@
+"""
+임베딩 인코딩 테스트
+"""
+import numpy as np
+import pytest
+
+from app.utils.embedding_codec import encode_embedding, decode_embedding
+
+
+class TestEmbeddingCodec:
+    """임베딩 인코딩/디코딩 왕복 테스트"""
+
+    @pytest.fixture
+    def embedding(self):
+        vector = np.random.default_rng(0).normal(0, 1, 512)
+        return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+    def test_float_list_default(self, embedding):
+        """기본 포맷은 기존과 같은 float 리스트"""
+        encoded = encode_embedding(embedding)
+        assert isinstance(encoded, list)
+        assert len(encoded) == 512
+
+    def test_float32_lossless(self, embedding):
+        """float32 인코딩은 무손실"""
+        decoded = decode_embedding(encode_embedding(embedding, "base64_float32"))
+        assert np.array_equal(decoded, embedding)
+
+    @pytest.mark.parametrize("embedding_format,tolerance", [("base64_float16", 1e-3), ("int8", 1e-2)])
+    def test_lossy_formats_preserve_similarity(self, embedding, embedding_format, tolerance):
+        """손실 포맷도 코사인 유사도는 거의 보존"""
+        encoded = encode_embedding(embedding, embedding_format)
+        decoded = decode_embedding(encoded)
+
+        assert encoded["dim"] == 512
+        cosine = float(np.dot(decoded, embedding) / np.linalg.norm(decoded))
+        assert cosine == pytest.approx(1.0, abs=tolerance)
+
+    def test_encoded_is_smaller(self, embedding):
+        """인코딩 결과가 JSON 리스트보다 작음"""
+        import json
+
+        list_size = len(json.dumps(encode_embedding(embedding)))
+        for embedding_format in ("base64_float32", "base64_float16", "int8"):
+            assert len(json.dumps(encode_embedding(embedding, embedding_format))) < list_size
+
+    def test_dim_mismatch_rejected(self, embedding):
+        """dim 이 실제 길이와 다르면 오류"""
+        encoded = encode_embedding(embedding, "base64_float16")
+        encoded["dim"] = 256
+        with pytest.raises(ValueError):
+            decode_embedding(encoded)
+
+    @pytest.mark.parametrize("bad", [float("nan"), float("inf"), float("-inf")])
+    def test_non_finite_rejected(self, embedding, bad):
+        """NaN/inf 는 리스트와 base64 모두 거부"""
+        vector = embedding.copy()
+        vector[3] = bad
+        with pytest.raises(ValueError):
+            decode_embedding(vector.tolist())
+        with pytest.raises(ValueError):
+            decode_embedding(encode_embedding(vector, "base64_float32"))
+
+    def test_gallery_enroll_rejects_nan(self, embedding):
+        """NaN 임베딩 등록 요청은 검증 단계에서 거부"""
+        from pydantic import ValidationError
+
+        from app.schemas.requests import GalleryEnrollRequest
+
+        vector = embedding.copy()
+        vector[0] = float("nan")
+        with pytest.raises(ValidationError):
+            GalleryEnrollRequest(person_id="p1", embedding=encode_embedding(vector, "base64_float32"))
@@ -0,0 +1,136 @@
+"""
+임베딩 입력 해석 및 /embeddings/* 엔드포인트 테스트
+"""
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from app.api.routes import embeddings
+from app.core.config import settings
+from app.models.model_manager import model_manager
+from app.schemas.requests import (
+    EmbeddingInput,
+    EmbeddingComparisonRequest,
+    EmbeddingSearchRequest,
+    EmbeddingBatchAnalysisRequest
+)
+from app.services.embedding_inputs import resolve_embedding_inputs
+from app.utils.embedding_codec import encode_embedding
+
+
+class FakeAnalyzer:
+    """이미지마다 고정 임베딩을 돌려주는 분석기 (호출 수 기록)"""
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.calls = 0
+
+    async def extract_embedding(self, image, face_id=0):
+        self.calls += 1
+        seed = sum(map(ord, image))
+        return {"embedding": np.random.default_rng(seed).normal(size=self.dim).astype(np.float32).tolist()}
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    fake = FakeAnalyzer()
+    monkeypatch.setattr(model_manager, "get_face_analyzer", lambda: fake)
+    return fake
+
+
+def vector(seed, dim=512):
+    return np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+
+
+def image_input(seed):
+    # 검증을 거치지 않는 구성 (FakeAnalyzer 는 문자열만 봄)
+    return EmbeddingInput.model_construct(id=f"img-{seed}", embedding=None, image=f"image-{seed}")
+
+
+class TestResolveEmbeddingInputs:
+    """임베딩/이미지 혼합 입력을 정규화 행렬로 변환"""
+
+    def test_mixed_inputs_only_analyze_images(self, analyzer):
+        """임베딩 항목은 디코딩만 하고 이미지 항목만 분석하는지 확인"""
+        items = [
+            EmbeddingInput(id="a", embedding=vector(1).tolist()),
+            image_input(2),
+            EmbeddingInput(id="c", embedding=encode_embedding(vector(3), "base64_float16")),
+        ]
+
+        matrix, image_count = asyncio.run(resolve_embedding_inputs(items))
+
+        assert matrix.shape == (3, 512) and image_count == 1 and analyzer.calls == 1
+        np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), 1.0, rtol=1e-5)
+        np.testing.assert_allclose(matrix[0], vector(1) / np.linalg.norm(vector(1)), rtol=1e-5)
+
+    def test_dimension_mismatch_rejected(self, analyzer):
+        """차원이 다른 임베딩이 섞이면 ValueError"""
+        items = [EmbeddingInput(embedding=vector(1).tolist()), EmbeddingInput(embedding=vector(2, dim=128).tolist())]
+        with pytest.raises(ValueError, match="차원"):
+            asyncio.run(resolve_embedding_inputs(items))
+
+    def test_item_limits(self, analyzer, monkeypatch):
+        """임베딩 수와 이미지 수 상한을 각각 적용"""
+        monkeypatch.setattr(settings, "max_embedding_batch_size", 3)
+        items = [EmbeddingInput(embedding=vector(i).tolist()) for i in range(4)]
+        with pytest.raises(ValueError, match="최대 3개"):
+            asyncio.run(resolve_embedding_inputs(items))
+        assert asyncio.run(resolve_embedding_inputs(items, max_items=4))[0].shape == (4, 512)
+
+        monkeypatch.setattr(settings, "max_batch_size", 1)
+        with pytest.raises(ValueError, match="이미지 입력 수"):
+            asyncio.run(resolve_embedding_inputs([image_input(1), image_input(2)], max_items=10))
+        assert analyzer.calls == 0
+
+
+class TestEmbeddingRoutes:
+    """/embeddings/compare, /search, /batch-analysis"""
+
+    def test_compare_embedding_with_image(self, analyzer):
+        request = EmbeddingComparisonRequest.model_construct(
+            source=EmbeddingInput(embedding=vector(1).tolist()), target=image_input(1), similarity_threshold=0.6
+        )
+        data = asyncio.run(embeddings.compare_embeddings(request)).data
+        assert data["computed_from_images"] == 1 and -1.0 <= data["similarity"] <= 1.0
+
+    def test_search_ranks_identical_candidate_first(self, analyzer):
+        candidates = [EmbeddingInput(id=str(i), embedding=vector(i).tolist()) for i in range(5)]
+        request = EmbeddingSearchRequest(query=EmbeddingInput(embedding=vector(3).tolist()), candidates=candidates, top_k=2)
+
+        matches = asyncio.run(embeddings.search_embeddings(request)).data["matches"]
+
+        assert [m["id"] for m in matches][0] == "3" and len(matches) == 2
+        assert matches[0]["similarity"] == pytest.approx(1.0, abs=1e-5)
+
+    def test_search_dimension_mismatch_is_400(self, analyzer):
+        request = EmbeddingSearchRequest(
+            query=EmbeddingInput(embedding=vector(1).tolist()),
+            candidates=[EmbeddingInput(embedding=vector(2, dim=128).tolist())]
+        )
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(embeddings.search_embeddings(request))
+        assert exc.value.status_code == 400
+
+    def test_batch_analysis_uses_matrix_limit(self, analyzer, monkeypatch):
+        """N×N 행렬을 만드는 배치 분석은 비교/검색보다 작은 상한을 적용"""
+        monkeypatch.setattr(settings, "max_embedding_matrix_size", 3)
+        items = [EmbeddingInput(id=str(i), embedding=vector(i).tolist()) for i in range(4)]
+
+        request = EmbeddingBatchAnalysisRequest(items=items, analysis_type="similarity_matrix")
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(embeddings.batch_analyze_embeddings(request))
+        assert exc.value.status_code == 400
+
+        # 같은 수의 후보는 검색에서 허용
+        search = EmbeddingSearchRequest(query=items[0], candidates=items[1:])
+        assert asyncio.run(embeddings.search_embeddings(search)).success
+
+        request = EmbeddingBatchAnalysisRequest(items=items[:3], analysis_type="similarity_matrix")
+        assert asyncio.run(embeddings.batch_analyze_embeddings(request)).success
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,245 @@
+"""
+가족 유사도 분석기 테스트 (단건 vs 배열 기반)
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.models import family_similarity as family_similarity_module
+from app.models.family_similarity import FamilySimilarityAnalyzer, DESCRIPTOR_SIZE
+from app.services.analysis_cache import CachedFace
+
+
+def make_face(rng, with_landmarks=True):
+    """테스트용 얼굴 정보 (정규화된 임베딩 + 5점 랜드마크)"""
+    embedding = rng.normal(0, 1, 512)
+    embedding /= np.linalg.norm(embedding)
+
+    base = np.array([[30, 40], [70, 40], [50, 60], [35, 80], [65, 80]], dtype=np.float64)
+    points = base * rng.uniform(0.8, 1.2) + rng.normal(0, 3, base.shape)
+
+    return {
+        "embedding": embedding,
+        "landmarks": [{"x": float(x), "y": float(y)} for x, y in points] if with_landmarks else []
+    }
+
+
+class TestBatchedFamilySimilarity:
+    """배열 기반 계산이 단건 계산과 같은지 확인"""
+
+    @pytest.fixture
+    def analyzer(self):
+        return FamilySimilarityAnalyzer()
+
+    def test_matrix_matches_per_pair(self, analyzer):
+        """M x N 행렬 결과가 쌍별 calculate_family_similarity 결과와 같은지 확인"""
+        rng = np.random.default_rng(0)
+        parents = [make_face(rng) for _ in range(4)]
+        children = [make_face(rng) for _ in range(3)]
+        # 기본 유사도가 클리핑되지 않도록 자녀를 부모와 비슷하게
+        for child, parent in zip(children, parents):
+            mixed = child["embedding"] * 0.4 + parent["embedding"]
+            child["embedding"] = mixed / np.linalg.norm(mixed)
+
+        parent_ages = [40, None, 35, 62]
+        child_ages = [8, 30, None]
+
+        result = analyzer.calculate_family_similarity_matrix(parents, children, parent_ages, child_ages)
+
+        for c, child in enumerate(children):
+            for p, parent in enumerate(parents):
+                expected = analyzer.calculate_family_similarity(parent, child, parent_ages[p], child_ages[c])
+                assert result["family_similarity"][c, p] == pytest.approx(expected["family_similarity"], abs=1e-12)
+                assert result["base_similarity"][c, p] == pytest.approx(expected["base_similarity"], abs=1e-12)
+                assert result["age_corrected_similarity"][c, p] == pytest.approx(expected["age_corrected_similarity"], abs=1e-12)
+                assert result["confidence"][c, p] == pytest.approx(expected["confidence"], abs=1e-12)
+                for feature, value in expected["feature_breakdown"].items():
+                    assert result["feature_breakdown"][feature][c, p] == pytest.approx(value, abs=1e-12)
+
+    def test_child_against_parents(self, analyzer):
+        """자녀 1명 x 부모 N명 결과가 행렬 결과의 한 행과 같은지 확인"""
+        rng = np.random.default_rng(1)
+        parents = [make_face(rng) for _ in range(5)]
+        child = make_face(rng)
+
+        parent_embeddings = np.stack([p["embedding"] for p in parents])
+        parent_landmarks = analyzer.landmarks_to_array([p["landmarks"] for p in parents])
+        child_landmarks = analyzer.landmarks_to_array([child["landmarks"]])[0]
+
+        row = analyzer.score_child_against_parents(
+            child["embedding"], child_landmarks, parent_embeddings, parent_landmarks, 10, [40] * 5
+        )
+        matrix = analyzer.calculate_family_similarity_matrix(parents, [child], [40] * 5, [10])
+
+        assert row["family_similarity"].shape == (5,)
+        assert np.allclose(row["family_similarity"], matrix["family_similarity"][0])
+
+    def test_missing_landmarks_use_estimate(self, analyzer):
+        """랜드마크가 없으면 임베딩 기반 추정 범위(0.2-0.95)를 사용"""
+        rng = np.random.default_rng(2)
+        parents = [make_face(rng, with_landmarks=False), make_face(rng)]
+        children = [make_face(rng)]
+
+        result = analyzer.calculate_family_similarity_matrix(parents, children)
+
+        for values in result["feature_breakdown"].values():
+            assert 0.2 <= values[0, 0] <= 0.95
+
+
+class TestFaceDescriptors:
+    """얼굴별로 저장하는 기하 특징 벡터 테스트"""
+
+    @pytest.fixture
+    def analyzer(self):
+        return FamilySimilarityAnalyzer()
+
+    def test_descriptors_match_landmark_path(self, analyzer):
+        """미리 계산한 기하 특징으로 계산해도 랜드마크 기반 결과와 같은지 확인"""
+        rng = np.random.default_rng(3)
+        parents = [make_face(rng) for _ in range(4)]
+        children = [make_face(rng) for _ in range(2)]
+        expected = analyzer.calculate_family_similarity_matrix(parents, children, [40] * 4, [8, 12])
+
+        for face in parents + children:
+            face["descriptor"] = analyzer.compute_descriptor_array(analyzer.landmarks_to_array([face["landmarks"]]))[0]
+            face["landmarks"] = []
+        result = analyzer.calculate_family_similarity_matrix(parents, children, [40] * 4, [8, 12])
+
+        assert parents[0]["descriptor"].shape == (DESCRIPTOR_SIZE,)
+        assert np.allclose(result["family_similarity"], expected["family_similarity"])
+        for feature, values in expected["feature_breakdown"].items():
+            assert np.allclose(result["feature_breakdown"][feature], values)
+
+    def test_face_descriptor_computed_once(self, analyzer, monkeypatch):
+        """얼굴 객체에 저장된 기하 특징을 재사용하고, 키포인트가 없으면 무효로 표시하는지 확인"""
+        calls = []
+        compute = analyzer.compute_descriptor_array
+        monkeypatch.setattr(analyzer, "compute_descriptor_array", lambda pts: calls.append(1) or compute(pts))
+        kps = [[30, 40], [70, 40], [50, 60], [35, 80], [65, 80]]
+        face = CachedFace(bbox=[0, 0, 100, 100], kps=kps, det_score=0.9, normed_embedding=None)
+
+        first = analyzer.face_descriptor(face)
+        assert analyzer.face_descriptor(face) is first and len(calls) == 1
+        assert analyzer.unpack_descriptors(first)["valid"][0]
+
+        no_kps = CachedFace(bbox=[0, 0, 100, 100], kps=None, det_score=0.9, normed_embedding=None)
+        assert not analyzer.unpack_descriptors(analyzer.face_descriptor(no_kps))["valid"][0]
+
+    def test_find_most_similar_parent_reuses_cached_descriptors(self, monkeypatch):
+        """부모 찾기가 감지 시 저장된 기하 특징을 쓰고, 반복 요청에서 다시 계산하지 않는지 확인"""
+        from tests.test_analysis_cache import FakeApp, make_image
+        from app.models import face_analyzer as face_analyzer_module
+        from app.models.face_analyzer import FaceAnalyzer
+        from app.services.analysis_cache import FaceAnalysisCache
+        from app.services.negative_cache import NegativeCache
+
+        monkeypatch.setattr(face_analyzer_module, "analysis_cache", FaceAnalysisCache(max_bytes=1024 * 1024, ttl=60, enabled=True))
+        monkeypatch.setattr(face_analyzer_module, "negative_cache", NegativeCache(ttl=30, max_entries=8, enabled=True))
+        analyzer = FaceAnalyzer(None)
+        analyzer.app = FakeApp()
+        analyzer.is_loaded = True
+        shared = family_similarity_module.family_analyzer
+        calls = []
+        compute = shared.compute_descriptor_array
+        monkeypatch.setattr(shared, "compute_descriptor_array", lambda pts: calls.append(len(pts)) or compute(pts))
+
+        child = make_image((10, 20, 30))
+        parents = [make_image((200, 100, 50)), make_image((90, 90, 90)), make_image((5, 5, 5))]
+        first = asyncio.run(analyzer.find_most_similar_parent(child, parents, use_family_analysis=True))
+        computed = len(calls)
+        second = asyncio.run(analyzer.find_most_similar_parent(child, parents, use_family_analysis=True))
+
+        assert computed == 4 and len(calls) == computed
+        assert first == second
+        assert {m["image_index"] for m in first["matches"]} == {0, 1, 2}
+        assert first["best_match"]["family_similarity"] == max(m["family_similarity"] for m in first["matches"])
+
+    def test_detected_child_age_takes_precedence(self, monkeypatch):
+        """감지된 자녀 나이가 있으면 요청의 child_age 보다 우선하는지 확인 (기존 동작)"""
+        from tests.test_analysis_cache import FakeApp, make_image
+        from app.models import face_analyzer as face_analyzer_module
+        from app.models.face_analyzer import FaceAnalyzer
+        from app.services.analysis_cache import FaceAnalysisCache
+
+        monkeypatch.setattr(face_analyzer_module, "analysis_cache", FaceAnalysisCache(max_bytes=1024 * 1024, ttl=60, enabled=True))
+        analyzer = FaceAnalyzer(None)
+        analyzer.app = FakeApp()
+        analyzer.is_loaded = True
+        shared = family_similarity_module.family_analyzer
+        ages = []
+        score = shared.score_child_against_parents
+        monkeypatch.setattr(shared, "score_child_against_parents",
+                            lambda *args, **kwargs: ages.append(kwargs["child_age"]) or score(*args, **kwargs))
+
+        asyncio.run(analyzer.find_most_similar_parent(make_image((10, 20, 30)), [make_image((90, 90, 90))],
+                                                      child_age=5, use_family_analysis=True))
+
+        assert ages == [34]
+
+
+class TestFamilyMatrixAnalysis:
+    """FaceAnalyzer.analyze_family_matrix_sync (/family-matrix) 테스트"""
+
+    @pytest.fixture
+    def analyzer(self, monkeypatch):
+        from tests.test_analysis_cache import FakeApp
+        from app.models import face_analyzer as face_analyzer_module
+        from app.models.face_analyzer import FaceAnalyzer
+        from app.services.analysis_cache import FaceAnalysisCache
+        from app.services.negative_cache import NegativeCache
+
+        monkeypatch.setattr(face_analyzer_module, "analysis_cache", FaceAnalysisCache(max_bytes=1024 * 1024, ttl=60, enabled=True))
+        monkeypatch.setattr(face_analyzer_module, "negative_cache", NegativeCache(ttl=30, max_entries=8, enabled=True))
+        analyzer = FaceAnalyzer(None)
+        analyzer.app = FakeApp()
+        analyzer.is_loaded = True
+        return analyzer
+
+    def test_shared_image_detected_once(self, analyzer):
+        """부모와 자녀 목록에 같은 이미지가 있으면 한 번만 감지하는지 확인"""
+        from tests.test_analysis_cache import make_image
+
+        shared_image = make_image((10, 20, 30))
+        parents = [{"id": "mom", "image": shared_image, "age": None},
+                   {"id": "dad", "image": make_image((90, 90, 90)), "age": None}]
+        children = [{"id": "kid", "image": shared_image, "age": None}]
+
+        result = analyzer.analyze_family_matrix_sync(parents, children)
+
+        assert analyzer.app.calls == 2
+        assert result["parent_ids"] == ["mom", "dad"] and result["child_ids"] == ["kid"]
+        assert result["faces"]["mom"] == result["faces"]["kid"]
+        assert np.array(result["family_similarity_matrix"]).shape == (1, 2)
+
+    def test_failed_image_reported(self, analyzer):
+        """디코딩할 수 없는 이미지는 행렬에서 빠지고 failed_ids 에 들어가는지 확인"""
+        from tests.test_analysis_cache import make_image
+
+        parents = [{"id": "mom", "image": make_image((10, 20, 30)), "age": None},
+                   {"id": "broken", "image": "data:image/png;base64,bm90LWFuLWltYWdl", "age": None}]
+        children = [{"id": "kid", "image": make_image((90, 90, 90)), "age": None}]
+
+        result = analyzer.analyze_family_matrix_sync(parents, children)
+
+        assert result["failed_ids"] == ["broken"]
+        assert result["parent_ids"] == ["mom"] and "broken" not in result["faces"]
+
+    def test_request_age_overrides_detected_age(self, analyzer, monkeypatch):
+        """행렬 분석은 요청에 나이가 있으면 감지된 나이 대신 쓰는지 확인"""
+        from tests.test_analysis_cache import make_image
+
+        shared = family_similarity_module.family_analyzer
+        ages = []
+        matrix = shared.calculate_family_similarity_matrix
+        monkeypatch.setattr(shared, "calculate_family_similarity_matrix",
+                            lambda parents, children, parent_ages, child_ages:
+                            ages.append((parent_ages, child_ages)) or matrix(parents, children, parent_ages, child_ages))
+        parents = [{"id": "mom", "image": make_image((10, 20, 30)), "age": 41},
+                   {"id": "dad", "image": make_image((90, 90, 90)), "age": None}]
+        children = [{"id": "kid", "image": make_image((200, 100, 50)), "age": 6}]
+
+        result = analyzer.analyze_family_matrix_sync(parents, children)
+
+        assert ages == [([41, 34], [6])]
+        assert result["faces"]["kid"]["age"] == 34  # 응답의 얼굴 정보는 감지된 나이
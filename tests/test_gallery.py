@@ -0,0 +1,977 @@
+"""
+얼굴 갤러리 테스트
+"""
+import time
+
+import numpy as np
+import pytest
+
+from app.models.gallery import gallery as gallery_module
+from app.models.gallery.gallery import FaceGallery
+from app.models.gallery.templates import face_quality_weight
+from app.models.gallery.dedupe import LSHTable
+from app.models.gallery.persistence import GalleryLockedError, write_snapshot, load_latest_snapshot
+from app.models.gallery.sharding import ShardedGallery, ShardUnavailableError
+from app.models.family_similarity import FamilySimilarityAnalyzer
+
+
+def random_embeddings(rng, count, dim=512):
+    """테스트용 랜덤 임베딩"""
+    return rng.normal(0, 1, (count, dim)).astype(np.float32)
+
+
+def simulate_crash(gallery):
+    """닫지 않고 프로세스가 죽은 상황 - 커널이 하듯 디렉토리 잠금만 풀림"""
+    gallery._dir_lock.release()
+
+
+def exact_top_k(vectors, query, k):
+    """정답 검색 결과 (전수 비교)"""
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = vectors @ (query / np.linalg.norm(query))
+    return np.argsort(-scores)[:k].tolist()
+
+
+class TestFaceGallery:
+    """갤러리 등록/삭제/검색 테스트"""
+
+    def test_search_matches_exact_top_k(self, tmp_path):
+        """검색 결과가 전수 비교 정답과 같은지 확인"""
+        rng = np.random.default_rng(0)
+        vectors = random_embeddings(rng, 50)
+        gallery = FaceGallery(str(tmp_path), dim=512)
+        for i, vec in enumerate(vectors):
+            gallery.enroll(vec, face_id=f"f{i}")
+
+        query = vectors[7] + rng.normal(0, 0.1, 512)
+        results = gallery.search(query, top_k=5)
+
+        assert [r["id"] for r in results] == [f"f{i}" for i in exact_top_k(vectors, query, 5)]
+        assert results[0]["id"] == "f7"
+        assert all(a["similarity"] >= b["similarity"] for a, b in zip(results, results[1:]))
+
+    def test_delete_excludes_from_search(self, tmp_path):
+        """삭제된 얼굴은 검색되지 않는지 확인"""
+        rng = np.random.default_rng(1)
+        vectors = random_embeddings(rng, 10)
+        gallery = FaceGallery(str(tmp_path), dim=512)
+        for i, vec in enumerate(vectors):
+            gallery.enroll(vec, face_id=f"f{i}")
+
+        assert gallery.delete("f3")
+        assert not gallery.delete("f3")
+        assert gallery.size == 9
+
+        results = gallery.search(vectors[3], top_k=10)
+        assert "f3" not in [r["id"] for r in results]
+        assert len(results) == 9
+
+    def test_duplicate_id_rejected(self, tmp_path):
+        """같은 ID 중복 등록 거부"""
+        gallery = FaceGallery(str(tmp_path), dim=4)
+        gallery.enroll([1, 0, 0, 0], face_id="a")
+        with pytest.raises(ValueError):
+            gallery.enroll([0, 1, 0, 0], face_id="a")
+
+    def test_dimension_mismatch_rejected(self, tmp_path):
+        """차원이 다른 임베딩 거부"""
+        gallery = FaceGallery(str(tmp_path), dim=4)
+        with pytest.raises(ValueError):
+            gallery.enroll([1, 0, 0], face_id="a")
+        with pytest.raises(ValueError):
+            gallery.search([1, 0, 0])
+
+    def test_persists_across_reopen(self, tmp_path):
+        """닫았다 다시 열어도 등록/삭제 상태와 메타데이터가 유지되는지 확인"""
+        rng = np.random.default_rng(2)
+        vectors = random_embeddings(rng, 5)
+        gallery = FaceGallery(str(tmp_path), dim=512)
+        for i, vec in enumerate(vectors):
+            gallery.enroll(vec, face_id=f"f{i}", metadata={"name": f"person{i}"})
+        gallery.delete("f1")
+        gallery.close()
+
+        reopened = FaceGallery(str(tmp_path), dim=512)
+        assert reopened.size == 4
+        results = reopened.search(vectors[2], top_k=1)
+        assert results[0]["id"] == "f2"
+        assert results[0]["metadata"] == {"name": "person2"}
+        assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-5)
+        assert reopened.get("f1") is None
+
+    def test_capacity_growth(self, tmp_path):
+        """초기 용량을 넘겨도 기존 행이 유지되는지 확인"""
+        rng = np.random.default_rng(3)
+        vectors = random_embeddings(rng, 20, dim=8)
+        gallery = FaceGallery(str(tmp_path), dim=8)
+        gallery.store.initial_capacity = 4
+        for i, vec in enumerate(vectors):
+            gallery.enroll(vec, face_id=f"f{i}")
+
+        assert gallery.store.capacity >= 20
+        for i in (0, 5, 19):
+            assert gallery.search(vectors[i], top_k=1)[0]["id"] == f"f{i}"
+
+
+class TestHNSWIndex:
+    """HNSW 인덱스 테스트"""
+
+    def make_gallery(self, tmp_path, vectors, **params):
+        gallery = FaceGallery(str(tmp_path), dim=vectors.shape[1], index_type="hnsw", index_params=params)
+        for i, vec in enumerate(vectors):
+            gallery.enroll(vec, face_id=f"f{i}")
+        return gallery
+
+    def test_recall_against_exact(self, tmp_path):
+        """held-out 질의에 대한 recall@10 이 충분히 높은지 확인"""
+        rng = np.random.default_rng(0)
+        centers = rng.normal(0, 1, (40, 64))
+        vectors = (centers[rng.integers(0, 40, 600)] + rng.normal(0, 0.5, (600, 64))).astype(np.float32)
+        queries = (centers[rng.integers(0, 40, 30)] + rng.normal(0, 0.5, (30, 64))).astype(np.float32)
+
+        gallery = self.make_gallery(tmp_path, vectors, m=8, ef_construction=64)
+        report = gallery.evaluate_recall(queries, k=10, ef_search=64)
+
+        assert report["recall"] >= 0.95
+        assert report["index_type"] == "hnsw"
+
+    def test_incremental_insert_is_searchable(self, tmp_path):
+        """검색 후에 추가한 얼굴도 바로 검색되는지 확인"""
+        rng = np.random.default_rng(1)
+        vectors = random_embeddings(rng, 200, dim=32)
+        gallery = self.make_gallery(tmp_path, vectors, m=8, ef_construction=32)
+        gallery.search(vectors[0], top_k=1)
+
+        new_vector = rng.normal(0, 1, 32)
+        gallery.enroll(new_vector, face_id="new")
+        assert gallery.search(new_vector, top_k=1)[0]["id"] == "new"
+
+    def test_deleted_faces_not_returned(self, tmp_path):
+        """삭제된 얼굴은 그래프에 남아도 결과에서 빠지는지 확인"""
+        rng = np.random.default_rng(2)
+        vectors = random_embeddings(rng, 100, dim=32)
+        gallery = self.make_gallery(tmp_path, vectors, m=8, ef_construction=32)
+
+        gallery.delete("f10")
+        ids = [r["id"] for r in gallery.search(vectors[10], top_k=5)]
+        assert "f10" not in ids
+        assert len(ids) == 5
+
+    def test_deleted_nodes_repaired_and_pruned(self, tmp_path):
+        """많이 삭제해도(진입점 포함) recall 이 유지되고, 스냅샷에서 삭제된 노드가 빠지는지 확인"""
+        rng = np.random.default_rng(5)
+        vectors = random_embeddings(rng, 300, dim=32)
+        gallery = self.make_gallery(tmp_path, vectors, m=8, ef_construction=32)
+        gallery.compact(wait=True)
+
+        deleted = set(rng.choice(300, 120, replace=False).tolist()) | {int(gallery.index.entry_point)}
+        for i in deleted:
+            gallery.delete(f"f{i}")
+        gallery.enroll(vectors[0] * -1.0, face_id="after")
+
+        kept = np.array(sorted(set(range(300)) - deleted))
+        queries = vectors[kept[:40]] + rng.normal(0, 0.1, (40, 32)).astype(np.float32)
+        assert gallery.evaluate_recall(queries, k=5, ef_search=64)["recall"] >= 0.95
+        assert gallery.index.entry_point not in deleted
+        assert gallery.get_stats()["index"]["nodes"] == len(kept) + 1
+
+        gallery.close()
+        reopened = FaceGallery(str(tmp_path), dim=32, index_type="hnsw", index_params={"m": 8})
+        reopened.open()
+        state = reopened.index.get_state()
+        assert np.count_nonzero(state["levels"] >= 0) == len(kept) + 1
+        assert not np.isin(state["layer0_indices"], list(deleted)).any()
+        assert reopened.search(vectors[0] * -1.0, top_k=1)[0]["id"] == "after"
+
+    def test_index_rebuilt_on_reopen(self, tmp_path):
+        """다시 열 때 저장된 얼굴로 인덱스가 구성되는지 확인"""
+        rng = np.random.default_rng(3)
+        vectors = random_embeddings(rng, 50, dim=16)
+        gallery = self.make_gallery(tmp_path, vectors, m=4, ef_construction=16)
+        gallery.close()
+
+        reopened = FaceGallery(str(tmp_path), dim=16, index_type="hnsw", index_params={"m": 4})
+        assert reopened.get_stats()["index"]["nodes"] == 50
+        assert reopened.search(vectors[7], top_k=1)[0]["id"] == "f7"
+
+
+class TestIVFPQIndex:
+    """IVF-PQ 인덱스 테스트"""
+
+    params = {"nlist": 8, "m": 8, "nprobe": 4, "rerank": 50, "iterations": 10}
+
+    def make_data(self, seed, count=600, dim=32):
+        rng = np.random.default_rng(seed)
+        centers = rng.normal(0, 1, (30, dim))
+        vectors = (centers[rng.integers(0, 30, count)] + rng.normal(0, 0.4, (count, dim))).astype(np.float32)
+        queries = (centers[rng.integers(0, 30, 20)] + rng.normal(0, 0.4, (20, dim))).astype(np.float32)
+        return vectors, queries
+
+    def make_gallery(self, tmp_path, vectors):
+        gallery = FaceGallery(str(tmp_path), dim=vectors.shape[1], index_type="ivfpq", index_params=self.params)
+        gallery.enroll_many(vectors, [f"f{i}" for i in range(len(vectors))])
+        return gallery
+
+    def test_untrained_uses_exact_search(self, tmp_path):
+        """학습 전에는 전수 검색 결과를 반환하는지 확인"""
+        vectors, queries = self.make_data(0)
+        gallery = self.make_gallery(tmp_path, vectors)
+
+        assert gallery.evaluate_recall(queries, k=10)["recall"] == 1.0
+        assert gallery.get_stats()["index"]["trained"] is False
+
+    def test_recall_after_training(self, tmp_path):
+        """학습 후 재정렬 포함 recall@10 확인"""
+        vectors, queries = self.make_data(1)
+        gallery = self.make_gallery(tmp_path, vectors)
+        stats = gallery.train_index()
+
+        assert stats["vectors"] == 600
+        assert stats["code_bytes_per_face"] == 8 + 4
+        assert gallery.evaluate_recall(queries, k=10, nprobe=8)["recall"] >= 0.95
+
+    def test_reranked_scores_are_exact(self, tmp_path):
+        """재정렬된 유사도가 원본 벡터 내적과 같은지 확인"""
+        vectors, queries = self.make_data(2)
+        gallery = self.make_gallery(tmp_path, vectors)
+        gallery.train_index()
+
+        results = gallery.search(queries[0], top_k=5, threshold=-1.0)
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        query = queries[0] / np.linalg.norm(queries[0])
+        for result in results:
+            row = int(result["id"][1:])
+            assert result["similarity"] == pytest.approx(float(normalized[row] @ query), abs=1e-5)
+
+    def test_add_after_training_and_delete(self, tmp_path):
+        """학습 후 등록/삭제가 검색에 반영되는지 확인"""
+        vectors, _ = self.make_data(3)
+        gallery = self.make_gallery(tmp_path, vectors)
+        gallery.train_index()
+
+        new_vector = vectors[0] + np.random.default_rng(4).normal(0, 0.01, vectors.shape[1])
+        gallery.enroll(new_vector, face_id="new")
+        gallery.delete("f0")
+
+        ids = [r["id"] for r in gallery.search(new_vector, top_k=3)]
+        assert ids[0] == "new"
+        assert "f0" not in ids
+
+    def test_training_survives_reopen(self, tmp_path):
+        """다시 열면 저장된 코드북으로 얼굴이 다시 인코딩되는지 확인"""
+        vectors, queries = self.make_data(5)
+        gallery = self.make_gallery(tmp_path, vectors)
+        gallery.train_index()
+        gallery.close()
+
+        reopened = FaceGallery(str(tmp_path), dim=32, index_type="ivfpq", index_params=self.params)
+        stats = reopened.get_stats()["index"]
+        assert stats["trained"] is True
+        assert stats["vectors"] == 600
+
+    def test_training_requires_enough_faces(self, tmp_path):
+        """학습 데이터가 부족하면 ValueError"""
+        vectors, _ = self.make_data(6, count=100)
+        gallery = self.make_gallery(tmp_path, vectors)
+        with pytest.raises(ValueError):
+            gallery.train_index()
+
+
+class TestGalleryPersistence:
+    """스냅샷/WAL 복원 테스트"""
+
+    def test_wal_replay_without_close(self, tmp_path):
+        """닫지 않고 종료(크래시)해도 WAL 재생으로 상태가 복원되는지 확인"""
+        rng = np.random.default_rng(0)
+        vectors = random_embeddings(rng, 20, dim=16)
+        gallery = FaceGallery(str(tmp_path), dim=16, wal_fsync=False)
+        gallery.enroll_many(vectors[:10], [f"f{i}" for i in range(10)])
+        for i in range(10, 20):
+            gallery.enroll(vectors[i], face_id=f"f{i}", metadata={"i": i})
+        gallery.delete("f3")
+        simulate_crash(gallery)
+
+        restored = FaceGallery(str(tmp_path), dim=16, wal_fsync=False)
+        report = restored.open()
+
+        assert report["replayed_records"] == 21
+        assert restored.size == 19
+        assert restored.get("f3") is None
+        assert restored.get("f15")["metadata"] == {"i": 15}
+        assert restored.search(vectors[12], top_k=1)[0]["id"] == "f12"
+
+    def test_snapshot_plus_wal_tail(self, tmp_path):
+        """스냅샷 이후 기록만 재생하는지 확인"""
+        rng = np.random.default_rng(1)
+        vectors = random_embeddings(rng, 12, dim=16)
+        gallery = FaceGallery(str(tmp_path), dim=16, wal_fsync=False)
+        gallery.enroll_many(vectors[:8], [f"f{i}" for i in range(8)])
+        assert gallery.compact(wait=True)
+        gallery.enroll_many(vectors[8:], [f"f{i}" for i in range(8, 12)])
+        gallery.delete("f0")
+        simulate_crash(gallery)
+
+        restored = FaceGallery(str(tmp_path), dim=16, wal_fsync=False)
+        report = restored.open()
+
+        assert report["replayed_records"] == 5
+        assert restored.size == 11
+        assert sorted(restored.store.row_of) == sorted(f"f{i}" for i in range(1, 12))
+
+    def test_unreadable_snapshot_falls_back(self, tmp_path):
+        """최신 스냅샷을 읽을 수 없으면 이전 세대 스냅샷으로 복원하는지 확인"""
+        store_state = {"count": 2, "ids": ["a", "b"], "metadata": {}, "attributes": {}, "deleted": []}
+        write_snapshot(tmp_path, 1, 8, "flat", store_state, None)
+        write_snapshot(tmp_path, 2, 8, "flat", dict(store_state, count=3, ids=["a", "b", "c"]), None)
+        (tmp_path / "snapshots" / "00000002" / "records.json").write_text("{\"ids\": [")
+
+        snapshot = load_latest_snapshot(tmp_path)
+
+        assert snapshot["generation"] == 1
+        assert snapshot["ids"] == ["a", "b"]
+
+    def test_crash_mid_compaction(self, tmp_path, monkeypatch):
+        """압축 도중 죽어도 이전 스냅샷과 vectors.f32, 남은 WAL 들로 제자리 갱신/삭제까지 복원되는지 확인"""
+        rng = np.random.default_rng(5)
+        vectors = random_embeddings(rng, 12, dim=16)
+        gallery = FaceGallery(str(tmp_path), dim=16, wal_fsync=False)
+        gallery.enroll_many(vectors[:8], [f"f{i}" for i in range(8)])
+        assert gallery.compact(wait=True)
+        generation = gallery._wal_generation
+
+        # 스냅샷 행을 제자리에서 바꿈
+        gallery.add_samples("f1", [vectors[8]])
+        gallery.delete("f2")
+
+        def torn_snapshot(root, generation, *args):
+            tmp_dir = root / "snapshots" / f"{generation:08d}.tmp"
+            tmp_dir.mkdir(parents=True)
+            (tmp_dir / "records.json").write_text("{")
+            raise OSError("기록 중 종료")
+
+        monkeypatch.setattr(gallery_module, "write_snapshot", torn_snapshot)
+        with pytest.raises(OSError):
+            gallery.compact(wait=True)
+        monkeypatch.undo()
+
+        # 압축이 상태를 복사한 뒤의 기록은 새 WAL 에 쌓임
+        gallery.add_samples("f3", [vectors[9]])
+        gallery.add_samples("f1", [vectors[10]])
+        gallery.delete("f4")
+        gallery.enroll(vectors[11], face_id="f11")
+        expected = {face_id: np.array(gallery.store.vectors[row]) for face_id, row in gallery.store.row_of.items()}
+        simulate_crash(gallery)
+
+        restored = FaceGallery(str(tmp_path), dim=16, wal_fsync=False)
+        report = restored.open()
+
+        assert report["snapshot_generation"] == generation
+        assert sorted(restored.store.row_of) == sorted(expected)
+        for face_id, vector in expected.items():
+            np.testing.assert_array_equal(restored.store.vectors[restored.store.row_of[face_id]], vector)
+        assert restored.get("f1")["samples"] == 3
+        assert restored.search(expected["f3"], top_k=1)[0]["id"] == "f3"
+
+        assert restored.compact(wait=True)
+        assert not list((tmp_path / "snapshots").glob("*.tmp"))
+
+    def test_torn_wal_tail_ignored(self, tmp_path):
+        """WAL 마지막 줄이 잘려 있어도 앞의 기록은 복원되는지 확인"""
+        rng = np.random.default_rng(2)
+        vectors = random_embeddings(rng, 3, dim=8)
+        gallery = FaceGallery(str(tmp_path), dim=8, wal_fsync=False)
+        for i, vec in enumerate(vectors):
+            gallery.enroll(vec, face_id=f"f{i}")
+
+        wal_file = gallery._wal.path
+        data = wal_file.read_bytes()
+        wal_file.write_bytes(data[:-20])
+        simulate_crash(gallery)
+
+        restored = FaceGallery(str(tmp_path), dim=8, wal_fsync=False)
+        restored.open()
+        assert restored.size == 2
+        restored.enroll(vectors[2], face_id="f2")
+        restored.close()
+
+        again = FaceGallery(str(tmp_path), dim=8, wal_fsync=False)
+        assert again.size == 3
+
+    def test_directory_owned_by_one_gallery(self, tmp_path):
+        """같은 디렉토리를 두 번째로 열면 기다리지 않고 실패하고, 닫으면 다시 열 수 있는지 확인"""
+        gallery = FaceGallery(str(tmp_path), dim=8, wal_fsync=False)
+        gallery.enroll(np.ones(8), face_id="a")
+
+        other = FaceGallery(str(tmp_path), dim=8, wal_fsync=False)
+        with pytest.raises(GalleryLockedError):
+            other.open()
+        assert not other.is_open
+
+        gallery.close()
+        assert other.open()["size"] == 1
+        other.close()
+
+    def test_hnsw_graph_restored_from_snapshot(self, tmp_path):
+        """스냅샷의 HNSW 그래프가 다시 만들지 않고 그대로 복원되는지 확인"""
+        rng = np.random.default_rng(3)
+        vectors = random_embeddings(rng, 80, dim=16)
+        params = {"m": 4, "ef_construction": 16}
+        gallery = FaceGallery(str(tmp_path), dim=16, index_type="hnsw", index_params=params, wal_fsync=False)
+        gallery.enroll_many(vectors, [f"f{i}" for i in range(80)])
+        original = gallery.index.get_state()
+        gallery.close()
+
+        restored = FaceGallery(str(tmp_path), dim=16, index_type="hnsw", index_params=params, wal_fsync=False)
+        report = restored.open()
+
+        assert report["replayed_records"] == 0
+        restored_state = restored.index.get_state()
+        assert sorted(restored_state) == sorted(original)
+        for name, array in original.items():
+            np.testing.assert_array_equal(restored_state[name], array)
+        # 스냅샷 배열을 파이썬 목록으로 바꾸지 않고 그대로 매핑
+        assert isinstance(restored.index._base[0][2], np.memmap)
+        assert restored.search(vectors[5], top_k=1)[0]["id"] == "f5"
+
+    def test_background_compaction(self, tmp_path):
+        """WAL 이 임계값을 넘으면 백그라운드 압축 후 이전 WAL 이 지워지는지 확인"""
+        rng = np.random.default_rng(4)
+        vectors = random_embeddings(rng, 10, dim=8)
+        gallery = FaceGallery(str(tmp_path), dim=8, wal_fsync=False, compaction_wal_records=5)
+        gallery.open()
+        first_generation = gallery._wal_generation
+        for i, vec in enumerate(vectors[:5]):
+            gallery.enroll(vec, face_id=f"f{i}")
+
+        # 백그라운드 압축이 끝날 때까지 대기
+        for _ in range(100):
+            if gallery._wal_generation > first_generation and not gallery._compaction_lock.locked():
+                break
+            time.sleep(0.05)
+
+        assert gallery._wal_generation > first_generation
+        assert not (tmp_path / f"wal-{first_generation:08d}.log").exists()
+        simulate_crash(gallery)
+
+        restored = FaceGallery(str(tmp_path), dim=8, wal_fsync=False)
+        assert restored.open()["replayed_records"] == 0
+        assert restored.size == 5
+
+
+class TestFilteredSearch:
+    """속성 필터 검색 테스트"""
+
+    def make_gallery(self, tmp_path, count=300, dim=16, **kwargs):
+        rng = np.random.default_rng(0)
+        vectors = random_embeddings(rng, count, dim=dim)
+        attributes = [
+            {"age": 10 + (i % 50), "gender": "female" if i % 2 else "male", "tenant": f"t{i % 3}"}
+            for i in range(count)
+        ]
+        gallery = FaceGallery(str(tmp_path), dim=dim, wal_fsync=False, **kwargs)
+        gallery.enroll_many(vectors, [f"f{i}" for i in range(count)], attributes=attributes)
+        return gallery, vectors, attributes
+
+    @staticmethod
+    def expected_ids(vectors, attributes, query, k, predicate):
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        scores = normalized @ (query / np.linalg.norm(query))
+        rows = [i for i in np.argsort(-scores) if predicate(attributes[i])]
+        return [f"f{i}" for i in rows[:k]]
+
+    def test_exact_filtered_top_k(self, tmp_path):
+        """필터를 만족하는 얼굴 중 정확한 top-k 를 반환하는지 확인"""
+        gallery, vectors, attributes = self.make_gallery(tmp_path)
+        query = vectors[0]
+        filters = {"gender": "female", "age_min": 20, "age_max": 29, "tenant": "t1"}
+
+        results = gallery.search(query, top_k=5, filters=filters)
+        expected = self.expected_ids(
+            vectors, attributes, query, 5,
+            lambda a: a["gender"] == "female" and 20 <= a["age"] <= 29 and a["tenant"] == "t1"
+        )
+
+        assert [r["id"] for r in results] == expected
+        assert all(r["attributes"]["tenant"] == "t1" for r in results)
+
+    def test_filter_fills_top_k(self, tmp_path):
+        """필터를 검색 후에 적용하지 않으므로 top_k 가 채워지는지 확인"""
+        gallery, vectors, _ = self.make_gallery(tmp_path)
+        results = gallery.search(vectors[0], top_k=20, filters={"tenant": ["t0", "t2"]})
+
+        assert len(results) == 20
+        assert {r["attributes"]["tenant"] for r in results} <= {"t0", "t2"}
+
+    def test_unknown_tenant_returns_nothing(self, tmp_path):
+        """등록되지 않은 테넌트는 결과 없음"""
+        gallery, vectors, _ = self.make_gallery(tmp_path, count=20)
+        assert gallery.search(vectors[0], top_k=5, filters={"tenant": "nobody"}) == []
+
+    def test_hnsw_filtered_traversal(self, tmp_path):
+        """HNSW 탐색 중 필터 적용 시 recall 과 필터 만족 여부 확인"""
+        gallery, vectors, _ = self.make_gallery(
+            tmp_path, count=400, index_type="hnsw", index_params={"m": 8, "ef_construction": 64},
+            filter_exact_limit=0
+        )
+        queries = random_embeddings(np.random.default_rng(9), 10, dim=16)
+        filters = {"gender": "male", "tenant": ["t0", "t1"]}
+
+        report = gallery.evaluate_recall(queries, k=10, ef_search=128, filters=filters)
+        assert report["recall"] >= 0.9
+        for result in gallery.search(queries[0], top_k=10, filters=filters):
+            assert result["attributes"]["gender"] == "male"
+            assert result["attributes"]["tenant"] in ("t0", "t1")
+
+    def test_attributes_persist(self, tmp_path):
+        """속성이 스냅샷과 WAL 을 거쳐 복원되는지 확인"""
+        gallery, vectors, attributes = self.make_gallery(tmp_path, count=10)
+        gallery.compact(wait=True)
+        gallery.enroll(vectors[0] + 0.1, face_id="late", attributes={"age": 25, "gender": "Female", "tenant": "t9"})
+        simulate_crash(gallery)
+
+        restored = FaceGallery(str(tmp_path), dim=16, wal_fsync=False)
+        assert restored.get("f3")["attributes"] == attributes[3]
+        assert restored.get("late")["attributes"] == {"age": 25, "gender": "female", "tenant": "t9"}
+        assert [r["id"] for r in restored.search(vectors[0], top_k=3, filters={"tenant": "t9"})] == ["late"]
+
+
+class TestRangeSearch:
+    """임계값 범위 검색 테스트"""
+
+    def make_clustered(self, seed, clusters=20, per_cluster=50, dim=64):
+        """같은 사람의 얼굴이 연달아 등록된 갤러리 데이터"""
+        rng = np.random.default_rng(seed)
+        centers = rng.normal(0, 1, (clusters, dim))
+        vectors = np.repeat(centers, per_cluster, axis=0) + rng.normal(0, 0.3, (clusters * per_cluster, dim))
+        return rng, vectors.astype(np.float32)
+
+    def brute_force(self, vectors, query, threshold):
+        """정답 범위 검색 (전수 비교)"""
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        scores = vectors @ (query / np.linalg.norm(query))
+        return {f"f{i}" for i in np.flatnonzero(scores >= threshold)}
+
+    def test_matches_brute_force_and_prunes(self, tmp_path):
+        """범위 검색 결과가 전수 비교와 같고 먼 블록은 건너뛰는지 확인"""
+        rng, vectors = self.make_clustered(0)
+        gallery = FaceGallery(str(tmp_path), dim=64, range_block_size=50)
+        gallery.enroll_many(vectors, [f"f{i}" for i in range(len(vectors))])
+
+        query = vectors[120] + rng.normal(0, 0.1, 64)
+        result = gallery.range_search(query, 0.7)
+
+        assert {m["id"] for m in result["matches"]} == self.brute_force(vectors, query, 0.7)
+        assert result["total_matches"] == len(result["matches"]) > 0
+        assert all(a["similarity"] >= b["similarity"] for a, b in zip(result["matches"], result["matches"][1:]))
+        assert result["stats"]["candidate_blocks"] < result["stats"]["total_blocks"] == 20
+        assert result["stats"]["scanned_rows"] < len(vectors)
+
+    def test_bounds_follow_appends_and_deletes(self, tmp_path):
+        """등록/삭제 후에도 결과가 정확한지 확인 (마지막 블록 상한 갱신)"""
+        rng, vectors = self.make_clustered(1, clusters=5)
+        gallery = FaceGallery(str(tmp_path), dim=64, range_block_size=64)
+        gallery.enroll_many(vectors[:100], [f"f{i}" for i in range(100)])
+        query = vectors[230]
+        gallery.range_search(query, 0.6)
+
+        gallery.enroll_many(vectors[100:], [f"f{i}" for i in range(100, len(vectors))])
+        gallery.delete("f230")
+        expected = self.brute_force(vectors, query, 0.6) - {"f230"}
+
+        assert {m["id"] for m in gallery.range_search(query, 0.6)["matches"]} == expected
+
+    def test_max_results_and_filters(self, tmp_path):
+        """max_results 로 잘리고 속성 필터가 적용되는지 확인"""
+        rng, vectors = self.make_clustered(2, clusters=4)
+        gallery = FaceGallery(str(tmp_path), dim=64, range_block_size=32)
+        gallery.enroll_many(
+            vectors, [f"f{i}" for i in range(len(vectors))],
+            attributes=[{"tenant": "a" if i % 2 else "b"} for i in range(len(vectors))]
+        )
+
+        result = gallery.range_search(vectors[10], 0.5, max_results=5)
+        assert len(result["matches"]) == 5
+        assert result["truncated"] and result["total_matches"] > 5
+
+        filtered = gallery.range_search(vectors[10], 0.5, filters={"tenant": "a"})
+        assert filtered["matches"]
+        assert all(m["attributes"]["tenant"] == "a" for m in filtered["matches"])
+
+    def test_streamed_blocks_cover_all_matches(self, tmp_path):
+        """블록 단위 스트리밍 결과를 합치면 전체 결과와 같은지 확인"""
+        rng, vectors = self.make_clustered(3, clusters=6)
+        gallery = FaceGallery(str(tmp_path), dim=64, range_block_size=25)
+        gallery.enroll_many(vectors, [f"f{i}" for i in range(len(vectors))])
+
+        stats = {}
+        blocks = list(gallery.iter_range_search(vectors[0], 0.6, stats=stats))
+
+        assert len(blocks) > 1
+        assert stats["matches"] == sum(len(b) for b in blocks)
+        assert {m["id"] for b in blocks for m in b} == self.brute_force(vectors, vectors[0], 0.6)
+
+    def test_ivfpq_list_pruning(self, tmp_path):
+        """학습된 IVF-PQ 는 역리스트 상한으로 가지치기하며 결과는 정확한지 확인"""
+        rng, vectors = self.make_clustered(4, clusters=10, per_cluster=60, dim=32)
+        params = {"nlist": 16, "m": 8, "nprobe": 4, "iterations": 10}
+        gallery = FaceGallery(str(tmp_path), dim=32, index_type="ivfpq", index_params=params)
+        gallery.enroll_many(vectors, [f"f{i}" for i in range(len(vectors))])
+        gallery.train_index()
+
+        query = vectors[300]
+        result = gallery.range_search(query, 0.7)
+
+        assert {m["id"] for m in result["matches"]} == self.brute_force(vectors, query, 0.7)
+        assert result["stats"]["candidate_blocks"] < 16
+
+        gallery.close()
+        reopened = FaceGallery(str(tmp_path), dim=32, index_type="ivfpq", index_params=params)
+        assert {m["id"] for m in reopened.range_search(query, 0.7)["matches"]} == self.brute_force(vectors, query, 0.7)
+
+
+class TestIdentityTemplates:
+    """신원 템플릿 테스트"""
+
+    def unit(self, vector):
+        return vector / np.linalg.norm(vector)
+
+    def test_template_is_weighted_mean(self, tmp_path):
+        """템플릿이 품질 가중 평균이고 행 수가 늘지 않는지 확인"""
+        rng = np.random.default_rng(0)
+        photos = random_embeddings(rng, 3, dim=32)
+        gallery = FaceGallery(str(tmp_path), dim=32)
+        gallery.enroll(photos[0], face_id="p", quality=0.9)
+        result = gallery.add_samples("p", photos[1:], qualities=[0.5, 0.2])
+
+        expected = self.unit(sum(w * self.unit(v) for w, v in zip([0.9, 0.5, 0.2], photos)))
+        row = gallery.store.row_of["p"]
+        assert result["samples"] == 3
+        assert gallery.store.count == 1
+        assert np.allclose(gallery.store.vectors[row], expected, atol=1e-5)
+
+        with pytest.raises(ValueError):
+            gallery.add_samples("missing", photos[:1])
+
+    def test_templates_survive_replay_and_snapshot(self, tmp_path):
+        """WAL 재생과 스냅샷 복원 후 템플릿/표본이 같은지 확인"""
+        rng = np.random.default_rng(1)
+        photos = random_embeddings(rng, 4, dim=16)
+        gallery = FaceGallery(str(tmp_path), dim=16, max_exemplars=2)
+        gallery.enroll(photos[0], face_id="p")
+        gallery.add_samples("p", photos[1:], qualities=[0.3, 0.9, 0.6])
+        template = np.array(gallery.store.vectors[0])
+        gallery._wal.close()
+        simulate_crash(gallery)
+
+        replayed = FaceGallery(str(tmp_path), dim=16, max_exemplars=2)
+        replayed.open()
+        assert np.allclose(replayed.store.vectors[0], template)
+        assert replayed.get("p")["samples"] == 4
+        assert replayed.get("p")["exemplars"] == 2
+        replayed.close()
+
+        restored = FaceGallery(str(tmp_path), dim=16, max_exemplars=2)
+        restored.open()
+        assert np.allclose(restored.store.vectors[0], template)
+        # 가중치가 높은 첫 사진(1.0)과 세 번째 사진(0.9)만 남음
+        assert restored.exemplars.best_score("p", self.unit(photos[2])) == pytest.approx(1.0, abs=1e-5)
+        assert restored.exemplars.best_score("p", self.unit(photos[1])) < 0.99
+        restored.add_samples("p", photos[:1])
+        assert restored.get("p")["samples"] == 5
+
+    def test_exemplars_rerank_candidates(self, tmp_path):
+        """대표 표본이 있으면 상위 후보 점수가 표본 유사도로 보정되는지 확인"""
+        rng = np.random.default_rng(2)
+        photos = random_embeddings(rng, 2, dim=32)
+        others = random_embeddings(rng, 20, dim=32)
+        gallery = FaceGallery(str(tmp_path), dim=32, max_exemplars=4)
+        gallery.enroll_many(others, [f"o{i}" for i in range(20)])
+        gallery.enroll(photos[0], face_id="p")
+        gallery.add_samples("p", photos[1:])
+
+        query = photos[1]
+        template_only = gallery.search(query, top_k=1, use_exemplars=False)[0]
+        reranked = gallery.search(query, top_k=1)[0]
+
+        assert reranked["id"] == "p"
+        assert reranked["similarity"] == pytest.approx(1.0, abs=1e-5)
+        assert template_only["similarity"] < reranked["similarity"]
+
+    def test_ivfpq_reencodes_updated_template(self, tmp_path):
+        """IVF-PQ 에서 템플릿 갱신 후에도 검색되고 인덱스 크기가 같은지 확인"""
+        rng = np.random.default_rng(3)
+        vectors = random_embeddings(rng, 300, dim=16)
+        params = {"nlist": 4, "m": 4, "nprobe": 4, "iterations": 5}
+        gallery = FaceGallery(str(tmp_path), dim=16, index_type="ivfpq", index_params=params)
+        gallery.enroll_many(vectors, [f"f{i}" for i in range(300)])
+        gallery.train_index()
+
+        gallery.add_samples("f0", [vectors[1]])
+        expected = self.unit(self.unit(vectors[0]) + self.unit(vectors[1]))
+
+        assert len(gallery.index) == 300
+        assert gallery.search(expected, top_k=1)[0]["id"] == "f0"
+        assert {m["id"] for m in gallery.range_search(expected, 0.99)["matches"]} == {"f0"}
+
+    def test_face_quality_weight(self):
+        """검출 점수와 얼굴 크기로 가중치 계산"""
+        assert face_quality_weight(0.9, {"width": 200, "height": 250}) == pytest.approx(0.9)
+        assert face_quality_weight(0.8, {"width": 56, "height": 56}) == pytest.approx(0.4)
+        assert face_quality_weight(None) == 1.0
+
+
+class TestDeduplication:
+    """LSH 중복 억제 테스트"""
+
+    def near(self, rng, vector, noise=0.05):
+        """거의 같은 얼굴 (유사도 약 0.99)"""
+        vector = vector / np.linalg.norm(vector)
+        return vector + rng.normal(0, noise / np.sqrt(vector.shape[0]), vector.shape[0])
+
+    def test_lsh_finds_near_duplicates(self):
+        """가까운 벡터는 후보로 찾고 무관한 벡터는 대부분 거르는지 확인"""
+        rng = np.random.default_rng(0)
+        vectors = random_embeddings(rng, 2000, dim=64)
+        table = LSHTable(64)
+        table.add(np.arange(2000), vectors)
+
+        found = sum(i in table.candidates(table.keys(self.near(rng, vectors[i]))[0]) for i in range(100))
+        assert found >= 98
+        assert table.candidates(table.keys(vectors[0])[0]).size < 50
+
+    def test_skip_duplicate_enrollment(self, tmp_path):
+        """거의 같은 얼굴은 건너뛰고 기존 ID 를 반환하는지 확인"""
+        rng = np.random.default_rng(1)
+        vectors = random_embeddings(rng, 50, dim=64)
+        gallery = FaceGallery(str(tmp_path), dim=64, dedupe_threshold=0.95)
+        gallery.enroll_many(vectors, [f"f{i}" for i in range(50)])
+
+        outcomes = []
+        assert gallery.enroll(self.near(rng, vectors[7]), face_id="again", outcomes=outcomes) == "f7"
+        assert outcomes[0]["status"] == "skipped" and outcomes[0]["similarity"] >= 0.95
+        assert gallery.size == 50 and gallery.get("again") is None
+
+        assert gallery.enroll(self.near(rng, vectors[7]), face_id="forced", dedupe=False) == "forced"
+        assert gallery.enroll(random_embeddings(rng, 1, dim=64)[0], face_id="new") == "new"
+        assert gallery.get_stats()["dedupe"]["skipped"] == 1
+
+    def test_merge_duplicates_within_batch(self, tmp_path):
+        """같은 요청 안의 중복은 앞선 얼굴의 템플릿에 합치는지 확인"""
+        rng = np.random.default_rng(2)
+        base = random_embeddings(rng, 3, dim=64)
+        batch = [base[0], self.near(rng, base[0]), base[1], self.near(rng, base[0]), base[2]]
+        gallery = FaceGallery(str(tmp_path), dim=64, dedupe_threshold=0.95, dedupe_action="merge")
+
+        outcomes = []
+        ids = gallery.enroll_many(batch, ["a", "b", "c", "d", "e"], outcomes=outcomes)
+
+        assert ids == ["a", "a", "c", "a", "e"]
+        assert [o["status"] for o in outcomes] == ["enrolled", "merged", "enrolled", "merged", "enrolled"]
+        assert gallery.size == 3
+        assert gallery.get("a")["samples"] == 3
+
+    def test_bulk_dedupe_job(self, tmp_path):
+        """기존 데이터 일괄 정리 (dry_run 은 변경 없음)"""
+        rng = np.random.default_rng(3)
+        vectors = random_embeddings(rng, 200, dim=64)
+        duplicates = np.array([self.near(rng, vectors[i]) for i in range(0, 200, 10)])
+        gallery = FaceGallery(str(tmp_path), dim=64)
+        gallery.enroll_many(np.vstack([vectors, duplicates]), [f"f{i}" for i in range(220)])
+
+        preview = gallery.dedupe(threshold=0.95, dry_run=True)
+        assert preview["duplicates"] == 20 and preview["applied"] == 0
+        assert gallery.size == 220
+
+        result = gallery.dedupe(threshold=0.95, action="merge")
+        assert result["applied"] == 20
+        assert gallery.size == 200
+        assert gallery.get("f0")["samples"] == 2
+        assert {p["duplicate_of"] for p in result["pairs"]} == {f"f{i}" for i in range(0, 200, 10)}
+
+        with pytest.raises(ValueError):
+            gallery.dedupe()
+
+
+class TestKinshipSearch:
+    """친족 검색 테스트 (ANN 후보 + 가족 유사도 재정렬)"""
+
+    @staticmethod
+    def random_landmarks(rng, count):
+        """눈/코/입 배치가 조금씩 다른 5점 랜드마크"""
+        base = np.array([[120, 80], [180, 80], [150, 120], [130, 160], [170, 160]], dtype=np.float64)
+        return base + rng.normal(0, 6, (count, 5, 2))
+
+    def build(self, tmp_path, rng, count=200):
+        vectors = random_embeddings(rng, count, dim=64)
+        landmarks = self.random_landmarks(rng, count)
+        ages = rng.integers(5, 80, count)
+        gallery = FaceGallery(str(tmp_path), dim=64)
+        gallery.enroll_many(
+            vectors, [f"f{i}" for i in range(count)],
+            attributes=[{"age": int(a), "landmarks": lm.tolist()} for a, lm in zip(ages, landmarks)]
+        )
+        return gallery, vectors, landmarks, ages
+
+    def test_reranks_shortlist_by_family_similarity(self, tmp_path):
+        """임베딩 상위 shortlist 후보만 가족 유사도로 계산하고, 점수가 단건 분석기와 같은지 확인"""
+        rng = np.random.default_rng(0)
+        gallery, vectors, landmarks, ages = self.build(tmp_path, rng)
+        query = vectors[3] + vectors[9] + rng.normal(0, 0.3, 64)
+        query_landmarks = self.random_landmarks(rng, 1)[0]
+
+        stats = {}
+        results = gallery.kinship_search(query, landmarks=query_landmarks.tolist(), age=10, top_k=5,
+                                         shortlist=20, stats=stats)
+        assert stats["candidates"] == 20
+        assert len(results) == 5
+        assert {r["id"] for r in results} <= {f"f{i}" for i in exact_top_k(vectors, query, 20)}
+        assert all(a["family_similarity"] >= b["family_similarity"] for a, b in zip(results, results[1:]))
+
+        analyzer = FamilySimilarityAnalyzer()
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        for match in results:
+            i = int(match["id"][1:])
+            expected = analyzer.calculate_family_similarity(
+                {"embedding": normalized[i], "landmarks": [{"x": x, "y": y} for x, y in landmarks[i]]},
+                {"embedding": query / np.linalg.norm(query),
+                 "landmarks": [{"x": x, "y": y} for x, y in query_landmarks]},
+                parent_age=int(ages[i]), child_age=10
+            )
+            assert match["family_similarity"] == pytest.approx(expected["family_similarity"], abs=1e-5)
+            assert match["similarity_level"] == expected["similarity_level"]
+
+    def test_exclude_ids_and_landmarks_persist(self, tmp_path):
+        """질의 본인 제외와 등록 랜드마크가 재시작 후에도 쓰이는지 확인"""
+        rng = np.random.default_rng(1)
+        gallery, vectors, landmarks, _ = self.build(tmp_path, rng, count=50)
+        gallery.close()
+
+        reopened = FaceGallery(str(tmp_path), dim=64)
+        assert np.allclose(reopened.get("f7")["attributes"]["landmarks"], landmarks[7])
+        results = reopened.kinship_search(vectors[7], landmarks=landmarks[7].tolist(), top_k=10,
+                                          exclude_ids=["f7"])
+        assert len(results) == 10
+        assert "f7" not in [r["id"] for r in results]
+        assert reopened.kinship_search(vectors[7], top_k=10, min_family_similarity=1.0) == []
+
+        with pytest.raises(ValueError):
+            reopened.enroll(vectors[0], face_id="bad", attributes={"landmarks": [[1, 2]] * 4 + [["x"]]})
+
+
+class TestShardedGallery:
+    """샤딩 갤러리 scatter-gather 테스트 (샤드 프로세스를 로컬에서 모두 띄움)"""
+
+    def test_scatter_gather_matches_single_gallery(self, tmp_path):
+        """샤드 결과를 합친 top-k 가 전수 비교 정답과 같고 재시작 후에도 유지되는지 확인"""
+        rng = np.random.default_rng(0)
+        vectors = random_embeddings(rng, 300, dim=32)
+        gallery = ShardedGallery(str(tmp_path), num_shards=3, dim=32)
+        try:
+            gallery.open()
+            assert gallery.enroll_many(vectors, [f"f{i}" for i in range(300)])[0] == "f0"
+            stats = gallery.get_stats()
+            assert stats["size"] == 300
+            assert all(shard["size"] > 0 for shard in stats["shards"].values())
+
+            query = vectors[42] + rng.normal(0, 0.1, 32)
+            search_stats = {}
+            results = gallery.search(query, top_k=10, stats=search_stats)
+            assert [r["id"] for r in results] == [f"f{i}" for i in exact_top_k(vectors, query, 10)]
+            assert search_stats["shards"] == 3 and search_stats["failed_shards"] == []
+
+            assert gallery.get("f7")["id"] == "f7"
+            assert gallery.delete("f7") and gallery.get("f7") is None
+            assert gallery.range_search(vectors[42], 0.99)["matches"][0]["id"] == "f42"
+        finally:
+            gallery.close()
+
+        reopened = ShardedGallery(str(tmp_path), num_shards=3, dim=32)
+        try:
+            assert reopened.size == 299
+        finally:
+            reopened.close()
+
+        with pytest.raises(ValueError):
+            ShardedGallery(str(tmp_path), num_shards=2, dim=32).open()
+
+    def test_tenant_partition_and_shard_failure(self, tmp_path, monkeypatch):
+        """테넌트 필터는 한 샤드에만 가고, 죽은 샤드는 재시작하거나 부분 결과로 처리되는지 확인"""
+        rng = np.random.default_rng(1)
+        vectors = random_embeddings(rng, 120, dim=16)
+        tenants = [f"t{i % 8}" for i in range(120)]
+        gallery = ShardedGallery(str(tmp_path), num_shards=2, partition="tenant", dim=16)
+        assert {gallery.shard_for("x", {"tenant": t}) for t in tenants} == {0, 1}
+        try:
+            gallery.enroll_many(vectors, [f"f{i}" for i in range(120)], attributes=[{"tenant": t} for t in tenants])
+
+            stats = {}
+            results = gallery.search(vectors[9], top_k=5, filters={"tenant": "t1"}, stats=stats)
+            assert stats["shards"] == 1
+            assert results[0]["id"] == "f9"
+            assert all(r["attributes"]["tenant"] == "t1" for r in results)
+
+            # 죽은 샤드는 다음 호출 때 스냅샷 + WAL 로 다시 열림
+            gallery.shards[0].process.kill()
+            gallery.shards[0].process.join()
+            assert len(gallery.search(vectors[0], top_k=120)) == 120
+            assert gallery.get_stats()["restarts"] == 1
+
+            # 재시작도 실패하면 나머지 샤드의 부분 결과
+            def fail_start():
+                raise ShardUnavailableError("테스트")
+            gallery.shards[0].process.kill()
+            gallery.shards[0].process.join()
+            monkeypatch.setattr(gallery.shards[0], "start", fail_start)
+            stats = {}
+            results = gallery.search(vectors[0], top_k=120, stats=stats)
+            assert stats["failed_shards"] == [0]
+            assert 0 < len(results) < 120
+            with pytest.raises(ShardUnavailableError):
+                gallery.enroll_many(vectors[:10], [f"n{i}" for i in range(10)],
+                                    attributes=[{"tenant": t} for t in tenants[:10]])
+        finally:
+            gallery.close()
+
+    def test_timed_out_shard_not_restarted(self, tmp_path):
+        """시간 초과된 샤드는 죽이지 않고, 늦은 응답은 다음 호출이 버리는지 확인"""
+        rng = np.random.default_rng(2)
+        vectors = random_embeddings(rng, 40, dim=16)
+        gallery = ShardedGallery(str(tmp_path), num_shards=2, dim=16)
+        try:
+            gallery.enroll_many(vectors, [f"f{i}" for i in range(40)])
+            shard = gallery.shards[0]
+            pid = shard.process.pid
+
+            with pytest.raises(ShardUnavailableError):
+                shard.call("get_stats", timeout=1e-9)
+            assert shard.alive and shard._pending is not None
+
+            assert shard.call("size") > 0
+            assert shard.process.pid == pid
+            assert gallery.size == 40
+            assert gallery.get_stats()["restarts"] == 0
+        finally:
+            gallery.close()
+
+    def test_hash_partition_dedupe_sees_all_shards(self, tmp_path):
+        """해시 분할 등록 중복 억제가 다른 샤드의 얼굴과 같은 요청의 얼굴을 찾아 합치는지 확인"""
+        rng = np.random.default_rng(3)
+        vectors = random_embeddings(rng, 30, dim=16)
+        gallery = ShardedGallery(str(tmp_path), num_shards=3, dim=16, dedupe_threshold=0.95, dedupe_action="merge")
+        try:
+            gallery.enroll_many(vectors, [f"f{i}" for i in range(30)])
+            new_ids = [f"d{i}" for i in range(30)] + ["y0", "y1"]
+            assert any(gallery.shard_for(d) != gallery.shard_for(f"f{i}") for i, d in enumerate(new_ids[:30]))
+
+            extra = rng.normal(0, 1, 16).astype(np.float32)
+            batch = np.vstack([vectors + rng.normal(0, 0.01, vectors.shape), [extra, extra * 1.01]])
+            outcomes = []
+            ids = gallery.enroll_many(batch, new_ids, outcomes=outcomes)
+
+            assert ids == [f"f{i}" for i in range(30)] + ["y0", "y0"]
+            assert [o["status"] for o in outcomes] == ["merged"] * 30 + ["enrolled", "merged"]
+            assert gallery.size == 31
+            assert gallery.get("f3")["samples"] == 2
+            assert gallery.get("y0")["samples"] == 2
+        finally:
+            gallery.close()
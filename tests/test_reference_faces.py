@@ -0,0 +1,156 @@
+"""
+참조 얼굴 테스트
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.models import face_analyzer as face_analyzer_module
+from app.models.face_analyzer import FaceAnalyzer
+from app.schemas.requests import FaceComparisonRequest, FamilySimilarityRequest, FindMostSimilarParentRequest
+from app.services.analysis_cache import FaceAnalysisCache, CachedFace
+from app.services.negative_cache import NegativeCache
+from app.services.redis_cache import RedisAnalysisCache
+from app.services.reference_faces import ReferenceFaceManager
+from tests.test_analysis_cache import FakeApp, InMemoryRedis, make_image
+
+
+def make_face(age=30):
+    embedding = np.ones(512, dtype=np.float32) / np.sqrt(512)
+    return CachedFace(bbox=[0, 0, 100, 100], kps=None, det_score=0.9, normed_embedding=embedding, age=age, gender=1)
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    """가짜 모델과 새 캐시를 쓰는 FaceAnalyzer"""
+    monkeypatch.setattr(face_analyzer_module, "analysis_cache", FaceAnalysisCache(max_bytes=1024 * 1024, ttl=60, enabled=True))
+    monkeypatch.setattr(face_analyzer_module, "negative_cache", NegativeCache(ttl=30, max_entries=8, enabled=True))
+    analyzer = FaceAnalyzer(None)
+    analyzer.app = FakeApp()
+    analyzer.is_loaded = True
+    return analyzer
+
+
+class TestReferenceFaceManager:
+    """참조 얼굴 저장소 테스트"""
+
+    def test_create_copies_face_and_overrides_age(self):
+        manager = ReferenceFaceManager(ttl=60, max_references=10)
+        face = make_face(age=30)
+
+        reference = manager.create(face, age=7, name="child")
+
+        assert reference.face is not face and face.age == 30
+        assert reference.face.age == 7
+        assert manager.get(reference.reference_id) is reference
+        assert reference.get_summary()["name"] == "child"
+
+    def test_expired_reference_is_removed(self, monkeypatch):
+        manager = ReferenceFaceManager(ttl=10, max_references=10)
+        now = [1000.0]
+        monkeypatch.setattr("app.services.reference_faces.time.time", lambda: now[0])
+        reference = manager.create(make_face())
+
+        now[0] += 5
+        assert manager.get(reference.reference_id) is reference
+        now[0] += 9  # 조회로 TTL 이 연장되어 아직 유효
+        assert manager.get(reference.reference_id) is reference
+        now[0] += 11
+        assert manager.get(reference.reference_id) is None
+
+        with pytest.raises(ValueError, match="참조 얼굴을 찾을 수 없거나 만료되었습니다"):
+            manager.resolve(reference.reference_id)
+
+    def test_capacity_evicts_least_recently_used(self, monkeypatch):
+        manager = ReferenceFaceManager(ttl=60, max_references=2)
+        now = [1000.0]
+        monkeypatch.setattr("app.services.reference_faces.time.time", lambda: now[0])
+        first = manager.create(make_face())
+        now[0] += 1
+        second = manager.create(make_face())
+        now[0] += 1
+        manager.get(first.reference_id)
+
+        manager.create(make_face())
+
+        assert manager.get(second.reference_id) is None
+        assert manager.get(first.reference_id) is first
+        assert manager.get_stats()["active_references"] == 2
+
+    def test_shared_between_workers(self):
+        """Redis 계층이 켜져 있으면 다른 워커(매니저)가 만든 참조 얼굴도 찾는지 확인"""
+        shared = RedisAnalysisCache(ttl=60, enabled=True, prefix="test:", client=InMemoryRedis())
+        worker_a = ReferenceFaceManager(ttl=60, max_references=10, shared=shared)
+        worker_b = ReferenceFaceManager(ttl=60, max_references=10, shared=shared)
+        reference = worker_a.create(make_face(age=30), age=7, name="child")
+
+        found = worker_b.resolve(reference.reference_id)
+
+        assert found.face.age == 7 and found.name == "child"
+        np.testing.assert_array_equal(found.face.normed_embedding, reference.face.normed_embedding)
+        assert worker_b.get_stats()["active_references"] == 1
+
+        worker_a.delete(reference.reference_id)
+        assert ReferenceFaceManager(ttl=60, max_references=10, shared=shared).get(reference.reference_id) is None
+
+    def test_unshared_reference_stays_in_process(self):
+        worker_a = ReferenceFaceManager(ttl=60, max_references=10, shared=RedisAnalysisCache(enabled=False))
+        worker_b = ReferenceFaceManager(ttl=60, max_references=10, shared=RedisAnalysisCache(enabled=False))
+        reference = worker_a.create(make_face())
+
+        assert worker_b.get(reference.reference_id) is None
+
+
+class TestReferenceFaceAnalysis:
+    """참조 얼굴을 쓰는 비교 분석 테스트"""
+
+    def test_compare_with_reference_skips_detection(self, analyzer):
+        """참조 얼굴 쪽은 다시 감지하지 않고 대상 이미지만 분석하는지 확인"""
+        image = make_image()
+        manager = ReferenceFaceManager(ttl=60, max_references=10)
+        reference = manager.create(asyncio.run(analyzer.analyze_reference_face(image)))
+        assert analyzer.app.calls == 1
+
+        result = asyncio.run(analyzer.compare_faces(reference, make_image((10, 20, 30))))
+
+        assert analyzer.app.calls == 2
+        assert -1.0 <= result["similarity"] <= 1.0
+
+        same = asyncio.run(analyzer.compare_faces(reference, image))
+        assert analyzer.app.calls == 2
+        assert same["similarity"] == pytest.approx(1.0, abs=1e-3)
+
+    def test_family_similarity_uses_reference_age(self, analyzer):
+        manager = ReferenceFaceManager(ttl=60, max_references=10)
+        child = manager.create(asyncio.run(analyzer.analyze_reference_face(make_image())), age=6)
+
+        result = asyncio.run(analyzer.analyze_family_similarity(make_image((10, 20, 30)), child))
+
+        assert result["child_face"]["age"] == 6
+
+    def test_face_id_out_of_range(self, analyzer):
+        with pytest.raises(ValueError, match="face_id"):
+            asyncio.run(analyzer.analyze_reference_face(make_image(), face_id=3))
+
+
+class TestReferenceRequestValidation:
+    """이미지/참조 얼굴 ID 중 하나만 받는 요청 검증"""
+
+    def test_exactly_one_of_image_or_reference(self):
+        image = make_image()
+
+        assert FaceComparisonRequest(source_reference_id="ref", target_image=image).source_image is None
+        assert FamilySimilarityRequest(parent_image=image, child_reference_id="ref").child_image is None
+        assert FindMostSimilarParentRequest(child_reference_id="ref", parent_images=[image, image]).child_reference_id == "ref"
+
+        with pytest.raises(ValueError):
+            FaceComparisonRequest(source_image=image, source_reference_id="ref", target_image=image)
+        with pytest.raises(ValueError):
+            FamilySimilarityRequest(parent_image=image)
+        with pytest.raises(ValueError):
+            FindMostSimilarParentRequest(parent_images=[image, image])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
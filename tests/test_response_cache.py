@@ -0,0 +1,107 @@
+"""
+응답 캐시 (ETag / If-None-Match) 테스트
+"""
+import asyncio
+import base64
+import io
+import json
+
+import pytest
+from PIL import Image
+from starlette.requests import Request
+
+from app.api.routes import faces
+from app.schemas.requests import AgeEstimationRequest, FaceDetectionRequest
+from app.services.response_cache import ResponseCache, make_etag, etag_matches
+
+
+def make_image(color=(200, 100, 50)):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def http_request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": headers})
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(max_entries=16, max_bytes=1024 * 1024, ttl=60, enabled=True)
+    monkeypatch.setattr(faces, "response_cache", cache)
+    return cache
+
+
+class TestResponseCache:
+    """ETag 생성과 캐시 한도 테스트"""
+
+    def test_etag_depends_on_inputs(self):
+        """이미지, 파라미터, 모델 버전 중 하나라도 다르면 ETag 가 달라지는지 확인"""
+        image = make_image()
+        etag = make_etag("detect_faces", [image], {"max_faces": 5}, "buffalo_l")
+
+        assert etag == make_etag("detect_faces", [image], {"max_faces": 5}, "buffalo_l")
+        assert etag.startswith('"') and etag.endswith('"')
+        assert len({
+            etag,
+            make_etag("detect_faces", [make_image((0, 0, 0))], {"max_faces": 5}, "buffalo_l"),
+            make_etag("detect_faces", [image], {"max_faces": 6}, "buffalo_l"),
+            make_etag("detect_faces", [image], {"max_faces": 5}, "antelopev2"),
+            make_etag("estimate_age", [image], {"max_faces": 5}, "buffalo_l")
+        }) == 5
+
+    def test_if_none_match_parsing(self):
+        assert etag_matches('"a", "b"', '"b"')
+        assert etag_matches('W/"b"', '"b"')
+        assert etag_matches("*", '"b"')
+        assert not etag_matches('"a"', '"b"') and not etag_matches(None, '"b"')
+
+    def test_bounded_by_entries_and_bytes(self):
+        """항목 수와 바이트 한도를 넘으면 오래된 본문부터 제거하는지 확인"""
+        cache = ResponseCache(max_entries=3, max_bytes=250, ttl=60, enabled=True)
+        for i in range(3):
+            cache.put(f"e{i}", b"x" * 100)
+
+        stats = cache.get_stats()
+        assert cache.get("e0") is None and cache.get("e2") is not None
+        assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 200, 1)
+
+        cache.put("huge", b"x" * 1000)
+        assert cache.get("huge") is None
+
+
+class TestConditionalRoutes:
+    """엔드포인트의 ETag / 304 / 캐시 본문 응답 테스트 (더미 모드)"""
+
+    def test_repeat_served_from_cache_and_304(self, cache):
+        image = make_image()
+        first = asyncio.run(faces.estimate_age(AgeEstimationRequest(image=image), http_request()))
+        etag = first.headers["etag"]
+
+        repeat = asyncio.run(faces.estimate_age(AgeEstimationRequest(image=image), http_request()))
+        not_modified = asyncio.run(faces.estimate_age(AgeEstimationRequest(image=image), http_request(etag)))
+
+        assert first.headers["x-cache"] == "MISS" and repeat.headers["x-cache"] == "HIT"
+        first_body, repeat_body = json.loads(first.body), json.loads(repeat.body)
+        assert repeat_body["success"] is True and repeat_body["data"] == first_body["data"]
+        # 메타데이터는 저장하지 않고 요청마다 새로 만듦
+        assert repeat_body["metadata"]["request_id"] != first_body["metadata"]["request_id"]
+        assert sorted(repeat_body["metadata"]) == sorted(first_body["metadata"])
+        assert not_modified.status_code == 304 and not_modified.headers["etag"] == etag
+
+        stats = cache.get_stats()
+        assert (stats["hits"], stats["misses"], stats["not_modified"]) == (1, 1, 1)
+
+    def test_parameters_change_etag(self, cache):
+        """파라미터가 다르면 캐시된 응답을 쓰지 않는지 확인"""
+        image = make_image()
+        with_landmarks = asyncio.run(faces.detect_faces(
+            FaceDetectionRequest(image=image, include_landmarks=True), http_request()
+        ))
+        without = asyncio.run(faces.detect_faces(
+            FaceDetectionRequest(image=image, include_landmarks=False), http_request(with_landmarks.headers["etag"])
+        ))
+
+        assert without.status_code == 200
+        assert without.headers["etag"] != with_landmarks.headers["etag"]
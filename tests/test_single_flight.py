@@ -0,0 +1,157 @@
+"""
+단일 실행 (처리 중 동일 요청 합침) 테스트
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.request_context import start_request, set_request_flag
+from app.services.single_flight import SingleFlight
+
+
+class SlowAnalyzer:
+    """동기 추론처럼 이벤트 루프를 막는 분석 메서드 (호출 수 기록)"""
+
+    def __init__(self, delay=0.2, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.threads = set()
+
+    def analyze(self, image, threshold=0.5):
+        self.calls += 1
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"image": image, "threshold": threshold, "faces": [{"age": 30}]}
+
+
+async def run_concurrently(flight, analyzer, requests):
+    return await asyncio.gather(
+        *[flight.run("analyze", [image], {"threshold": threshold}, analyzer.analyze, image, threshold=threshold)
+          for image, threshold in requests],
+        return_exceptions=True
+    )
+
+
+class TestSingleFlight:
+    """SingleFlight 동작 테스트"""
+
+    def test_identical_requests_share_one_computation(self):
+        """동시에 들어온 동일 요청이 한 번만 계산되고 결과 사본을 받는지 확인"""
+        flight = SingleFlight(enabled=True)
+        analyzer = SlowAnalyzer()
+
+        results = asyncio.run(run_concurrently(flight, analyzer, [("img-a", 0.5)] * 5))
+
+        assert analyzer.calls == 1
+        assert all(result == results[0] for result in results)
+        assert len({id(result) for result in results}) == 5
+        assert threading.get_ident() not in analyzer.threads
+
+        stats = flight.get_stats()
+        assert (stats["leaders"], stats["coalesced"], stats["in_flight"]) == (1, 4, 0)
+        assert stats["coalesced_by_endpoint"] == {"analyze": 4}
+
+    def test_leaders_run_in_sized_executor(self):
+        """리더 계산이 정해진 크기의 작업 스레드 풀에서 실행되는지 확인"""
+        flight = SingleFlight(enabled=True, max_workers=1)
+        analyzer = SlowAnalyzer(delay=0.02)
+
+        asyncio.run(run_concurrently(flight, analyzer, [("img-a", 0.5), ("img-b", 0.5), ("img-c", 0.5)]))
+
+        assert analyzer.calls == 3 and len(analyzer.threads) == 1
+        assert flight.get_stats()["max_workers"] == 1
+
+    def test_different_keys_run_separately(self):
+        """이미지나 파라미터가 다르면 따로 계산하는지 확인"""
+        flight = SingleFlight(enabled=True)
+        analyzer = SlowAnalyzer(delay=0.05)
+
+        asyncio.run(run_concurrently(flight, analyzer, [("img-a", 0.5), ("img-b", 0.5), ("img-a", 0.7)]))
+
+        assert analyzer.calls == 3
+        assert flight.get_stats()["coalesced"] == 0
+
+    def test_error_reaches_every_waiter(self):
+        """리더 계산 오류가 합류한 요청에도 전달되고, 이후 요청은 다시 계산하는지 확인"""
+        flight = SingleFlight(enabled=True)
+        analyzer = SlowAnalyzer(error=ValueError("얼굴을 찾을 수 없습니다"))
+
+        results = asyncio.run(run_concurrently(flight, analyzer, [("img-a", 0.5)] * 3))
+        assert all(isinstance(result, ValueError) for result in results)
+        assert analyzer.calls == 1 and flight.get_stats()["failures"] == 1
+
+        asyncio.run(run_concurrently(flight, analyzer, [("img-a", 0.5)]))
+        assert analyzer.calls == 2
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        """리더 요청이 취소돼도 뒤따르는 요청은 결과를 받는지 확인"""
+        flight = SingleFlight(enabled=True)
+        analyzer = SlowAnalyzer()
+
+        async def scenario():
+            leader = asyncio.ensure_future(flight.run("analyze", ["img-a"], {}, analyzer.analyze, "img-a"))
+            await asyncio.sleep(0.01)
+            follower = asyncio.ensure_future(flight.run("analyze", ["img-a"], {}, analyzer.analyze, "img-a"))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(scenario())["image"] == "img-a"
+        assert analyzer.calls == 1
+
+    def test_followers_receive_leader_flags(self):
+        """리더 계산 중 남긴 요청 표시가 합류한 요청에도 반영되는지 확인"""
+        flight = SingleFlight(enabled=True)
+
+        def no_face(image):
+            time.sleep(0.1)
+            set_request_flag("no_face")
+            raise ValueError("이미지에서 얼굴을 찾을 수 없습니다")
+
+        async def request():
+            flags = start_request()
+            with pytest.raises(ValueError):
+                await flight.run("analyze", ["img-a"], {}, no_face, "img-a")
+            return flags
+
+        async def scenario():
+            return await asyncio.gather(request(), request())
+
+        assert all(flags.get("no_face") for flags in asyncio.run(scenario()))
+        assert flight.get_stats()["coalesced"] == 1
+
+    def test_disabled_runs_every_request(self):
+        flight = SingleFlight(enabled=False)
+        analyzer = SlowAnalyzer(delay=0.01)
+
+        asyncio.run(run_concurrently(flight, analyzer, [("img-a", 0.5)] * 3))
+
+        assert analyzer.calls == 3
+
+    def test_analyzer_async_variants_run_off_event_loop(self):
+        """FaceAnalyzer 의 async 판이 이벤트 루프가 아닌 분석 작업 스레드에서 실행되는지 확인"""
+        from app.models.face_analyzer import FaceAnalyzer, _async_variant
+
+        threads = []
+
+        def estimate_age_sync(self, image):
+            threads.append(threading.current_thread().name)
+            return {"age": 30}
+
+        estimate_age = _async_variant(estimate_age_sync)
+
+        async def scenario():
+            return await estimate_age(FaceAnalyzer(None), "img"), threading.current_thread().name
+
+        result, loop_thread = asyncio.run(scenario())
+        assert result == {"age": 30}
+        assert threads and threads[0] != loop_thread and threads[0].startswith("analysis")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])